@@ -19,6 +19,25 @@ INSERT INTO settings (key, value, description) VALUES
 ('recent_check_interval_minutes', '2', 'Таймаут "недавних" проверок (устар.?).')
 ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, description = EXCLUDED.description;
 
+-- Комментарий: Сроки хранения истории и параметры очистки (flask checks retention, v5.0.7).
+-- При повторном применении обновляются только описания, значения, измененные администратором, сохраняются.
+INSERT INTO settings (key, value, description) VALUES
+('retention_raw_checks_days', '30', 'Срок хранения "сырых" результатов проверок node_checks/node_check_details (сутки). Старше - только агрегаты.'),
+('retention_rollup_hourly_days', '180', 'Срок хранения почасовых агрегатов node_check_rollups (сутки).'),
+('retention_rollup_daily_days', '1095', 'Срок хранения суточных агрегатов node_check_rollups (сутки).'),
+('retention_system_events_days', '90', 'Срок хранения системных событий system_events (сутки).'),
+('retention_system_events_hot_days', '2', 'Сколько суток журнала событий хранится в горячих (полностью индексированных) секциях; старше - холодные секции только с BRIN. API событий без start_time читает только горячие секции.'),
+('retention_purge_batch_size', '5000', 'Размер пакета удаления строк за одну транзакцию при очистке.')
+ON CONFLICT (key) DO UPDATE SET description = EXCLUDED.description;
+
+-- Комментарий: Политика записи событий о результатах проверок (v5.0.23).
+-- check_events_mode: 'transitions' - только смена состояния задания, 'all' - событие на каждый
+-- результат (как до 5.0.23), 'none' - не записывать. Сводки - flask checks event-summaries.
+INSERT INTO settings (key, value, description) VALUES
+('check_events_mode', 'transitions', 'События о результатах проверок в system_events: transitions - только смена IsAvailable/CheckSuccess задания, all - на каждый результат, none - не записывать.'),
+('check_events_summary_interval_seconds', '60', 'Интервал сводных событий CHECK_RESULTS_SUMMARY "получено N результатов от объекта" (сек, 0 - не записывать).')
+ON CONFLICT (key) DO UPDATE SET description = EXCLUDED.description;
+
 -- =============================================================================
 -- == КОНЕЦ ЗАПОЛНЕНИЯ settings ==
 -- =============================================================================
\ No newline at end of file
@@ -25,6 +25,16 @@ INSERT INTO node_property_types (name, description) VALUES
 ('critical_service_name', 'Имя критичной службы для этого типа узла')
 ON CONFLICT (name) DO NOTHING;
 
+-- Комментарий: Методы заданий, результаты которых определяют статус узла на дашборде (через запятую, например 'PING' или 'SQL_QUERY_EXECUTE,PROCESS_LIST'). Версия 5.0.20.
+INSERT INTO node_property_types (name, description) VALUES
+('status_methods', 'Методы заданий, определяющие статус узла (через запятую)')
+ON CONFLICT (name) DO NOTHING;
+
+-- Комментарий: Сочетание результатов нескольких заданий статуса: 'latest' (последний результат), 'worst' (худший - нужны все доступные), 'best' (лучший - достаточно одного). Версия 5.0.20.
+INSERT INTO node_property_types (name, description) VALUES
+('status_combine', 'Сочетание результатов заданий статуса: latest / worst / best')
+ON CONFLICT (name) DO NOTHING;
+
 -- Сброс последовательности (если нужно)
 -- SELECT setval(pg_get_serial_sequence('node_property_types', 'id'), COALESCE(max(id), 1)) FROM node_property_types;
 
@@ -20,6 +20,15 @@ INSERT INTO node_properties (node_type_id, property_type_id, property_value) VAL
 (0, (SELECT id FROM node_property_types WHERE name='icon_color' LIMIT 1), '#95a5a6')
 ON CONFLICT (node_type_id, property_type_id) DO UPDATE SET property_value = EXCLUDED.property_value;
 
+-- Комментарий: Политика статуса по умолчанию для базового типа: последний результат PING-заданий.
+INSERT INTO node_properties (node_type_id, property_type_id, property_value) VALUES
+(0, (SELECT id FROM node_property_types WHERE name='status_methods' LIMIT 1), 'PING')
+ON CONFLICT (node_type_id, property_type_id) DO UPDATE SET property_value = EXCLUDED.property_value;
+
+INSERT INTO node_properties (node_type_id, property_type_id, property_value) VALUES
+(0, (SELECT id FROM node_property_types WHERE name='status_combine' LIMIT 1), 'latest')
+ON CONFLICT (node_type_id, property_type_id) DO UPDATE SET property_value = EXCLUDED.property_value;
+
 -- =============================================================================
 -- == КОНЕЦ ЗАПОЛНЕНИЯ node_properties ДЛЯ БАЗОВОГО ТИПА ==
 -- =============================================================================
\ No newline at end of file
@@ -1,7 +1,7 @@
 -- =============================================================================
 -- Файл: 001_create_tables.sql
 -- Назначение: Создание всех таблиц базы данных мониторинга (pipeline-архитектура).
--- Версия схемы: 5.0.3 (исправлено: добавлено поле check_success в node_checks)
+-- Версия схемы: 5.0.25 (хранимые оффлайн-конфигурации и отметки их устаревания)
 -- =============================================================================
 
 -- ----------------------------------------------------------------------------- 
@@ -126,10 +126,13 @@ COMMENT ON TABLE nodes IS 'Узлы мониторинга (серверы, ра
 -- ----------------------------------------------------------------------------- 
 -- Таблица: api_keys
 -- Назначение: Хранение API-ключей для аутентификации агентов и сервисов.
+--             Версия 5.0.4: Ключ имеет формат 'sm_<key_prefix>_<secret>'.
+--             key_prefix хранится открыто и индексирован, key_hash - хеш секретной части.
 -- -----------------------------------------------------------------------------
 CREATE TABLE api_keys (
     id SERIAL PRIMARY KEY,
-    key_hash VARCHAR(64) NOT NULL UNIQUE,         -- SHA-256 хеш от API-ключа
+    key_prefix VARCHAR(16) NULL,                  -- Публичный идентификатор ключа (NULL у ключей старого формата)
+    key_hash VARCHAR(255) NOT NULL UNIQUE,        -- Хеш Werkzeug секретной части (у старых ключей - хеш всего ключа)
     description TEXT NOT NULL,                    -- Описание назначения ключа
     role VARCHAR(50) NOT NULL DEFAULT 'agent'     -- Роль ключа (agent, loader, configurator, admin)
         CHECK (role IN ('agent', 'loader', 'configurator', 'admin')),
@@ -140,14 +143,21 @@ CREATE TABLE api_keys (
     CONSTRAINT fk_api_key_subdivision_object_id FOREIGN KEY (object_id) REFERENCES subdivisions(object_id) ON DELETE SET NULL -- Если подразделение удалено, object_id сбрасывается в NULL
 );
 COMMENT ON TABLE api_keys IS 'API ключи для аутентификации агентов и внешних скриптов/сервисов.';
+COMMENT ON COLUMN api_keys.key_prefix IS 'Публичный идентификатор ключа (часть предъявляемого ключа). Поиск ключа выполняется по нему, затем проверяется один хеш.';
 
 -- ----------------------------------------------------------------------------- 
 -- Таблица: node_checks
 -- Назначение: Хранение истории результатов выполнения проверок/pipeline-заданий.
 --             Версия 5.0.3: Добавлено поле check_success.
+--             Версия 5.0.6: Секционирование RANGE по checked_at (секция на сутки UTC,
+--             имя node_checks_pYYYYMMDD). Секции создаются заранее функцией
+--             create_check_partitions (flask checks create-partitions), старые
+--             удаляются целиком drop_check_partitions. Первичный ключ включает
+--             ключ секционирования, поэтому ссылки на node_checks(id) из других
+--             таблиц (кроме node_check_details) - логические, без FK.
 -- -----------------------------------------------------------------------------
 CREATE TABLE node_checks (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     node_id INTEGER NOT NULL,                     -- Ссылка на nodes.id (будет добавлена в 005_add_foreign_keys.sql)
     assignment_id INTEGER NULL,                   -- Ссылка на node_check_assignments.id (будет добавлена)
     method_id INTEGER NOT NULL,                   -- Ссылка на check_methods.id (основной метод задания, будет добавлена)
@@ -159,9 +169,13 @@ CREATE TABLE node_checks (
     executor_host TEXT NULL,                      -- Имя хоста исполнителя (агента)
     resolution_method TEXT NULL,                  -- Имя метода/типа проверки, как его определил агент/загрузчик
     assignment_config_version VARCHAR(100) NULL,  -- Версия конфигурации заданий (для оффлайн-агентов)
-    agent_script_version VARCHAR(100) NULL        -- Версия скрипта агента
-);
-COMMENT ON TABLE node_checks IS 'История результатов выполнения проверок/pipeline-заданий узлов.';
+    agent_script_version VARCHAR(100) NULL,       -- Версия скрипта агента
+    PRIMARY KEY (id, checked_at)
+) PARTITION BY RANGE (checked_at);
+-- Секция по умолчанию: принимает строки, для дат которых секция еще не создана.
+-- В штатном режиме должна оставаться пустой (см. flask checks create-partitions).
+CREATE TABLE node_checks_default PARTITION OF node_checks DEFAULT;
+COMMENT ON TABLE node_checks IS 'История результатов выполнения проверок/pipeline-заданий узлов. Секционирована по checked_at (сутки UTC).';
 COMMENT ON COLUMN node_checks.is_available IS 'Указывает, удалось ли успешно выполнить саму проверку/pipeline (True) или произошла ошибка выполнения (False).';
 COMMENT ON COLUMN node_checks.check_success IS 'Результат выполнения критериев успеха для данной проверки/pipeline (True - критерии пройдены, False - не пройдены, Null - критерии не применялись или ошибка их оценки).';
 COMMENT ON COLUMN node_checks.checked_at IS 'Серверное время UTC записи результата проверки в базу данных.';
@@ -191,21 +205,106 @@ COMMENT ON COLUMN node_check_assignments.last_node_check_id IS 'Ссылка н
 -- ----------------------------------------------------------------------------- 
 -- Таблица: node_check_details
 -- Назначение: Детализированные результаты проверок (например, вывод команды, список файлов).
+--             Версия 5.0.6: Секционирование по checked_at (копия node_checks.checked_at),
+--             секции совпадают с секциями node_checks и удаляются вместе с ними.
 -- -----------------------------------------------------------------------------
 CREATE TABLE node_check_details (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     node_check_id INTEGER NOT NULL,               -- Ссылка на node_checks.id (будет добавлена)
+    checked_at TIMESTAMPTZ NOT NULL,              -- Равно node_checks.checked_at родительской записи (ключ секционирования)
     detail_type TEXT NOT NULL,                    -- Тип детализации (например, 'PING_REPLY', 'PROCESS_INFO_RAW', 'STEPS_RESULTS')
-    data JSONB NOT NULL                           -- Сами детали в формате JSONB
+    data JSONB NOT NULL,                          -- Сами детали в формате JSONB
+    PRIMARY KEY (id, checked_at)
+) PARTITION BY RANGE (checked_at);
+CREATE TABLE node_check_details_default PARTITION OF node_check_details DEFAULT;
+COMMENT ON TABLE node_check_details IS 'Детализированные результаты отдельных проверок или шагов pipeline в формате JSONB. Секционирована по checked_at (сутки UTC).';
+
+-- -----------------------------------------------------------------------------
+-- Таблица: node_check_ingest_keys
+-- Назначение: Ключи идемпотентности принятых результатов проверок (v5.0.15).
+--             Повторная отправка результата с тем же ключом (повтор файла
+--             result_loader после таймаута, повтор порции очереди приема)
+--             не создает новую запись в node_checks (INSERT ... ON CONFLICT DO NOTHING).
+--             Ключ передается агентом или вычисляется API из (задание, время
+--             выполнения на агенте, исполнитель). Секционирование RANGE по
+--             check_day - суткам UTC времени выполнения на агенте: повтор
+--             всегда попадает в ту же секцию независимо от времени повтора,
+--             проверка ключа - один поиск по PK небольшой суточной секции.
+--             Секции создаются/удаляются вместе с секциями node_checks.
+-- -----------------------------------------------------------------------------
+CREATE TABLE node_check_ingest_keys (
+    check_day DATE NOT NULL,                      -- Сутки UTC времени выполнения проверки (ключ секционирования)
+    idempotency_key TEXT NOT NULL,                -- Ключ идемпотентности результата
+    node_check_id INTEGER NOT NULL,               -- ID записи в node_checks, созданной по этому ключу
+    PRIMARY KEY (check_day, idempotency_key)
+) PARTITION BY RANGE (check_day);
+CREATE TABLE node_check_ingest_keys_default PARTITION OF node_check_ingest_keys DEFAULT;
+COMMENT ON TABLE node_check_ingest_keys IS 'Ключи идемпотентности принятых результатов проверок (защита от повторной записи). Секционирована по check_day (сутки UTC).';
+COMMENT ON COLUMN node_check_ingest_keys.check_day IS 'Сутки UTC времени выполнения проверки на агенте (check_timestamp; без него - время записи).';
+
+-- ----------------------------------------------------------------------------- 
+-- Таблица: node_check_latest
+-- Назначение: Текущее состояние каждого задания - последний результат и время
+--             последнего полного успеха. Поддерживается процедурами записи
+--             результатов (record_check_result_proc, record_check_results_bulk),
+--             чтобы дашборд читал O(заданий) строк вместо сканирования истории.
+--             Версия 5.0.5. Заполнение по существующей истории: flask checks backfill-latest.
+-- -----------------------------------------------------------------------------
+CREATE TABLE node_check_latest (
+    assignment_id INTEGER PRIMARY KEY,            -- Ссылка на node_check_assignments.id (будет добавлена)
+    node_id INTEGER NOT NULL,                     -- Ссылка на nodes.id (будет добавлена)
+    method_id INTEGER NOT NULL,                   -- Основной метод задания (копия из node_checks)
+    last_node_check_id INTEGER NOT NULL,          -- ID последней записи в node_checks по заданию
+    is_available BOOLEAN NOT NULL,                -- is_available последнего результата
+    check_success BOOLEAN NULL,                   -- check_success последнего результата
+    checked_at TIMESTAMPTZ NOT NULL,              -- Время записи последнего результата в БД
+    check_timestamp TIMESTAMPTZ NULL,             -- Время выполнения последней проверки на агенте
+    executor_object_id INTEGER NULL,
+    executor_host TEXT NULL,
+    last_success_at TIMESTAMPTZ NULL              -- checked_at последнего результата с is_available=TRUE и check_success=TRUE
 );
-COMMENT ON TABLE node_check_details IS 'Детализированные результаты отдельных проверок или шагов pipeline в формате JSONB.';
+COMMENT ON TABLE node_check_latest IS 'Текущее состояние заданий: последний результат проверки и время последнего успеха. Поддерживается при записи результатов.';
+COMMENT ON COLUMN node_check_latest.last_success_at IS 'Серверное время последнего результата, в котором и is_available, и check_success были TRUE.';
+
+-- ----------------------------------------------------------------------------- 
+-- Таблица: node_check_rollups
+-- Назначение: Почасовые и суточные агрегаты доступности по заданиям (v5.0.7).
+--             Заполняются из node_checks до удаления "сырой" истории (flask checks
+--             retention), после чего история старше срока хранения доступна
+--             только в агрегированном виде. Сроки хранения - в таблице settings.
+-- -----------------------------------------------------------------------------
+CREATE TABLE node_check_rollups (
+    id BIGSERIAL PRIMARY KEY,
+    bucket_size VARCHAR(4) NOT NULL               -- Размер интервала агрегации
+        CHECK (bucket_size IN ('hour', 'day')),
+    bucket_start TIMESTAMPTZ NOT NULL,            -- Начало интервала (UTC, с точностью до часа/суток)
+    node_id INTEGER NOT NULL,                     -- Ссылка на nodes.id (будет добавлена)
+    assignment_id INTEGER NULL,                   -- ID задания (логическая ссылка; NULL - задание удалено)
+    method_id INTEGER NOT NULL,                   -- Основной метод задания
+    checks_count INTEGER NOT NULL,                -- Количество результатов за интервал
+    available_count INTEGER NOT NULL,             -- Из них с is_available = TRUE
+    success_count INTEGER NOT NULL,               -- Из них с is_available = TRUE и check_success = TRUE
+    first_checked_at TIMESTAMPTZ NOT NULL,        -- Время первого результата в интервале
+    last_checked_at TIMESTAMPTZ NOT NULL          -- Время последнего результата в интервале
+);
+COMMENT ON TABLE node_check_rollups IS 'Почасовые/суточные агрегаты результатов проверок по заданиям (количество, доля успешных, первое/последнее время).';
+COMMENT ON COLUMN node_check_rollups.success_count IS 'Количество результатов с is_available = TRUE и check_success = TRUE; доля успешных = success_count / checks_count.';
 
 -- ----------------------------------------------------------------------------- 
 -- Таблица: system_events
 -- Назначение: Журнал системных событий приложения (логи).
+--             Версия 5.0.24: Журнал только дописывается и секционирован RANGE по
+--             event_time (секция на сутки UTC, имя system_events_pYYYYMMDD).
+--             Горячие секции (последние retention_system_events_hot_days суток и
+--             секции вперед) имеют полный набор индексов для фильтров и поиска;
+--             старые секции переводятся в холодные - остается один BRIN-индекс
+--             (event_time, id). Индексов на родительской таблице нет: набор индексов
+--             задается для каждой секции (create_event_partitions, demote_event_partitions),
+--             поэтому первичного ключа нет - id уникален по последовательности,
+--             в горячих секциях - уникальный индекс по id.
 -- -----------------------------------------------------------------------------
 CREATE TABLE system_events (
-    id SERIAL PRIMARY KEY,
+    id SERIAL NOT NULL,
     event_time TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL, -- Время возникновения события (серверное UTC)
     event_type VARCHAR(50) NOT NULL,              -- Тип события (например, 'USER_LOGIN', 'API_KEY_CREATED', 'FILE_PROCESSED')
     severity VARCHAR(10) NOT NULL DEFAULT 'INFO'  -- Уровень важности события
@@ -218,13 +317,20 @@ CREATE TABLE system_events (
     node_check_id INTEGER NULL,                   -- ID связанного результата проверки
     related_entity VARCHAR(50),                   -- Тип другой связанной сущности (например, 'FILE', 'USER')
     related_entity_id TEXT,                       -- ID или имя этой связанной сущности
-    details JSONB                                 -- Дополнительные детали события в JSONB
-);
-COMMENT ON TABLE system_events IS 'Журнал системных событий (логирование действий пользователей, ошибок приложения, важных операций).';
+    details JSONB,                                -- Дополнительные детали события в JSONB
+    message_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('russian', message)) STORED -- Версия 5.0.22: полнотекстовый поиск по сообщению
+) PARTITION BY RANGE (event_time);
+-- Секция по умолчанию (индексируется как горячая): принимает события, для дат которых
+-- секция еще не создана. В штатном режиме пуста (секции создаются заранее).
+CREATE TABLE system_events_default PARTITION OF system_events DEFAULT;
+COMMENT ON TABLE system_events IS 'Журнал системных событий (логирование действий пользователей, ошибок приложения, важных операций). Секционирован по event_time (сутки UTC): горячие секции полностью индексированы, холодные - только BRIN.';
+COMMENT ON COLUMN system_events.message_tsv IS 'Лексемы сообщения (конфигурация russian) для полнотекстового поиска; вычисляется PostgreSQL при записи.';
 
 -- ----------------------------------------------------------------------------- 
 -- Таблица: offline_config_versions
 -- Назначение: Хранение версий конфигураций для оффлайн-агентов.
+--             Версия 5.0.25: Сгенерированная конфигурация заданий хранится в config_json
+--             и адресуется content_hash; API отдает ее без повторной генерации.
 -- -----------------------------------------------------------------------------
 CREATE TABLE offline_config_versions (
     version_id SERIAL PRIMARY KEY,
@@ -237,9 +343,27 @@ CREATE TABLE offline_config_versions (
     created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL, -- Время создания версии
     is_active BOOLEAN DEFAULT TRUE NOT NULL,      -- Является ли эта версия текущей активной для данного object_id и config_type
     file_path VARCHAR(255) NULL,                  -- Путь к файлу конфигурации на сервере (если он сохраняется)
-    transport_system_code VARCHAR(10) NULL        -- Код ТС, для которого эта конфигурация (для удобства поиска)
+    transport_system_code VARCHAR(10) NULL,       -- Код ТС, для которого эта конфигурация (для удобства поиска)
+    config_json JSONB NULL                        -- Версия 5.0.25: сгенерированная конфигурация (для 'assignments')
 );
 COMMENT ON TABLE offline_config_versions IS 'Версии конфигураций (заданий или скриптов) для оффлайн-агентов, позволяет отслеживать изменения.';
+COMMENT ON COLUMN offline_config_versions.content_hash IS 'SHA-256 содержимого конфигурации без времени генерации и тега версии. Одинаковое содержимое - одна версия.';
+COMMENT ON COLUMN offline_config_versions.config_json IS 'Сгенерированная конфигурация заданий (ответ /objects/<id>/offline_config); NULL у версий, созданных до 5.0.25.';
+
+-- ----------------------------------------------------------------------------- 
+-- Таблица: offline_config_dirty
+-- Назначение: Объекты (подразделения), чья хранимая оффлайн-конфигурация устарела.
+--             Отметки ставят триггеры на изменение заданий, узлов, подразделений,
+--             методов и интервала по умолчанию; снимает generate_offline_config.
+--             Версия 5.0.25.
+-- -----------------------------------------------------------------------------
+CREATE TABLE offline_config_dirty (
+    object_id INTEGER PRIMARY KEY,                -- subdivisions.object_id (логическая ссылка)
+    changes BIGINT DEFAULT 1 NOT NULL,            -- Счетчик изменений с момента отметки
+    marked_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP NOT NULL -- Время последнего изменения
+);
+COMMENT ON TABLE offline_config_dirty IS 'Объекты, для которых хранимая оффлайн-конфигурация заданий устарела и будет сгенерирована заново при следующем запросе.';
+COMMENT ON COLUMN offline_config_dirty.changes IS 'Увеличивается при каждом изменении. Генерация снимает отметку, только если счетчик не изменился за время генерации.';
 
 -- =============================================================================
 -- == КОНЕЦ СОЗДАНИЯ ТАБЛИЦ ==
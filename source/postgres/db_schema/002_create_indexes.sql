@@ -10,6 +10,15 @@
 
 CREATE EXTENSION IF NOT EXISTS pgcrypto;
 
+-- Версия 5.0.22: pg_trgm (contrib) - триграммные индексы для поиска подстроки (ILIKE '%...%').
+-- Без расширения схема создается, поиск подстроки выполняется без индексов.
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE WARNING 'Расширение pg_trgm недоступно (%): триграммные индексы поиска не будут созданы.', SQLERRM;
+END $$;
+
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: subdivisions
 -- -----------------------------------------------------------------------------
@@ -45,6 +54,8 @@ CREATE INDEX idx_api_keys_is_active ON api_keys(is_active);
 COMMENT ON INDEX idx_api_keys_role IS 'Оптимизирует выборку по роли в таблице api_keys.';
 COMMENT ON INDEX idx_api_keys_object_id IS 'Оптимизирует выборку по объекту в таблице api_keys.';
 COMMENT ON INDEX idx_api_keys_is_active IS 'Оптимизирует выборку активных ключей в таблице api_keys.';
+CREATE UNIQUE INDEX idx_api_keys_key_prefix ON api_keys(key_prefix) WHERE key_prefix IS NOT NULL;
+COMMENT ON INDEX idx_api_keys_key_prefix IS 'Поиск API-ключа по публичному префиксу при аутентификации (одна выборка вместо перебора всех ключей).';
 
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: check_methods
@@ -110,7 +121,6 @@ COMMENT ON INDEX idx_nodes_type IS 'Оптимизирует выборку уз
 -- Индекс для поиска по имени узла.
 CREATE INDEX IF NOT EXISTS idx_nodes_name ON nodes(name);
 COMMENT ON INDEX idx_nodes_name IS 'Ускоряет поиск узлов по имени (например, в UI управления).';
--- CREATE INDEX IF NOT EXISTS idx_nodes_name_trgm ON nodes USING gin (name gin_trgm_ops); -- Для ILIKE поиска, если расширение pg_trgm установлено
 
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: node_check_assignments
@@ -135,8 +145,9 @@ CREATE INDEX IF NOT EXISTS idx_node_checks_node_id_checked_at ON node_checks(nod
 COMMENT ON INDEX idx_node_checks_node_id_checked_at IS 'Оптимизирует выборку истории проверок для конкретного узла с сортировкой по времени.';
 
 -- Индекс для внешнего ключа assignment_id (ускоряет поиск истории проверок по конкретному заданию).
-CREATE INDEX IF NOT EXISTS idx_node_checks_assignment_id ON node_checks(assignment_id);
-COMMENT ON INDEX idx_node_checks_assignment_id IS 'Ускоряет поиск всех результатов проверок, выполненных по конкретному заданию.';
+-- Версия 5.0.6: Составной с checked_at - история задания читается без сортировки.
+CREATE INDEX IF NOT EXISTS idx_node_checks_assignment_id_checked_at ON node_checks(assignment_id, checked_at DESC);
+COMMENT ON INDEX idx_node_checks_assignment_id_checked_at IS 'Оптимизирует выборку истории проверок конкретного задания с сортировкой по времени.';
 
 -- Индекс для внешнего ключа method_id (ускоряет поиск истории проверок по методу).
 CREATE INDEX IF NOT EXISTS idx_node_checks_method_id ON node_checks(method_id);
@@ -170,6 +181,23 @@ COMMENT ON INDEX idx_assignment_unique_pipeline_hash IS 'Уникальност
 CREATE UNIQUE INDEX unique_node_method_pipeline ON node_check_assignments (node_id, method_id, pipeline);
 COMMENT ON INDEX unique_node_method_pipeline IS 'Гарантирует уникальность сочетания node_id, method_id и pipeline.';
 
+-- -----------------------------------------------------------------------------
+-- Индексы для таблицы: node_check_latest
+-- -----------------------------------------------------------------------------
+-- Выборка текущего состояния заданий конкретных узлов (дашборд, статус после записи).
+CREATE INDEX IF NOT EXISTS idx_node_check_latest_node_id ON node_check_latest(node_id);
+COMMENT ON INDEX idx_node_check_latest_node_id IS 'Ускоряет выборку текущего состояния заданий для набора узлов.';
+
+-- -----------------------------------------------------------------------------
+-- Индексы для таблицы: node_check_rollups
+-- -----------------------------------------------------------------------------
+CREATE INDEX IF NOT EXISTS idx_node_check_rollups_node ON node_check_rollups(node_id, bucket_size, bucket_start DESC);
+COMMENT ON INDEX idx_node_check_rollups_node IS 'Агрегированная история узла по интервалам.';
+CREATE INDEX IF NOT EXISTS idx_node_check_rollups_assignment ON node_check_rollups(assignment_id, bucket_size, bucket_start DESC);
+COMMENT ON INDEX idx_node_check_rollups_assignment IS 'Агрегированная история задания по интервалам.';
+CREATE INDEX IF NOT EXISTS idx_node_check_rollups_bucket ON node_check_rollups(bucket_size, bucket_start);
+COMMENT ON INDEX idx_node_check_rollups_bucket IS 'Пересчет и удаление агрегатов по диапазону интервалов.';
+
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: node_check_details
 -- -----------------------------------------------------------------------------
@@ -188,41 +216,48 @@ COMMENT ON INDEX idx_node_check_details_data IS 'Позволяет эффект
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: system_events
 -- -----------------------------------------------------------------------------
--- Индекс по времени события (основной для просмотра лога).
-CREATE INDEX IF NOT EXISTS idx_system_events_event_time ON system_events(event_time DESC);
-COMMENT ON INDEX idx_system_events_event_time IS 'Основной индекс для отображения и фильтрации системных событий по времени.';
-
--- Индекс по типу события (для фильтрации).
-CREATE INDEX IF NOT EXISTS idx_system_events_event_type ON system_events(event_type);
-COMMENT ON INDEX idx_system_events_event_type IS 'Ускоряет фильтрацию системных событий по их типу.';
-
--- Индекс по уровню важности (для фильтрации).
-CREATE INDEX IF NOT EXISTS idx_system_events_severity ON system_events(severity);
-COMMENT ON INDEX idx_system_events_severity IS 'Ускоряет фильтрацию системных событий по уровню важности.';
+-- Версия 5.0.24: system_events секционирована по event_time, индексы задаются для
+-- каждой секции, а не для родительской таблицы (иначе они наследуются всеми секциями):
+--   - горячие секции - index_hot_event_partition (003): (event_time, id), id (уникальный),
+--     event_type, severity, object_id, node_id, assignment_id, node_check_id,
+--     (related_entity, related_entity_id), GIN details, GIN message_tsv и, при наличии
+--     pg_trgm, триграммный GIN message;
+--   - холодные секции - только BRIN (event_time, id) (demote_event_partitions).
+-- Прежние индексы несекционированной таблицы (до 5.0.24) удаляются.
+DROP INDEX IF EXISTS idx_system_events_event_time;
+DROP INDEX IF EXISTS idx_system_events_time_id;
+DROP INDEX IF EXISTS idx_system_events_event_type;
+DROP INDEX IF EXISTS idx_system_events_severity;
+DROP INDEX IF EXISTS idx_system_events_object_id;
+DROP INDEX IF EXISTS idx_system_events_node_id;
+DROP INDEX IF EXISTS idx_system_events_assignment_id;
+DROP INDEX IF EXISTS idx_system_events_node_check_id;
+DROP INDEX IF EXISTS idx_system_events_related;
+DROP INDEX IF EXISTS idx_system_events_details_gin;
+DROP INDEX IF EXISTS idx_system_events_message_tsv;
+DROP INDEX IF EXISTS idx_system_events_message_trgm;
 
--- Индекс по ID объекта (для фильтрации событий, связанных с подразделением).
-CREATE INDEX IF NOT EXISTS idx_system_events_object_id ON system_events(object_id);
-COMMENT ON INDEX idx_system_events_object_id IS 'Ускоряет поиск событий, относящихся к конкретному объекту/подразделению.';
-
--- Индекс по ID узла (для фильтрации событий, связанных с узлом).
-CREATE INDEX IF NOT EXISTS idx_system_events_node_id ON system_events(node_id);
-COMMENT ON INDEX idx_system_events_node_id IS 'Ускоряет поиск событий, относящихся к конкретному узлу.';
-
--- Индекс по ID задания (для фильтрации событий, связанных с заданием).
-CREATE INDEX IF NOT EXISTS idx_system_events_assignment_id ON system_events(assignment_id);
-COMMENT ON INDEX idx_system_events_assignment_id IS 'Ускоряет поиск событий, относящихся к конкретному заданию.';
-
--- Индекс по ID результата проверки (для фильтрации событий, связанных с проверкой).
-CREATE INDEX IF NOT EXISTS idx_system_events_node_check_id ON system_events(node_check_id);
-COMMENT ON INDEX idx_system_events_node_check_id IS 'Ускоряет поиск событий, относящихся к конкретному результату проверки.';
-
--- Составной индекс по связанной сущности (для фильтрации, например, по файлам).
-CREATE INDEX IF NOT EXISTS idx_system_events_related ON system_events(related_entity, related_entity_id);
-COMMENT ON INDEX idx_system_events_related IS 'Ускоряет поиск событий, связанных с определенной сущностью (например, файлом).';
-
--- GIN-индекс для поля details (JSONB) для поиска по содержимому деталей события.
-CREATE INDEX IF NOT EXISTS idx_system_events_details_gin ON system_events USING gin (details);
-COMMENT ON INDEX idx_system_events_details_gin IS 'Позволяет эффективно искать события по содержимому поля details (JSONB).';
+-- -----------------------------------------------------------------------------
+-- Триграммные индексы поиска подстроки (Версия 5.0.22)
+-- Обслуживают ILIKE '%текст%' (от 3 символов) в поиске узлов, заданий и событий.
+-- Создаются, только если установлено расширение pg_trgm.
+-- -----------------------------------------------------------------------------
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        RAISE WARNING 'pg_trgm не установлено: триграммные индексы поиска пропущены.';
+        RETURN;
+    END IF;
+    CREATE INDEX IF NOT EXISTS idx_nodes_name_trgm ON nodes USING gin (name gin_trgm_ops);
+    COMMENT ON INDEX idx_nodes_name_trgm IS 'Поиск узлов по подстроке имени (ILIKE).';
+    CREATE INDEX IF NOT EXISTS idx_nodes_ip_address_trgm ON nodes USING gin (ip_address gin_trgm_ops);
+    COMMENT ON INDEX idx_nodes_ip_address_trgm IS 'Поиск узлов по подстроке IP-адреса (ILIKE).';
+    CREATE INDEX IF NOT EXISTS idx_nodes_description_trgm ON nodes USING gin (description gin_trgm_ops);
+    COMMENT ON INDEX idx_nodes_description_trgm IS 'Поиск узлов по подстроке описания (ILIKE).';
+    CREATE INDEX IF NOT EXISTS idx_node_check_assignments_description_trgm ON node_check_assignments USING gin (description gin_trgm_ops);
+    COMMENT ON INDEX idx_node_check_assignments_description_trgm IS 'Поиск заданий по подстроке описания (ILIKE).';
+    -- Триграммный индекс сообщений событий - на горячих секциях (index_hot_event_partition, 003).
+END $$;
 
 -- -----------------------------------------------------------------------------
 -- Индексы для таблицы: offline_config_versions
@@ -239,6 +274,12 @@ CREATE INDEX IF NOT EXISTS idx_offline_config_last_active_script
     WHERE is_active = TRUE AND object_id IS NULL AND config_type = 'script'; -- Уточнили тип и NULL
 COMMENT ON INDEX idx_offline_config_last_active_script IS 'Оптимизирует поиск последней активной версии СКРИПТА агента.';
 
+-- Версия 5.0.25: Поиск хранимой конфигурации по хешу содержимого.
+CREATE INDEX IF NOT EXISTS idx_offline_config_content_hash
+    ON offline_config_versions (object_id, content_hash)
+    WHERE config_type = 'assignments' AND config_json IS NOT NULL;
+COMMENT ON INDEX idx_offline_config_content_hash IS 'Поиск хранимой конфигурации заданий объекта по хешу содержимого (повторное использование версии).';
+
 -- Уникальный индекс для version_tag (создается автоматически с UNIQUE CONSTRAINT).
 -- CREATE UNIQUE INDEX IF NOT EXISTS idx_offline_config_versions_version_tag ON offline_config_versions(version_tag);
 -- COMMENT ON INDEX idx_offline_config_versions_version_tag IS 'Обеспечивает уникальность тегов версий конфигураций.';
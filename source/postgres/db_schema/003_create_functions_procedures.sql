@@ -1,17 +1,51 @@
 -- =============================================================================
 -- Файл: 003_create_functions_procedures.sql
 -- Назначение: Создание хранимых функций и процедур.
--- Версия схемы: 5.0.2 (record_check_result_proc принимает p_check_success)
+-- Версия схемы: 5.0.25 (хранимые оффлайн-конфигурации, отметки устаревания и триггеры)
 -- =============================================================================
 
+-- -----------------------------------------------------------------------------
+-- Функция: get_check_events_mode
+-- Назначение: Политика записи событий о результатах проверок (settings.check_events_mode):
+--             'transitions' - только смена состояния задания (CHECK_STATE_CHANGED:
+--                             is_available или check_success изменились, первый результат);
+--             'all'         - как до 5.0.23: событие на каждый результат
+--                             (CHECK_RESULT_RECEIVED, для смены состояния - CHECK_STATE_CHANGED);
+--             'none'        - события о результатах не записываются.
+--             Ошибки записи (DB_PROC_WARN/DB_PROC_ERROR) логируются всегда.
+--             Отсутствующее или неизвестное значение - 'transitions'.
+-- Версия схемы: 5.0.23
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION get_check_events_mode()
+RETURNS TEXT
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT CASE WHEN s.value IN ('all', 'transitions', 'none') THEN s.value ELSE 'transitions' END
+    FROM (SELECT (SELECT value FROM settings WHERE key = 'check_events_mode') AS value) s;
+$$;
+COMMENT ON FUNCTION get_check_events_mode()
+IS 'Политика записи событий о результатах проверок из settings.check_events_mode (all/transitions/none, по умолчанию transitions). Версия схемы: 5.0.23.';
+
 -- -----------------------------------------------------------------------------
 -- Процедура: record_check_result_proc (Версия с поддержкой p_check_success)
 -- Назначение: Атомарная запись результата проверки узла (или pipeline-задания).
 --             Включает запись is_available и нового check_success в node_checks.
 --             Обновляет last_executed_at и last_node_check_id в node_check_assignments.
 --             Логирует событие 'CHECK_RESULT_RECEIVED' в system_events.
--- Версия схемы: 5.0.2
+--             Версия 5.0.5: Обновляет текущее состояние задания в node_check_latest.
+--             Версия 5.0.15: Необязательный ключ идемпотентности p_idempotency_key.
+--             Если результат с таким ключом уже записан (повторная отправка),
+--             запись не выполняется: p_duplicate = TRUE, p_node_check_id - ID
+--             ранее созданной записи. Иначе p_node_check_id - ID новой записи.
+--             Версия 5.0.23: Событие пишется по политике get_check_events_mode():
+--             по умолчанию только при смене состояния задания (CHECK_STATE_CHANGED,
+--             предыдущее состояние - из node_check_latest до его обновления).
+-- Версия схемы: 5.0.23
 -- -----------------------------------------------------------------------------
+-- Сигнатура до 5.0.15 (без ключа идемпотентности) удаляется, чтобы вызов по
+-- именам параметров не был неоднозначным.
+DROP PROCEDURE IF EXISTS record_check_result_proc(INTEGER, BOOLEAN, BOOLEAN, TIMESTAMPTZ, INTEGER, TEXT, TEXT, TEXT, JSONB, TEXT, TEXT);
 CREATE OR REPLACE PROCEDURE record_check_result_proc(
     p_assignment_id INTEGER,
     p_is_available BOOLEAN,
@@ -23,7 +57,10 @@ CREATE OR REPLACE PROCEDURE record_check_result_proc(
     p_detail_type TEXT DEFAULT NULL,
     p_detail_data JSONB DEFAULT NULL,
     p_assignment_version TEXT DEFAULT NULL,
-    p_agent_version TEXT DEFAULT NULL
+    p_agent_version TEXT DEFAULT NULL,
+    p_idempotency_key TEXT DEFAULT NULL,    -- Ключ идемпотентности результата (NULL - без проверки повтора)
+    INOUT p_node_check_id INTEGER DEFAULT NULL, -- Выход: ID записи в node_checks (новой или ранее созданной)
+    INOUT p_duplicate BOOLEAN DEFAULT NULL  -- Выход: TRUE, если результат с этим ключом уже был записан
 )
 LANGUAGE plpgsql
 AS $$
@@ -33,7 +70,14 @@ DECLARE
     v_node_check_id INTEGER; -- ID созданной записи в node_checks
     v_node_name VARCHAR(255);
     v_parent_subdivision_id INTEGER;
+    v_check_day DATE := (COALESCE(p_check_timestamp, CURRENT_TIMESTAMP) AT TIME ZONE 'UTC')::DATE;
+    v_events_mode TEXT := get_check_events_mode();
+    v_has_previous BOOLEAN; -- Было ли у задания состояние в node_check_latest
+    v_previous_is_available BOOLEAN;
+    v_previous_check_success BOOLEAN;
+    v_state_changed BOOLEAN;
 BEGIN
+    p_duplicate := FALSE;
     -- 1. Получаем информацию о задании и связанном узле
     SELECT a.node_id, a.method_id, n.name, n.parent_subdivision_id
     INTO v_node_id, v_method_id, v_node_name, v_parent_subdivision_id
@@ -50,9 +94,25 @@ BEGIN
             USING ERRCODE = 'P0002', HINT = 'Проверьте ID задания или убедитесь, что задание существует.';
     END IF;
 
+    -- 1a. ID записи выделяется заранее, чтобы сохранить его вместе с ключом идемпотентности.
+    --     Ключ уже есть (повторная отправка) - результат не записывается.
+    v_node_check_id := nextval(pg_get_serial_sequence('node_checks', 'id'));
+    IF p_idempotency_key IS NOT NULL THEN
+        INSERT INTO node_check_ingest_keys (check_day, idempotency_key, node_check_id)
+        VALUES (v_check_day, p_idempotency_key, v_node_check_id)
+        ON CONFLICT (check_day, idempotency_key) DO NOTHING;
+        IF NOT FOUND THEN
+            SELECT k.node_check_id INTO p_node_check_id
+            FROM node_check_ingest_keys k
+            WHERE k.check_day = v_check_day AND k.idempotency_key = p_idempotency_key;
+            p_duplicate := TRUE;
+            RETURN;
+        END IF;
+    END IF;
+
     -- 2. Вставляем результат в node_checks, включая новое поле check_success
     INSERT INTO node_checks (
-        node_id, assignment_id, method_id,
+        id, node_id, assignment_id, method_id,
         is_available, check_success, -- <<< ДОБАВЛЕНО check_success
         checked_at, -- Время записи в БД (серверное)
         check_timestamp, -- Время выполнения на агенте
@@ -60,19 +120,19 @@ BEGIN
         assignment_config_version, agent_script_version
     )
     VALUES (
-        v_node_id, p_assignment_id, v_method_id,
+        v_node_check_id, v_node_id, p_assignment_id, v_method_id,
         p_is_available, p_check_success, -- <<< ПЕРЕДАЕМ p_check_success
         CURRENT_TIMESTAMP, -- checked_at всегда текущее время сервера
         COALESCE(p_check_timestamp, CURRENT_TIMESTAMP), -- Используем время агента, если есть, иначе время сервера
         p_executor_object_id, p_executor_host, p_resolution_method,
         p_assignment_version, p_agent_version
-    )
-    RETURNING id INTO v_node_check_id; -- Получаем ID созданной записи
+    );
+    p_node_check_id := v_node_check_id;
 
     -- 3. Если переданы детали, записываем их в node_check_details
     IF p_detail_type IS NOT NULL AND p_detail_data IS NOT NULL THEN
-        INSERT INTO node_check_details (node_check_id, detail_type, data)
-        VALUES (v_node_check_id, p_detail_type, p_detail_data);
+        INSERT INTO node_check_details (node_check_id, checked_at, detail_type, data)
+        VALUES (v_node_check_id, CURRENT_TIMESTAMP, p_detail_type, p_detail_data); -- checked_at = node_checks.checked_at
     END IF;
 
     -- 4. Обновляем информацию о последней проверке в node_check_assignments
@@ -84,27 +144,76 @@ BEGIN
         last_node_check_id = v_node_check_id
     WHERE id = p_assignment_id;
 
-    -- 5. Логируем событие о получении результата проверки
-    INSERT INTO system_events (
-        event_type, severity, message, source,
-        object_id, node_id, assignment_id, node_check_id,
-        details
+    -- 4a. Предыдущее состояние задания (для политики событий). Строка блокируется до
+    --     конца транзакции, чтобы параллельные результаты того же задания сравнивались
+    --     с уже обновленным состоянием.
+    SELECT l.is_available, l.check_success
+    INTO v_previous_is_available, v_previous_check_success
+    FROM node_check_latest l
+    WHERE l.assignment_id = p_assignment_id
+    FOR UPDATE;
+    v_has_previous := FOUND;
+    v_state_changed := NOT v_has_previous
+        OR v_previous_is_available IS DISTINCT FROM p_is_available
+        OR v_previous_check_success IS DISTINCT FROM p_check_success;
+
+    -- 4b. Обновляем текущее состояние задания (читается дашбордом вместо истории)
+    INSERT INTO node_check_latest (
+        assignment_id, node_id, method_id, last_node_check_id,
+        is_available, check_success, checked_at, check_timestamp,
+        executor_object_id, executor_host, last_success_at
     )
     VALUES (
-        'CHECK_RESULT_RECEIVED', 'INFO',
-        format('Получен результат для узла "%s" (Задание ID %s, Метод ID %s): IsAvailable=%s, CheckSuccess=%s.',
-               v_node_name, p_assignment_id, v_method_id, p_is_available, COALESCE(p_check_success::text, 'N/A')),
-        'record_check_result_proc', p_executor_object_id, v_node_id, p_assignment_id, v_node_check_id,
-        jsonb_build_object(
-            'executor_host', p_executor_host,
-            'resolution_method', p_resolution_method,
-            'source_timestamp_utc', p_check_timestamp, -- Время от агента (может быть NULL)
-            'has_details', (p_detail_type IS NOT NULL AND p_detail_data IS NOT NULL),
-            'parent_subdivision_id', v_parent_subdivision_id, -- ID подразделения узла
-            'assignment_version', p_assignment_version,
-            'agent_version', p_agent_version
+        p_assignment_id, v_node_id, v_method_id, v_node_check_id,
+        p_is_available, p_check_success, CURRENT_TIMESTAMP, COALESCE(p_check_timestamp, CURRENT_TIMESTAMP),
+        p_executor_object_id, p_executor_host,
+        CASE WHEN p_is_available AND p_check_success IS TRUE THEN CURRENT_TIMESTAMP END
+    )
+    ON CONFLICT (assignment_id) DO UPDATE SET
+        node_id = EXCLUDED.node_id,
+        method_id = EXCLUDED.method_id,
+        last_node_check_id = EXCLUDED.last_node_check_id,
+        is_available = EXCLUDED.is_available,
+        check_success = EXCLUDED.check_success,
+        checked_at = EXCLUDED.checked_at,
+        check_timestamp = EXCLUDED.check_timestamp,
+        executor_object_id = EXCLUDED.executor_object_id,
+        executor_host = EXCLUDED.executor_host,
+        last_success_at = COALESCE(EXCLUDED.last_success_at, node_check_latest.last_success_at);
+
+    -- 5. Логируем событие по политике: смена состояния или (режим 'all') каждый результат
+    IF v_events_mode = 'all' OR (v_events_mode = 'transitions' AND v_state_changed) THEN
+        INSERT INTO system_events (
+            event_type, severity, message, source,
+            object_id, node_id, assignment_id, node_check_id,
+            details
         )
-    );
+        VALUES (
+            CASE WHEN v_state_changed THEN 'CHECK_STATE_CHANGED' ELSE 'CHECK_RESULT_RECEIVED' END,
+            CASE WHEN v_state_changed AND (p_is_available IS NOT TRUE OR p_check_success IS FALSE) THEN 'WARN' ELSE 'INFO' END,
+            CASE WHEN v_state_changed THEN
+                format('Изменилось состояние узла "%s" (Задание ID %s, Метод ID %s): IsAvailable %s -> %s, CheckSuccess %s -> %s.',
+                       v_node_name, p_assignment_id, v_method_id,
+                       COALESCE(v_previous_is_available::text, 'N/A'), p_is_available,
+                       COALESCE(v_previous_check_success::text, 'N/A'), COALESCE(p_check_success::text, 'N/A'))
+            ELSE
+                format('Получен результат для узла "%s" (Задание ID %s, Метод ID %s): IsAvailable=%s, CheckSuccess=%s.',
+                       v_node_name, p_assignment_id, v_method_id, p_is_available, COALESCE(p_check_success::text, 'N/A'))
+            END,
+            'record_check_result_proc', p_executor_object_id, v_node_id, p_assignment_id, v_node_check_id,
+            jsonb_build_object(
+                'executor_host', p_executor_host,
+                'resolution_method', p_resolution_method,
+                'source_timestamp_utc', p_check_timestamp, -- Время от агента (может быть NULL)
+                'has_details', (p_detail_type IS NOT NULL AND p_detail_data IS NOT NULL),
+                'parent_subdivision_id', v_parent_subdivision_id, -- ID подразделения узла
+                'assignment_version', p_assignment_version,
+                'agent_version', p_agent_version,
+                'previous_is_available', v_previous_is_available,
+                'previous_check_success', v_previous_check_success
+            )
+        );
+    END IF;
 
 EXCEPTION
     WHEN SQLSTATE 'P0002' THEN -- Код ошибки 'Задание не найдено', который мы сами определили
@@ -140,8 +249,276 @@ EXCEPTION
         RAISE; -- Пробрасываем исключение дальше
 END;
 $$;
-COMMENT ON PROCEDURE record_check_result_proc(INTEGER, BOOLEAN, BOOLEAN, TIMESTAMPTZ, INTEGER, TEXT, TEXT, TEXT, JSONB, TEXT, TEXT)
-IS 'Записывает результат проверки/pipeline-задания, включая is_available и check_success. Обновляет задание и логирует событие. Версия схемы: 5.0.2.';
+COMMENT ON PROCEDURE record_check_result_proc(INTEGER, BOOLEAN, BOOLEAN, TIMESTAMPTZ, INTEGER, TEXT, TEXT, TEXT, JSONB, TEXT, TEXT, TEXT, INTEGER, BOOLEAN)
+IS 'Записывает результат проверки/pipeline-задания, включая is_available и check_success. Обновляет задание и его текущее состояние (node_check_latest), логирует событие по политике get_check_events_mode() (по умолчанию - только смена состояния). Повтор с уже записанным ключом идемпотентности не записывается (p_duplicate). Версия схемы: 5.0.23.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: record_check_results_bulk
+-- Назначение: Пакетная (set-based) запись результатов проверок.
+--             Принимает JSONB-массив уже провалидированных записей и выполняет
+--             вставку в node_checks, node_check_details, обновление
+--             node_check_assignments и запись событий CHECK_RESULT_RECEIVED
+--             одним SQL-оператором вместо N вызовов record_check_result_proc.
+--             Элементы с несуществующим assignment_id не записываются
+--             (для них логируется DB_PROC_WARN) и не попадают в результат.
+-- Формат элемента p_results:
+--   { "item_index": 0, "assignment_id": 1, "is_available": true, "check_success": null,
+--     "check_timestamp": "...", "executor_object_id": 1060, "executor_host": null,
+--     "resolution_method": "...", "detail_type": "...", "detail_data": {...},
+--     "assignment_version": "...", "agent_version": "...", "idempotency_key": "..." }
+-- Возвращает: item_index, assignment_id, node_id, node_check_id, duplicate записанных элементов.
+-- Версия 5.0.5: Обновляет текущее состояние заданий в node_check_latest.
+-- Версия 5.0.15: Элементы с idempotency_key, который уже записан (ранее или выше
+--             в этом же пакете), не записываются и возвращаются с duplicate = TRUE
+--             и ID ранее созданной записи. Проверка - INSERT ... ON CONFLICT DO NOTHING
+--             в суточную секцию node_check_ingest_keys.
+-- Версия 5.0.23: События пишутся по политике get_check_events_mode(), как в
+--             record_check_result_proc. Предыдущее состояние элемента - предыдущий
+--             по порядку элемент того же задания в пакете, для первого - строка
+--             node_check_latest (CTE читают ее до обновления в этом же операторе).
+-- Версия схемы: 5.0.23
+-- -----------------------------------------------------------------------------
+-- Тип результата изменился в 5.0.15 (duplicate) - CREATE OR REPLACE его не меняет.
+DROP FUNCTION IF EXISTS record_check_results_bulk(JSONB);
+CREATE OR REPLACE FUNCTION record_check_results_bulk(p_results JSONB)
+RETURNS TABLE (
+    item_index INTEGER,
+    assignment_id INTEGER,
+    node_id INTEGER,
+    node_check_id INTEGER,
+    duplicate BOOLEAN
+)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_events_mode TEXT := get_check_events_mode();
+BEGIN
+    RETURN QUERY
+    WITH input_rows AS (
+        SELECT r.*
+        FROM jsonb_to_recordset(p_results) AS r(
+            item_index INTEGER,
+            assignment_id INTEGER,
+            is_available BOOLEAN,
+            check_success BOOLEAN,
+            check_timestamp TIMESTAMPTZ,
+            executor_object_id INTEGER,
+            executor_host TEXT,
+            resolution_method TEXT,
+            detail_type TEXT,
+            detail_data JSONB,
+            assignment_version TEXT,
+            agent_version TEXT,
+            idempotency_key TEXT
+        )
+    ),
+    -- ID для node_checks выделяем заранее, чтобы связать строки с item_index
+    -- без повторного поиска (MATERIALIZED гарантирует один nextval на строку).
+    resolved AS MATERIALIZED (
+        SELECT
+            i.*,
+            a.node_id AS r_node_id,
+            a.method_id AS r_method_id,
+            n.name AS r_node_name,
+            n.parent_subdivision_id AS r_parent_subdivision_id,
+            (COALESCE(i.check_timestamp, CURRENT_TIMESTAMP) AT TIME ZONE 'UTC')::DATE AS r_check_day,
+            nextval(pg_get_serial_sequence('node_checks', 'id'))::INTEGER AS r_node_check_id
+        FROM input_rows i
+        JOIN node_check_assignments a ON a.id = i.assignment_id
+        JOIN nodes n ON a.node_id = n.id
+    ),
+    -- Ключи идемпотентности: вставляется только первый по порядку элемент с ключом,
+    -- уже записанные (в т.ч. параллельной транзакцией) ключи пропускаются.
+    keyed AS (
+        INSERT INTO node_check_ingest_keys (check_day, idempotency_key, node_check_id)
+        SELECT r.r_check_day, r.idempotency_key, r.r_node_check_id
+        FROM resolved r
+        WHERE r.idempotency_key IS NOT NULL
+        ORDER BY r.item_index
+        ON CONFLICT (check_day, idempotency_key) DO NOTHING
+        RETURNING node_check_ingest_keys.check_day, node_check_ingest_keys.idempotency_key, node_check_ingest_keys.node_check_id
+    ),
+    -- Элементы, которые действительно записываются (без ключа или с новым ключом)
+    accepted AS MATERIALIZED (
+        SELECT r.*
+        FROM resolved r
+        WHERE r.idempotency_key IS NULL
+           OR EXISTS (SELECT 1 FROM keyed k WHERE k.node_check_id = r.r_node_check_id)
+    ),
+    inserted_checks AS (
+        INSERT INTO node_checks (
+            id, node_id, assignment_id, method_id,
+            is_available, check_success,
+            checked_at, check_timestamp,
+            executor_object_id, executor_host, resolution_method,
+            assignment_config_version, agent_script_version
+        )
+        SELECT
+            r.r_node_check_id, r.r_node_id, r.assignment_id, r.r_method_id,
+            r.is_available, r.check_success,
+            CURRENT_TIMESTAMP, COALESCE(r.check_timestamp, CURRENT_TIMESTAMP),
+            r.executor_object_id, r.executor_host, r.resolution_method,
+            r.assignment_version, r.agent_version
+        FROM accepted r
+        ORDER BY r.item_index
+        RETURNING id
+    ),
+    inserted_details AS (
+        INSERT INTO node_check_details (node_check_id, checked_at, detail_type, data)
+        SELECT ic.id, CURRENT_TIMESTAMP, r.detail_type, r.detail_data
+        FROM inserted_checks ic
+        JOIN accepted r ON r.r_node_check_id = ic.id
+        WHERE r.detail_type IS NOT NULL AND r.detail_data IS NOT NULL
+        RETURNING 1
+    ),
+    -- Для каждого задания берем последний по порядку в пакете результат,
+    -- как если бы элементы записывались последовательно.
+    updated_assignments AS (
+        UPDATE node_check_assignments a
+        SET
+            last_executed_at = COALESCE(latest.check_timestamp, CURRENT_TIMESTAMP),
+            last_node_check_id = latest.r_node_check_id
+        FROM (
+            SELECT DISTINCT ON (r.assignment_id) r.assignment_id, r.check_timestamp, r.r_node_check_id
+            FROM accepted r
+            ORDER BY r.assignment_id, r.item_index DESC
+        ) latest
+        WHERE a.id = latest.assignment_id
+        RETURNING 1
+    ),
+    -- Текущее состояние задания: последний элемент пакета, время успеха -
+    -- если в пакете был хотя бы один полностью успешный результат.
+    upserted_latest AS (
+        INSERT INTO node_check_latest (
+            assignment_id, node_id, method_id, last_node_check_id,
+            is_available, check_success, checked_at, check_timestamp,
+            executor_object_id, executor_host, last_success_at
+        )
+        SELECT
+            latest.assignment_id, latest.r_node_id, latest.r_method_id, latest.r_node_check_id,
+            latest.is_available, latest.check_success, CURRENT_TIMESTAMP, COALESCE(latest.check_timestamp, CURRENT_TIMESTAMP),
+            latest.executor_object_id, latest.executor_host,
+            CASE WHEN latest.had_success THEN CURRENT_TIMESTAMP END
+        FROM (
+            SELECT DISTINCT ON (r.assignment_id)
+                r.assignment_id, r.r_node_id, r.r_method_id, r.r_node_check_id,
+                r.is_available, r.check_success, r.check_timestamp,
+                r.executor_object_id, r.executor_host,
+                bool_or(r.is_available AND r.check_success IS TRUE) OVER (PARTITION BY r.assignment_id) AS had_success
+            FROM accepted r
+            ORDER BY r.assignment_id, r.item_index DESC
+        ) latest
+        ON CONFLICT (assignment_id) DO UPDATE SET
+            node_id = EXCLUDED.node_id,
+            method_id = EXCLUDED.method_id,
+            last_node_check_id = EXCLUDED.last_node_check_id,
+            is_available = EXCLUDED.is_available,
+            check_success = EXCLUDED.check_success,
+            checked_at = EXCLUDED.checked_at,
+            check_timestamp = EXCLUDED.check_timestamp,
+            executor_object_id = EXCLUDED.executor_object_id,
+            executor_host = EXCLUDED.executor_host,
+            last_success_at = COALESCE(EXCLUDED.last_success_at, node_check_latest.last_success_at)
+        RETURNING 1
+    ),
+    -- Предыдущее состояние каждого элемента: предыдущий элемент задания в пакете,
+    -- для первого - node_check_latest (снимок до upserted_latest).
+    state_changes AS (
+        SELECT
+            r.*,
+            CASE WHEN ordered.batch_position = 1 THEN l.is_available ELSE ordered.batch_previous_is_available END AS previous_is_available,
+            CASE WHEN ordered.batch_position = 1 THEN l.check_success ELSE ordered.batch_previous_check_success END AS previous_check_success,
+            (ordered.batch_position > 1 OR l.assignment_id IS NOT NULL) AS has_previous
+        FROM accepted r
+        JOIN (
+            SELECT
+                a.r_node_check_id,
+                ROW_NUMBER() OVER w AS batch_position,
+                LAG(a.is_available) OVER w AS batch_previous_is_available,
+                LAG(a.check_success) OVER w AS batch_previous_check_success
+            FROM accepted a
+            WINDOW w AS (PARTITION BY a.assignment_id ORDER BY a.item_index)
+        ) ordered ON ordered.r_node_check_id = r.r_node_check_id
+        LEFT JOIN node_check_latest l ON l.assignment_id = r.assignment_id
+        WHERE v_events_mode <> 'none'
+    ),
+    logged_events AS (
+        INSERT INTO system_events (
+            event_type, severity, message, source,
+            object_id, node_id, assignment_id, node_check_id,
+            details
+        )
+        SELECT
+            CASE WHEN sc.state_changed THEN 'CHECK_STATE_CHANGED' ELSE 'CHECK_RESULT_RECEIVED' END,
+            CASE WHEN sc.state_changed AND (r.is_available IS NOT TRUE OR r.check_success IS FALSE) THEN 'WARN' ELSE 'INFO' END,
+            CASE WHEN sc.state_changed THEN
+                format('Изменилось состояние узла "%s" (Задание ID %s, Метод ID %s): IsAvailable %s -> %s, CheckSuccess %s -> %s.',
+                       r.r_node_name, r.assignment_id, r.r_method_id,
+                       COALESCE(r.previous_is_available::text, 'N/A'), r.is_available,
+                       COALESCE(r.previous_check_success::text, 'N/A'), COALESCE(r.check_success::text, 'N/A'))
+            ELSE
+                format('Получен результат для узла "%s" (Задание ID %s, Метод ID %s): IsAvailable=%s, CheckSuccess=%s.',
+                       r.r_node_name, r.assignment_id, r.r_method_id, r.is_available, COALESCE(r.check_success::text, 'N/A'))
+            END,
+            'record_check_results_bulk', r.executor_object_id, r.r_node_id, r.assignment_id, ic.id,
+            jsonb_build_object(
+                'executor_host', r.executor_host,
+                'resolution_method', r.resolution_method,
+                'source_timestamp_utc', r.check_timestamp,
+                'has_details', (r.detail_type IS NOT NULL AND r.detail_data IS NOT NULL),
+                'parent_subdivision_id', r.r_parent_subdivision_id,
+                'assignment_version', r.assignment_version,
+                'agent_version', r.agent_version,
+                'previous_is_available', r.previous_is_available,
+                'previous_check_success', r.previous_check_success
+            )
+        FROM inserted_checks ic
+        JOIN state_changes r ON r.r_node_check_id = ic.id
+        CROSS JOIN LATERAL (
+            SELECT (NOT r.has_previous
+                    OR r.previous_is_available IS DISTINCT FROM r.is_available
+                    OR r.previous_check_success IS DISTINCT FROM r.check_success) AS state_changed
+        ) sc
+        WHERE v_events_mode = 'all' OR sc.state_changed
+        RETURNING 1
+    ),
+    logged_missing AS (
+        INSERT INTO system_events (event_type, severity, message, source, object_id, details)
+        SELECT
+            'DB_PROC_WARN', 'WARN',
+            format('Попытка записи результата для несуществующего задания ID=%s. Исполнитель: ObjectID=%s (Хост: %s).',
+                   i.assignment_id, i.executor_object_id, i.executor_host),
+            'record_check_results_bulk', i.executor_object_id,
+            jsonb_build_object(
+                'original_assignment_id', i.assignment_id,
+                'item_index', i.item_index,
+                'assignment_version', i.assignment_version,
+                'agent_version', i.agent_version
+            )
+        FROM input_rows i
+        WHERE NOT EXISTS (SELECT 1 FROM resolved r WHERE r.item_index = i.item_index)
+        RETURNING 1
+    )
+    SELECT r.item_index, r.assignment_id, r.r_node_id, r.r_node_check_id, FALSE
+    FROM accepted r
+    UNION ALL
+    -- Повторы: ID записи из уже существующего ключа или из ключа, вставленного выше в пакете
+    SELECT r.item_index, r.assignment_id, r.r_node_id,
+           COALESCE(
+               (SELECT k.node_check_id FROM keyed k
+                WHERE k.check_day = r.r_check_day AND k.idempotency_key = r.idempotency_key),
+               (SELECT ek.node_check_id FROM node_check_ingest_keys ek
+                WHERE ek.check_day = r.r_check_day AND ek.idempotency_key = r.idempotency_key)
+           ),
+           TRUE
+    FROM resolved r
+    WHERE NOT EXISTS (SELECT 1 FROM accepted a WHERE a.item_index = r.item_index)
+    ORDER BY 1;
+END;
+$$;
+COMMENT ON FUNCTION record_check_results_bulk(JSONB)
+IS 'Пакетная set-based запись результатов проверок (node_checks, node_check_details, node_check_assignments, node_check_latest, system_events по политике get_check_events_mode()). Возвращает соответствие item_index -> node_check_id; повторы по ключу идемпотентности не записываются (duplicate = TRUE). Версия схемы: 5.0.23.';
 
 -- ... (остальные функции get_active_assignments_for_object, generate_offline_config, и т.д. БЕЗ ИЗМЕНЕНИЙ от предыдущей версии,
 --      т.к. они уже работают с pipeline и не зависят от check_success напрямую в своих возвращаемых значениях) ...
@@ -187,23 +564,158 @@ $$ LANGUAGE plpgsql STABLE;
 COMMENT ON FUNCTION get_active_assignments_for_object(INTEGER)
 IS 'Возвращает активные (is_enabled=TRUE) pipeline-задания для агента по его executor object_id. Версия схемы: 5.0.2.';
 
+-- -----------------------------------------------------------------------------
+-- Функция: mark_offline_configs_dirty
+-- Назначение: Отмечает хранимые оффлайн-конфигурации объектов как устаревшие
+--             (offline_config_dirty). Повторная отметка увеличивает счетчик changes,
+--             поэтому идущая параллельно генерация не снимет ее.
+-- Версия схемы: 5.0.25
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION mark_offline_configs_dirty(p_object_ids INTEGER[])
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO offline_config_dirty (object_id)
+    SELECT DISTINCT ids.object_id FROM unnest(p_object_ids) AS ids(object_id)
+    WHERE ids.object_id IS NOT NULL
+    ORDER BY ids.object_id -- Одинаковый порядок блокировок у параллельных транзакций
+    ON CONFLICT (object_id) DO UPDATE
+    SET changes = offline_config_dirty.changes + 1,
+        marked_at = CURRENT_TIMESTAMP;
+$$;
+COMMENT ON FUNCTION mark_offline_configs_dirty(INTEGER[])
+IS 'Отмечает оффлайн-конфигурации объектов (subdivisions.object_id) как устаревшие. Версия схемы: 5.0.25.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: offline_config_dirty_trigger
+-- Назначение: Триггерная функция (FOR EACH ROW) - отмечает устаревшими конфигурации
+--             объектов, чье содержимое затронуто изменением строки:
+--             node_check_assignments - объект узла задания (прежнего и нового);
+--             nodes - подразделение узла (имя/IP/перенос, удаление с заданиями);
+--             subdivisions - сам объект (код ТС, object_id);
+--             check_methods - объекты с заданиями этого метода (имя метода);
+--             settings - все объекты с хранимой конфигурацией (интервал по умолчанию).
+-- Версия схемы: 5.0.25
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION offline_config_dirty_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    -- Поля OLD/NEW разбираются только в ветке своей таблицы (план строится при выполнении)
+    IF TG_TABLE_NAME = 'node_check_assignments' THEN
+        PERFORM mark_offline_configs_dirty(ARRAY(
+            SELECT s.object_id FROM nodes n JOIN subdivisions s ON s.id = n.parent_subdivision_id
+            WHERE n.id IN (CASE WHEN TG_OP <> 'INSERT' THEN OLD.node_id END,
+                           CASE WHEN TG_OP <> 'DELETE' THEN NEW.node_id END)));
+    ELSIF TG_TABLE_NAME = 'nodes' THEN
+        PERFORM mark_offline_configs_dirty(ARRAY(
+            SELECT s.object_id FROM subdivisions s
+            WHERE s.id IN (OLD.parent_subdivision_id, CASE WHEN TG_OP = 'UPDATE' THEN NEW.parent_subdivision_id END)));
+    ELSIF TG_TABLE_NAME = 'subdivisions' THEN
+        PERFORM mark_offline_configs_dirty(ARRAY[OLD.object_id, NEW.object_id]);
+    ELSIF TG_TABLE_NAME = 'check_methods' THEN
+        PERFORM mark_offline_configs_dirty(ARRAY(
+            SELECT DISTINCT s.object_id
+            FROM node_check_assignments nca
+            JOIN nodes n ON n.id = nca.node_id
+            JOIN subdivisions s ON s.id = n.parent_subdivision_id
+            WHERE nca.method_id = NEW.id));
+    ELSIF TG_TABLE_NAME = 'settings' THEN
+        PERFORM mark_offline_configs_dirty(ARRAY(
+            SELECT DISTINCT ocv.object_id FROM offline_config_versions ocv
+            WHERE ocv.config_type = 'assignments' AND ocv.is_active = TRUE AND ocv.object_id IS NOT NULL));
+    END IF;
+    RETURN NULL; -- AFTER-триггер
+END;
+$$;
+COMMENT ON FUNCTION offline_config_dirty_trigger()
+IS 'Триггерная функция: отмечает устаревшими оффлайн-конфигурации объектов, затронутых изменением заданий, узлов, подразделений, методов или интервала по умолчанию. Версия схемы: 5.0.25.';
+
+-- Триггеры срабатывают только на поля, из которых собирается конфигурация
+-- (запись результатов проверок обновляет last_executed_at заданий и их не вызывает).
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_assignments_ins_del
+    AFTER INSERT OR DELETE ON node_check_assignments
+    FOR EACH ROW EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_assignments_upd
+    AFTER UPDATE ON node_check_assignments
+    FOR EACH ROW
+    WHEN ((OLD.node_id, OLD.method_id, OLD.pipeline, OLD.check_interval_seconds, OLD.is_enabled)
+          IS DISTINCT FROM (NEW.node_id, NEW.method_id, NEW.pipeline, NEW.check_interval_seconds, NEW.is_enabled))
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_nodes_del
+    AFTER DELETE ON nodes
+    FOR EACH ROW EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_nodes_upd
+    AFTER UPDATE ON nodes
+    FOR EACH ROW
+    WHEN ((OLD.name, OLD.ip_address, OLD.parent_subdivision_id)
+          IS DISTINCT FROM (NEW.name, NEW.ip_address, NEW.parent_subdivision_id))
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_subdivisions_upd
+    AFTER UPDATE ON subdivisions
+    FOR EACH ROW
+    WHEN ((OLD.object_id, OLD.transport_system_code) IS DISTINCT FROM (NEW.object_id, NEW.transport_system_code))
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_methods_upd
+    AFTER UPDATE ON check_methods
+    FOR EACH ROW
+    WHEN (OLD.method_name IS DISTINCT FROM NEW.method_name)
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_settings_ins_upd
+    AFTER INSERT OR UPDATE ON settings
+    FOR EACH ROW
+    WHEN (NEW.key = 'default_check_interval_seconds')
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+CREATE OR REPLACE TRIGGER trg_offline_config_dirty_settings_del
+    AFTER DELETE ON settings
+    FOR EACH ROW
+    WHEN (OLD.key = 'default_check_interval_seconds')
+    EXECUTE FUNCTION offline_config_dirty_trigger();
+
+-- -----------------------------------------------------------------------------
 -- Функция: generate_offline_config (Версия для pipeline-архитектуры)
--- ... (код без изменений, уже генерирует с pipeline) ...
+-- Назначение: Генерирует конфигурацию заданий объекта для оффлайн-агента и сохраняет ее.
+--             Версия 5.0.25: Конфигурация адресуется SHA-256 содержимого (без времени
+--             генерации и тега версии): при совпадении хеша с сохраненной версией объекта
+--             возвращается она (тот же тег и generated_at_utc), иначе создается новая
+--             версия с config_json. Активна только текущая версия объекта; отметка
+--             offline_config_dirty снимается, если за время генерации не было изменений.
+--             Хеш - встроенной sha256 (pgcrypto не требуется).
+-- Версия схемы: 5.0.25
+-- -----------------------------------------------------------------------------
 CREATE OR REPLACE FUNCTION generate_offline_config(p_executor_object_id INTEGER)
 RETURNS JSONB AS $$
 DECLARE
     v_assignments_jsonb JSONB;
     v_default_interval INTEGER;
+    v_content_jsonb JSONB;
     v_config_jsonb JSONB;
+    v_error_jsonb JSONB;
     v_subdivision_info RECORD;
     v_assignment_version_tag TEXT;
     v_content_hash TEXT;
-    v_last_version_hash TEXT;
+    v_dirty_changes BIGINT;
 BEGIN
+    -- Генерации одного объекта выполняются по очереди: вторая найдет версию первой по хешу
+    PERFORM pg_advisory_xact_lock(hashtext('generate_offline_config'), p_executor_object_id);
+    -- Счетчик читается до сборки заданий: изменение, зафиксированное позже, оставит отметку
+    SELECT d.changes INTO v_dirty_changes FROM offline_config_dirty d WHERE d.object_id = p_executor_object_id;
+
     SELECT s.id, s.transport_system_code INTO v_subdivision_info
     FROM subdivisions s WHERE s.object_id = p_executor_object_id;
-    IF NOT FOUND THEN RETURN jsonb_build_object('error', 'Subdivision not found', 'message', 'Подразделение с указанным object_id не найдено.', 'object_id', p_executor_object_id); END IF;
-    IF v_subdivision_info.transport_system_code IS NULL THEN RETURN jsonb_build_object('error', 'Transport system code missing', 'message', 'Для подразделения не указан код транспортной системы (transport_system_code).', 'object_id', p_executor_object_id); END IF;
+    IF NOT FOUND THEN
+        v_error_jsonb := jsonb_build_object('error', 'Subdivision not found', 'message', 'Подразделение с указанным object_id не найдено.', 'object_id', p_executor_object_id);
+    ELSIF v_subdivision_info.transport_system_code IS NULL THEN
+        v_error_jsonb := jsonb_build_object('error', 'Transport system code missing', 'message', 'Для подразделения не указан код транспортной системы (transport_system_code).', 'object_id', p_executor_object_id);
+    END IF;
+    IF v_error_jsonb IS NOT NULL THEN
+        -- Сохраненная конфигурация больше не отдается
+        UPDATE offline_config_versions SET is_active = FALSE
+        WHERE object_id = p_executor_object_id AND config_type = 'assignments' AND is_active = TRUE;
+        DELETE FROM offline_config_dirty WHERE object_id = p_executor_object_id AND changes = v_dirty_changes;
+        RETURN v_error_jsonb;
+    END IF;
 
     SELECT CAST(value AS INTEGER) INTO v_default_interval FROM settings WHERE key = 'default_check_interval_seconds';
     v_default_interval := COALESCE(v_default_interval, 300); -- Увеличил стандартный интервал по умолчанию
@@ -230,51 +742,115 @@ BEGIN
         WHERE nca.is_enabled = TRUE AND s.object_id = p_executor_object_id
     ) AS sub_assignments;
 
-    BEGIN
-        v_content_hash := encode(digest(v_assignments_jsonb::text, 'sha256'), 'hex');
-    EXCEPTION WHEN OTHERS THEN
-        RAISE WARNING 'Не удалось рассчитать SHA256 хэш для версионирования заданий (pgcrypto?). Версионирование пропускается. Ошибка: %', SQLERRM;
-        v_content_hash := NULL;
-    END;
-
-    v_assignment_version_tag := NULL;
-    IF v_content_hash IS NOT NULL THEN
-        SELECT ocv.version_tag, ocv.content_hash INTO v_assignment_version_tag, v_last_version_hash
-        FROM offline_config_versions ocv
-        WHERE ocv.object_id = p_executor_object_id AND ocv.config_type = 'assignments' AND ocv.is_active = TRUE
-        ORDER BY ocv.created_at DESC LIMIT 1;
-        IF FOUND AND v_last_version_hash = v_content_hash THEN
-             RAISE NOTICE '[Ver OfflineCfg] Конфигурация заданий для object_id % не изменилась. Версия: %', p_executor_object_id, v_assignment_version_tag;
-        ELSE
-             v_assignment_version_tag := to_char(CURRENT_TIMESTAMP, 'YYYYMMDDHH24MISSMS') || '_' || p_executor_object_id || '_' || left(v_content_hash, 8); -- Добавил MS для большей уникальности
-             RAISE NOTICE '[Ver OfflineCfg] Конфигурация заданий для object_id % изменилась/новая. Новая версия: %', p_executor_object_id, v_assignment_version_tag;
-             INSERT INTO offline_config_versions (object_id, config_type, version_tag, content_hash, description, transport_system_code, is_active)
-             VALUES (p_executor_object_id, 'assignments', v_assignment_version_tag, v_content_hash, 'Авто-версия pipeline-заданий', v_subdivision_info.transport_system_code, TRUE)
-             ON CONFLICT (version_tag) DO NOTHING;
-        END IF;
-    ELSE
-        v_assignment_version_tag := 'nohash_' || to_char(CURRENT_TIMESTAMP, 'YYYYMMDDHH24MISSMS') || '_' || p_executor_object_id;
-        RAISE WARNING '[Ver OfflineCfg] Используется временный тег версии (pgcrypto не сработал): %', v_assignment_version_tag;
-    END IF;
-
-    v_config_jsonb := jsonb_build_object(
+    v_content_jsonb := jsonb_build_object(
         'object_id', p_executor_object_id,
         'config_type', 'offline_hybrid_agent_pipeline_v5.0.2', -- Обновляем версию формата конфига
-        'generated_at_utc', CURRENT_TIMESTAMP, -- Добавляем _utc для ясности
-        'assignment_config_version', v_assignment_version_tag,
         'transport_system_code', v_subdivision_info.transport_system_code,
         'default_check_interval_seconds', v_default_interval,
         'assignments', v_assignments_jsonb
     );
+    v_content_hash := encode(sha256(convert_to(v_content_jsonb::text, 'UTF8')), 'hex'); -- Текст jsonb канонический (порядок ключей)
+
+    -- Такое содержимое уже сохранялось (в том числе до отката изменений) - отдается та же версия
+    SELECT ocv.version_tag, ocv.config_json INTO v_assignment_version_tag, v_config_jsonb
+    FROM offline_config_versions ocv
+    WHERE ocv.object_id = p_executor_object_id AND ocv.config_type = 'assignments'
+      AND ocv.content_hash = v_content_hash AND ocv.config_json IS NOT NULL
+    ORDER BY ocv.created_at DESC LIMIT 1;
+    IF NOT FOUND THEN
+        v_assignment_version_tag := to_char(CURRENT_TIMESTAMP, 'YYYYMMDDHH24MISSMS') || '_' || p_executor_object_id || '_' || left(v_content_hash, 8); -- Добавил MS для большей уникальности
+        v_config_jsonb := v_content_jsonb || jsonb_build_object(
+            'generated_at_utc', CURRENT_TIMESTAMP, -- Добавляем _utc для ясности
+            'assignment_config_version', v_assignment_version_tag
+        );
+        RAISE NOTICE '[Ver OfflineCfg] Конфигурация заданий для object_id % изменилась/новая. Новая версия: %', p_executor_object_id, v_assignment_version_tag;
+        INSERT INTO offline_config_versions (object_id, config_type, version_tag, content_hash, description, transport_system_code, is_active, config_json)
+        VALUES (p_executor_object_id, 'assignments', v_assignment_version_tag, v_content_hash, 'Авто-версия pipeline-заданий', v_subdivision_info.transport_system_code, TRUE, v_config_jsonb)
+        ON CONFLICT (version_tag) DO NOTHING;
+    END IF;
+
+    -- Активна только текущая версия объекта
+    UPDATE offline_config_versions SET is_active = (version_tag = v_assignment_version_tag)
+    WHERE object_id = p_executor_object_id AND config_type = 'assignments'
+      AND is_active IS DISTINCT FROM (version_tag = v_assignment_version_tag);
+    DELETE FROM offline_config_dirty WHERE object_id = p_executor_object_id AND changes = v_dirty_changes;
     RETURN v_config_jsonb;
 END;
 $$ LANGUAGE plpgsql VOLATILE;
 COMMENT ON FUNCTION generate_offline_config(INTEGER)
-IS 'Генерирует JSON конфигурацию (метаданные + активные pipeline-задания) для оффлайн-агента. Версия схемы: 5.0.2.';
+IS 'Генерирует JSON конфигурацию (метаданные + активные pipeline-задания) для оффлайн-агента и сохраняет ее в offline_config_versions по хешу содержимого. Версия схемы: 5.0.25.';
 
--- Функция: get_node_base_info (Без изменений, т.к. не зависит от check_success напрямую)
--- ... (код без изменений) ...
-CREATE OR REPLACE FUNCTION get_node_base_info(node_id_filter INTEGER DEFAULT NULL)
+-- -----------------------------------------------------------------------------
+-- Функция: get_offline_config_version
+-- Назначение: Текущая версия оффлайн-конфигурации объекта: {"version_tag", "content_hash",
+--             "regenerated"}. Конфигурация генерируется заново (generate_offline_config),
+--             только если объект отмечен в offline_config_dirty или сохраненной версии нет;
+--             иначе - чтение одной строки по индексу активных версий.
+--             Ошибки генерации возвращаются как в generate_offline_config ({"error", ...}).
+-- Версия схемы: 5.0.25
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION get_offline_config_version(p_executor_object_id INTEGER)
+RETURNS JSONB AS $$
+DECLARE
+    v_version_jsonb JSONB;
+    v_config_jsonb JSONB;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM offline_config_dirty d WHERE d.object_id = p_executor_object_id) THEN
+        SELECT jsonb_build_object('version_tag', ocv.version_tag, 'content_hash', ocv.content_hash, 'regenerated', FALSE)
+        INTO v_version_jsonb
+        FROM offline_config_versions ocv
+        WHERE ocv.object_id = p_executor_object_id AND ocv.config_type = 'assignments'
+          AND ocv.is_active = TRUE AND ocv.config_json IS NOT NULL
+        ORDER BY ocv.created_at DESC LIMIT 1;
+        IF FOUND THEN
+            RETURN v_version_jsonb;
+        END IF;
+    END IF;
+
+    v_config_jsonb := generate_offline_config(p_executor_object_id);
+    IF v_config_jsonb ? 'error' THEN
+        RETURN v_config_jsonb;
+    END IF;
+    SELECT jsonb_build_object('version_tag', ocv.version_tag, 'content_hash', ocv.content_hash, 'regenerated', TRUE)
+    INTO v_version_jsonb
+    FROM offline_config_versions ocv
+    WHERE ocv.version_tag = v_config_jsonb ->> 'assignment_config_version';
+    RETURN v_version_jsonb;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+COMMENT ON FUNCTION get_offline_config_version(INTEGER)
+IS 'Тег и хеш содержимого текущей оффлайн-конфигурации объекта; генерирует конфигурацию только для устаревших (offline_config_dirty) или еще не сохраненных. Версия схемы: 5.0.25.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: refresh_dirty_offline_configs
+-- Назначение: Генерирует заново конфигурации всех объектов из offline_config_dirty
+--             (flask checks offline-configs, например перед запуском конфигуратора).
+--             Возвращает количество обработанных объектов.
+-- Версия схемы: 5.0.25
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION refresh_dirty_offline_configs()
+RETURNS INTEGER AS $$
+DECLARE
+    v_object_id INTEGER;
+    v_refreshed INTEGER := 0;
+BEGIN
+    FOR v_object_id IN SELECT d.object_id FROM offline_config_dirty d ORDER BY d.object_id LOOP
+        PERFORM generate_offline_config(v_object_id);
+        v_refreshed := v_refreshed + 1;
+    END LOOP;
+    RETURN v_refreshed;
+END;
+$$ LANGUAGE plpgsql VOLATILE;
+COMMENT ON FUNCTION refresh_dirty_offline_configs()
+IS 'Генерирует заново оффлайн-конфигурации объектов, отмеченных в offline_config_dirty. Версия схемы: 5.0.25.';
+
+-- Функция: get_node_base_info
+-- Назначение: Базовая информация об узлах. Фильтр - массив ID узлов (NULL = все узлы),
+--             чтобы статус после записи результатов считался только для затронутых узлов.
+-- Версия схемы: 5.0.4
+-- -----------------------------------------------------------------------------
+DROP FUNCTION IF EXISTS get_node_base_info(INTEGER);
+CREATE OR REPLACE FUNCTION get_node_base_info(node_ids_filter INTEGER[] DEFAULT NULL)
 RETURNS TABLE (
     id INTEGER, name VARCHAR(255), ip_address VARCHAR(45), description TEXT,
     subdivision_id INTEGER, subdivision_short_name VARCHAR(100),
@@ -324,18 +900,21 @@ BEGIN
     JOIN subdivisions s ON n.parent_subdivision_id = s.id
     LEFT JOIN type_hierarchy th ON n.node_type_id = th.id
     LEFT JOIN node_type_properties ntp_actual ON ntp_actual.node_type_id = COALESCE(n.node_type_id, v_default_node_type_id)
-    WHERE node_id_filter IS NULL OR n.id = node_id_filter
+    WHERE node_ids_filter IS NULL OR n.id = ANY(node_ids_filter)
     ORDER BY s.priority, s.short_name, node_type_priority, display_order, n.name;
 END;
 $$ LANGUAGE plpgsql STABLE;
-COMMENT ON FUNCTION get_node_base_info(INTEGER)
-IS 'Возвращает базовую информацию об узлах, их типах, подразделениях и вычисленных свойствах. Версия схемы: 5.0.2.';
+COMMENT ON FUNCTION get_node_base_info(INTEGER[])
+IS 'Возвращает базовую информацию об узлах (всех или из массива ID), их типах, подразделениях и вычисленных свойствах. Версия схемы: 5.0.4.';
 
 
 -- Функция: get_node_ping_status (ВАЖНО: теперь должна возвращать и check_success)
 -- Назначение: Возвращает статус последней PING-проверки для узлов.
+--             Фильтр - массив ID узлов (NULL = все узлы). Версия схемы: 5.0.4
+--             Версия 5.0.5: Читает node_check_latest (O(заданий)) вместо сканирования истории node_checks.
 -- -----------------------------------------------------------------------------
-CREATE OR REPLACE FUNCTION get_node_ping_status(node_id_filter INTEGER DEFAULT NULL)
+DROP FUNCTION IF EXISTS get_node_ping_status(INTEGER);
+CREATE OR REPLACE FUNCTION get_node_ping_status(node_ids_filter INTEGER[] DEFAULT NULL)
 RETURNS TABLE (
     node_id INTEGER,
     is_available BOOLEAN,
@@ -362,31 +941,30 @@ BEGIN
         FROM node_check_assignments nca
         WHERE nca.method_id = v_ping_method_id
           AND nca.is_enabled = TRUE -- Учитываем только включенные задания
-          AND (node_id_filter IS NULL OR nca.node_id = node_id_filter)
+          AND (node_ids_filter IS NULL OR nca.node_id = ANY(node_ids_filter))
     ),
     last_ping_checks AS (
-        -- Последняя проверка PING для каждого узла, выполненная по активному заданию
-        SELECT DISTINCT ON (nc_inner.node_id)
-            nc_inner.node_id,
-            nc_inner.is_available,
-            nc_inner.check_success, -- <<< ВЫБИРАЕМ check_success
-            nc_inner.checked_at,    -- Время записи в БД
-            nc_inner.check_timestamp, -- Время на агенте
-            nc_inner.executor_object_id,
-            nc_inner.executor_host
-        FROM node_checks nc_inner
-        JOIN ping_assignments pa ON nc_inner.assignment_id = pa.assignment_id -- Только по активным PING-заданиям
-        ORDER BY nc_inner.node_id, nc_inner.checked_at DESC -- checked_at (БД) для определения "последней"
+        -- Последняя проверка PING для каждого узла среди его активных PING-заданий
+        SELECT DISTINCT ON (ncl.node_id)
+            ncl.node_id,
+            ncl.is_available,
+            ncl.check_success,
+            ncl.checked_at,    -- Время записи в БД
+            ncl.check_timestamp, -- Время на агенте
+            ncl.executor_object_id,
+            ncl.executor_host
+        FROM node_check_latest ncl
+        JOIN ping_assignments pa ON ncl.assignment_id = pa.assignment_id -- Только по активным PING-заданиям
+        ORDER BY ncl.node_id, ncl.checked_at DESC -- checked_at (БД) для определения "последней"
     ),
     last_truly_available_ping_checks AS (
         -- Последняя УСПЕШНАЯ проверка PING (is_available=TRUE И check_success=TRUE)
-        SELECT DISTINCT ON (nc_avail.node_id)
-            nc_avail.node_id,
-            nc_avail.checked_at AS last_available_time -- Время записи в БД
-        FROM node_checks nc_avail
-        JOIN ping_assignments pa_avail ON nc_avail.assignment_id = pa_avail.assignment_id
-        WHERE nc_avail.is_available = TRUE AND nc_avail.check_success = TRUE -- Условие успешности
-        ORDER BY nc_avail.node_id, nc_avail.checked_at DESC
+        SELECT
+            ncl_avail.node_id,
+            MAX(ncl_avail.last_success_at) AS last_available_time -- Время записи в БД
+        FROM node_check_latest ncl_avail
+        JOIN ping_assignments pa_avail ON ncl_avail.assignment_id = pa_avail.assignment_id
+        GROUP BY ncl_avail.node_id
     )
     SELECT
         n.id as node_id,
@@ -400,11 +978,185 @@ BEGIN
     FROM nodes n
     LEFT JOIN last_ping_checks lpc ON n.id = lpc.node_id
     LEFT JOIN last_truly_available_ping_checks lapc ON n.id = lapc.node_id
-    WHERE node_id_filter IS NULL OR n.id = node_id_filter;
+    WHERE node_ids_filter IS NULL OR n.id = ANY(node_ids_filter);
+END;
+$$ LANGUAGE plpgsql STABLE;
+COMMENT ON FUNCTION get_node_ping_status(INTEGER[])
+IS 'Возвращает статус последней PING-проверки для узлов (всех или из массива ID), включая is_available и check_success. Учитывает is_enabled в заданиях. Читает node_check_latest. Версия схемы: 5.0.5.';
+
+
+-- -----------------------------------------------------------------------------
+-- Функция: get_node_primary_status
+-- Назначение: Статус узлов по политике статуса их типа (node_properties):
+--             status_methods - методы заданий, определяющие статус узла (через запятую),
+--             status_combine - сочетание результатов нескольких заданий:
+--                 'latest' - последний записанный результат (как get_node_ping_status),
+--                 'worst'  - худший результат (узел доступен, только если доступны все),
+--                 'best'   - лучший результат (достаточно одного доступного задания).
+--             Свойство, не заданное типу, берется у базового типа (ID=0), затем 'PING'/'latest'.
+--             Политики всех типов вычисляются одним set-based запросом по текущему
+--             состоянию заданий (node_check_latest), без отдельного поиска по каждому методу.
+--             Фильтр - массив ID узлов (NULL = все узлы).
+-- Версия схемы: 5.0.20
+-- -----------------------------------------------------------------------------
+DROP FUNCTION IF EXISTS get_node_primary_status(INTEGER[]);
+CREATE OR REPLACE FUNCTION get_node_primary_status(node_ids_filter INTEGER[] DEFAULT NULL)
+RETURNS TABLE (
+    node_id INTEGER,
+    status_method TEXT,          -- Метод задания, результат которого определил статус (или настроенные методы, если данных нет)
+    status_combine TEXT,         -- Примененный режим сочетания: latest / worst / best
+    status_assignments INTEGER,  -- Количество активных заданий политики с результатами
+    is_available BOOLEAN,
+    check_success BOOLEAN,
+    last_checked TIMESTAMPTZ,    -- Время записи в БД
+    last_available TIMESTAMPTZ,  -- Время последней полной доступности (is_available и check_success)
+    check_timestamp TIMESTAMPTZ, -- Время на агенте
+    executor_object_id INTEGER,
+    executor_host TEXT
+) AS $$
+DECLARE v_default_node_type_id INTEGER := 0;
+BEGIN
+    RETURN QUERY
+    WITH type_policy_properties AS (
+        SELECT
+            p.node_type_id,
+            MAX(CASE WHEN pt.name = 'status_methods' THEN p.property_value END) AS status_methods,
+            MAX(CASE WHEN pt.name = 'status_combine' THEN p.property_value END) AS status_combine
+        FROM node_properties p JOIN node_property_types pt ON p.property_type_id = pt.id
+        WHERE pt.name IN ('status_methods', 'status_combine')
+        GROUP BY p.node_type_id
+    ),
+    type_policies AS (
+        -- Политика каждого типа (включая базовый): разбор списка методов один раз на тип, а не на узел
+        SELECT
+            nt.id AS node_type_id,
+            string_to_array(upper(regexp_replace(COALESCE(tpp.status_methods, dpp.status_methods, 'PING'), '\s+', '', 'g')), ',') AS method_names,
+            CASE WHEN lower(btrim(COALESCE(tpp.status_combine, dpp.status_combine, 'latest'))) IN ('worst', 'best')
+                 THEN lower(btrim(COALESCE(tpp.status_combine, dpp.status_combine)))
+                 ELSE 'latest' END AS combine
+        FROM node_types nt
+        LEFT JOIN type_policy_properties tpp ON tpp.node_type_id = nt.id
+        LEFT JOIN type_policy_properties dpp ON dpp.node_type_id = v_default_node_type_id
+    ),
+    node_policies AS (
+        SELECT
+            n.id AS node_id,
+            COALESCE(tp.method_names, ARRAY['PING']) AS method_names,
+            COALESCE(tp.combine, 'latest') AS combine
+        FROM nodes n
+        LEFT JOIN type_policies tp ON tp.node_type_id = COALESCE(n.node_type_id, v_default_node_type_id)
+        WHERE node_ids_filter IS NULL OR n.id = ANY(node_ids_filter)
+    ),
+    policy_checks AS (
+        -- Текущее состояние всех активных заданий, попадающих в политику своего узла
+        SELECT
+            np.node_id, np.combine, cm.method_name,
+            ncl.is_available, ncl.check_success, ncl.checked_at, ncl.check_timestamp,
+            ncl.executor_object_id, ncl.executor_host, ncl.last_success_at,
+            CASE WHEN NOT ncl.is_available THEN 3
+                 WHEN ncl.check_success IS FALSE THEN 2
+                 WHEN ncl.check_success IS NULL THEN 1
+                 ELSE 0 END AS severity -- Чем больше, тем хуже результат
+        FROM node_policies np
+        JOIN node_check_assignments nca ON nca.node_id = np.node_id AND nca.is_enabled = TRUE
+        JOIN check_methods cm ON cm.id = nca.method_id AND cm.method_name = ANY(np.method_names)
+        JOIN node_check_latest ncl ON ncl.assignment_id = nca.id
+    ),
+    chosen_checks AS (
+        -- Результат, определяющий статус узла, согласно режиму сочетания
+        SELECT DISTINCT ON (pc.node_id) pc.*
+        FROM policy_checks pc
+        ORDER BY pc.node_id,
+                 CASE pc.combine WHEN 'worst' THEN pc.severity WHEN 'best' THEN -pc.severity ELSE 0 END DESC,
+                 CASE WHEN pc.combine = 'worst' THEN COALESCE(pc.check_timestamp, pc.checked_at) END ASC NULLS LAST, -- Среди худших - самый старый
+                 pc.checked_at DESC
+    ),
+    policy_totals AS (
+        SELECT
+            pc.node_id,
+            COUNT(*)::INTEGER AS assignments_count,
+            CASE WHEN MIN(pc.combine) = 'worst'
+                 THEN CASE WHEN COUNT(pc.last_success_at) = COUNT(*) THEN MIN(pc.last_success_at) END -- Все задания были успешны
+                 ELSE MAX(pc.last_success_at) END AS last_available_time
+        FROM policy_checks pc
+        GROUP BY pc.node_id
+    )
+    SELECT
+        np.node_id,
+        COALESCE(cc.method_name, array_to_string(np.method_names, ', ')) AS status_method,
+        np.combine AS status_combine,
+        COALESCE(pt.assignments_count, 0) AS status_assignments,
+        cc.is_available,
+        cc.check_success,
+        cc.checked_at AS last_checked,
+        pt.last_available_time AS last_available,
+        cc.check_timestamp,
+        cc.executor_object_id,
+        cc.executor_host
+    FROM node_policies np
+    LEFT JOIN chosen_checks cc ON cc.node_id = np.node_id
+    LEFT JOIN policy_totals pt ON pt.node_id = np.node_id;
 END;
 $$ LANGUAGE plpgsql STABLE;
-COMMENT ON FUNCTION get_node_ping_status(INTEGER)
-IS 'Возвращает статус последней PING-проверки для узлов, включая is_available и check_success. Учитывает is_enabled в заданиях. Версия схемы: 5.0.2.';
+COMMENT ON FUNCTION get_node_primary_status(INTEGER[])
+IS 'Возвращает статус узлов (всех или из массива ID) по политике статуса типа узла (свойства status_methods, status_combine): одним запросом по node_check_latest для всех политик. Версия схемы: 5.0.20.';
+
+
+-- -----------------------------------------------------------------------------
+-- Функция: backfill_node_check_latest
+-- Назначение: Заполняет node_check_latest по существующей истории node_checks
+--             (однократно после обновления схемы, затем таблицу поддерживают
+--             процедуры записи). Не затирает более свежее состояние.
+-- Возвращает: количество вставленных/обновленных строк.
+-- Версия схемы: 5.0.5
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION backfill_node_check_latest()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rows INTEGER;
+BEGIN
+    INSERT INTO node_check_latest (
+        assignment_id, node_id, method_id, last_node_check_id,
+        is_available, check_success, checked_at, check_timestamp,
+        executor_object_id, executor_host, last_success_at
+    )
+    SELECT
+        lc.assignment_id, lc.node_id, lc.method_id, lc.id,
+        lc.is_available, lc.check_success, lc.checked_at, lc.check_timestamp,
+        lc.executor_object_id, lc.executor_host, ls.last_success_at
+    FROM (
+        SELECT DISTINCT ON (nc.assignment_id) nc.*
+        FROM node_checks nc
+        JOIN node_check_assignments a ON a.id = nc.assignment_id
+        ORDER BY nc.assignment_id, nc.checked_at DESC, nc.id DESC
+    ) lc
+    LEFT JOIN (
+        SELECT nc.assignment_id, MAX(nc.checked_at) AS last_success_at
+        FROM node_checks nc
+        WHERE nc.assignment_id IS NOT NULL AND nc.is_available = TRUE AND nc.check_success = TRUE
+        GROUP BY nc.assignment_id
+    ) ls ON ls.assignment_id = lc.assignment_id
+    ON CONFLICT (assignment_id) DO UPDATE SET
+        node_id = EXCLUDED.node_id,
+        method_id = EXCLUDED.method_id,
+        last_node_check_id = EXCLUDED.last_node_check_id,
+        is_available = EXCLUDED.is_available,
+        check_success = EXCLUDED.check_success,
+        checked_at = EXCLUDED.checked_at,
+        check_timestamp = EXCLUDED.check_timestamp,
+        executor_object_id = EXCLUDED.executor_object_id,
+        executor_host = EXCLUDED.executor_host,
+        last_success_at = GREATEST(EXCLUDED.last_success_at, node_check_latest.last_success_at)
+    WHERE node_check_latest.checked_at <= EXCLUDED.checked_at;
+
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    RETURN v_rows;
+END;
+$$;
+COMMENT ON FUNCTION backfill_node_check_latest()
+IS 'Заполняет node_check_latest по истории node_checks (однократно после обновления схемы). Версия схемы: 5.0.5.';
 
 -- Функция: get_subdivisions (Без изменений)
 -- ... (код без изменений) ...
@@ -423,6 +1175,495 @@ $$ LANGUAGE plpgsql STABLE;
 COMMENT ON FUNCTION get_subdivisions()
 IS 'Возвращает список всех подразделений (включая иконку), отсортированный по приоритету и имени. Версия схемы: 5.0.2.';
 
+-- -----------------------------------------------------------------------------
+-- Функция: create_day_partitions
+-- Назначение: Создает секции суток p_parents[i] || p_suffix с границами
+--             [p_from; p_to) по столбцу p_key_column. Строки этих суток, уже
+--             попавшие в секцию по умолчанию (иначе CREATE TABLE ... PARTITION OF
+--             завершается ошибкой), переносятся в новые секции. Секцию по умолчанию
+--             не отсоединяем (на node_checks ссылается FK node_check_details), а
+--             переносим строки через временную таблицу: сначала из ссылающихся таблиц
+--             (p_parents в обратном порядке), затем возвращаем в прямом порядке.
+--             Генерируемые столбцы (message_tsv) не переносятся - вычисляются заново.
+-- Возвращает: имена созданных секций.
+-- Версия схемы: 5.0.6
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION create_day_partitions(p_parents TEXT[], p_key_column TEXT, p_suffix TEXT, p_from TEXT, p_to TEXT)
+RETURNS TEXT[]
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_idx INTEGER;
+    v_parent TEXT;
+    v_default TEXT;
+    v_columns TEXT;
+    v_moved BIGINT;
+    v_moved_counts BIGINT[] := array_fill(0::BIGINT, ARRAY[cardinality(p_parents)]);
+    v_created TEXT[] := ARRAY[]::TEXT[];
+BEGIN
+    -- 1. Выносим строки суток из секций по умолчанию (сначала ссылающиеся таблицы)
+    FOR v_idx IN REVERSE cardinality(p_parents)..1 LOOP
+        v_parent := p_parents[v_idx];
+        CONTINUE WHEN to_regclass(v_parent || p_suffix) IS NOT NULL;
+        v_default := NULL;
+        SELECT pt.partdefid::regclass::TEXT INTO v_default
+        FROM pg_partitioned_table pt
+        WHERE pt.partrelid = v_parent::regclass AND pt.partdefid <> 0;
+        CONTINUE WHEN v_default IS NULL;
+        SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum) INTO v_columns
+        FROM pg_attribute a
+        WHERE a.attrelid = v_parent::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = '';
+        EXECUTE format('CREATE TEMP TABLE IF NOT EXISTS %I ON COMMIT DROP AS SELECT %s FROM %I WITH NO DATA',
+                       '_moved_' || v_parent, v_columns, v_parent);
+        EXECUTE format('TRUNCATE %I', '_moved_' || v_parent);
+        EXECUTE format(
+            'WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING %s) INSERT INTO %I SELECT * FROM moved',
+            v_default, p_key_column, p_from, p_key_column, p_to, v_columns, '_moved_' || v_parent
+        );
+        GET DIAGNOSTICS v_moved = ROW_COUNT;
+        v_moved_counts[v_idx] := v_moved;
+    END LOOP;
+    -- 2. Создаем секции и возвращаем в них строки (сначала таблицы, на которые ссылаются)
+    FOR v_idx IN 1..cardinality(p_parents) LOOP
+        v_parent := p_parents[v_idx];
+        CONTINUE WHEN to_regclass(v_parent || p_suffix) IS NOT NULL;
+        EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                       v_parent || p_suffix, v_parent, p_from, p_to);
+        v_created := v_created || (v_parent || p_suffix);
+        IF v_moved_counts[v_idx] > 0 THEN
+            SELECT string_agg(quote_ident(a.attname), ', ' ORDER BY a.attnum) INTO v_columns
+            FROM pg_attribute a
+            WHERE a.attrelid = v_parent::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = '';
+            EXECUTE format('INSERT INTO %I (%s) SELECT %s FROM %I', v_parent, v_columns, v_columns, '_moved_' || v_parent);
+            RAISE NOTICE 'Из секции по умолчанию % перенесено строк: % (секция %)', v_parent, v_moved_counts[v_idx], v_parent || p_suffix;
+        END IF;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+COMMENT ON FUNCTION create_day_partitions(TEXT[], TEXT, TEXT, TEXT, TEXT)
+IS 'Создает секции суток для набора секционированных таблиц, перенося уже попавшие в секцию по умолчанию строки этих суток. Версия схемы: 5.0.6.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: create_check_partitions
+-- Назначение: Создает суточные (UTC) секции node_checks и node_check_details
+--             для дат [p_from; p_to], если их еще нет. Вызывается заранее
+--             (flask checks create-partitions / планировщик), чтобы записи
+--             не попадали в секцию по умолчанию.
+--             Версия 5.0.15: Также секции ключей идемпотентности node_check_ingest_keys.
+--             Строки суток, уже попавшие в секцию по умолчанию, переносятся в новую
+--             секцию (create_day_partitions); если сутки создать не удалось, выдается
+--             WARNING и создаются секции остальных суток.
+-- Возвращает: количество созданных секций.
+-- Версия схемы: 5.0.15
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION create_check_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_day DATE;
+    v_suffix TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    IF p_from IS NULL OR p_to IS NULL OR p_to < p_from THEN
+        RAISE EXCEPTION 'Некорректный диапазон дат для секций: % - %', p_from, p_to USING ERRCODE = '22023';
+    END IF;
+    v_day := p_from;
+    WHILE v_day <= p_to LOOP
+        v_suffix := '_p' || to_char(v_day, 'YYYYMMDD');
+        -- Ошибка по одним суткам (блокировка, конфликт с секцией по умолчанию)
+        -- не должна мешать созданию секций остальных суток
+        BEGIN
+            v_created := v_created + cardinality(create_day_partitions(
+                ARRAY['node_checks', 'node_check_details'], 'checked_at', v_suffix,
+                (v_day::timestamp AT TIME ZONE 'UTC')::TEXT, ((v_day + 1)::timestamp AT TIME ZONE 'UTC')::TEXT
+            ));
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'Секции node_checks/node_check_details за % не созданы: % (%)', v_day, SQLERRM, SQLSTATE;
+        END;
+        -- Ключи идемпотентности секционированы по дате (check_day), а не по времени
+        BEGIN
+            v_created := v_created + cardinality(create_day_partitions(
+                ARRAY['node_check_ingest_keys'], 'check_day', v_suffix, v_day::TEXT, (v_day + 1)::TEXT
+            ));
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'Секция node_check_ingest_keys за % не создана: % (%)', v_day, SQLERRM, SQLSTATE;
+        END;
+        v_day := v_day + 1;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+COMMENT ON FUNCTION create_check_partitions(DATE, DATE)
+IS 'Создает недостающие суточные (UTC) секции node_checks, node_check_details и node_check_ingest_keys за диапазон дат. Версия схемы: 5.0.15.';
+
+
+-- -----------------------------------------------------------------------------
+-- Функция: drop_check_partitions
+-- Назначение: Хранение истории (retention) удалением целых секций: отсоединяет
+--             (и, если p_detach_only = FALSE, удаляет) суточные секции
+--             node_check_details и node_checks, целиком лежащие раньше p_before.
+--             Секции деталей обрабатываются первыми (FK ссылается на node_checks).
+--             Секции по умолчанию не затрагиваются.
+--             Версия 5.0.15: Также секции ключей идемпотентности node_check_ingest_keys.
+-- Возвращает: имя секции и выполненное действие ('DETACHED' / 'DROPPED').
+-- Версия схемы: 5.0.15
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION drop_check_partitions(p_before DATE, p_detach_only BOOLEAN DEFAULT FALSE)
+RETURNS TABLE (partition_name TEXT, action TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rec RECORD;
+BEGIN
+    FOR v_rec IN
+        SELECT parent.relname::TEXT AS parent_name, child.relname::TEXT AS child_name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname IN ('node_checks', 'node_check_details', 'node_check_ingest_keys')
+          AND child.relname ~ '_p[0-9]{8}$'
+          AND to_date(right(child.relname, 8), 'YYYYMMDD') < p_before
+        ORDER BY (parent.relname = 'node_checks'), child.relname -- Сначала детали
+    LOOP
+        EXECUTE format('ALTER TABLE %I DETACH PARTITION %I', v_rec.parent_name, v_rec.child_name);
+        IF p_detach_only THEN
+            partition_name := v_rec.child_name; action := 'DETACHED';
+        ELSE
+            EXECUTE format('DROP TABLE %I', v_rec.child_name);
+            partition_name := v_rec.child_name; action := 'DROPPED';
+        END IF;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+COMMENT ON FUNCTION drop_check_partitions(DATE, BOOLEAN)
+IS 'Отсоединяет/удаляет суточные секции истории проверок и ключей идемпотентности старше указанной даты (retention без DELETE и VACUUM). Версия схемы: 5.0.15.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: index_hot_event_partition
+-- Назначение: Создает полный ("горячий") набор индексов секции журнала событий:
+--             порядок журнала и курсор (event_time, id), уникальность id, фильтры API
+--             (тип, важность, объект, узел, задание, результат проверки, связанная
+--             сущность), GIN по details и message_tsv, триграммный GIN по message
+--             (если установлено pg_trgm). Идемпотентна.
+-- Версия схемы: 5.0.24
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION index_hot_event_partition(p_partition TEXT)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_index_def TEXT[]; -- {суффикс имени, определение индекса}
+BEGIN
+    FOREACH v_index_def SLICE 1 IN ARRAY ARRAY[
+        ['time_id',       '(event_time DESC, id DESC)'],
+        ['event_type',    '(event_type)'],
+        ['severity',      '(severity)'],
+        ['object_id',     '(object_id)'],
+        ['node_id',       '(node_id)'],
+        ['assignment_id', '(assignment_id)'],
+        ['node_check_id', '(node_check_id)'],
+        ['related',       '(related_entity, related_entity_id)'],
+        ['details_gin',   'USING gin (details)'],
+        ['message_tsv',   'USING gin (message_tsv)']
+    ] LOOP
+        EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I %s', p_partition || '_' || v_index_def[1], p_partition, v_index_def[2]);
+    END LOOP;
+    EXECUTE format('CREATE UNIQUE INDEX IF NOT EXISTS %I ON %I (id)', p_partition || '_id', p_partition);
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        EXECUTE format('CREATE INDEX IF NOT EXISTS %I ON %I USING gin (message gin_trgm_ops)', p_partition || '_message_trgm', p_partition);
+    END IF;
+END;
+$$;
+COMMENT ON FUNCTION index_hot_event_partition(TEXT)
+IS 'Создает полный набор индексов горячей секции system_events (фильтры, поиск, курсор). Версия схемы: 5.0.24.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: create_event_partitions
+-- Назначение: Создает суточные (UTC) секции system_events (system_events_pYYYYMMDD)
+--             для дат [p_from; p_to], если их еще нет, с горячим набором индексов.
+--             Вызывается при старте (flask checks create-partitions) и каждым прогоном
+--             flask checks retention, чтобы события не попадали в секцию по умолчанию.
+--             События суток, уже попавшие в секцию по умолчанию, переносятся в новую
+--             секцию (create_day_partitions); если сутки создать не удалось, выдается
+--             WARNING и создаются секции остальных суток.
+-- Возвращает: количество созданных секций.
+-- Версия схемы: 5.0.24
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION create_event_partitions(p_from DATE, p_to DATE)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_day DATE;
+    v_partition TEXT;
+    v_created INTEGER := 0;
+BEGIN
+    IF p_from IS NULL OR p_to IS NULL OR p_to < p_from THEN
+        RAISE EXCEPTION 'Некорректный диапазон дат для секций: % - %', p_from, p_to USING ERRCODE = '22023';
+    END IF;
+    v_day := p_from;
+    WHILE v_day <= p_to LOOP
+        v_partition := 'system_events_p' || to_char(v_day, 'YYYYMMDD');
+        -- События суток, уже попавшие в секцию по умолчанию, переносятся в новую секцию;
+        -- ошибка по одним суткам не мешает созданию секций остальных суток
+        BEGIN
+            IF cardinality(create_day_partitions(
+                ARRAY['system_events'], 'event_time', '_p' || to_char(v_day, 'YYYYMMDD'),
+                (v_day::timestamp AT TIME ZONE 'UTC')::TEXT, ((v_day + 1)::timestamp AT TIME ZONE 'UTC')::TEXT
+            )) > 0 THEN
+                PERFORM index_hot_event_partition(v_partition);
+                v_created := v_created + 1;
+            END IF;
+        EXCEPTION WHEN OTHERS THEN
+            RAISE WARNING 'Секция % не создана: % (%)', v_partition, SQLERRM, SQLSTATE;
+        END;
+        v_day := v_day + 1;
+    END LOOP;
+    RETURN v_created;
+END;
+$$;
+COMMENT ON FUNCTION create_event_partitions(DATE, DATE)
+IS 'Создает недостающие суточные (UTC) секции system_events за диапазон дат с горячим набором индексов. Версия схемы: 5.0.24.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: demote_event_partitions
+-- Назначение: Переводит суточные секции system_events, целиком лежащие раньше
+--             p_before, в холодные: создает BRIN-индекс (event_time, id) и удаляет
+--             остальные индексы секции. В секции больше не пишут (журнал только
+--             дописывается, event_time - время записи), строки упорядочены по
+--             времени, поэтому BRIN из нескольких страниц заменяет B-tree и GIN.
+--             Уже холодные секции (есть индекс <секция>_brin) пропускаются.
+-- Возвращает: имена переведенных секций.
+-- Версия схемы: 5.0.24
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION demote_event_partitions(p_before DATE)
+RETURNS TABLE (partition_name TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rec RECORD;
+    v_index_name TEXT;
+BEGIN
+    FOR v_rec IN
+        SELECT child.relname::TEXT AS child_name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = 'system_events'
+          AND child.relname ~ '_p[0-9]{8}$'
+          AND to_date(right(child.relname, 8), 'YYYYMMDD') < p_before
+          AND to_regclass(child.relname || '_brin') IS NULL
+        ORDER BY child.relname
+    LOOP
+        EXECUTE format('CREATE INDEX %I ON %I USING brin (event_time, id)', v_rec.child_name || '_brin', v_rec.child_name);
+        FOR v_index_name IN
+            SELECT idx.relname::TEXT
+            FROM pg_index x
+            JOIN pg_class idx ON idx.oid = x.indexrelid
+            WHERE x.indrelid = to_regclass(v_rec.child_name)
+              AND idx.relname <> v_rec.child_name || '_brin'
+        LOOP
+            EXECUTE format('DROP INDEX %I', v_index_name);
+        END LOOP;
+        partition_name := v_rec.child_name;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+COMMENT ON FUNCTION demote_event_partitions(DATE)
+IS 'Переводит секции system_events старше даты в холодные: остается только BRIN-индекс (event_time, id). Версия схемы: 5.0.24.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: drop_event_partitions
+-- Назначение: Хранение журнала событий удалением целых суточных секций
+--             system_events, лежащих раньше p_before (без DELETE и VACUUM).
+--             Секция по умолчанию не затрагивается (очищается пакетами).
+-- Возвращает: имена удаленных секций.
+-- Версия схемы: 5.0.24
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION drop_event_partitions(p_before DATE)
+RETURNS TABLE (partition_name TEXT)
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_rec RECORD;
+BEGIN
+    FOR v_rec IN
+        SELECT child.relname::TEXT AS child_name
+        FROM pg_inherits i
+        JOIN pg_class parent ON parent.oid = i.inhparent
+        JOIN pg_class child ON child.oid = i.inhrelid
+        WHERE parent.relname = 'system_events'
+          AND child.relname ~ '_p[0-9]{8}$'
+          AND to_date(right(child.relname, 8), 'YYYYMMDD') < p_before
+        ORDER BY child.relname
+    LOOP
+        EXECUTE format('ALTER TABLE system_events DETACH PARTITION %I', v_rec.child_name);
+        EXECUTE format('DROP TABLE %I', v_rec.child_name);
+        partition_name := v_rec.child_name;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+COMMENT ON FUNCTION drop_event_partitions(DATE)
+IS 'Удаляет суточные секции system_events старше указанной даты (хранение журнала без DELETE и VACUUM). Версия схемы: 5.0.24.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: rollup_node_checks
+-- Назначение: Пересчитывает почасовые агрегаты node_check_rollups за полные часы
+--             [p_from; p_to) и суточные агрегаты (из почасовых) за затронутые сутки.
+--             Идемпотентна: агрегаты интервала удаляются и вставляются заново.
+--             Границы - UTC. Вызывается порциями (flask checks retention).
+-- Возвращает: количество вставленных почасовых агрегатов.
+-- Версия схемы: 5.0.7
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION rollup_node_checks(p_from TIMESTAMPTZ, p_to TIMESTAMPTZ)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_from TIMESTAMPTZ := date_trunc('hour', p_from AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    v_to TIMESTAMPTZ := date_trunc('hour', p_to AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    v_day_from TIMESTAMPTZ := date_trunc('day', p_from AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+    v_day_to TIMESTAMPTZ;
+    v_rows INTEGER;
+BEGIN
+    IF v_to <= v_from THEN
+        RETURN 0;
+    END IF;
+    v_day_to := date_trunc('day', (v_to - INTERVAL '1 microsecond') AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' + INTERVAL '1 day';
+
+    DELETE FROM node_check_rollups
+    WHERE bucket_size = 'hour' AND bucket_start >= v_from AND bucket_start < v_to;
+
+    INSERT INTO node_check_rollups (
+        bucket_size, bucket_start, node_id, assignment_id, method_id,
+        checks_count, available_count, success_count, first_checked_at, last_checked_at
+    )
+    SELECT
+        'hour', date_trunc('hour', nc.checked_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+        nc.node_id, nc.assignment_id, nc.method_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE nc.is_available),
+        COUNT(*) FILTER (WHERE nc.is_available AND nc.check_success IS TRUE),
+        MIN(nc.checked_at), MAX(nc.checked_at)
+    FROM node_checks nc
+    WHERE nc.checked_at >= v_from AND nc.checked_at < v_to
+    GROUP BY 2, nc.node_id, nc.assignment_id, nc.method_id;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+
+    -- Суточные агрегаты затронутых суток пересчитываются из почасовых
+    DELETE FROM node_check_rollups
+    WHERE bucket_size = 'day' AND bucket_start >= v_day_from AND bucket_start < v_day_to;
+
+    INSERT INTO node_check_rollups (
+        bucket_size, bucket_start, node_id, assignment_id, method_id,
+        checks_count, available_count, success_count, first_checked_at, last_checked_at
+    )
+    SELECT
+        'day', date_trunc('day', r.bucket_start AT TIME ZONE 'UTC') AT TIME ZONE 'UTC',
+        r.node_id, r.assignment_id, r.method_id,
+        SUM(r.checks_count), SUM(r.available_count), SUM(r.success_count),
+        MIN(r.first_checked_at), MAX(r.last_checked_at)
+    FROM node_check_rollups r
+    WHERE r.bucket_size = 'hour' AND r.bucket_start >= v_day_from AND r.bucket_start < v_day_to
+    GROUP BY 2, r.node_id, r.assignment_id, r.method_id;
+
+    RETURN v_rows;
+END;
+$$;
+COMMENT ON FUNCTION rollup_node_checks(TIMESTAMPTZ, TIMESTAMPTZ)
+IS 'Пересчитывает почасовые (за полные часы диапазона) и суточные агрегаты доступности node_check_rollups. Версия схемы: 5.0.7.';
+
+-- -----------------------------------------------------------------------------
+-- Функция: log_check_result_summaries
+-- Назначение: Сводные события о полученных результатах проверок вместо события на
+--             каждый результат: одно событие CHECK_RESULTS_SUMMARY на объект-исполнитель
+--             за интервал settings.check_events_summary_interval_seconds (0 - отключено):
+--             "получено N результатов от объекта X за период". Считается по node_checks
+--             (индекс по checked_at, отсечение секций), при записи результатов ничего
+--             дополнительно не пишется.
+--             Обрабатываются только завершенные интервалы после отметки
+--             settings.check_events_summary_watermark. Строка отметки блокируется,
+--             поэтому параллельные вызовы (несколько экземпляров по cron) не дублируют
+--             сводки. После простоя пропущенный период (не более суток) сводится
+--             одним событием на объект.
+-- Возвращает: Количество записанных сводных событий.
+-- Версия схемы: 5.0.23
+-- -----------------------------------------------------------------------------
+CREATE OR REPLACE FUNCTION log_check_result_summaries(p_now TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_interval_text TEXT;
+    v_interval INTERVAL;
+    v_watermark_text TEXT;
+    v_window_start TIMESTAMPTZ;
+    v_window_end TIMESTAMPTZ;
+    v_logged INTEGER;
+BEGIN
+    SELECT value INTO v_interval_text FROM settings WHERE key = 'check_events_summary_interval_seconds';
+    IF v_interval_text IS NULL OR v_interval_text !~ '^[0-9]+$' OR v_interval_text::INTEGER <= 0 THEN
+        RETURN 0;
+    END IF;
+    v_interval := make_interval(secs => v_interval_text::INTEGER);
+    v_window_end := date_bin(v_interval, p_now, TIMESTAMPTZ '2000-01-01 00:00:00+00');
+
+    INSERT INTO settings (key, value, description)
+    VALUES ('check_events_summary_watermark', '', 'Конец последнего интервала, за который записаны сводные события о результатах проверок (служебная).')
+    ON CONFLICT (key) DO NOTHING;
+    SELECT value INTO v_watermark_text FROM settings WHERE key = 'check_events_summary_watermark' FOR UPDATE;
+
+    v_window_start := GREATEST(
+        COALESCE(NULLIF(v_watermark_text, '')::TIMESTAMPTZ, v_window_end - v_interval),
+        v_window_end - INTERVAL '1 day'
+    );
+    IF v_window_start >= v_window_end THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO system_events (event_type, severity, message, source, object_id, details)
+    SELECT
+        'CHECK_RESULTS_SUMMARY', 'INFO',
+        format('Получено результатов проверок от объекта %s за %s - %s: %s (недоступно: %s, критерии не пройдены: %s).',
+               COALESCE(c.executor_object_id::text, 'N/A'),
+               to_char(v_window_start AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS'),
+               to_char(v_window_end AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS "UTC"'),
+               COUNT(*), COUNT(*) FILTER (WHERE NOT c.is_available), COUNT(*) FILTER (WHERE c.check_success IS FALSE)),
+        'log_check_result_summaries', c.executor_object_id,
+        jsonb_build_object(
+            'window_start_utc', v_window_start,
+            'window_end_utc', v_window_end,
+            'results_count', COUNT(*),
+            'unavailable_count', COUNT(*) FILTER (WHERE NOT c.is_available),
+            'failed_count', COUNT(*) FILTER (WHERE c.check_success IS FALSE),
+            'nodes_count', COUNT(DISTINCT c.node_id),
+            'assignments_count', COUNT(DISTINCT c.assignment_id)
+        )
+    FROM node_checks c
+    WHERE c.checked_at >= v_window_start AND c.checked_at < v_window_end
+    GROUP BY c.executor_object_id;
+    GET DIAGNOSTICS v_logged = ROW_COUNT;
+
+    UPDATE settings
+    SET value = to_char(v_window_end AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"+00:00"')
+    WHERE key = 'check_events_summary_watermark';
+    RETURN v_logged;
+END;
+$$;
+COMMENT ON FUNCTION log_check_result_summaries(TIMESTAMPTZ)
+IS 'Записывает сводные события CHECK_RESULTS_SUMMARY (количество результатов по объекту-исполнителю) за завершенные интервалы settings.check_events_summary_interval_seconds после отметки check_events_summary_watermark. Версия схемы: 5.0.23.';
+
+-- Начальный набор секций: вчера, сегодня и неделя вперед (дальше - flask checks create-partitions).
+SELECT create_check_partitions(CURRENT_DATE - 1, CURRENT_DATE + 7);
+SELECT create_event_partitions(CURRENT_DATE - 1, CURRENT_DATE + 7);
+-- Секция событий по умолчанию индексируется как горячая (принимает события без своей секции).
+SELECT index_hot_event_partition('system_events_default');
+
 -- =============================================================================
 -- == КОНЕЦ СОЗДАНИЯ ФУНКЦИЙ И ПРОЦЕДУР ==
 -- =============================================================================
\ No newline at end of file
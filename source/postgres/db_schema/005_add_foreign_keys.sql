@@ -3,7 +3,7 @@
 -- Назначение: Добавление всех ограничений внешних ключей (FOREIGN KEY).
 --             Вынесено в отдельный файл для управления зависимостями при
 --             создании/удалении таблиц и для ясности схемы.
--- Версия схемы: 5.0.2 (исправлен порядок FK, добавлены все FK)
+-- Версия схемы: 5.0.24 (ссылки system_events - логические)
 -- =============================================================================
 
 -- -----------------------------------------------------------------------------
@@ -85,11 +85,9 @@ ALTER TABLE node_check_assignments
     ON DELETE RESTRICT;
 COMMENT ON CONSTRAINT fk_assignments_method ON node_check_assignments IS 'Ссылка на основной метод задания. Запрещает удаление метода, если он используется (RESTRICT).';
 
--- Ссылка на последнюю проверку (исправленная ошибка)
-ALTER TABLE node_check_assignments
-    ADD CONSTRAINT fk_assignments_last_check
-    FOREIGN KEY (last_node_check_id) REFERENCES node_checks(id) ON DELETE SET NULL;
-COMMENT ON CONSTRAINT fk_assignments_last_check ON node_check_assignments IS 'Ссылка на ID последней проверки (из node_checks), выполненной по этому заданию.';
+-- Ссылка на последнюю проверку (last_node_check_id) - логическая, без FK:
+-- node_checks секционирована, ее первичный ключ (id, checked_at), а старые
+-- секции удаляются целиком (v5.0.6).
 
 -- -----------------------------------------------------------------------------
 -- Внешние ключи для таблицы: node_checks
@@ -136,29 +134,48 @@ ALTER TABLE node_checks
 -- Внешние ключи для таблицы: node_check_details
 -- -----------------------------------------------------------------------------
 -- Ссылка на основную запись о проверке.
+-- Версия 5.0.6: Ключ (node_check_id, checked_at) - обе таблицы секционированы по checked_at.
 ALTER TABLE node_check_details
     ADD CONSTRAINT fk_node_check_details_check
-    FOREIGN KEY (node_check_id) REFERENCES node_checks(id)
+    FOREIGN KEY (node_check_id, checked_at) REFERENCES node_checks(id, checked_at)
     ON DELETE CASCADE;
 COMMENT ON CONSTRAINT fk_node_check_details_check ON node_check_details IS 'Ссылка на основную запись проверки. Детали удаляются вместе с проверкой (CASCADE).';
 
 -- -----------------------------------------------------------------------------
--- Внешние ключи для таблицы: system_events
+-- Внешние ключи для таблицы: node_check_latest
 -- -----------------------------------------------------------------------------
-ALTER TABLE system_events
-    ADD CONSTRAINT fk_system_events_node
-    FOREIGN KEY (node_id) REFERENCES nodes(id) ON DELETE SET NULL;
-COMMENT ON CONSTRAINT fk_system_events_node ON system_events IS 'Ссылка на связанный узел. Сбрасывается в NULL при удалении узла.';
+-- Текущее состояние не имеет смысла без задания/узла - удаляется вместе с ними.
+-- Ссылки на node_checks нет намеренно: очистка истории не должна стирать текущее состояние.
+ALTER TABLE node_check_latest
+    ADD CONSTRAINT fk_node_check_latest_assignment
+    FOREIGN KEY (assignment_id) REFERENCES node_check_assignments(id)
+    ON DELETE CASCADE;
+COMMENT ON CONSTRAINT fk_node_check_latest_assignment ON node_check_latest IS 'Ссылка на задание. Состояние удаляется вместе с заданием (CASCADE).';
+
+ALTER TABLE node_check_latest
+    ADD CONSTRAINT fk_node_check_latest_node
+    FOREIGN KEY (node_id) REFERENCES nodes(id)
+    ON DELETE CASCADE;
+COMMENT ON CONSTRAINT fk_node_check_latest_node ON node_check_latest IS 'Ссылка на узел. Состояние удаляется вместе с узлом (CASCADE).';
 
-ALTER TABLE system_events
-    ADD CONSTRAINT fk_system_events_assignment
-    FOREIGN KEY (assignment_id) REFERENCES node_check_assignments(id) ON DELETE SET NULL;
-COMMENT ON CONSTRAINT fk_system_events_assignment ON system_events IS 'Ссылка на связанное задание. Сбрасывается в NULL при удалении задания.';
+-- -----------------------------------------------------------------------------
+-- Внешние ключи для таблицы: node_check_rollups
+-- -----------------------------------------------------------------------------
+-- assignment_id - логическая ссылка (как node_checks.assignment_id, переживает удаление задания).
+ALTER TABLE node_check_rollups
+    ADD CONSTRAINT fk_node_check_rollups_node
+    FOREIGN KEY (node_id) REFERENCES nodes(id)
+    ON DELETE CASCADE;
+COMMENT ON CONSTRAINT fk_node_check_rollups_node ON node_check_rollups IS 'Ссылка на узел. Агрегаты удаляются вместе с узлом (CASCADE).';
 
-ALTER TABLE system_events
-    ADD CONSTRAINT fk_system_events_check
-    FOREIGN KEY (node_check_id) REFERENCES node_checks(id) ON DELETE SET NULL;
-COMMENT ON CONSTRAINT fk_system_events_check ON system_events IS 'Ссылка на связанный результат проверки. Сбрасывается в NULL при удалении проверки.';
+-- -----------------------------------------------------------------------------
+-- Внешние ключи для таблицы: system_events
+-- -----------------------------------------------------------------------------
+-- Версия 5.0.24: Ссылки журнала событий (node_id, assignment_id, node_check_id) -
+-- логические, без FK. Журнал только дописывается: ON DELETE SET NULL при удалении
+-- узла/задания обновлял бы строки во всех секциях, включая холодные (без индексов
+-- по node_id/assignment_id - полный просмотр), и стирал бы из журнала, к чему
+-- относилось событие.
 
 -- -----------------------------------------------------------------------------
 -- Внешние ключи для таблицы: offline_config_versions
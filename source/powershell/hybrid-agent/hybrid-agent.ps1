@@ -1,7 +1,10 @@
 ﻿# powershell/hybrid-agent/hybrid-agent.ps1
 # --- Гибридный Агент Мониторинга Status Monitor (Pipeline-архитектура) ---
-# --- Версия 7.1.0 ---
-# Изменения:
+# --- Версия 7.1.1 ---
+# Изменения (7.1.1):
+# - Опция конфигурации 'compress_request_body' ("none" | "gzip"): в Online режиме тело запроса
+#   к /checks сжимается gzip (Content-Encoding: gzip, сервер Status Monitor v5.0.17+).
+# Изменения (7.1.0):
 # - Полная адаптация под выполнение pipeline-заданий.
 # - В Online режиме: для каждого задания выполняется pipeline, собираются результаты всех шагов,
 #   формируется один агрегированный результат для задания и отправляется в API.
@@ -14,7 +17,7 @@
 
 <#
 .SYNOPSIS
-    Гибридный агент системы мониторинга Status Monitor v7.1.0 (Pipeline-архитектура).
+    Гибридный агент системы мониторинга Status Monitor v7.1.1 (Pipeline-архитектура).
     Выполняет pipeline-задания в Online или Offline режиме.
 .DESCRIPTION
     Online режим:
@@ -28,7 +31,7 @@
     - Собирает агрегированные результаты всех заданий.
     - Сохраняет их в .zrpu файл для последующей загрузки.
 .NOTES
-    Версия: 7.1.0
+    Версия: 7.1.1
     Дата: [Актуальная Дата]
     Зависит от модуля StatusMonitorAgentUtils (v2.1.3+).
 #>
@@ -59,7 +62,7 @@ $script:ComputerName = $env:COMPUTERNAME
 $script:Config = $null
 $script:EffectiveLogLevel = "Info"
 $script:LogFilePath = $null
-$script:AgentVersion = "hybrid_agent_v7.1.0" # <<< ОБНОВЛЕНА ВЕРСИЯ АГЕНТА
+$script:AgentVersion = "hybrid_agent_v7.1.1" # <<< ОБНОВЛЕНА ВЕРСИЯ АГЕНТА
 
 # Переменные для Online режима
 $script:ActiveAssignmentsOnline = @{} # Хранит { assignment_id = $AssignmentObject (с pipeline) }
@@ -114,6 +117,14 @@ function Write-Log {
     }
 }
 
+function ConvertTo-GzipBytes { # Сжатие тела запроса для Content-Encoding: gzip
+    param([Parameter(Mandatory=$true)][byte[]]$Bytes)
+    $compressedStream = New-Object System.IO.MemoryStream
+    $gzipStream = New-Object System.IO.Compression.GzipStream($compressedStream, [System.IO.Compression.CompressionMode]::Compress)
+    try { $gzipStream.Write($Bytes, 0, $Bytes.Length) } finally { $gzipStream.Dispose() } # Dispose дописывает завершающий блок gzip
+    return ,$compressedStream.ToArray()
+}
+
 function Invoke-ApiRequestWithRetry {
     [CmdletBinding()]
     param(
@@ -121,7 +132,8 @@ function Invoke-ApiRequestWithRetry {
         [Parameter(Mandatory=$true)][string]$Method,
         [Parameter(Mandatory=$false)]$BodyObject = $null,
         [Parameter(Mandatory=$true)][hashtable]$Headers,
-        [Parameter(Mandatory=$true)][string]$Description
+        [Parameter(Mandatory=$true)][string]$Description,
+        [Parameter(Mandatory=$false)][switch]$CompressBody # Сжать тело gzip (только для эндпоинтов приема результатов)
     )
     $currentTry = 0; $apiResponseObject = $null
     $maxRetriesForRequest = if ($script:Config -and $script:Config.PSObject.Properties.Name -contains 'max_api_retries') { [int]$script:Config.max_api_retries } else { 3 }
@@ -134,6 +146,12 @@ function Invoke-ApiRequestWithRetry {
             $invokeRestParams.ContentType = 'application/json; charset=utf-8'
             $invokeRestParams.Body = [System.Text.Encoding]::UTF8.GetBytes($jsonRequestBody)
             Write-Log "Тело запроса для ($Description) (длина: $($invokeRestParams.Body.Length) байт): $jsonRequestBody" -Level Debug
+            if ($CompressBody) {
+                $uncompressedBodyLength = $invokeRestParams.Body.Length
+                $invokeRestParams.Body = ConvertTo-GzipBytes -Bytes $invokeRestParams.Body
+                $invokeRestParams.Headers = $Headers.Clone(); $invokeRestParams.Headers['Content-Encoding'] = 'gzip'
+                Write-Log "Тело запроса для ($Description) сжато gzip: $uncompressedBodyLength -> $($invokeRestParams.Body.Length) байт." -Level Verbose
+            }
         } catch { Write-Log "Критическая ошибка ConvertTo-Json для ($Description): $($_.Exception.Message)" -Level Error; throw "Ошибка преобразования тела запроса в JSON для операции '$Description'." }
     }
     while ($currentTry -lt $maxRetriesForRequest) {
@@ -357,9 +375,10 @@ if ($agentMode -eq 'online') {
                     }
 
                     $checksApiUrlOnline = "$($script:Config.api_base_url.TrimEnd('/'))/v1/checks"
+                    $compressChecksBodyOnline = ($script:Config.PSObject.Properties.Name -contains 'compress_request_body') -and ($script:Config.compress_request_body -eq 'gzip')
                     $sendAggregatedResultSuccess = $false
                     try {
-                        $apiResponseFromPostAggregated = Invoke-ApiRequestWithRetry -Uri $checksApiUrlOnline -Method Post -BodyObject $aggregatedPipelineResultPayload -Headers $apiHeaders -Description "Отправка агрегированного результата pipeline ID $currentAssignmentIdOnline"
+                        $apiResponseFromPostAggregated = Invoke-ApiRequestWithRetry -Uri $checksApiUrlOnline -Method Post -BodyObject $aggregatedPipelineResultPayload -Headers $apiHeaders -CompressBody:$compressChecksBodyOnline -Description "Отправка агрегированного результата pipeline ID $currentAssignmentIdOnline"
                         
                         # Анализ ответа (как в v7.0.5 для одиночной отправки)
                         $statusFromApiAggregated = $null
@@ -1,7 +1,10 @@
 ﻿# powershell/result_loader/result_loader.ps1
 # --- Загрузчик Результатов для Status Monitor (v5.x - Pipeline Архитектура) ---
-# --- Версия 5.0.0 ---
-# Изменения:
+# --- Версия 5.0.1 ---
+# Изменения (5.0.1):
+# - Опция конфигурации 'compress_request_body' ("none" | "gzip"): тело запроса к /checks/bulk
+#   сжимается gzip и отправляется с заголовком Content-Encoding: gzip (сервер Status Monitor v5.0.17+).
+# Изменения (5.0.0):
 # - Адаптирован для обработки .zrpu файлов, содержащих агрегированные результаты выполнения pipeline-заданий.
 # - Каждый элемент в массиве 'results' .zrpu файла теперь представляет собой результат целого pipeline.
 # - При формировании payload для API /checks/bulk (или /checks):
@@ -32,7 +35,7 @@
     [string] Путь к файлу конфигурации загрузчика (JSON).
     По умолчанию: "$PSScriptRoot\config.json".
 .NOTES
-    Версия: 5.0.0
+    Версия: 5.0.1
     Дата: [Актуальная Дата]
     Зависимости: PowerShell 5.1+, Сетевой доступ к API, Права доступа к папкам.
     Ожидает, что .zrpu файлы сгенерированы Гибридным Агентом v7.1.0+ (Pipeline).
@@ -48,14 +51,14 @@ param(
 )
 
 # --- 1. Глобальные переменные и константы ---
-$ScriptVersion = "5.0.0" # <<< ОБНОВЛЕНА ВЕРСИЯ СКРИПТА
+$ScriptVersion = "5.0.1" # <<< ОБНОВЛЕНА ВЕРСИЯ СКРИПТА
 $script:Config = $null
 $script:EffectiveLogLevel = "Info" # Уровень логирования по умолчанию
 $script:LogFilePath = $null
 $script:ComputerName = $env:COMPUTERNAME
 # Значения по умолчанию для некоторых параметров конфигурации
 $DefaultLogLevel = "Info"; $DefaultScanInterval = 30; $DefaultApiTimeout = 60;
-$DefaultMaxRetries = 3; $DefaultRetryDelay = 5;
+$DefaultMaxRetries = 3; $DefaultRetryDelay = 5; $DefaultCompressRequestBody = "none";
 $ValidLogLevels = @("Debug", "Verbose", "Info", "Warn", "Error");
 $script:EffectiveApiKey = $null # Будет установлено из конфига или параметра
 
@@ -103,6 +106,14 @@ function Write-Log {
     }
 }
 
+function ConvertTo-GzipBytes { # Сжатие тела запроса для Content-Encoding: gzip
+    param([Parameter(Mandatory=$true)][byte[]]$Bytes)
+    $compressedStream = New-Object System.IO.MemoryStream
+    $gzipStream = New-Object System.IO.Compression.GzipStream($compressedStream, [System.IO.Compression.CompressionMode]::Compress)
+    try { $gzipStream.Write($Bytes, 0, $Bytes.Length) } finally { $gzipStream.Dispose() } # Dispose дописывает завершающий блок gzip
+    return ,$compressedStream.ToArray()
+}
+
 filter Get-OrElse { # Фильтр для получения значения по умолчанию, если основное null/пустое
     param([object]$DefaultValue)
     if ($null -ne $_ -and (($_ -isnot [string]) -or (-not [string]::IsNullOrWhiteSpace($_)))) { $_ } else { $DefaultValue }
@@ -115,7 +126,8 @@ function Invoke-ApiRequestWithRetry { # Функция для выполнени
         [Parameter(Mandatory=$true)][string]$Method,
         [Parameter(Mandatory=$false)]$BodyObject = $null,
         [Parameter(Mandatory=$true)][hashtable]$Headers,
-        [Parameter(Mandatory=$true)][string]$Description
+        [Parameter(Mandatory=$true)][string]$Description,
+        [Parameter(Mandatory=$false)][switch]$CompressBody # Сжать тело gzip (только для эндпоинтов приема результатов)
     )
     # ... (реализация функции Invoke-ApiRequestWithRetry без изменений от версии 4.2.3) ...
     # Важно: ConvertTo-Json использует -Depth 10 для сохранения структуры pipeline.
@@ -131,6 +143,12 @@ function Invoke-ApiRequestWithRetry { # Функция для выполнени
             $invokeParams.ContentType = 'application/json; charset=utf-8'
             $invokeParams.Body = [System.Text.Encoding]::UTF8.GetBytes($jsonBody)
             Write-Log "Тело запроса для ($Description) (длина: $($invokeParams.Body.Length) байт): $jsonBody" -Level Debug
+            if ($CompressBody) {
+                $uncompressedBodyLength = $invokeParams.Body.Length
+                $invokeParams.Body = ConvertTo-GzipBytes -Bytes $invokeParams.Body
+                $invokeParams.Headers = $Headers.Clone(); $invokeParams.Headers['Content-Encoding'] = 'gzip'
+                Write-Log "Тело запроса для ($Description) сжато gzip: $uncompressedBodyLength -> $($invokeParams.Body.Length) байт." -Level Verbose
+            }
         } catch {
             Write-Log "Критическая ошибка ConvertTo-Json для ($Description): $($_.Exception.Message)" -Level Error
             throw "Ошибка преобразования тела запроса в JSON для операции '$Description'."
@@ -343,6 +361,7 @@ while ($true) {
                         BodyObject  = $apiBodyForBulkRequest
                         Headers     = $headersForBulkChecks
                         Description = "Отправка $($payloadItemsForApiBulkRequest.Count) агрегированных результатов из файла '$($fileInfo.Name)'"
+                        CompressBody = (($script:Config.compress_request_body | Get-OrElse $DefaultCompressRequestBody) -eq 'gzip')
                     }
                     Write-Log ("Отправка $($payloadItemsForApiBulkRequest.Count) агрегированных результатов из файла '$($fileInfo.Name)' на $apiUrlForBulkChecks...") -Level Info
                     
@@ -2,6 +2,13 @@
 """
 Основной файл Flask-приложения для Status Monitor.
 Версия 5.0.1: Исправлен импорт и регистрация CLI-команд.
+Версия 5.0.9: Рассылка изменений статусов узлов через SocketIO (services.status_push).
+Версия 5.0.11: user_loader читает пользователя через кеш (auth_utils.load_user_data).
+Версия 5.0.12: Ленивое получение соединения с БД в рамках запроса (db_request.init_request_db).
+Версия 5.0.14: Асинхронный прием результатов проверок (services.check_ingest).
+Версия 5.0.17: Потоковая распаковка сжатых тел запросов приема результатов (request_decoding).
+Версия 5.0.18: JSON-провайдер на orjson для ответов API и сообщений SocketIO (json_provider).
+Версия 5.0.24: Фоновое обслуживание БД - секции и хранение истории (services.maintenance).
 """
 import os
 import logging
@@ -16,10 +23,17 @@ from flask_login import LoginManager
 # --- Импорт компонентов приложения ---
 from .db_connection import get_connection, close_db_pool, db_pool, psycopg2 # Добавил psycopg2 для user_loader
 from .models.user import User
-from .repositories import user_repository # Теперь user_repository используется
 from .errors import register_error_handlers
-from .commands import user_cli, api_key_cli # <<< ИЗМЕНЕНО: Импортируем группы команд
+from .commands import user_cli, api_key_cli, checks_cli # <<< ИЗМЕНЕНО: Импортируем группы команд
+from .auth_utils import flush_api_key_last_used, init_api_key_last_used_flush, load_user_data
 from .routes import init_routes
+from .services.status_push import init_status_push
+from .db_request import init_request_db
+from .request_decoding import init_request_decoding
+from . import json_provider
+from .json_provider import FastJSONProvider
+from .services.check_ingest import init_check_ingest
+from .services.maintenance import init_maintenance
 
 # --- Инициализация расширений Flask ---
 cors: Optional[CORS] = None
@@ -33,6 +47,7 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
     global cors, socketio, login_manager
 
     app = Flask(__name__, instance_relative_config=True)
+    app.json = FastJSONProvider(app) # jsonify/get_json через orjson, даты - ISO 8601
     module_logger.info(f"Создание экземпляра Flask-приложения (PID: {os.getpid()}). Имя модуля: {app.name}")
 
     # --- Загрузка конфигурации ---
@@ -68,8 +83,13 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
     # --- Инициализация расширений Flask ---
     cors = CORS(app, resources={r"/api/*": {"origins": "*"}})
     module_logger.info("Flask-CORS инициализирован.")
-    socketio = SocketIO(app, async_mode='eventlet', manage_session=True, cors_allowed_origins="*")
+    socketio = SocketIO(app, async_mode='eventlet', manage_session=True, cors_allowed_origins="*",
+                        json=json_provider) # Сообщения кодируются так же, как ответы API
     module_logger.info("Flask-SocketIO инициализирован с async_mode='eventlet'.")
+    init_status_push(socketio, app) # Подписка клиентов на пакеты изменений статусов узлов
+    init_check_ingest(socketio) # Фоновая запись очереди приема результатов (CHECK_INGEST_MODE=async)
+    init_api_key_last_used_flush(socketio) # Пакетная запись last_used_at API-ключей вне запросов
+    init_maintenance(socketio, app) # Секции вперед и хранение истории (MAINTENANCE_INTERVAL_SECONDS)
     login_manager = LoginManager()
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
@@ -82,38 +102,14 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
         if not user_id_str: return None
         try:
             user_id = int(user_id_str)
-            # Используем соединение из g или новое, если нужно
-            conn_for_loader = getattr(g, 'db_conn', None)
-            needs_new_conn = conn_for_loader is None or conn_for_loader.closed
-            
-            actual_conn_source = None
-            if needs_new_conn:
-                module_logger.debug(f"load_user_from_db: g.db_conn отсутствует/закрыто. Получаем новое соединение.")
-                actual_conn_source = get_connection() # Это контекстный менеджер
-            else:
-                actual_conn_source = conn_for_loader # Используем существующее (без with)
-
-            # Логика работы с соединением
-            user_data_dict: Optional[Dict] = None
-            if needs_new_conn:
-                with actual_conn_source as new_conn_ctx: # Используем with для нового соединения
-                    cursor = new_conn_ctx.cursor() # Предполагаем RealDictCursor из get_connection
-                    user_data_dict = user_repository.get_user_by_id(cursor, user_id)
-            else: # Используем существующее соединение из g (без with)
-                # Важно: курсор g.db_cursor должен быть уже создан в before_request
-                if hasattr(g, 'db_cursor') and g.db_cursor and not g.db_cursor.closed:
-                    user_data_dict = user_repository.get_user_by_id(g.db_cursor, user_id)
-                else: # Если курсора нет, создаем временный из g.db_conn
-                    module_logger.warning("load_user_from_db: g.db_cursor отсутствует или закрыт, создаем временный.")
-                    with conn_for_loader.cursor() as temp_cursor: # Временный курсор
-                         user_data_dict = user_repository.get_user_by_id(temp_cursor, user_id)
-
+            # Кеш пользователей (auth_utils): БД запрашивается не чаще раза в USER_CACHE_TTL_SECONDS
+            user_data_dict = load_user_data(user_id)
             if user_data_dict:
-                module_logger .debug(f"load_user_from_db: Пользователь ID {user_id} найден (данные: {user_data_dict.get('username')}).")
+                module_logger.debug(f"load_user_from_db: Пользователь ID {user_id} найден (данные: {user_data_dict.get('username')}).")
                 return User(id=user_data_dict['id'], username=user_data_dict['username'],
                             password_hash=user_data_dict['password_hash'], is_active=user_data_dict['is_active'])
             else:
-                module_logger .debug(f"load_user_from_db: Пользователь ID {user_id} не найден.")
+                module_logger.debug(f"load_user_from_db: Пользователь ID {user_id} не найден.")
                 return None
         except ValueError:
             module_logger.warning(f"load_user_from_db: Неверный формат user_id: '{user_id_str}'.")
@@ -126,55 +122,11 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
             return None
 
     # --- Регистрация обработчиков запросов ---
-    @app.before_request
-    def before_request_setup_db():
-        if not hasattr(g, 'db_conn') or g.db_conn is None or g.db_conn.closed:
-            try:
-                if db_pool is None:
-                    module_logger.critical("Пул db_pool не инициализирован в db_connection.py!")
-                    g.db_conn = None; g.db_cursor = None; return
-                
-                # Получаем соединение из пула. get_connection() теперь контекстный менеджер,
-                # но здесь нам нужно сохранить соединение в g на время запроса.
-                # Поэтому напрямую используем db_pool.getconn().
-                # Контекстный менеджер get_connection() сам вернет его в пул.
-                # Для before_request/teardown_appcontext лучше управлять соединением явно.
-                g.db_conn = db_pool.getconn()
-                g.db_cursor = g.db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) # Используем RealDictCursor
-                module_logger.debug(f"Соединение с БД (ID: {id(g.db_conn)}) получено из пула и установлено в g.db_conn.")
-            except psycopg2.Error as e_getconn_before:
-                module_logger.error(f"Ошибка получения соединения из пула в before_request: {e_getconn_before}", exc_info=True)
-                g.db_conn = None; g.db_cursor = None
-            except Exception as e_setup_g: # Ловим другие возможные ошибки, если get_connection() изменился
-                module_logger.error(f"Неожиданная ошибка при установке g.db_conn в before_request: {e_setup_g}", exc_info=True)
-                g.db_conn = None; g.db_cursor = None
-
-
-    @app.teardown_appcontext
-    def teardown_db_connection(exception=None):
-        cursor = g.pop('db_cursor', None)
-        if cursor is not None:
-            try:
-                if not cursor.closed: cursor.close()
-                module_logger.debug("Курсор БД успешно закрыт в teardown_appcontext.")
-            except psycopg2.Error as e_close_cur_tear:
-                module_logger.error(f"Ошибка при закрытии курсора БД в teardown: {e_close_cur_tear}", exc_info=True)
-
-        conn = g.pop('db_conn', None)
-        if conn is not None:
-            if db_pool is None:
-                module_logger.warning("Пул db_pool не был инициализирован, не могу вернуть соединение из g.db_conn в teardown.")
-                try:
-                    if not conn.closed: conn.close()
-                except psycopg2.Error: pass
-                return
-            try:
-                # Если была ошибка, psycopg2 мог пометить соединение как "broken".
-                # putconn сам разберется с этим (не вернет сломанное соединение в пул или закроет его).
-                db_pool.putconn(conn)
-                module_logger.debug(f"Соединение с БД (ID: {id(conn)}) возвращено в пул в teardown_appcontext.")
-            except psycopg2.Error as e_putconn_tear:
-                module_logger.error(f"Ошибка при возврате соединения (ID: {id(conn)}) в пул в teardown: {e_putconn_tear}", exc_info=True)
+    # Соединение берется из пула при первом обращении к g.db_conn/g.db_cursor
+    # и возвращается сразу после формирования ответа (см. db_request.py).
+    init_request_db(app)
+    # Сжатые тела запросов (Content-Encoding: gzip/zstd) для приема результатов (см. request_decoding.py)
+    init_request_decoding(app)
 
     # --- Регистрация кастомных обработчиков ошибок API ---
     register_error_handlers(app)
@@ -188,7 +140,8 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
     if hasattr(app, 'cli'):
         app.cli.add_command(user_cli) # <<< ИЗМЕНЕНО: Регистрируем группу user_cli
         app.cli.add_command(api_key_cli) # <<< ИЗМЕНЕНО: Регистрируем группу api_key_cli
-        module_logger.info("Кастомные CLI-команды (группы: user, apikey) зарегистрированы.")
+        app.cli.add_command(checks_cli) # Обслуживание данных проверок (node_check_latest)
+        module_logger.info("Кастомные CLI-команды (группы: user, apikey, checks) зарегистрированы.")
     else:
         module_logger.warning("Объект app.cli не найден, CLI-команды не будут зарегистрированы.")
 
@@ -196,6 +149,8 @@ def create_app(config_name: Optional[str] = None, test_config: Optional[Dict[str
     import atexit
     atexit.register(close_db_pool)
     module_logger.info("Функция close_db_pool зарегистрирована для выполнения при завершении приложения.")
+    # atexit выполняет функции в обратном порядке: накопленные last_used_at записываются до закрытия пула
+    atexit.register(flush_api_key_last_used)
 
     module_logger.info("Экземпляр Flask-приложения успешно создан и сконфигурирован.")
     return app
@@ -2,11 +2,25 @@
 """
 Утилиты для аутентификации и авторизации пользователей и API-ключей.
 Версия 5.0.3: API-ключи теперь хешируются и проверяются с использованием Werkzeug.
+Версия 5.0.4: Формат ключа с публичным префиксом: поиск по индексу вместо перебора всех ключей.
+Версия 5.0.5: LRU/TTL-кеш проверенных ключей, пакетная запись last_used_at, счетчики кеша.
+              last_used_at записывает фоновая задача (init_api_key_last_used_flush) раз в
+              API_KEY_LAST_USED_FLUSH_SECONDS; запрос только обновляет словарь в памяти и не
+              берет второе соединение из пула.
+Версия 5.0.11: Тот же LRU/TTL-кеш используется для пользователей UI (user_loader Flask-Login):
+              данные пользователя берутся из БД не чаще, чем раз в USER_CACHE_TTL_SECONDS.
 """
-# import hashlib # Больше не нужен для API-ключей
+import hashlib # Для проверки ключей старого формата (SHA-256) и ключа кеша
 import logging
+import os
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
 from functools import wraps
-from flask import request, g, current_app
+from flask import request, g, current_app, has_app_context
 from flask_login import current_user as flask_login_current_user
 import psycopg2
 from psycopg2.extras import RealDictCursor
@@ -17,7 +31,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 
 from .errors import ApiUnauthorized, ApiForbidden, ApiInternalError
 from .db_connection import get_connection
-from .repositories import api_key_repository
+from .repositories import api_key_repository, user_repository
 
 logger = logging.getLogger(__name__)
 # logger.setLevel(logging.DEBUG) # Уровень лучше задавать в app.py или конфигурации
@@ -75,14 +89,60 @@ def verify_user_credentials(username_to_verify: str, password_to_verify: str) ->
 # Функции для API-ключей
 # =============================
 
-# Старая функция hash_api_key больше не нужна, если мы используем Werkzeug.
-# Вместо нее будет generate_password_hash при создании и check_password_hash при проверке.
+# Формат ключа (v5.0.4): 'sm_<key_prefix>_<secret>'.
+#   key_prefix - публичный идентификатор (12 hex-символов), хранится открыто и индексирован;
+#   secret     - секретная часть, в БД хранится только ее хеш Werkzeug.
+# Проверка ключа нового формата = одна индексированная выборка + одна проверка хеша.
+API_KEY_FORMAT_MARKER = 'sm'
+API_KEY_PREFIX_HEX_BYTES = 6 # 12 hex-символов
+_API_KEY_PREFIX_RE = re.compile(r'^[0-9a-f]{%d}$' % (API_KEY_PREFIX_HEX_BYTES * 2))
+
+def generate_api_key(secret_length: int = 32) -> Tuple[str, str, str]:
+    """
+    Генерирует новый API-ключ.
+    Returns:
+        Кортеж (ключ в открытом виде для выдачи клиенту, key_prefix, key_hash для БД).
+    """
+    key_prefix = secrets.token_hex(API_KEY_PREFIX_HEX_BYTES)
+    secret_part = secrets.token_urlsafe(secret_length)
+    api_key_plain_text = f"{API_KEY_FORMAT_MARKER}_{key_prefix}_{secret_part}"
+    key_hash = generate_password_hash(secret_part, method='pbkdf2:sha256')
+    return api_key_plain_text, key_prefix, key_hash
+
+def split_api_key(api_key_value_plain_text: str) -> Tuple[Optional[str], str]:
+    """
+    Разбирает предъявленный ключ на (key_prefix, secret).
+    Для ключей старого формата возвращает (None, исходный ключ).
+    """
+    key_parts = api_key_value_plain_text.split('_', 2)
+    if len(key_parts) == 3 and key_parts[0] == API_KEY_FORMAT_MARKER and _API_KEY_PREFIX_RE.match(key_parts[1]) and key_parts[2]:
+        return key_parts[1], key_parts[2]
+    return None, api_key_value_plain_text
+
+def _find_legacy_api_key(cursor, api_key_value_plain_text: str) -> Optional[Dict[str, Any]]:
+    """
+    Проверяет ключ старого формата (без префикса). Такие ключи работают до ротации
+    (`flask apikey rotate <id>`):
+      1. SHA-256 хеш всего ключа (ключи из UI до v5.0.4) - индексированный поиск по key_hash;
+      2. хеш Werkzeug всего ключа (ключи из CLI до v5.0.4) - перебор только ключей без префикса.
+    """
+    sha256_hex = hashlib.sha256(api_key_value_plain_text.encode('utf-8')).hexdigest()
+    key_by_sha256 = api_key_repository.find_api_key_by_hash(cursor, sha256_hex)
+    if key_by_sha256 and key_by_sha256.get('key_prefix') is None:
+        return key_by_sha256
+    for legacy_key_entry in api_key_repository.fetch_legacy_api_keys(cursor, only_active=True):
+        stored_hash = legacy_key_entry['key_hash']
+        if '$' in stored_hash and check_password_hash(stored_hash, api_key_value_plain_text):
+            return legacy_key_entry
+    return None
 
 def verify_api_key(api_key_value_plain_text: str) -> Optional[Dict[str, Any]]:
     """
     Проверяет API-ключ, предоставленный в запросе.
-    Теперь использует check_password_hash для сравнения предоставленного ключа
-    с хешем, хранящимся в БД (который был создан с помощью generate_password_hash).
+    Сначала ищет ключ в кеше проверенных ключей. При промахе ключ нового формата ищется
+    по key_prefix (api_key_repository.find_api_key_by_prefix), после чего выполняется одна
+    проверка хеша секретной части. Ключи старого формата проверяются через _find_legacy_api_key.
+    last_used_at записывается отложенно (см. flush_api_key_last_used).
 
     Args:
         api_key_value_plain_text (str): API-ключ в открытом виде, полученный из запроса.
@@ -94,140 +154,240 @@ def verify_api_key(api_key_value_plain_text: str) -> Optional[Dict[str, Any]]:
     if not api_key_value_plain_text:
         logger.debug("AuthUtils verify_api_key: Предоставлен пустой API-ключ.")
         return None
-    
-    logger.debug(f"AuthUtils verify_api_key: Начало проверки API-ключа (значение ключа скрыто).")
-    
-    # ВАЖНО: Мы не можем просто хешировать api_key_value_plain_text и искать по хешу,
-    # так как generate_password_hash создает новый хеш с новой солью каждый раз.
-    # Мы должны получить все активные ключи (или их хеши) и проверить каждый.
-    # Это менее эффективно, но более безопасно, если злоумышленник получит доступ к БД.
-    # Альтернатива: хранить часть ключа в открытом виде для быстрого поиска, а затем проверять хеш,
-    # или если количество ключей небольшое, можно перебирать.
-
-    # --- Способ 1: Перебор всех активных ключей (менее эффективно, но не требует изменений в find_api_key_by_hash) ---
-    # Этот способ будет работать, если ключей не очень много.
-    # Если ключей тысячи, нужен другой подход (например, хранить префикс ключа).
-    
-    # Для демонстрации, здесь мы НЕ будем перебирать все ключи.
-    # Мы будем предполагать, что если мы хотим использовать check_password_hash,
-    # то нам нужно как-то найти потенциальный хеш для сравнения.
-    # Это означает, что API-ключи должны иметь некую идентифицирующую часть,
-    # которая не является секретом, и по которой можно найти соответствующий хеш в БД.
-    # Например, префикс ключа или ID ключа, передаваемый вместе с секретной частью.
-
-    # *** ПРОСТОЙ, НО НЕЭФФЕКТИВНЫЙ ВАРИАНТ (если ключей много) ***
-    # (Оставлю его закомментированным, т.к. он не масштабируем)
-    # try:
-    #     with get_connection() as conn:
-    #         with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-    #             # Получаем ВСЕ АКТИВНЫЕ хеши ключей из БД
-    #             cursor.execute("SELECT id, key_hash, role, object_id, is_active FROM api_keys WHERE is_active = TRUE;")
-    #             all_active_key_hashes_from_db = cursor.fetchall()
-    #
-    #     if not all_active_key_hashes_from_db:
-    #         logger.warning("AuthUtils verify_api_key: В базе нет активных API-ключей для проверки.")
-    #         return None
-    #
-    #     for key_db_info in all_active_key_hashes_from_db:
-    #         stored_werkzeug_hash = key_db_info['key_hash']
-    #         if check_password_hash(stored_werkzeug_hash, api_key_value_plain_text):
-    #             # Ключ совпал!
-    #             logger.info(f"API-ключ ID {key_db_info['id']} (роль: {key_db_info['role']}) успешно верифицирован (Werkzeug).")
-    #             try: # Обновляем last_used_at
-    #                 with get_connection() as conn_update: # Новое соединение для обновления
-    #                     with conn_update.cursor() as cursor_update:
-    #                         api_key_repository.update_last_used(cursor_update, key_db_info['id'])
-    #                         conn_update.commit()
-    #             except Exception as e_update_ts: logger.error(...)
-    #             return key_db_info # Возвращаем информацию о ключе
-    #
-    #     logger.warning(f"AuthUtils verify_api_key: Предоставленный API-ключ не прошел проверку Werkzeug ни с одним из активных ключей в БД.")
-    #     return None # Ключ не подошел ни к одному хешу
-    #
-    # except psycopg2.Error as db_err_api: # ...
-    # except Exception as e_api: # ...
-
-    # --- Способ 2: Предполагаем, что API ключ передается в формате "key_id:secret_part" ---
-    # ИЛИ, что у нас есть некий Lookup ID, который не секретен.
-    # Для ПРОСТОТЫ и чтобы не менять формат передачи ключа и логику репозитория `find_api_key_by_hash`,
-    # мы сделаем следующее:
-    # 1. `api_key_repository.find_api_key_by_hash` будет искать по ПЕРВОЙ ЧАСТИ хеша (например, первые N символов, не соль!).
-    #    Это небезопасно и не рекомендуется для production! Это только для примера, как можно было бы адаптировать.
-    # 2. Либо, что более правильно, если мы переходим на Werkzeug для API ключей, то `api_key_repository.find_api_key_by_hash`
-    #    должен измениться, чтобы принимать, например, ID ключа или его уникальное несекретное имя,
-    #    по которому он найдет ЗАХЕШИРОВАННЫЙ КЛЮЧ Werkzeug, и уже этот хеш будет проверяться.
-
-    # *** РЕКОМЕНДУЕМЫЙ И ПРАВИЛЬНЫЙ ПОДХОД, ЕСЛИ ПЕРЕХОДИТЬ НА WERKZEUG ПОЛНОСТЬЮ: ***
-    # Вы должны иметь какой-то несекретный идентификатор ключа, который клиент также передает.
-    # Допустим, API-ключ теперь состоит из двух частей: `public_identifier` и `secret_token`.
-    # Клиент передает обе.
-    # 1. Вы ищете в БД `key_hash` по `public_identifier`.
-    # 2. Затем проверяете `check_password_hash(key_hash_from_db, secret_token_from_client)`.
-
-    # *** ВАШ ТЕКУЩИЙ ВАРИАНТ С ОДНИМ КЛЮЧОМ И ОДНИМ ХЕШЕМ (SHA256) ***
-    # Поскольку вы переходите на Werkzeug, нам нужно изменить логику.
-    # Давайте предположим, что вы хотите найти ключ по какому-то НЕХЕШИРОВАННОМУ идентификатору,
-    # например, по `description` (хотя это не уникально) или по специальному полю `lookup_id` в таблице `api_keys`.
-    #
-    # Если же мы оставляем поиск по ХЕШУ, то Werkzeug не подходит, т.к. `generate_password_hash`
-    # каждый раз создает новый хеш.
-    #
-    # ОСТАВИМ ПОКА ЧТО ВАШУ СТАРУЮ ЛОГИКУ С ПРЯМЫМ SHA256, Т.К. ОНА ПРОЩЕ ДЛЯ API-КЛЮЧЕЙ,
-    # И НЕ ТРЕБУЕТ ИЗМЕНЕНИЯ СПОСОБА ПЕРЕДАЧИ КЛЮЧА КЛИЕНТОМ.
-    # Если вы все же ХОТИТЕ Werkzeug для API ключей, то нужно:
-    #   1. Изменить команду `apikey create`: `api_key_hashed_to_store = generate_password_hash(api_key_plain_text)`
-    #   2. В `verify_api_key`:
-    #      - Получить ВСЕ активные ключи из БД.
-    #      - Для каждого ключа из БД: `if check_password_hash(key_hash_from_db, api_key_value_plain_text): return key_info_from_db`
-    #   Это будет медленно, если ключей много.
-
-    # ----- НАЧАЛО ИСПРАВЛЕНИЯ С ПЕРЕХОДОМ НА WERKZEUG (МЕДЛЕННЫЙ ВАРИАНТ) -----
-    # Этот вариант предполагает, что в БД УЖЕ хранятся хеши, созданные generate_password_hash.
-    # Если там старые SHA256 хеши, они не пройдут проверку.
-    logger.debug(f"AuthUtils verify_api_key (Werkzeug): Попытка проверки ключа '{api_key_value_plain_text[:5]}...' со всеми активными ключами в БД.")
+
+    key_cache_digest = _api_key_cache_digest(api_key_value_plain_text)
+    cached_key_info = _verified_api_key_cache.get(key_cache_digest)
+    if cached_key_info:
+        _mark_api_key_used(cached_key_info['id'])
+        return cached_key_info
+
+    key_prefix, secret_part = split_api_key(api_key_value_plain_text)
+    logger.debug(f"AuthUtils verify_api_key: Проверка ключа (префикс: {key_prefix or 'старый формат'}).")
     try:
+        found_key_info: Optional[Dict[str, Any]] = None
         with get_connection() as conn:
             with conn.cursor(cursor_factory=RealDictCursor) as cursor:
-                # Получаем ВСЕ АКТИВНЫЕ ключи (точнее, их хеши и метаданные) из БД
-                # api_key_repository.fetch_active_keys(cursor) - такой функции нет, сделаем прямой запрос
-                cursor.execute("SELECT id, key_hash, role, object_id, is_active FROM api_keys WHERE is_active = TRUE;")
-                all_active_keys_from_db = cursor.fetchall()
+                if key_prefix:
+                    key_db_entry = api_key_repository.find_api_key_by_prefix(cursor, key_prefix)
+                    if key_db_entry and check_password_hash(key_db_entry['key_hash'], secret_part):
+                        found_key_info = key_db_entry
+                else:
+                    found_key_info = _find_legacy_api_key(cursor, api_key_value_plain_text)
+            conn.rollback() # Только чтение, закрываем транзакцию перед возвратом соединения в пул
 
-        if not all_active_keys_from_db:
-            logger.warning("AuthUtils verify_api_key (Werkzeug): В базе нет активных API-ключей для проверки.")
+        if not found_key_info or not found_key_info.get('is_active'):
+            logger.warning("AuthUtils verify_api_key: Предоставленный API-ключ не найден, неверен или неактивен.")
             return None
 
-        found_key_info = None
-        for key_db_entry in all_active_keys_from_db:
-            stored_werkzeug_hash = key_db_entry['key_hash']
-            # Проверяем предоставленный ключ (plain text) с сохраненным хешем Werkzeug
-            if check_password_hash(stored_werkzeug_hash, api_key_value_plain_text):
-                found_key_info = key_db_entry # Ключ совпал!
-                break # Прерываем цикл, т.к. ключ найден
-
-        if found_key_info:
-            logger.info(f"API-ключ ID {found_key_info['id']} (роль: {found_key_info['role']}) успешно верифицирован (Werkzeug).")
-            # Обновляем last_used_at (это можно сделать в отдельном try-except или вынести)
-            try:
-                with get_connection() as conn_update: # Новое соединение для обновления
-                    with conn_update.cursor() as cursor_update:
-                        api_key_repository.update_last_used(cursor_update, found_key_info['id'])
-                        conn_update.commit()
-            except Exception as e_update_ts:
-                logger.error(f"Не удалось обновить last_used_at для API-ключа ID {found_key_info.get('id')}: {e_update_ts}")
-            return found_key_info
-        else:
-            logger.warning(f"AuthUtils verify_api_key (Werkzeug): Предоставленный API-ключ не прошел проверку ни с одним из активных ключей в БД.")
-            return None # Ключ не подошел ни к одному хешу
+        key_info_for_request = {k: found_key_info[k] for k in ('id', 'role', 'object_id', 'is_active')}
+        logger.info(f"API-ключ ID {key_info_for_request['id']} (роль: {key_info_for_request['role']}) успешно верифицирован.")
+        _verified_api_key_cache.put(key_cache_digest, key_info_for_request)
+        _mark_api_key_used(key_info_for_request['id'])
+        return key_info_for_request
 
     except psycopg2.Error as db_err_api:
-        logger.error(f"AuthUtils verify_api_key (Werkzeug): Ошибка БД при проверке API-ключа: {db_err_api}", exc_info=True)
+        logger.error(f"AuthUtils verify_api_key: Ошибка БД при проверке API-ключа: {db_err_api}", exc_info=True)
         return None
     except Exception as e_api:
-        logger.error(f"AuthUtils verify_api_key (Werkzeug): Неожиданная ошибка при проверке API-ключа: {e_api}", exc_info=True)
+        logger.error(f"AuthUtils verify_api_key: Неожиданная ошибка при проверке API-ключа: {e_api}", exc_info=True)
+        return None
+
+
+# =============================
+# Кеш проверенных API-ключей и отложенная запись last_used_at
+# =============================
+# Кеш хранит результат успешной проверки (id, role, object_id, is_active) по SHA-256
+# предъявленного ключа, чтобы не выполнять выборку и PBKDF2 на каждом запросе агента.
+# Ограничен по размеру (LRU) и по времени жизни записи (TTL). Инвалидация при изменении
+# или удалении ключа через api_key_routes действует в пределах процесса; в остальных
+# процессах (воркерах gunicorn) запись устаревает не позднее чем через TTL.
+API_KEY_CACHE_MAX_SIZE = int(os.getenv('API_KEY_CACHE_MAX_SIZE', 1024))
+API_KEY_CACHE_TTL_SECONDS = float(os.getenv('API_KEY_CACHE_TTL_SECONDS', 60))
+API_KEY_LAST_USED_FLUSH_SECONDS = float(os.getenv('API_KEY_LAST_USED_FLUSH_SECONDS', 30))
+
+class _TtlLruCache:
+    """ Потокобезопасный LRU-кеш с TTL (проверенные API-ключи, пользователи UI). Записи - словари с полем 'id'. """
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key_digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached_entry = self._entries.get(key_digest)
+            if cached_entry is None:
+                self.misses += 1
+                return None
+            expires_at, key_info = cached_entry
+            if expires_at < time.monotonic():
+                del self._entries[key_digest]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key_digest)
+            self.hits += 1
+            return dict(key_info)
+
+    def put(self, key_digest: str, key_info: Dict[str, Any]) -> None:
+        if self.max_size <= 0 or self.ttl_seconds <= 0:
+            return # Кеш отключен
+        with self._lock:
+            self._entries[key_digest] = (time.monotonic() + self.ttl_seconds, dict(key_info))
+            self._entries.move_to_end(key_digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key_id: Optional[int] = None) -> int:
+        """ Удаляет записи ключа key_id (или все записи, если key_id=None). Возвращает число удаленных. """
+        with self._lock:
+            if key_id is None:
+                removed_digests = list(self._entries.keys())
+            else:
+                removed_digests = [digest for digest, (_, info) in self._entries.items() if info.get('id') == key_id]
+            for digest in removed_digests:
+                del self._entries[digest]
+            self.invalidations += len(removed_digests)
+            return len(removed_digests)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total_lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries), "max_size": self.max_size, "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total_lookups, 4) if total_lookups else None,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
+
+_verified_api_key_cache = _TtlLruCache(API_KEY_CACHE_MAX_SIZE, API_KEY_CACHE_TTL_SECONDS)
+
+# Отложенные обновления last_used_at: key_id -> время последнего использования (UTC)
+_pending_last_used: Dict[int, datetime] = {}
+_pending_last_used_lock = threading.Lock()
+_last_used_flush_state: Dict[str, Any] = {"flushes": 0, "rows_flushed": 0}
+
+def _api_key_cache_digest(api_key_value_plain_text: str) -> str:
+    return hashlib.sha256(api_key_value_plain_text.encode('utf-8')).hexdigest()
+
+def invalidate_api_key_cache(key_id: Optional[int] = None) -> int:
+    """
+    Сбрасывает кеш проверенных ключей для key_id (или полностью, если key_id=None).
+    Вызывается при изменении/удалении ключа.
+    """
+    removed_count = _verified_api_key_cache.invalidate(key_id)
+    logger.debug(f"AuthUtils: Кеш API-ключей инвалидирован (key_id={key_id}), удалено записей: {removed_count}.")
+    return removed_count
+
+def _mark_api_key_used(key_id: int) -> None:
+    """ Запоминает использование ключа (только в памяти); в БД записывает фоновая задача flush_api_key_last_used. """
+    with _pending_last_used_lock:
+        _pending_last_used[key_id] = datetime.now(timezone.utc)
+
+def flush_api_key_last_used() -> int:
+    """
+    Записывает накопленные last_used_at одним UPDATE (фоновая задача, завершение процесса).
+    Returns:
+        Количество ключей, для которых обновлен last_used_at.
+    """
+    with _pending_last_used_lock:
+        if not _pending_last_used:
+            return 0
+        pending_snapshot = dict(_pending_last_used)
+        _pending_last_used.clear()
+    try:
+        with get_connection() as conn_flush:
+            with conn_flush.cursor() as cursor_flush:
+                api_key_repository.update_last_used_bulk(cursor_flush, pending_snapshot)
+            conn_flush.commit()
+        with _pending_last_used_lock:
+            _last_used_flush_state["flushes"] += 1
+            _last_used_flush_state["rows_flushed"] += len(pending_snapshot)
+        logger.debug(f"AuthUtils: last_used_at записан для {len(pending_snapshot)} API-ключей.")
+        return len(pending_snapshot)
+    except Exception as e_flush:
+        logger.error(f"Не удалось записать last_used_at для API-ключей ({len(pending_snapshot)} шт.): {e_flush}")
+        with _pending_last_used_lock: # Возвращаем неподтвержденные записи (более свежие не перетираем)
+            for pending_key_id, used_at in pending_snapshot.items():
+                _pending_last_used.setdefault(pending_key_id, used_at)
+        return 0
+
+def _api_key_last_used_loop(socketio) -> None:
+    logger.info(f"AuthUtils: Фоновая запись last_used_at API-ключей запущена (интервал {API_KEY_LAST_USED_FLUSH_SECONDS} с).")
+    while True:
+        socketio.sleep(API_KEY_LAST_USED_FLUSH_SECONDS)
+        try:
+            flush_api_key_last_used()
+        except Exception as e_loop:
+            logger.error(f"AuthUtils: Ошибка фоновой записи last_used_at: {e_loop}", exc_info=True)
+
+def init_api_key_last_used_flush(socketio) -> None:
+    """ Запускает фоновую запись last_used_at (остаток записывается при завершении процесса, atexit). """
+    socketio.start_background_task(_api_key_last_used_loop, socketio)
+
+def get_api_key_cache_stats() -> Dict[str, Any]:
+    """ Счетчики кеша проверенных ключей и отложенной записи last_used_at (для /health). """
+    cache_stats = _verified_api_key_cache.stats()
+    with _pending_last_used_lock:
+        cache_stats["last_used_pending"] = len(_pending_last_used)
+        cache_stats["last_used_flush_interval_seconds"] = API_KEY_LAST_USED_FLUSH_SECONDS
+        cache_stats["last_used_flushes"] = _last_used_flush_state["flushes"]
+        cache_stats["last_used_rows_flushed"] = _last_used_flush_state["rows_flushed"]
+    return cache_stats
+
+# =============================
+# Кеш пользователей UI (user_loader)
+# =============================
+# TTL ограничивает время, в течение которого изменения пользователя (например, деактивация),
+# сделанные в другом процессе (CLI, другой воркер), еще не видны этому процессу.
+USER_CACHE_MAX_SIZE = int(os.getenv('USER_CACHE_MAX_SIZE', 256))
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 30))
+
+_user_cache = _TtlLruCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_SECONDS)
+
+def load_user_data(user_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Данные пользователя (id, username, password_hash, is_active) для user_loader.
+    Берутся из кеша или из БД: через курсор текущего запроса (g.db_cursor), а вне запроса -
+    через отдельное соединение из пула. Неактивные пользователи тоже кешируются
+    (Flask-Login отклоняет их по is_active). Ошибки БД пробрасываются.
+    """
+    cached_user = _user_cache.get(str(user_id))
+    if cached_user is not None:
+        return cached_user
+    request_cursor = getattr(g, 'db_cursor', None) if has_app_context() else None
+    if request_cursor is not None and not request_cursor.closed:
+        user_row = user_repository.get_user_by_id(request_cursor, user_id)
+    else:
+        with get_connection() as conn_user:
+            try:
+                with conn_user.cursor(cursor_factory=RealDictCursor) as cursor_user:
+                    user_row = user_repository.get_user_by_id(cursor_user, user_id)
+            finally:
+                conn_user.rollback()
+    if not user_row:
         return None
-    # ----- КОНЕЦ ИСПРАВЛЕНИЯ С ПЕРЕХОДОМ НА WERKZEUG -----
+    user_data = {'id': user_row['id'], 'username': user_row['username'],
+                 'password_hash': user_row['password_hash'], 'is_active': user_row['is_active']}
+    _user_cache.put(str(user_id), user_data)
+    return dict(user_data)
+
+def invalidate_user_cache(user_id: Optional[int] = None) -> int:
+    """
+    Сбрасывает кеш пользователя user_id (или весь кеш, если user_id=None).
+    Вызывается при входе, изменении и удалении пользователя.
+    """
+    removed_count = _user_cache.invalidate(user_id)
+    logger.debug(f"AuthUtils: Кеш пользователей инвалидирован (user_id={user_id}), удалено записей: {removed_count}.")
+    return removed_count
 
+def get_user_cache_stats() -> Dict[str, Any]:
+    """ Счетчики кеша пользователей UI (для /health). """
+    return _user_cache.stats()
 
 # =============================
 # Декораторы для Защиты Маршрутов
@@ -2,9 +2,19 @@
 """
 Модуль для определения кастомных команд Flask CLI.
 Версия 5.0.4: API-ключи теперь хешируются с использованием Werkzeug (generate_password_hash).
+Версия 5.0.5: Ключи создаются в формате с публичным префиксом (auth_utils.generate_api_key).
+              Добавлены команды `apikey migrate-format` и `apikey rotate` для перевода старых ключей.
+Версия 5.0.6: Группа `checks`: команда `checks backfill-latest` заполняет node_check_latest по истории.
+              Команды `checks create-partitions` / `checks drop-partitions` - суточные секции истории.
+Версия 5.0.7: Команда `checks retention` - агрегация и очистка истории по срокам из settings.
+Версия 5.0.11: Команды `user set-active` и `user delete`; сбрасывают кеш пользователей UI.
+Версия 5.0.23: Команда `checks event-summaries` - сводные события о полученных результатах.
+Версия 5.0.24: `checks create-partitions` также создает секции журнала событий system_events.
+Версия 5.0.25: Команда `checks offline-configs` - генерация устаревших оффлайн-конфигураций.
 """
 import logging
 import click
+from datetime import datetime, timezone, timedelta
 from flask.cli import AppGroup
 import secrets
 import psycopg2
@@ -15,13 +25,16 @@ from werkzeug.security import generate_password_hash
 # Убираем from .auth_utils import hash_api_key, если он там больше не нужен
 
 from .db_connection import get_connection
-from .repositories import user_repository, api_key_repository, subdivision_repository
+from .repositories import user_repository, api_key_repository, subdivision_repository, check_repository, event_repository, assignment_repository
+from .auth_utils import generate_api_key, invalidate_user_cache
+from .services import retention_service
 # Старая функция auth_utils.hash_api_key больше не нужна, если мы перешли на Werkzeug
 
 logger = logging.getLogger(__name__)
 
 user_cli = AppGroup('user', help='Команды для управления пользователями UI.')
 api_key_cli = AppGroup('apikey', help='Команды для управления API-ключами.')
+checks_cli = AppGroup('checks', help='Команды для обслуживания данных проверок.')
 
 # --- Команда для создания пользователя UI ---
 @user_cli.command('create')
@@ -64,14 +77,70 @@ def create_user_command(username, password, active):
         logger.exception(f"CLI create-user: Неожиданная ошибка для пользователя '{username}'.")
 
 
+def _find_user_id(cursor, username: str):
+    user_row = user_repository.get_user_by_username(cursor, username)
+    return user_row['id'] if user_row else None
+
+
+# --- Команда для активации/деактивации пользователя UI ---
+@user_cli.command('set-active')
+@click.argument('username')
+@click.option('--active/--inactive', required=True, help='Активировать или деактивировать пользователя.')
+def set_user_active_command(username, active):
+    """
+    Активирует или деактивирует пользователя UI.
+    Веб-процесс увидит изменение не позже, чем через USER_CACHE_TTL_SECONDS (кеш пользователей).
+    """
+    try:
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                user_id = _find_user_id(cursor, username)
+                if user_id is None:
+                    click.echo(click.style(f"Пользователь '{username}' не найден.", fg="yellow"))
+                    return
+                user_repository.update_user(cursor, user_id, {'is_active': active})
+            conn.commit()
+        invalidate_user_cache(user_id)
+        click.echo(click.style(f"Пользователь '{username}' (ID: {user_id}) {'активирован' if active else 'деактивирован'}.", fg="green"))
+        logger.info(f"CLI: Пользователь '{username}' (ID: {user_id}) is_active={active}.")
+    except psycopg2.Error as db_err:
+        click.echo(click.style(f"Ошибка базы данных при изменении пользователя: {db_err}", fg="red"))
+        logger.error(f"CLI user set-active: Ошибка БД для пользователя '{username}': {db_err}", exc_info=True)
+
+
+# --- Команда для удаления пользователя UI ---
+@user_cli.command('delete')
+@click.argument('username')
+@click.option('--yes', is_flag=True, help='Не запрашивать подтверждение.')
+def delete_user_command(username, yes):
+    """ Удаляет пользователя UI. """
+    if not yes and not click.confirm(f"Удалить пользователя '{username}'?"):
+        click.echo("Отменено.")
+        return
+    try:
+        with get_connection() as conn:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                user_id = _find_user_id(cursor, username)
+                if user_id is None or not user_repository.delete_user(cursor, user_id):
+                    click.echo(click.style(f"Пользователь '{username}' не найден.", fg="yellow"))
+                    return
+            conn.commit()
+        invalidate_user_cache(user_id)
+        click.echo(click.style(f"Пользователь '{username}' (ID: {user_id}) удален.", fg="green"))
+        logger.info(f"CLI: Пользователь '{username}' (ID: {user_id}) удален.")
+    except psycopg2.Error as db_err:
+        click.echo(click.style(f"Ошибка базы данных при удалении пользователя: {db_err}", fg="red"))
+        logger.error(f"CLI user delete: Ошибка БД для пользователя '{username}': {db_err}", exc_info=True)
+
+
 # --- Команда для создания API-ключа ---
 @api_key_cli.command('create')
 @click.option('--description', '-d', required=True, help='Описание назначения API-ключа.')
 @click.option('--role', '-r', required=True, type=click.Choice(['agent', 'loader', 'configurator', 'admin'], case_sensitive=False), help='Роль API-ключа.')
 @click.option('--object-id', '-o', type=int, default=None, help='ID объекта (подразделения), к которому привязан ключ.')
-@click.option('--length', '-l', type=int, default=32, show_default=True, help='Длина генерируемого ключа (до хеширования).')
+@click.option('--length', '-l', type=int, default=32, show_default=True, help='Длина секретной части ключа (до хеширования).')
 def create_api_key_command(description, role, object_id, length):
-    """ Создает новый API-ключ и выводит его в консоль. Хеш ключа создается с помощью Werkzeug. """
+    """ Создает новый API-ключ (формат sm_<префикс>_<секрет>) и выводит его в консоль. """
     logger.info(f"CLI: Попытка создания API-ключа (Werkzeug). Описание: '{description}', Роль: '{role}', ObjectID: {object_id or 'N/A'}.")
     if length < 24 or length > 64: # Длина самого токена до хеширования
         click.echo(click.style("Ошибка: Длина ключа (до хеширования) должна быть от 24 до 64 символов.", fg="red")); return
@@ -83,13 +152,9 @@ def create_api_key_command(description, role, object_id, length):
                     if not subdivision_repository.check_subdivision_exists_by_object_id(cursor_check_sub, object_id):
                         click.echo(click.style(f"Ошибка: Подразделение с object_id={object_id} не найдено.", fg="red")); return
         
-        # 1. Генерируем сам API-ключ в открытом виде (он будет показан пользователю)
-        api_key_plain_text = secrets.token_urlsafe(length)
-        
-        # 2. Хешируем этот ключ с помощью Werkzeug для безопасного хранения в БД
-        # <<< ИЗМЕНЕНО ЗДЕСЬ: Используем generate_password_hash >>>
-        # Метод можно выбрать, но pbkdf2:sha256 - хороший дефолт.
-        api_key_hashed_to_store = generate_password_hash(api_key_plain_text, method='pbkdf2:sha256')
+        # Генерируем ключ в открытом виде (будет показан пользователю), его публичный префикс
+        # и хеш Werkzeug секретной части для хранения в БД
+        api_key_plain_text, api_key_prefix, api_key_hashed_to_store = generate_api_key(length)
         
         with get_connection() as conn_create_key:
             with conn_create_key.cursor(cursor_factory=RealDictCursor) as cursor_create_key:
@@ -98,14 +163,15 @@ def create_api_key_command(description, role, object_id, length):
                     key_hash=api_key_hashed_to_store, # Передаем хеш Werkzeug
                     description=description,
                     role=role.lower(),
-                    object_id=object_id
+                    object_id=object_id,
+                    key_prefix=api_key_prefix
                 )
                 if new_api_key_id:
                     conn_create_key.commit()
                     click.echo(click.style("API Ключ успешно создан (с использованием Werkzeug хеширования)!", fg="green"))
                     click.echo(click.style("ВАЖНО: Сохраните этот ключ. Он больше НЕ БУДЕТ ПОКАЗАН:", bold=True, fg="red"))
                     click.echo(click.style(api_key_plain_text, fg="yellow", bold=True))
-                    click.echo(f"(ID ключа в базе: {new_api_key_id}. Хеш в БД (начало): {api_key_hashed_to_store[:20]}...)")
+                    click.echo(f"(ID ключа в базе: {new_api_key_id}. Префикс: {api_key_prefix})")
                     logger.info(f"CLI: API-ключ ID={new_api_key_id} (роль: {role.lower()}) создан с хешем Werkzeug.")
                 else:
                     click.echo(click.style("Не удалось создать API-ключ (репозиторий не вернул ID).", fg="red"))
@@ -121,4 +187,255 @@ def create_api_key_command(description, role, object_id, length):
         logger.warning(f"CLI create-api-key: Ошибка валидации: {val_err_create_key}")
     except Exception as e_create_key:
         click.echo(click.style(f"Непредвиденная ошибка при создании API-ключа: {e_create_key}", fg="red"))
-        logger.exception("CLI create-api-key: Неожиданная ошибка.")
\ No newline at end of file
+        logger.exception("CLI create-api-key: Неожиданная ошибка.")
+
+
+# --- Команда для перевода схемы api_keys на формат ключей с префиксом ---
+@api_key_cli.command('migrate-format')
+def migrate_api_key_format_command():
+    """
+    Обновляет таблицу api_keys для ключей формата sm_<префикс>_<секрет> (v5.0.5):
+    добавляет колонку key_prefix с индексом и расширяет key_hash под хеши Werkzeug.
+    Ключи старого формата продолжают работать до ротации (`flask apikey rotate <id>`).
+    Команда идемпотентна.
+    """
+    logger.info("CLI: Миграция формата API-ключей.")
+    migration_sql_statements = [
+        "ALTER TABLE api_keys ADD COLUMN IF NOT EXISTS key_prefix VARCHAR(16) NULL;",
+        "ALTER TABLE api_keys ALTER COLUMN key_hash TYPE VARCHAR(255);",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_prefix ON api_keys(key_prefix) WHERE key_prefix IS NOT NULL;",
+    ]
+    try:
+        with get_connection() as conn_migrate:
+            with conn_migrate.cursor(cursor_factory=RealDictCursor) as cursor_migrate:
+                for migration_sql in migration_sql_statements:
+                    cursor_migrate.execute(migration_sql)
+                legacy_keys = api_key_repository.fetch_legacy_api_keys(cursor_migrate, only_active=True)
+            conn_migrate.commit()
+        click.echo(click.style("Схема api_keys обновлена для ключей с префиксом.", fg="green"))
+        if not legacy_keys:
+            click.echo("Активных ключей старого формата нет.")
+            return
+        click.echo(click.style(f"Активных ключей старого формата: {len(legacy_keys)}. Они продолжат работать до ротации:", fg="yellow"))
+        for legacy_key in legacy_keys:
+            click.echo(f"  ID={legacy_key['id']}  роль={legacy_key['role']}  object_id={legacy_key['object_id'] or '-'}  "
+                       f"последнее использование={legacy_key['last_used_at'] or '-'}  '{legacy_key['description']}'")
+        click.echo("Для перевода ключа на новый формат: flask apikey rotate <ID> (новый ключ нужно передать клиенту).")
+        logger.info(f"CLI apikey migrate-format: схема обновлена, ключей старого формата: {len(legacy_keys)}.")
+    except psycopg2.Error as db_err_migrate:
+        click.echo(click.style(f"Ошибка базы данных при миграции формата API-ключей: {db_err_migrate}", fg="red"))
+        logger.error(f"CLI apikey migrate-format: Ошибка БД: {db_err_migrate}", exc_info=True)
+    except Exception as e_migrate:
+        click.echo(click.style(f"Непредвиденная ошибка при миграции формата API-ключей: {e_migrate}", fg="red"))
+        logger.exception("CLI apikey migrate-format: Неожиданная ошибка.")
+
+
+# --- Команда для ротации (перевыпуска) секрета API-ключа ---
+@api_key_cli.command('rotate')
+@click.argument('key_id', type=int)
+@click.option('--length', '-l', type=int, default=32, show_default=True, help='Длина секретной части ключа (до хеширования).')
+def rotate_api_key_command(key_id, length):
+    """ Выпускает новый ключ (формат с префиксом) для существующей записи; роль и object_id сохраняются. Старый ключ перестает действовать. """
+    logger.info(f"CLI: Ротация API-ключа ID={key_id}.")
+    if length < 24 or length > 64:
+        click.echo(click.style("Ошибка: Длина ключа (до хеширования) должна быть от 24 до 64 символов.", fg="red")); return
+    try:
+        api_key_plain_text, api_key_prefix, api_key_hashed_to_store = generate_api_key(length)
+        with get_connection() as conn_rotate:
+            with conn_rotate.cursor(cursor_factory=RealDictCursor) as cursor_rotate:
+                if not api_key_repository.set_api_key_secret(cursor_rotate, key_id, api_key_prefix, api_key_hashed_to_store):
+                    click.echo(click.style(f"Ошибка: API-ключ с ID={key_id} не найден.", fg="red")); return
+            conn_rotate.commit()
+        click.echo(click.style(f"Ключ ID={key_id} перевыпущен. Старое значение ключа больше не действует.", fg="green"))
+        click.echo(click.style("ВАЖНО: Сохраните этот ключ. Он больше НЕ БУДЕТ ПОКАЗАН:", bold=True, fg="red"))
+        click.echo(click.style(api_key_plain_text, fg="yellow", bold=True))
+        click.echo(f"(ID ключа в базе: {key_id}. Префикс: {api_key_prefix})")
+        logger.info(f"CLI: API-ключ ID={key_id} ротирован, новый префикс '{api_key_prefix}'.")
+    except psycopg2.Error as db_err_rotate:
+        click.echo(click.style(f"Ошибка базы данных при ротации API-ключа: {db_err_rotate}", fg="red"))
+        logger.error(f"CLI apikey rotate: Ошибка БД для ключа ID={key_id}: {db_err_rotate}", exc_info=True)
+    except Exception as e_rotate:
+        click.echo(click.style(f"Непредвиденная ошибка при ротации API-ключа: {e_rotate}", fg="red"))
+        logger.exception(f"CLI apikey rotate: Неожиданная ошибка для ключа ID={key_id}.")
+
+
+# --- Команда для заполнения текущего состояния заданий по истории проверок ---
+@checks_cli.command('backfill-latest')
+def backfill_latest_checks_command():
+    """
+    Заполняет node_check_latest по существующей истории node_checks (v5.0.5).
+    Запускается один раз после обновления схемы; дальше таблицу поддерживают
+    процедуры записи результатов. Команда идемпотентна.
+    """
+    logger.info("CLI: Заполнение node_check_latest по истории проверок.")
+    try:
+        with get_connection() as conn_backfill:
+            with conn_backfill.cursor(cursor_factory=RealDictCursor) as cursor_backfill:
+                affected_rows = check_repository.backfill_node_check_latest(cursor_backfill)
+            conn_backfill.commit()
+        click.echo(click.style(f"node_check_latest заполнена: обработано заданий - {affected_rows}.", fg="green"))
+        logger.info(f"CLI checks backfill-latest: обработано заданий - {affected_rows}.")
+    except psycopg2.Error as db_err_backfill:
+        click.echo(click.style(f"Ошибка базы данных при заполнении node_check_latest: {db_err_backfill}", fg="red"))
+        logger.error(f"CLI checks backfill-latest: Ошибка БД: {db_err_backfill}", exc_info=True)
+    except Exception as e_backfill:
+        click.echo(click.style(f"Непредвиденная ошибка при заполнении node_check_latest: {e_backfill}", fg="red"))
+        logger.exception("CLI checks backfill-latest: Неожиданная ошибка.")
+
+
+# --- Команда для заблаговременного создания секций истории проверок ---
+@checks_cli.command('create-partitions')
+@click.option('--days-ahead', type=int, default=7, show_default=True, help='На сколько суток вперед (от сегодняшней даты UTC) создать секции.')
+@click.option('--days-back', type=int, default=1, show_default=True, help='На сколько суток назад создать недостающие секции.')
+def create_check_partitions_command(days_ahead, days_back):
+    """
+    Создает суточные секции node_checks и node_check_details (v5.0.6) и журнала
+    событий system_events (v5.0.24). Запускается при старте контейнера и периодически
+    (cron/планировщик), чтобы секции всегда существовали заранее. Команда идемпотентна.
+    """
+    if days_ahead < 0 or days_back < 0:
+        click.echo(click.style("Ошибка: --days-ahead и --days-back не могут быть отрицательными.", fg="red")); return
+    today_utc = datetime.now(timezone.utc).date()
+    date_from, date_to = today_utc - timedelta(days=days_back), today_utc + timedelta(days=days_ahead)
+    logger.info(f"CLI: Создание секций истории проверок {date_from} - {date_to}.")
+    try:
+        with get_connection() as conn_partitions:
+            with conn_partitions.cursor(cursor_factory=RealDictCursor) as cursor_partitions:
+                created_count = check_repository.create_check_partitions(cursor_partitions, date_from, date_to)
+                created_event_count = event_repository.create_event_partitions(cursor_partitions, date_from, date_to)
+                default_rows_count = check_repository.count_default_partition_rows(cursor_partitions)
+            conn_partitions.commit()
+        click.echo(click.style(f"Секции истории проверок на {date_from} - {date_to}: создано {created_count}.", fg="green"))
+        click.echo(click.style(f"Секции журнала событий на {date_from} - {date_to}: создано {created_event_count}.", fg="green"))
+        if default_rows_count:
+            click.echo(click.style(f"ВНИМАНИЕ: в секции node_checks_default {default_rows_count} строк - "
+                                   f"секции создаются недостаточно заранее.", fg="yellow"))
+            logger.warning(f"CLI checks create-partitions: в node_checks_default {default_rows_count} строк.")
+    except psycopg2.Error as db_err_partitions:
+        click.echo(click.style(f"Ошибка базы данных при создании секций: {db_err_partitions}", fg="red"))
+        logger.error(f"CLI checks create-partitions: Ошибка БД: {db_err_partitions}", exc_info=True)
+    except Exception as e_partitions:
+        click.echo(click.style(f"Непредвиденная ошибка при создании секций: {e_partitions}", fg="red"))
+        logger.exception("CLI checks create-partitions: Неожиданная ошибка.")
+
+
+# --- Команда для удаления старых секций истории проверок (retention) ---
+@checks_cli.command('drop-partitions')
+@click.option('--older-than-days', type=int, required=True, help='Удалить секции, целиком лежащие раньше, чем N суток назад (UTC).')
+@click.option('--detach-only', is_flag=True, default=False, help='Только отсоединить секции (таблицы остаются для архивации).')
+@click.option('--yes', is_flag=True, default=False, help='Не запрашивать подтверждение.')
+def drop_check_partitions_command(older_than_days, detach_only, yes):
+    """
+    Хранение истории проверок (v5.0.6): отсоединяет или удаляет суточные секции
+    node_check_details и node_checks старше N суток. В отличие от DELETE не
+    нагружает VACUUM и выполняется за время, не зависящее от объема данных.
+    """
+    if older_than_days < 1:
+        click.echo(click.style("Ошибка: --older-than-days должно быть не меньше 1.", fg="red")); return
+    before_date = datetime.now(timezone.utc).date() - timedelta(days=older_than_days)
+    action_text = "отсоединены" if detach_only else "УДАЛЕНЫ"
+    if not yes and not click.confirm(f"Секции истории проверок ранее {before_date} будут {action_text}. Продолжить?"):
+        click.echo("Отменено."); return
+    logger.info(f"CLI: Обработка секций истории проверок ранее {before_date} (detach_only={detach_only}).")
+    try:
+        with get_connection() as conn_retention:
+            with conn_retention.cursor(cursor_factory=RealDictCursor) as cursor_retention:
+                processed_partitions = check_repository.drop_check_partitions(cursor_retention, before_date, detach_only)
+            conn_retention.commit()
+        if not processed_partitions:
+            click.echo(f"Секций ранее {before_date} нет."); return
+        for partition_info in processed_partitions:
+            click.echo(f"  {partition_info['partition_name']}: {partition_info['action']}")
+        click.echo(click.style(f"Обработано секций: {len(processed_partitions)}.", fg="green"))
+    except psycopg2.Error as db_err_retention:
+        click.echo(click.style(f"Ошибка базы данных при удалении секций: {db_err_retention}", fg="red"))
+        logger.error(f"CLI checks drop-partitions: Ошибка БД: {db_err_retention}", exc_info=True)
+    except Exception as e_retention:
+        click.echo(click.style(f"Непредвиденная ошибка при удалении секций: {e_retention}", fg="red"))
+        logger.exception("CLI checks drop-partitions: Неожиданная ошибка.")
+
+
+# --- Команда хранения истории: агрегация и очистка по настройкам из settings ---
+@checks_cli.command('retention')
+def run_retention_command():
+    """
+    Агрегирует историю проверок в node_check_rollups и удаляет данные старше
+    сроков хранения из settings (retention_*), v5.0.7. Запускайте периодически
+    (например, раз в час из cron); каждый пакет удаления - отдельная транзакция.
+    """
+    logger.info("CLI: Запуск агрегации и очистки истории.")
+    try:
+        with get_connection() as conn_retention:
+            retention_stats = retention_service.run_retention(conn_retention)
+        retention_settings = retention_stats['settings']
+        click.echo(f"Сроки хранения (сутки): результаты - {retention_settings['retention_raw_checks_days']}, "
+                   f"почасовые агрегаты - {retention_settings['retention_rollup_hourly_days']}, "
+                   f"суточные - {retention_settings['retention_rollup_daily_days']}, "
+                   f"события - {retention_settings['retention_system_events_days']} "
+                   f"(в горячих секциях - {retention_settings['retention_system_events_hot_days']}).")
+        click.echo(f"История агрегирована до: {retention_stats['rollup_watermark'] or '- (история пуста)'}")
+        click.echo(f"Удалено секций: {len(retention_stats['dropped_partitions'])}, "
+                   f"результатов из секции по умолчанию: {retention_stats['deleted_default_checks']}, "
+                   f"секций событий: переведено в холодные {len(retention_stats['demoted_event_partitions'])}, "
+                   f"удалено {len(retention_stats['dropped_event_partitions'])}, "
+                   f"событий из секции по умолчанию: {retention_stats['deleted_events']}, "
+                   f"агрегатов: {retention_stats['deleted_hourly_rollups']} почасовых / {retention_stats['deleted_daily_rollups']} суточных.")
+        click.echo(click.style("Хранение истории: прогон завершен.", fg="green"))
+    except psycopg2.Error as db_err_retention_run:
+        click.echo(click.style(f"Ошибка базы данных при обработке истории: {db_err_retention_run}", fg="red"))
+        logger.error(f"CLI checks retention: Ошибка БД: {db_err_retention_run}", exc_info=True)
+    except Exception as e_retention_run:
+        click.echo(click.style(f"Непредвиденная ошибка при обработке истории: {e_retention_run}", fg="red"))
+        logger.exception("CLI checks retention: Неожиданная ошибка.")
+
+
+# --- Команда записи сводных событий о полученных результатах проверок ---
+@checks_cli.command('event-summaries')
+def log_check_event_summaries_command():
+    """
+    Записывает в system_events сводные события CHECK_RESULTS_SUMMARY ("получено N
+    результатов от объекта X") за завершенные интервалы check_events_summary_interval_seconds
+    из settings (v5.0.23). Заменяет событие на каждый результат. Периодически выполняется
+    фоновой задачей приложения (services.maintenance); команда - для ручного запуска или
+    планировщика при MAINTENANCE_SUMMARY_INTERVAL_SECONDS=0. Повторный запуск за тот же
+    интервал ничего не пишет.
+    """
+    logger.info("CLI: Запись сводных событий о результатах проверок.")
+    try:
+        with get_connection() as conn_summaries:
+            with conn_summaries.cursor(cursor_factory=RealDictCursor) as cursor_summaries:
+                logged_count = check_repository.log_check_result_summaries(cursor_summaries)
+            conn_summaries.commit()
+        click.echo(click.style(f"Сводных событий записано: {logged_count}.", fg="green"))
+        logger.info(f"CLI checks event-summaries: записано сводных событий - {logged_count}.")
+    except psycopg2.Error as db_err_summaries:
+        click.echo(click.style(f"Ошибка базы данных при записи сводных событий: {db_err_summaries}", fg="red"))
+        logger.error(f"CLI checks event-summaries: Ошибка БД: {db_err_summaries}", exc_info=True)
+    except Exception as e_summaries:
+        click.echo(click.style(f"Непредвиденная ошибка при записи сводных событий: {e_summaries}", fg="red"))
+        logger.exception("CLI checks event-summaries: Неожиданная ошибка.")
+
+
+# --- Команда генерации устаревших оффлайн-конфигураций ---
+@checks_cli.command('offline-configs')
+def refresh_offline_configs_command():
+    """
+    Генерирует заново оффлайн-конфигурации объектов, отмеченных устаревшими после изменения
+    заданий, узлов или подразделений (offline_config_dirty, v5.0.25). Необязательна:
+    API генерирует устаревшую конфигурацию при запросе; запуск перед конфигуратором
+    выносит генерацию из его запросов.
+    """
+    logger.info("CLI: Генерация устаревших оффлайн-конфигураций.")
+    try:
+        with get_connection() as conn_offline:
+            with conn_offline.cursor(cursor_factory=RealDictCursor) as cursor_offline:
+                refreshed_count = assignment_repository.refresh_dirty_offline_configs(cursor_offline)
+            conn_offline.commit()
+        click.echo(click.style(f"Оффлайн-конфигураций сгенерировано заново: {refreshed_count}.", fg="green"))
+        logger.info(f"CLI checks offline-configs: сгенерировано конфигураций - {refreshed_count}.")
+    except psycopg2.Error as db_err_offline:
+        click.echo(click.style(f"Ошибка базы данных при генерации оффлайн-конфигураций: {db_err_offline}", fg="red"))
+        logger.error(f"CLI checks offline-configs: Ошибка БД: {db_err_offline}", exc_info=True)
+    except Exception as e_offline:
+        click.echo(click.style(f"Непредвиденная ошибка при генерации оффлайн-конфигураций: {e_offline}", fg="red"))
+        logger.exception("CLI checks offline-configs: Неожиданная ошибка.")
@@ -2,15 +2,24 @@
 """
 Модуль для управления пулом соединений с PostgreSQL.
 Версия 5.0.3: Убран ненужный экспорт RealDictCursor.
+Версия 5.0.10: SimpleConnectionPool (не рассчитан на конкурентный доступ) заменен на
+              BoundedConnectionPool: ожидание свободного соединения с таймаутом и
+              ограниченной очередью, размер из окружения (DB_POOL_*), проверка
+              простаивающих соединений, пересоздание после ошибок и по возрасту,
+              счетчики для /health. Под eventlet (gunicorn -k eventlet) драйвер
+              переводится в кооперативный режим через psycogreen, если он установлен.
 """
 import os
+import threading
+import time
 import psycopg2 # Основной модуль
+import psycopg2.extensions
 import psycopg2.pool # Для пула соединений
 import psycopg2.extras # Для RealDictCursor, если он будет использоваться ЗДЕСЬ
 from urllib.parse import urlparse
 import logging
 import contextlib
-from typing import Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -45,15 +54,253 @@ else:
 
 logger.info(f"Параметры БД: HOST={DB_HOST}, PORT={DB_PORT}, USER={DB_USER}, DB_NAME={DB_NAME}")
 
-db_pool: Optional[psycopg2.pool.SimpleConnectionPool] = None
+# --- Параметры пула (переменные окружения) ---
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 10))
+DB_POOL_WAIT_TIMEOUT_SECONDS = float(os.getenv('DB_POOL_WAIT_TIMEOUT_SECONDS', 5))
+DB_POOL_MAX_WAITERS = int(os.getenv('DB_POOL_MAX_WAITERS', 100))
+DB_POOL_MAX_CONN_AGE_SECONDS = float(os.getenv('DB_POOL_MAX_CONN_AGE_SECONDS', 1800))
+DB_POOL_VALIDATE_IDLE_SECONDS = float(os.getenv('DB_POOL_VALIDATE_IDLE_SECONDS', 30))
+
+# --- Кооперативный режим psycopg2 под eventlet ---
+HAS_PSYCOGREEN = False
+try:
+    import eventlet.patcher
+    EVENTLET_PATCHED = eventlet.patcher.is_monkey_patched('socket')
+except ImportError:
+    EVENTLET_PATCHED = False
+if EVENTLET_PATCHED:
+    try:
+        from psycogreen.eventlet import patch_psycopg
+        patch_psycopg() # Ожидание ответа БД уступает управление другим greenlet вместо блокировки процесса
+        HAS_PSYCOGREEN = True
+        logger.info("psycopg2 переведен в кооперативный режим eventlet (psycogreen).")
+    except ImportError:
+        logger.warning("Модуль 'psycogreen' не найден: под eventlet запросы к БД блокируют процесс на время выполнения.")
+
+
+class PoolTimeoutError(psycopg2.pool.PoolError):
+    """ Свободное соединение не появилось за DB_POOL_WAIT_TIMEOUT_SECONDS. """
+
+
+class PoolQueueFullError(psycopg2.pool.PoolError):
+    """ Очередь ожидания соединения заполнена (DB_POOL_MAX_WAITERS). """
+
+
+class BoundedConnectionPool:
+    """
+    Потокобезопасный (и безопасный для greenlet при monkey-patch) пул соединений psycopg2.
+    Интерфейс совместим с SimpleConnectionPool: getconn(), putconn(conn, close=False), closeall().
+
+    - При исчерпании пула getconn() ждет освобождения соединения до wait_timeout секунд;
+      одновременно ждать могут не более max_waiters вызовов.
+    - Соединение, простаивавшее дольше validate_idle_seconds, перед выдачей проверяется SELECT 1.
+    - Соединения старше max_age_seconds, закрытые или в неизвестном состоянии транзакции
+      (ошибка соединения) при возврате закрываются и при необходимости создаются заново.
+    """
+    def __init__(self, minconn: int, maxconn: int, connect: Callable[[], Any],
+                 wait_timeout: float = 5.0, max_waiters: int = 100,
+                 max_age_seconds: float = 1800.0, validate_idle_seconds: float = 30.0):
+        if maxconn < 1 or minconn < 0 or minconn > maxconn:
+            raise ValueError(f"Некорректный размер пула: min={minconn}, max={maxconn}.")
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.wait_timeout = wait_timeout
+        self.max_waiters = max_waiters
+        self.max_age_seconds = max_age_seconds
+        self.validate_idle_seconds = validate_idle_seconds
+        self._connect = connect
+        self._condition = threading.Condition(threading.Lock())
+        self._idle: List[Tuple[Any, float]] = [] # (соединение, время возврата в пул) - LIFO
+        self._created_at: Dict[int, float] = {} # id(соединения) -> время создания (все открытые)
+        self._in_use: Dict[int, Any] = {}
+        self._opening = 0 # Соединения, создаваемые прямо сейчас (слот уже занят)
+        self._waiting = 0
+        self.closed = False
+        self._counters = {"acquired": 0, "waits": 0, "wait_time_total_ms": 0.0, "wait_time_max_ms": 0.0,
+                          "timeouts": 0, "rejected": 0, "connect_errors": 0, "discarded_broken": 0,
+                          "recycled_age": 0, "validation_failures": 0}
+        for _ in range(minconn):
+            try:
+                new_conn = self._open_connection()
+            except psycopg2.Error as e_preopen:
+                logger.warning(f"Пул: не удалось заранее открыть соединение ({e_preopen}), оно будет создано по требованию.")
+                break
+            with self._condition:
+                self._idle.append((new_conn, time.monotonic()))
+
+    def _open_connection(self) -> Any:
+        try:
+            new_conn = self._connect()
+        except psycopg2.Error:
+            with self._condition:
+                self._counters["connect_errors"] += 1
+            raise
+        with self._condition:
+            self._created_at[id(new_conn)] = time.monotonic()
+        return new_conn
+
+    def _close_quietly(self, conn: Any) -> None:
+        self._created_at.pop(id(conn), None)
+        try:
+            if not conn.closed:
+                conn.close()
+        except Exception:
+            pass
+
+    def _is_expired(self, conn: Any, now: float) -> bool:
+        created_at = self._created_at.get(id(conn), now)
+        return self.max_age_seconds > 0 and now - created_at >= self.max_age_seconds
+
+    def _validate(self, conn: Any) -> bool:
+        try:
+            with conn.cursor() as validate_cursor:
+                validate_cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, key: Any = None) -> Any:
+        """ Выдает соединение; при исчерпании пула ждет не дольше wait_timeout. """
+        wait_started: Optional[float] = None
+        while True:
+            candidate = None
+            must_open = False
+            with self._condition:
+                if self.closed:
+                    raise psycopg2.pool.PoolError("Пул соединений закрыт.")
+                now = time.monotonic()
+                while self._idle:
+                    idle_conn, returned_at = self._idle.pop()
+                    if idle_conn.closed or self._is_expired(idle_conn, now):
+                        self._counters["recycled_age" if not idle_conn.closed else "discarded_broken"] += 1
+                        self._close_quietly(idle_conn)
+                        continue
+                    candidate = (idle_conn, returned_at)
+                    break
+                if candidate is None:
+                    if len(self._created_at) + self._opening < self.maxconn:
+                        self._opening += 1
+                        must_open = True
+                    else:
+                        if wait_started is None:
+                            if self._waiting >= self.max_waiters:
+                                self._counters["rejected"] += 1
+                                raise PoolQueueFullError(f"Очередь ожидания соединения заполнена ({self.max_waiters}).")
+                            wait_started = now
+                            self._counters["waits"] += 1
+                        remaining = self.wait_timeout - (now - wait_started)
+                        if remaining <= 0:
+                            self._counters["timeouts"] += 1
+                            self._record_wait(wait_started)
+                            raise PoolTimeoutError(f"Нет свободного соединения с БД за {self.wait_timeout} с "
+                                                   f"(занято {len(self._in_use)} из {self.maxconn}).")
+                        self._waiting += 1
+                        try:
+                            self._condition.wait(remaining)
+                        finally:
+                            self._waiting -= 1
+                        continue
+            if must_open:
+                try:
+                    new_conn = self._open_connection()
+                finally:
+                    with self._condition:
+                        self._opening -= 1
+                        self._condition.notify()
+                return self._checkout(new_conn, wait_started)
+            idle_conn, returned_at = candidate
+            if self.validate_idle_seconds >= 0 and time.monotonic() - returned_at >= self.validate_idle_seconds:
+                if not self._validate(idle_conn):
+                    with self._condition:
+                        self._counters["validation_failures"] += 1
+                        self._close_quietly(idle_conn)
+                        self._condition.notify()
+                    continue
+            return self._checkout(idle_conn, wait_started)
+
+    def _record_wait(self, wait_started: Optional[float]) -> None:
+        if wait_started is None:
+            return
+        waited_ms = (time.monotonic() - wait_started) * 1000
+        self._counters["wait_time_total_ms"] += waited_ms
+        self._counters["wait_time_max_ms"] = max(self._counters["wait_time_max_ms"], waited_ms)
+
+    def _checkout(self, conn: Any, wait_started: Optional[float]) -> Any:
+        with self._condition:
+            self._in_use[id(conn)] = conn
+            self._counters["acquired"] += 1
+            self._record_wait(wait_started)
+        return conn
+
+    def putconn(self, conn: Any, key: Any = None, close: bool = False) -> None:
+        """ Возвращает соединение. Сломанные, устаревшие и закрытые соединения закрываются. """
+        discard_reason = None
+        if close:
+            discard_reason = "close"
+        elif conn.closed:
+            discard_reason = "discarded_broken"
+        else:
+            transaction_status = conn.info.transaction_status
+            if transaction_status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard_reason = "discarded_broken" # Соединение потеряно
+            elif transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback() # Незавершенная транзакция не должна достаться следующему запросу
+                except Exception:
+                    discard_reason = "discarded_broken"
+        with self._condition:
+            self._in_use.pop(id(conn), None)
+            if discard_reason is None and (self.closed or self._is_expired(conn, time.monotonic())):
+                discard_reason = "close" if self.closed else "recycled_age"
+            if discard_reason is None:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                if discard_reason != "close":
+                    self._counters[discard_reason] += 1
+                self._close_quietly(conn)
+            self._condition.notify()
+
+    def closeall(self) -> None:
+        with self._condition:
+            self.closed = True
+            for idle_conn, _ in self._idle:
+                self._close_quietly(idle_conn)
+            self._idle = []
+            for busy_conn in list(self._in_use.values()):
+                self._close_quietly(busy_conn)
+            self._in_use = {}
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            pool_stats = {"min": self.minconn, "max": self.maxconn, "open": len(self._created_at),
+                          "in_use": len(self._in_use), "idle": len(self._idle), "waiting": self._waiting,
+                          "wait_timeout_seconds": self.wait_timeout}
+            pool_stats.update(self._counters)
+            pool_stats["wait_time_total_ms"] = round(pool_stats["wait_time_total_ms"], 1)
+            pool_stats["wait_time_max_ms"] = round(pool_stats["wait_time_max_ms"], 1)
+            return pool_stats
+
+
+def _connect_to_db() -> psycopg2.extensions.connection:
+    return psycopg2.connect(host=DB_HOST, port=DB_PORT, dbname=DB_NAME, user=DB_USER,
+                            password=DB_PASSWORD, connect_timeout=5)
+
+
+db_pool: Optional[BoundedConnectionPool] = None
 try:
     if not all([DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD is not None]):
         logger.critical("Параметры БД не определены!")
     else:
-        db_pool = psycopg2.pool.SimpleConnectionPool(1, 10, host=DB_HOST, port=DB_PORT, dbname=DB_NAME,
-                                                    user=DB_USER, password=DB_PASSWORD, connect_timeout=5)
-        logger.info(f"Пул соединений psycopg2 инициализирован для {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME}")
-except psycopg2.Error as e: logger.critical(f"Ошибка инициализации пула psycopg2: {e}", exc_info=True)
+        db_pool = BoundedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, _connect_to_db,
+                                        wait_timeout=DB_POOL_WAIT_TIMEOUT_SECONDS, max_waiters=DB_POOL_MAX_WAITERS,
+                                        max_age_seconds=DB_POOL_MAX_CONN_AGE_SECONDS,
+                                        validate_idle_seconds=DB_POOL_VALIDATE_IDLE_SECONDS)
+        logger.info(f"Пул соединений psycopg2 инициализирован для {DB_USER}@{DB_HOST}:{DB_PORT}/{DB_NAME} "
+                    f"(min={DB_POOL_MIN}, max={DB_POOL_MAX}, ожидание {DB_POOL_WAIT_TIMEOUT_SECONDS} с).")
+except (ValueError, psycopg2.Error) as e: logger.critical(f"Ошибка инициализации пула psycopg2: {e}", exc_info=True)
 except Exception as e: logger.critical(f"Неожиданная ошибка инициализации пула: {e}", exc_info=True)
 
 @contextlib.contextmanager
@@ -72,6 +319,10 @@ def get_connection() -> psycopg2.extensions.connection:
                 logger.debug(f"Контекст: соединение (ID: {id(_conn)}) возвращено в пул.")
             except Exception as e: logger.error(f"Контекст: ошибка возврата соединения (ID: {id(_conn)}): {e}", exc_info=True)
 
+def get_db_pool_stats() -> Optional[Dict[str, Any]]:
+    """ Счетчики пула соединений (для /health). None, если пул не инициализирован. """
+    return db_pool.stats() if db_pool is not None else None
+
 def close_db_pool():
     if db_pool:
         logger.info("Закрытие соединений в пуле psycopg2..."); db_pool.closeall(); logger.info("Пул закрыт.")
@@ -0,0 +1,224 @@
+# status/app/db_request.py
+"""
+Соединение с БД в рамках запроса (g.db_conn / g.db_cursor).
+Версия 5.0.12: Соединение берется из пула лениво - при первом обращении к g.db_conn
+              или g.db_cursor (маршруты статики, страниц и /login GET пул не занимают),
+              и возвращается в пул сразу после формирования ответа (after_request),
+              а не при завершении контекста приложения. Время удержания соединения
+              накапливается по эндпоинтам (get_db_hold_stats, выводится в /health).
+Версия 5.0.13: Единица работы - одна транзакция на запрос. Маршруты не вызывают
+              commit/rollback: транзакция изменяющего запроса (POST/PUT/PATCH/DELETE)
+              фиксируется при возврате соединения, если ответ успешный (< 400),
+              иначе откатывается. Ошибка фиксации превращает ответ в 500.
+              Действия, которые можно выполнять только после фиксации (сброс и
+              обновление снимка дашборда), регистрируются через call_after_commit.
+              savepoint() изолирует отдельный элемент пакета внутри транзакции запроса.
+Версия 5.0.25: Маршрут чтения, сохраняющий вычисленные данные (оффлайн-конфигурация),
+              вызывает commit_read_request() - его транзакция фиксируется так же,
+              как у изменяющего запроса.
+"""
+import contextlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+from psycopg2 import sql
+from flask import Flask, Response, g, has_request_context, jsonify, request
+from flask.ctx import _AppCtxGlobals
+
+from . import db_connection
+from .errors import ApiInternalError
+
+logger = logging.getLogger(__name__)
+
+_REQUEST_DB_ATTRIBUTES = ('db_conn', 'db_cursor')
+_WRITE_METHODS = frozenset(('POST', 'PUT', 'PATCH', 'DELETE'))
+
+
+class LazyDbAppCtxGlobals(_AppCtxGlobals):
+    """ Объект g, в котором db_conn/db_cursor создаются при первом обращении. """
+    def __getattr__(self, name: str) -> Any:
+        if name in _REQUEST_DB_ATTRIBUTES:
+            acquire_request_db()
+            return self.__dict__[name]
+        return super().__getattr__(name)
+
+
+def acquire_request_db() -> None:
+    """
+    Берет соединение из пула и открывает RealDictCursor для текущего контекста.
+    При ошибке db_conn/db_cursor устанавливаются в None (маршруты отвечают ошибкой БД).
+    """
+    g_namespace = g._get_current_object().__dict__
+    g_namespace['db_conn'] = None
+    g_namespace['db_cursor'] = None
+    if db_connection.db_pool is None:
+        logger.critical("Пул db_pool не инициализирован в db_connection.py!")
+        return
+    try:
+        conn = db_connection.db_pool.getconn()
+    except psycopg2.Error as e_getconn:
+        logger.error(f"Ошибка получения соединения из пула: {e_getconn}", exc_info=True)
+        return
+    try:
+        cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    except psycopg2.Error as e_cursor:
+        logger.error(f"Ошибка создания курсора: {e_cursor}", exc_info=True)
+        db_connection.db_pool.putconn(conn)
+        return
+    g_namespace['db_conn'] = conn
+    g_namespace['db_cursor'] = cursor
+    g_namespace['_db_acquired_at'] = time.monotonic()
+    logger.debug(f"Соединение с БД (ID: {id(conn)}) получено из пула по первому обращению.")
+
+
+def call_after_commit(callback: Callable[[], None]) -> None:
+    """
+    Выполняет callback после успешной фиксации транзакции запроса
+    (или сразу по завершении успешного изменяющего запроса, если он не обращался к БД).
+    При откате транзакции callback отбрасывается.
+    """
+    g._get_current_object().__dict__.setdefault('_db_after_commit', []).append(callback)
+
+
+def commit_read_request() -> None:
+    """
+    Фиксировать транзакцию текущего запроса чтения (GET) при успешном ответе (< 400, включая 304).
+    Для маршрутов, которые при чтении сохраняют вычисленные данные для следующих запросов.
+    """
+    g._get_current_object().__dict__['_db_commit_read'] = True
+
+
+@contextlib.contextmanager
+def savepoint(cursor: psycopg2.extensions.cursor, name: str = 'request_item') -> Iterator[None]:
+    """
+    Точка сохранения внутри транзакции запроса: при исключении изменения блока
+    откатываются (ROLLBACK TO SAVEPOINT), транзакция остается рабочей, исключение пробрасывается.
+    """
+    savepoint_name = sql.Identifier(name)
+    cursor.execute(sql.SQL("SAVEPOINT {}").format(savepoint_name))
+    try:
+        yield
+    except Exception:
+        cursor.execute(sql.SQL("ROLLBACK TO SAVEPOINT {}").format(savepoint_name))
+        raise
+    cursor.execute(sql.SQL("RELEASE SAVEPOINT {}").format(savepoint_name))
+
+
+def _end_transaction(conn: psycopg2.extensions.connection, commit: bool) -> bool:
+    """ Фиксирует (commit=True) или откатывает открытую транзакцию. False - фиксация не удалась. """
+    if conn.closed:
+        return not commit
+    transaction_status = conn.info.transaction_status
+    if transaction_status == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        return True
+    if commit and transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+        try:
+            conn.commit()
+            return True
+        except psycopg2.Error as e_commit:
+            logger.error(f"Ошибка фиксации транзакции запроса (соединение ID: {id(conn)}): {e_commit}", exc_info=True)
+    elif commit:
+        logger.error(f"Транзакция запроса прервана ошибкой БД (статус {transaction_status}), изменения откатываются.")
+    try:
+        conn.rollback()
+    except psycopg2.Error as e_rollback:
+        logger.error(f"Ошибка отката транзакции запроса: {e_rollback}", exc_info=True)
+    return not commit
+
+
+def release_request_db(commit: bool = False) -> bool:
+    """
+    Завершает транзакцию (фиксация при commit=True, иначе откат), закрывает курсор
+    и возвращает соединение в пул, если оно было взято в этом контексте.
+    Возвращает False, если фиксация не удалась.
+    """
+    g_namespace = g._get_current_object().__dict__
+    cursor = g_namespace.pop('db_cursor', None)
+    conn = g_namespace.pop('db_conn', None)
+    acquired_at = g_namespace.pop('_db_acquired_at', None)
+    after_commit_callbacks = g_namespace.pop('_db_after_commit', [])
+    g_namespace.pop('_db_commit_read', None)
+    if cursor is not None:
+        try:
+            if not cursor.closed: cursor.close()
+        except psycopg2.Error as e_close_cursor:
+            logger.error(f"Ошибка при закрытии курсора БД: {e_close_cursor}", exc_info=True)
+    committed = True
+    if conn is not None:
+        committed = _end_transaction(conn, commit)
+        if acquired_at is not None:
+            endpoint = (request.endpoint or request.path) if has_request_context() else '<app_context>'
+            _record_hold_time(endpoint, time.monotonic() - acquired_at)
+        _return_to_pool(conn)
+    if commit and committed:
+        for callback in after_commit_callbacks:
+            try:
+                callback()
+            except Exception as e_callback:
+                logger.error(f"Ошибка действия после фиксации транзакции: {e_callback}", exc_info=True)
+    return committed
+
+
+def _return_to_pool(conn: psycopg2.extensions.connection) -> None:
+    if db_connection.db_pool is None:
+        try:
+            if not conn.closed: conn.close()
+        except psycopg2.Error: pass
+        return
+    try:
+        # Сломанное соединение putconn закроет, а не вернет в пул.
+        db_connection.db_pool.putconn(conn)
+        logger.debug(f"Соединение с БД (ID: {id(conn)}) возвращено в пул.")
+    except psycopg2.Error as e_putconn:
+        logger.error(f"Ошибка при возврате соединения (ID: {id(conn)}) в пул: {e_putconn}", exc_info=True)
+
+
+# --- Время удержания соединения по эндпоинтам ---
+_hold_stats: Dict[str, Dict[str, float]] = {}
+_hold_stats_lock = threading.Lock()
+
+
+def _record_hold_time(endpoint: str, held_seconds: float) -> None:
+    held_ms = held_seconds * 1000
+    with _hold_stats_lock:
+        endpoint_stats = _hold_stats.setdefault(endpoint, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        endpoint_stats["count"] += 1
+        endpoint_stats["total_ms"] += held_ms
+        endpoint_stats["max_ms"] = max(endpoint_stats["max_ms"], held_ms)
+
+
+def get_db_hold_stats(limit: Optional[int] = 20) -> List[Dict[str, Any]]:
+    """ Время удержания соединения по эндпоинтам, по убыванию суммарного времени (для /health). """
+    with _hold_stats_lock:
+        rows = [{"endpoint": endpoint, "count": int(stats["count"]),
+                 "avg_ms": round(stats["total_ms"] / stats["count"], 2) if stats["count"] else 0.0,
+                 "max_ms": round(stats["max_ms"], 2), "total_ms": round(stats["total_ms"], 1)}
+                for endpoint, stats in _hold_stats.items()]
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows[:limit] if limit else rows
+
+
+def init_request_db(app: Flask) -> None:
+    """ Подключает ленивый g и завершение транзакции запроса после ответа/при завершении контекста. """
+    app.app_ctx_globals_class = LazyDbAppCtxGlobals
+
+    @app.after_request
+    def release_db_after_request(response: Response) -> Response:
+        # Ответ сформирован - транзакция завершается, соединение больше не нужно
+        commit_requested = request.method in _WRITE_METHODS or g._get_current_object().__dict__.get('_db_commit_read', False)
+        commit = commit_requested and response.status_code < 400
+        if release_request_db(commit=commit):
+            return response
+        commit_error = ApiInternalError("Ошибка базы данных при фиксации изменений.")
+        error_response = jsonify(commit_error.to_dict())
+        error_response.status_code = commit_error.status_code
+        return error_response
+
+    @app.teardown_appcontext
+    def release_db_on_teardown(exception=None):
+        release_request_db() # Необработанное исключение или контекст без запроса (CLI) - откат
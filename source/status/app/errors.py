@@ -3,6 +3,9 @@
 Модуль для определения кастомных классов исключений API и их обработчиков.
 Это позволяет стандартизировать формат JSON-ответов об ошибках.
 Версия 5.0.1: Добавлен импорт Response для type hints.
+Версия 5.0.14: ApiServiceUnavailable (503) с заголовком Retry-After.
+Версия 5.0.16: ApiPayloadTooLarge (413) для ограничений размера пакетной загрузки.
+Версия 5.0.17: ApiUnsupportedMediaType (415) для неподдерживаемого Content-Encoding тела запроса.
 """
 import logging
 from flask import jsonify, Response # Для формирования JSON-ответов
@@ -81,6 +84,18 @@ class ApiValidationFailure(ApiBadRequest): # Наследуется от ApiBadR
     message = "Ошибка валидации входных данных."
     # Поле 'details' будет унаследовано и установлено при создании экземпляра
 
+class ApiPayloadTooLarge(ApiException):
+    """Исключение для слишком большого тела запроса или количества элементов в нем (HTTP 413)."""
+    status_code = 413
+    error_code = "PAYLOAD_TOO_LARGE"
+    message = "Тело запроса превышает допустимый размер."
+
+class ApiUnsupportedMediaType(ApiException):
+    """Исключение для неподдерживаемого формата или кодировки тела запроса (HTTP 415)."""
+    status_code = 415
+    error_code = "UNSUPPORTED_MEDIA_TYPE"
+    message = "Формат или кодировка тела запроса не поддерживается."
+
 class ApiConflict(ApiException):
     """Исключение для конфликтов ресурсов (HTTP 409)."""
     status_code = 409
@@ -106,6 +121,16 @@ class ApiInternalError(ApiException): # Наследуется от базово
     message = "Произошла непредвиденная ошибка на сервере. Пожалуйста, попробуйте позже."
     # Сообщение по умолчанию изменено на более общее для пользователя
 
+class ApiServiceUnavailable(ApiException):
+    """Исключение для временной перегрузки сервиса (HTTP 503). Клиент повторяет запрос через retry_after секунд."""
+    status_code = 503
+    error_code = "SERVICE_UNAVAILABLE"
+    message = "Сервис временно перегружен. Повторите запрос позже."
+
+    def __init__(self, message: Optional[str] = None, retry_after: Optional[int] = None, **kwargs):
+        super().__init__(message, **kwargs)
+        self.retry_after = retry_after
+
 # --- Обработчики ошибок для регистрации в приложении Flask ---
 
 def handle_api_exception(error: ApiException) -> Response:
@@ -121,6 +146,8 @@ def handle_api_exception(error: ApiException) -> Response:
 
     response = jsonify(error.to_dict())
     response.status_code = error.status_code
+    if getattr(error, 'retry_after', None) is not None:
+        response.headers['Retry-After'] = str(error.retry_after)
     return response
 
 def handle_psycopg2_error(error: psycopg2.Error) -> Response:
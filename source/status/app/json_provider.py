@@ -0,0 +1,91 @@
+# status/app/json_provider.py
+"""
+Сериализация JSON для ответов API и сообщений SocketIO.
+Версия 5.0.18: FastJSONProvider - JSON-провайдер Flask на orjson (если установлен,
+              иначе стандартный json). datetime/date сериализуются в ISO 8601 без
+              предварительного isoformat() в маршрутах и сервисах, Decimal - строкой
+              (как в DefaultJSONProvider), RealDictRow - как обычный dict.
+              Модуль сам по себе совместим с интерфейсом json (dumps/loads) и
+              передается в SocketIO, чтобы сообщения кодировались так же, как ответы.
+"""
+import dataclasses
+import decimal
+import json
+import logging
+import uuid
+from datetime import date, datetime
+from typing import Any
+
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+    HAS_ORJSON = True
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS # Ключи-числа (например, ID узлов) - как в json.dumps
+except ImportError:
+    HAS_ORJSON = False
+    logger.warning("Модуль 'orjson' не найден. Для JSON используется стандартный модуль json.")
+
+# Аргументы json.dumps, с которыми результат orjson не отличается (orjson всегда компактен и пишет UTF-8)
+_ORJSON_COMPATIBLE_KWARGS = frozenset(('separators', 'ensure_ascii'))
+
+
+def _json_default(value: Any) -> Any:
+    """ Сериализация типов, которых нет в JSON (для orjson - только то, что он не умеет сам). """
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if hasattr(value, '__html__'):
+        return str(value.__html__())
+    raise TypeError(f"Объект типа {type(value).__name__} не сериализуется в JSON.")
+
+
+def dumps_bytes(obj: Any, indent: bool = False) -> bytes:
+    """ Сериализует obj в UTF-8 JSON. Значения вне возможностей orjson (например, целые > 64 бит) - через json. """
+    if HAS_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_json_default,
+                                option=_ORJSON_OPTIONS | orjson.OPT_INDENT_2 if indent else _ORJSON_OPTIONS)
+        except TypeError: # orjson.JSONEncodeError
+            pass
+    return json.dumps(obj, default=_json_default, ensure_ascii=False,
+                      indent=2 if indent else None, separators=None if indent else (',', ':')).encode('utf-8')
+
+
+def dumps(obj: Any, **kwargs: Any) -> str:
+    """ Аналог json.dumps. Нестандартные аргументы (indent, sort_keys, ...) обрабатываются json.dumps. """
+    if kwargs.keys() <= _ORJSON_COMPATIBLE_KWARGS:
+        return dumps_bytes(obj).decode('utf-8')
+    kwargs.setdefault('default', _json_default)
+    return json.dumps(obj, **kwargs)
+
+
+def loads(s: Any, **kwargs: Any) -> Any:
+    """ Аналог json.loads (str или bytes). """
+    if HAS_ORJSON and not kwargs:
+        return orjson.loads(s)
+    return json.loads(s, **kwargs)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """ JSON-провайдер приложения: app.json.dumps/loads, jsonify() и request.get_json() через orjson. """
+    ensure_ascii = False
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        return loads(s, **kwargs)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(dumps_bytes(obj, indent=indent) + b"\n", mimetype=self.mimetype)
@@ -2,9 +2,13 @@
 """
 api_key_repository.py — Репозиторий для работы с API-ключами (таблица api_keys).
 Версия 5.0.1: Функции теперь принимают курсор, удалены commit, используется get_connection для импорта (хотя не вызывается).
+Версия 5.0.4: Ключи нового формата хранят публичный key_prefix; добавлен поиск по префиксу,
+              выборка ключей старого формата и замена секрета (ротация).
+Версия 5.0.5: Пакетное обновление last_used_at (update_last_used_bulk); исправлен лог в update_api_key.
 """
 import logging
 import psycopg2 # Для типизации курсора и обработки ошибок psycopg2.Error
+from datetime import datetime
 from typing import List, Dict, Any, Optional, Tuple
 
 # Импортируем get_connection, хотя функции теперь ожидают курсор.
@@ -22,17 +26,19 @@ def create_api_key(
     description: str,
     role: str,
     object_id: Optional[int] = None,
-    is_active: bool = True # Новые ключи по умолчанию активны
+    is_active: bool = True, # Новые ключи по умолчанию активны
+    key_prefix: Optional[str] = None
 ) -> Optional[int]:
     """
-    Создать новый API-ключ. Хранится только SHA-256 хеш!
+    Создать новый API-ключ. Хранится только хеш секретной части!
     Args:
         cursor: Активный курсор базы данных.
-        key_hash: SHA-256 хеш ключа.
+        key_hash: Хеш (Werkzeug) секретной части ключа.
         description: Описание назначения ключа.
         role: Роль ('agent', 'loader', 'configurator', 'admin').
         object_id: Опциональный ID объекта (подразделения).
         is_active: Статус активности ключа.
+        key_prefix: Публичный префикс ключа (см. auth_utils.generate_api_key).
     Returns:
         ID созданного ключа или None при ошибке.
     """
@@ -42,11 +48,12 @@ def create_api_key(
         raise ValueError(f"Недопустимая роль: {role}. Разрешены: {', '.join(allowed_roles)}")
 
     sql = """
-        INSERT INTO api_keys (key_hash, description, role, object_id, is_active)
-        VALUES (%(key_h)s, %(desc)s, %(role_val)s, %(obj_id)s, %(is_act)s)
+        INSERT INTO api_keys (key_prefix, key_hash, description, role, object_id, is_active)
+        VALUES (%(key_p)s, %(key_h)s, %(desc)s, %(role_val)s, %(obj_id)s, %(is_act)s)
         RETURNING id;
     """
     params = {
+        'key_p': key_prefix,
         'key_h': key_hash,
         'desc': description,
         'role_val': role.lower(), # Сохраняем роль в нижнем регистре
@@ -204,7 +211,7 @@ def update_api_key(
 
     params_for_sql_update['key_id_val'] = key_id
     sql_update_query = f"UPDATE api_keys SET {', '.join(update_set_parts)} WHERE id = %(key_id_val)s RETURNING id;"
-    logger.debug(f"Репозиторий: Попытка обновления API-ключа ID={key_id} с полями: {list(update_data.keys())}")
+    logger.debug(f"Репозиторий: Попытка обновления API-ключа ID={key_id} с полями: {list(data_to_update.keys())}")
     try:
         cursor.execute(sql_update_query, params_for_sql_update)
         updated_row = cursor.fetchone()
@@ -241,14 +248,30 @@ def delete_api_key(cursor: psycopg2.extensions.cursor, key_id: int) -> bool:
         raise
 
 # ==============================
-# АУТЕНТИФИКАЦИЯ ПО ХЕШУ
+# АУТЕНТИФИКАЦИЯ: ПОИСК ПО ПРЕФИКСУ / ХЕШУ
 # ==============================
+def find_api_key_by_prefix(cursor: psycopg2.extensions.cursor, key_prefix: str) -> Optional[Dict[str, Any]]:
+    """
+    Найти API-ключ нового формата по публичному префиксу (индекс idx_api_keys_key_prefix).
+    Возвращает словарь {id, key_prefix, key_hash, role, object_id, is_active} или None.
+    Хеш секрета проверяет вызывающий код (auth_utils.verify_api_key).
+    """
+    sql = "SELECT id, key_prefix, key_hash, role, object_id, is_active FROM api_keys WHERE key_prefix = %s;"
+    logger.debug(f"Репозиторий: Поиск API-ключа по префиксу '{key_prefix}'")
+    try:
+        cursor.execute(sql, (key_prefix,))
+        return cursor.fetchone()
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при поиске API-ключа по префиксу: {e}", exc_info=True)
+        raise
+
 def find_api_key_by_hash(cursor: psycopg2.extensions.cursor, key_hash: str) -> Optional[Dict[str, Any]]:
     """
-    Найти активный API-ключ по SHA-256 хешу (для аутентификации).
-    Возвращает словарь {id, role, object_id, is_active} или None.
+    Найти API-ключ старого формата по SHA-256 хешу всего ключа (уникальный индекс по key_hash).
+    Используется для ключей, созданных через UI до v5.0.4.
+    Возвращает словарь {id, key_prefix, role, object_id, is_active} или None.
     """
-    sql = "SELECT id, role, object_id, is_active FROM api_keys WHERE key_hash = %s;"
+    sql = "SELECT id, key_prefix, role, object_id, is_active FROM api_keys WHERE key_hash = %s;"
     # Не проверяем is_active здесь, это делает вызывающий auth_utils.verify_api_key
     logger.debug(f"Репозиторий: Поиск API-ключа по хешу (начало): {key_hash[:10]}...")
     try:
@@ -261,6 +284,41 @@ def find_api_key_by_hash(cursor: psycopg2.extensions.cursor, key_hash: str) -> O
         logger.error(f"Репозиторий: Ошибка БД при поиске API-ключа по хешу: {e}", exc_info=True)
         raise
 
+def fetch_legacy_api_keys(cursor: psycopg2.extensions.cursor, only_active: bool = True) -> List[Dict[str, Any]]:
+    """
+    Получить ключи старого формата (без key_prefix), включая key_hash.
+    Нужна для проверки еще не ротированных ключей и для команды `flask apikey migrate-format`.
+    """
+    sql = "SELECT id, key_hash, description, role, object_id, is_active, created_at, last_used_at FROM api_keys WHERE key_prefix IS NULL"
+    if only_active:
+        sql += " AND is_active = TRUE"
+    sql += " ORDER BY id;"
+    try:
+        cursor.execute(sql)
+        return cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при получении API-ключей старого формата: {e}", exc_info=True)
+        raise
+
+def set_api_key_secret(cursor: psycopg2.extensions.cursor, key_id: int, key_prefix: str, key_hash: str) -> bool:
+    """
+    Заменить секрет API-ключа (ротация): записывает новые key_prefix и key_hash.
+    Метаданные ключа (роль, object_id, описание) сохраняются. Возвращает True, если ключ найден.
+    """
+    sql = "UPDATE api_keys SET key_prefix = %s, key_hash = %s WHERE id = %s RETURNING id;"
+    logger.debug(f"Репозиторий: Замена секрета API-ключа ID={key_id}")
+    try:
+        cursor.execute(sql, (key_prefix, key_hash, key_id))
+        updated_row = cursor.fetchone()
+        if updated_row:
+            logger.info(f"Репозиторий: Секрет API-ключа ID={key_id} заменен (новый префикс '{key_prefix}').")
+            return True
+        logger.warning(f"Репозиторий set_api_key_secret: API-ключ ID={key_id} не найден.")
+        return False
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при замене секрета API-ключа ID {key_id}: {e}", exc_info=True)
+        raise
+
 # ==============================
 # ОБНОВИТЬ last_used_at
 # ==============================
@@ -274,6 +332,29 @@ def update_last_used(cursor: psycopg2.extensions.cursor, key_id: int) -> None:
     except psycopg2.Error as e: # Ошибку не пробрасываем, чтобы не ломать основной процесс аутентификации
         logger.error(f"Репозиторий: Ошибка БД при обновлении last_used_at для ключа ID {key_id}: {e}", exc_info=True)
 
+def update_last_used_bulk(cursor: psycopg2.extensions.cursor, last_used_by_key_id: Dict[int, datetime]) -> None:
+    """
+    Обновить last_used_at сразу для нескольких ключей одним UPDATE (отложенная запись из auth_utils).
+    Значение не уменьшается, если в БД уже записано более позднее время.
+    Ошибку БД пробрасывает: вызывающий код вернет записи в очередь.
+    """
+    if not last_used_by_key_id:
+        return
+    key_ids = list(last_used_by_key_id.keys())
+    used_at_values = [last_used_by_key_id[key_id] for key_id in key_ids]
+    sql = """
+        UPDATE api_keys a
+        SET last_used_at = GREATEST(COALESCE(a.last_used_at, u.used_at), u.used_at)
+        FROM unnest(%s::integer[], %s::timestamptz[]) AS u(key_id, used_at)
+        WHERE a.id = u.key_id;
+    """
+    logger.debug(f"Репозиторий: Пакетное обновление last_used_at для {len(key_ids)} API-ключей")
+    try:
+        cursor.execute(sql, (key_ids, used_at_values))
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при пакетном обновлении last_used_at: {e}", exc_info=True)
+        raise
+
 # ==============================
 # Конец файла
 # ==============================
\ No newline at end of file
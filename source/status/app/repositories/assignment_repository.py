@@ -3,6 +3,12 @@
 Репозиторий для CRUD-операций и бизнес-логики, связанной с Заданиями (Assignments).
 Версия 5.0.1: Исправлен импорт get_connection.
 Адаптирован для pipeline-архитектуры (v5.x), где задания определяются полем 'pipeline' (JSONB).
+Версия 5.0.22: Поиск заданий по описанию и имени узла - экранированная подстрока,
+              обслуживается триграммными индексами (text_search).
+Версия 5.0.25: Оффлайн-конфигурации объектов хранятся в offline_config_versions по хешу
+              содержимого; генерируются заново только для объектов, отмеченных триггерами
+              в offline_config_dirty (get_offline_config_version, fetch_offline_config,
+              refresh_dirty_offline_configs).
 """
 import json
 import logging
@@ -11,6 +17,7 @@ from typing import List, Dict, Any, Optional, Tuple
 
 # <<< ИЗМЕНЕНО: Импортируем get_connection >>>
 from ..db_connection import get_connection
+from . import text_search
 
 logger = logging.getLogger(__name__)
 
@@ -38,8 +45,8 @@ def _build_assignments_where_clause(
         params['target_node_type_id'] = filters['node_type_id']
         params['include_nested_types'] = filters.get('include_nested_types', False)
     if filters.get('search_text'):
-        where_clauses.append("(a.description ILIKE %(search_text)s OR n.name ILIKE %(search_text)s)")
-        params['search_text'] = f"%{filters['search_text']}%"
+        where_clauses.append(text_search.substring_search_clause(
+            ('a.description', 'n.name'), filters['search_text'], params, 'search_text'))
     where_sql = (" AND " + " AND ".join(where_clauses)) if where_clauses else ""
     return where_sql, params
 
@@ -50,7 +57,13 @@ def fetch_assignments_paginated(
     cursor: psycopg2.extensions.cursor, # Теперь курсор передается
     limit: Optional[int] = 25,
     offset: int = 0,
-    # ... (остальные параметры) ...
+    node_id: Optional[int] = None,
+    method_id: Optional[int] = None,
+    subdivision_id: Optional[int] = None,
+    node_type_id: Optional[int] = None,
+    search_text: Optional[str] = None,
+    is_enabled: Optional[bool] = None,
+    include_child_subdivisions: bool = False,
     include_nested_types: bool = False
 ) -> Tuple[List[Dict[str, Any]], int]:
     logger.debug(f"Репозиторий: Запрос списка заданий...") # Упрощенный лог
@@ -77,8 +90,8 @@ def fetch_assignments_paginated(
         simple_where_clauses.append("a.is_enabled = %(is_enabled_filter)s")
         params_query['is_enabled_filter'] = is_enabled
     if search_text:
-        simple_where_clauses.append("(a.description ILIKE %(search_text_filter)s OR n.name ILIKE %(search_text_filter)s)")
-        params_query['search_text_filter'] = f"%{search_text}%"
+        simple_where_clauses.append(text_search.substring_search_clause(
+            ('a.description', 'n.name'), search_text, params_query, 'search_text_filter'))
     if subdivision_id is not None:
         simple_where_clauses.append("n.parent_subdivision_id = %(subdivision_id_filter)s")
         params_query['subdivision_id_filter'] = subdivision_id
@@ -233,6 +246,39 @@ def fetch_assignments_status_for_node(cursor: psycopg2.extensions.cursor, node_i
         return assignments_status
     except psycopg2.Error as e: logger.error(f"Ошибка БД при получении статуса заданий для узла ID {node_id}: {e}", exc_info=True); raise
 
+# ============================================================================
+# ОФФЛАЙН-КОНФИГУРАЦИИ (хранимые версии, v5.0.25)
+# ============================================================================
+def get_offline_config_version(cursor: psycopg2.extensions.cursor, object_id: int) -> Dict[str, Any]:
+    """
+    Текущая версия оффлайн-конфигурации объекта (SQL-функция get_offline_config_version):
+    {'version_tag', 'content_hash', 'regenerated'}. Конфигурация генерируется заново, только если
+    объект отмечен устаревшим или сохраненной версии нет. Ошибка генерации возвращается
+    как словарь с ключом 'error' (подразделение не найдено, нет кода ТС).
+    """
+    sql = "SELECT get_offline_config_version(%(obj_id)s) AS config_version;"
+    try:
+        cursor.execute(sql, {'obj_id': object_id}); result = cursor.fetchone()
+        return result['config_version'] if result and result.get('config_version') else {}
+    except psycopg2.Error as e: logger.error(f"Ошибка БД при получении версии оффлайн-конфигурации object_id={object_id}: {e}", exc_info=True); raise
+
+def fetch_offline_config(cursor: psycopg2.extensions.cursor, version_tag: str) -> Optional[Dict[str, Any]]:
+    """ Сохраненная конфигурация версии version_tag (offline_config_versions.config_json). """
+    sql = "SELECT config_json FROM offline_config_versions WHERE version_tag = %(tag)s;"
+    try:
+        cursor.execute(sql, {'tag': version_tag}); result = cursor.fetchone()
+        return result['config_json'] if result else None
+    except psycopg2.Error as e: logger.error(f"Ошибка БД при чтении оффлайн-конфигурации {version_tag}: {e}", exc_info=True); raise
+
+def refresh_dirty_offline_configs(cursor: psycopg2.extensions.cursor) -> int:
+    """ Генерирует заново конфигурации всех объектов, отмеченных устаревшими. Возвращает их количество. """
+    try:
+        cursor.execute("SELECT refresh_dirty_offline_configs() AS refreshed_count;"); result = cursor.fetchone()
+        refreshed_count = result['refreshed_count'] if result else 0
+        logger.info(f"Репозиторий: оффлайн-конфигураций сгенерировано заново: {refreshed_count}.")
+        return refreshed_count
+    except psycopg2.Error as e: logger.error(f"Ошибка БД при обновлении оффлайн-конфигураций: {e}", exc_info=True); raise
+
 # ================================
 # Конец файла
 # ================================
\ No newline at end of file
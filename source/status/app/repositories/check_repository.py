@@ -2,12 +2,23 @@
 """
 Репозиторий для работы с результатами проверок (node_checks) и их деталями (node_check_details).
 Версия 5.0.2: Адаптировано для записи 'check_success'.
+Версия 5.0.3: Добавлена пакетная запись record_check_results_bulk (один SQL-вызов на пакет).
+Версия 5.0.5: Добавлено заполнение node_check_latest по истории (backfill_node_check_latest).
+Версия 5.0.6: node_checks/node_check_details секционированы по checked_at. Выборки истории
+             ограничены интервалом checked_at (отсечение секций), добавлено управление секциями.
+Версия 5.0.7: Агрегаты доступности node_check_rollups (пересчет, выборка истории, очистка)
+             и пакетная очистка секции по умолчанию для подсистемы хранения истории.
+Версия 5.0.15: Ключ идемпотентности результата (idempotency_key): повторная отправка
+              не создает новую запись, а возвращается как повтор (duplicate).
+              record_check_result_proc возвращает ID записи и признак повтора.
+Версия 5.0.23: События о результатах пишутся по политике из settings (check_events_mode),
+              сводные события за интервал - log_check_result_summaries.
 """
 import json
 import logging
 import psycopg2 # Для типизации и psycopg2.Error
 from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime # Для работы с датами
+from datetime import datetime, date # Для работы с датами
 
 # from ..db_connection import get_db_connection # Не импортируем, курсор передается
 
@@ -28,8 +39,9 @@ def record_check_result_proc(
     detail_type: Optional[str] = None,
     detail_data: Optional[Any] = None, # Может быть dict, list, str (если JSON-строка)
     p_assignment_version: Optional[str] = None, # Используем префикс p_ для соответствия SQL
-    p_agent_version: Optional[str] = None
-) -> Optional[int]:
+    p_agent_version: Optional[str] = None,
+    idempotency_key: Optional[str] = None
+) -> Dict[str, Any]:
     """
     Вызывает хранимую процедуру record_check_result_proc для атомарной записи
     результата проверки, включая детали, и обновления задания.
@@ -47,9 +59,11 @@ def record_check_result_proc(
         detail_data: Данные деталей (будут преобразованы в JSONB).
         p_assignment_version: Версия конфигурации заданий.
         p_agent_version: Версия скрипта агента.
+        idempotency_key: Ключ идемпотентности результата (None - без проверки повтора).
 
     Returns:
-        ID созданной записи в node_checks или None при ошибке.
+        Словарь {node_check_id, duplicate}: ID записи в node_checks (для повтора -
+        ранее созданной) и признак того, что результат с этим ключом уже был записан.
     """
     sql_proc_call = """
         CALL record_check_result_proc(
@@ -63,7 +77,10 @@ def record_check_result_proc(
             p_detail_type => %(det_type)s,
             p_detail_data => %(det_data)s,
             p_assignment_version => %(assign_ver)s,
-            p_agent_version => %(agent_ver)s
+            p_agent_version => %(agent_ver)s,
+            p_idempotency_key => %(idem_key)s,
+            p_node_check_id => NULL,
+            p_duplicate => NULL
         );
     """
     # Преобразуем detail_data в JSON-строку, если это dict или list,
@@ -96,34 +113,23 @@ def record_check_result_proc(
         'det_type': detail_type,
         'det_data': detail_data_json_str, # Передаем JSON-строку (или None)
         'assign_ver': p_assignment_version,
-        'agent_ver': p_agent_version
+        'agent_ver': p_agent_version,
+        'idem_key': idempotency_key
     }
     logger.debug(f"Репозиторий: Вызов record_check_result_proc с параметрами (кроме detail_data): "
                  f"assign_id={params['assign_id']}, is_avail={params['is_avail']}, chk_success={params['chk_success']}, "
                  f"chk_ts={params['chk_ts']}, exec_oid={params['exec_oid']}, assign_ver={params['assign_ver']}")
     try:
         cursor.execute(sql_proc_call, params)
-        # Процедура CALL не возвращает значения напрямую через RETURNING в Python так же, как SELECT.
-        # ID новой записи node_checks теперь будет доступен через обновление last_node_check_id в assignments.
-        # Мы можем запросить его, если это критично, или положиться на логику обновления в процедуре.
-        # Для простоты, здесь не будем пытаться получить ID напрямую из CALL.
-        # Если бы это была функция, можно было бы: new_check_id = cursor.fetchone()['id']
-        logger.info(f"Результат для задания ID {assignment_id} успешно передан в процедуру record_check_result_proc.")
-        # Так как ID не возвращается, возвращаем None или True/False в зависимости от того,
-        # ожидаем ли мы ID от этой функции. Пока вернем 1 как признак вызова (устаревшее поведение)
-        # или лучше None, т.к. ID не получен. Давайте изменим на возврат None, т.к. ID не извлекается.
-        # Однако, чтобы не ломать существующие вызовы, которые могут ожидать ID,
-        # лучше всего, если процедура могла бы вернуть ID через OUT параметр или
-        # Flask-эндпоинт получал бы ID из другого источника, если он ему нужен.
-        # Пока оставим возвращаемое значение как есть (не None), т.к. Flask-роут его не использует.
-        # Изменим на возврат None, так как ID не получаем.
-        # Если роуту нужен ID, он должен его получить по-другому (например, через SELECT MAX(id) или SELECT по last_node_check_id задания).
-        # В контексте процедуры, которая сама обновляет last_node_check_id, это может быть не нужно.
-        # **Уточнение:** Процедура обновляет last_node_check_id. Если ID нужен в Python,
-        # можно сделать SELECT currval(pg_get_serial_sequence('node_checks', 'id')) ПОСЛЕ CALL,
-        # но это требует осторожности в транзакциях.
-        # Для простоты, здесь не будем возвращать ID.
-        return None # ID созданной записи теперь не возвращается явно этой функцией
+        # CALL с INOUT-параметрами возвращает одну строку с их значениями
+        proc_result = cursor.fetchone()
+        write_result = {'node_check_id': proc_result['p_node_check_id'] if proc_result else None,
+                        'duplicate': bool(proc_result and proc_result['p_duplicate'])}
+        if write_result['duplicate']:
+            logger.info(f"Результат для задания ID {assignment_id} уже был записан (ключ '{idempotency_key}'), повтор пропущен.")
+        else:
+            logger.info(f"Результат для задания ID {assignment_id} успешно передан в процедуру record_check_result_proc.")
+        return write_result
     except psycopg2.Error as e:
         logger.error(f"Репозиторий: Ошибка БД при вызове record_check_result_proc для задания ID {assignment_id}: {e}", exc_info=True)
         # Пробрасываем ошибку дальше, чтобы ее мог обработать вызывающий код (например, Flask route)
@@ -133,16 +139,114 @@ def record_check_result_proc(
         logger.error(f"Репозиторий: Неожиданная ошибка при вызове record_check_result_proc для задания ID {assignment_id}: {ex_proc}", exc_info=True)
         raise
 
+# ============================================================================
+# ПАКЕТНАЯ ЗАПИСЬ РЕЗУЛЬТАТОВ (set-based, через SQL-функцию)
+# ============================================================================
+def _serialize_detail_data(detail_data: Optional[Any]) -> Optional[Any]:
+    """ Приводит detail_data к JSON-совместимому виду (аналогично record_check_result_proc). """
+    if detail_data is None or isinstance(detail_data, (dict, list)):
+        return detail_data
+    if isinstance(detail_data, str):
+        try:
+            return json.loads(detail_data)
+        except json.JSONDecodeError:
+            return {"value": detail_data}
+    return {"value": str(detail_data)}
+
+def record_check_results_bulk(
+    cursor: psycopg2.extensions.cursor,
+    items: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Записывает пакет уже провалидированных результатов проверок одним вызовом
+    SQL-функции record_check_results_bulk (INSERT ... SELECT из jsonb_to_recordset).
+
+    Args:
+        cursor: Активный курсор базы данных (RealDictCursor).
+        items: Список словарей с ключами item_index, assignment_id, is_available,
+               check_success, check_timestamp (datetime или None), executor_object_id,
+               executor_host, resolution_method, detail_type, detail_data,
+               assignment_version, agent_version и необязательным idempotency_key.
+
+    Returns:
+        Список словарей {item_index, assignment_id, node_id, node_check_id, duplicate}.
+        duplicate=True - результат с этим ключом идемпотентности уже был записан
+        (node_check_id - ранее созданная запись), повтор не записан.
+        Элементы с несуществующим заданием в список не попадают.
+    """
+    if not items:
+        return []
+    payload_for_db: List[Dict[str, Any]] = []
+    for item in items:
+        check_ts = item.get('check_timestamp')
+        payload_for_db.append({
+            'item_index': item['item_index'],
+            'assignment_id': item['assignment_id'],
+            'is_available': item['is_available'],
+            'check_success': item.get('check_success'),
+            'check_timestamp': check_ts.isoformat() if isinstance(check_ts, datetime) else check_ts,
+            'executor_object_id': item.get('executor_object_id'),
+            'executor_host': item.get('executor_host'),
+            'resolution_method': item.get('resolution_method'),
+            'detail_type': item.get('detail_type'),
+            'detail_data': _serialize_detail_data(item.get('detail_data')),
+            'assignment_version': item.get('assignment_version'),
+            'agent_version': item.get('agent_version'),
+            'idempotency_key': item.get('idempotency_key'),
+        })
+    try:
+        payload_json_str = json.dumps(payload_for_db)
+    except TypeError as te:
+        logger.error(f"Репозиторий: Ошибка сериализации пакета результатов в JSON: {te}", exc_info=True)
+        raise ValueError(f"Пакет результатов не может быть сериализован в JSON: {te}")
+
+    sql = "SELECT item_index, assignment_id, node_id, node_check_id, duplicate FROM record_check_results_bulk(%s::jsonb);"
+    logger.debug(f"Репозиторий: Вызов record_check_results_bulk для {len(payload_for_db)} записей.")
+    try:
+        cursor.execute(sql, (payload_json_str,))
+        written_rows = cursor.fetchall()
+        duplicates_count = sum(1 for row in written_rows if row['duplicate'])
+        logger.info(f"Репозиторий: record_check_results_bulk записал {len(written_rows) - duplicates_count} из {len(payload_for_db)} результатов"
+                    f" (повторов: {duplicates_count}).")
+        return written_rows
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при пакетной записи результатов ({len(payload_for_db)} шт.): {e}", exc_info=True)
+        raise
+
 # ============================================================================
 # ПОЛУЧЕНИЕ ИСТОРИИ И ДЕТАЛЕЙ ПРОВЕРОК
 # ============================================================================
 
+def _checked_at_range_condition(params: Dict[str, Any],
+                                checked_from: Optional[datetime],
+                                checked_to: Optional[datetime]) -> str:
+    """
+    Формирует условие по checked_at (ключ секционирования node_checks) и
+    добавляет значения границ в params. Пустая строка, если границ нет.
+    """
+    condition = ""
+    if checked_from is not None:
+        condition += " AND nc.checked_at >= %(checked_from_param)s"
+        params['checked_from_param'] = checked_from
+    if checked_to is not None:
+        condition += " AND nc.checked_at < %(checked_to_param)s"
+        params['checked_to_param'] = checked_to
+    return condition
+
 def fetch_check_details(cursor: psycopg2.extensions.cursor, node_check_id: int) -> List[Dict[str, Any]]:
     """
     Получает все детали для указанного результата проверки (node_check_id).
     Поле 'data' (JSONB) десериализуется psycopg2 (если используется RealDictCursor).
+    Соединение с node_checks по (id, checked_at) позволяет PostgreSQL читать
+    только секцию деталей, соответствующую времени проверки.
+    """
+    sql = """
+        SELECT ncd.id, ncd.detail_type, ncd.data
+        FROM node_checks nc
+        JOIN node_check_details ncd ON ncd.node_check_id = nc.id AND ncd.checked_at = nc.checked_at
+        WHERE nc.id = %s
+        ORDER BY ncd.id;
     """
-    sql = "SELECT id, detail_type, data FROM node_check_details WHERE node_check_id = %s ORDER BY id;"
     logger.debug(f"Репозиторий: Запрос деталей для node_check_id={node_check_id}")
     try:
         cursor.execute(sql, (node_check_id,))
@@ -162,11 +266,14 @@ def fetch_node_checks_history(
     cursor: psycopg2.extensions.cursor,
     node_id: int,
     method_id_filter: Optional[int] = None,
-    limit: int = 50
+    limit: int = 50,
+    checked_from: Optional[datetime] = None,
+    checked_to: Optional[datetime] = None
 ) -> List[Dict[str, Any]]:
     """
     Получает историю последних N результатов проверок для узла.
-    Может фильтроваться по ID метода проверки.
+    Может фильтроваться по ID метода проверки и интервалу checked_at
+    ([checked_from; checked_to)); границы интервала отсекают лишние секции node_checks.
     Включает поле check_success.
     """
     sql_base = """
@@ -176,7 +283,7 @@ def fetch_node_checks_history(
             nc.checked_at, nc.check_timestamp,
             nc.executor_object_id, nc.executor_host, nc.resolution_method,
             nc.assignment_config_version, nc.agent_script_version,
-            EXISTS (SELECT 1 FROM node_check_details ncd WHERE ncd.node_check_id = nc.id) AS has_details
+            EXISTS (SELECT 1 FROM node_check_details ncd WHERE ncd.node_check_id = nc.id AND ncd.checked_at = nc.checked_at) AS has_details
         FROM node_checks nc
         JOIN check_methods cm ON nc.method_id = cm.id
         WHERE nc.node_id = %(node_id_param)s
@@ -185,6 +292,7 @@ def fetch_node_checks_history(
     if method_id_filter is not None:
         sql_base += " AND nc.method_id = %(method_id_param)s"
         params['method_id_param'] = method_id_filter
+    sql_base += _checked_at_range_condition(params, checked_from, checked_to)
     
     sql_final = sql_base + " ORDER BY nc.checked_at DESC, nc.id DESC LIMIT %(limit_param)s;"
     logger.debug(f"Репозиторий: Запрос истории проверок для node_id={node_id}, method_id={method_id_filter}, limit={limit}")
@@ -199,29 +307,33 @@ def fetch_node_checks_history(
 def fetch_assignment_checks_history(
     cursor: psycopg2.extensions.cursor,
     assignment_id: int,
-    limit: int = 50
+    limit: int = 50,
+    checked_from: Optional[datetime] = None,
+    checked_to: Optional[datetime] = None
 ) -> List[Dict[str, Any]]:
     """
     Получает историю последних N результатов проверок для задания.
+    Интервал checked_at ([checked_from; checked_to)) отсекает лишние секции node_checks.
     Включает поле check_success.
     """
+    params: Dict[str, Any] = {'assign_id_param': assignment_id, 'limit_param': limit}
+    range_condition = _checked_at_range_condition(params, checked_from, checked_to)
     # SQL-запрос очень похож на fetch_node_checks_history, только фильтр по assignment_id
-    sql = """
+    sql = f"""
         SELECT
             nc.id, nc.node_id, n.name as node_name, nc.method_id, cm.method_name,
             nc.is_available, nc.check_success, -- <<< ВКЛЮЧАЕМ check_success
             nc.checked_at, nc.check_timestamp,
             nc.executor_object_id, nc.executor_host, nc.resolution_method,
             nc.assignment_config_version, nc.agent_script_version,
-            EXISTS (SELECT 1 FROM node_check_details ncd WHERE ncd.node_check_id = nc.id) AS has_details
+            EXISTS (SELECT 1 FROM node_check_details ncd WHERE ncd.node_check_id = nc.id AND ncd.checked_at = nc.checked_at) AS has_details
         FROM node_checks nc
         JOIN nodes n ON nc.node_id = n.id
         JOIN check_methods cm ON nc.method_id = cm.id
-        WHERE nc.assignment_id = %(assign_id_param)s
+        WHERE nc.assignment_id = %(assign_id_param)s{range_condition}
         ORDER BY nc.checked_at DESC, nc.id DESC
         LIMIT %(limit_param)s;
     """
-    params: Dict[str, Any] = {'assign_id_param': assignment_id, 'limit_param': limit}
     logger.debug(f"Репозиторий: Запрос истории проверок для assignment_id={assignment_id}, limit={limit}")
     try:
         cursor.execute(sql, params)
@@ -231,6 +343,264 @@ def fetch_assignment_checks_history(
         logger.error(f"Репозиторий: Ошибка БД при получении истории проверок для задания {assignment_id}: {e}", exc_info=True)
         raise
 
+# ============================================================================
+# ТЕКУЩЕЕ СОСТОЯНИЕ ЗАДАНИЙ (node_check_latest)
+# ============================================================================
+def backfill_node_check_latest(cursor: psycopg2.extensions.cursor) -> int:
+    """
+    Заполняет таблицу node_check_latest по существующей истории node_checks
+    (вызов SQL-функции backfill_node_check_latest). Более свежее состояние не затирается.
+
+    Returns:
+        Количество вставленных/обновленных строк.
+    """
+    sql = "SELECT backfill_node_check_latest() AS affected_rows;"
+    logger.debug("Репозиторий: Вызов backfill_node_check_latest.")
+    try:
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        affected_rows = result['affected_rows'] if result else 0
+        logger.info(f"Репозиторий: backfill_node_check_latest обработала {affected_rows} заданий.")
+        return affected_rows
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при заполнении node_check_latest: {e}", exc_info=True)
+        raise
+
+# ============================================================================
+# СЕКЦИИ ИСТОРИИ ПРОВЕРОК (node_checks / node_check_details)
+# ============================================================================
+def create_check_partitions(cursor: psycopg2.extensions.cursor, date_from: date, date_to: date) -> int:
+    """
+    Создает недостающие суточные (UTC) секции node_checks и node_check_details
+    за даты [date_from; date_to] (SQL-функция create_check_partitions).
+
+    Returns:
+        Количество созданных секций.
+    """
+    sql = "SELECT create_check_partitions(%s, %s) AS created_count;"
+    logger.debug(f"Репозиторий: Создание секций истории проверок {date_from} - {date_to}.")
+    try:
+        cursor.execute(sql, (date_from, date_to))
+        result = cursor.fetchone()
+        created_count = result['created_count'] if result else 0
+        logger.info(f"Репозиторий: Создано секций истории проверок: {created_count} ({date_from} - {date_to}).")
+        return created_count
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при создании секций истории проверок: {e}", exc_info=True)
+        raise
+
+def drop_check_partitions(cursor: psycopg2.extensions.cursor, before_date: date,
+                          detach_only: bool = False) -> List[Dict[str, Any]]:
+    """
+    Отсоединяет (detach_only=True) или удаляет суточные секции истории проверок,
+    целиком лежащие раньше before_date (SQL-функция drop_check_partitions).
+
+    Returns:
+        Список словарей {'partition_name', 'action'} по обработанным секциям.
+    """
+    sql = "SELECT partition_name, action FROM drop_check_partitions(%s, %s);"
+    logger.debug(f"Репозиторий: Удаление секций истории проверок ранее {before_date} (detach_only={detach_only}).")
+    try:
+        cursor.execute(sql, (before_date, detach_only))
+        processed_partitions = cursor.fetchall()
+        logger.info(f"Репозиторий: Обработано секций истории проверок ранее {before_date}: {len(processed_partitions)}.")
+        return processed_partitions
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при удалении секций истории проверок: {e}", exc_info=True)
+        raise
+
+def count_default_partition_rows(cursor: psycopg2.extensions.cursor) -> int:
+    """
+    Количество строк в секции по умолчанию node_checks_default. Ненулевое значение
+    означает, что секции не были созданы заранее (их нужно создавать с запасом).
+    """
+    sql = "SELECT COUNT(*) AS rows_count FROM node_checks_default;"
+    try:
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        return result['rows_count'] if result else 0
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при проверке секции node_checks_default: {e}", exc_info=True)
+        raise
+
+# ============================================================================
+# АГРЕГАТЫ ДОСТУПНОСТИ (node_check_rollups) И ОЧИСТКА ИСТОРИИ
+# ============================================================================
+def get_oldest_check_time(cursor: psycopg2.extensions.cursor) -> Optional[datetime]:
+    """ Время самого раннего результата в node_checks (None, если история пуста). """
+    sql = "SELECT MIN(checked_at) AS oldest_checked_at FROM node_checks;"
+    try:
+        cursor.execute(sql)
+        result = cursor.fetchone()
+        return result['oldest_checked_at'] if result else None
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при получении самого раннего результата проверки: {e}", exc_info=True)
+        raise
+
+def rollup_node_checks(cursor: psycopg2.extensions.cursor, rollup_from: datetime, rollup_to: datetime) -> int:
+    """
+    Пересчитывает почасовые агрегаты за полные часы [rollup_from; rollup_to) и суточные
+    агрегаты затронутых суток (SQL-функция rollup_node_checks). Идемпотентна.
+
+    Returns:
+        Количество вставленных почасовых агрегатов.
+    """
+    sql = "SELECT rollup_node_checks(%s, %s) AS hourly_rows;"
+    logger.debug(f"Репозиторий: Агрегация результатов проверок {rollup_from} - {rollup_to}.")
+    try:
+        cursor.execute(sql, (rollup_from, rollup_to))
+        result = cursor.fetchone()
+        return result['hourly_rows'] if result else 0
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при агрегации результатов проверок: {e}", exc_info=True)
+        raise
+
+def purge_default_partition_checks_batch(cursor: psycopg2.extensions.cursor, before: datetime, batch_size: int) -> int:
+    """
+    Удаляет не более batch_size результатов старше before из секции по умолчанию
+    node_checks_default (детали удаляются каскадно). Суточные секции удаляются
+    целиком через drop_check_partitions.
+
+    Returns:
+        Количество удаленных строк.
+    """
+    sql = """
+        DELETE FROM node_checks_default
+        WHERE (id, checked_at) IN (
+            SELECT id, checked_at FROM node_checks_default
+            WHERE checked_at < %s
+            LIMIT %s
+        );
+    """
+    try:
+        cursor.execute(sql, (before, batch_size))
+        return cursor.rowcount
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при очистке node_checks_default: {e}", exc_info=True)
+        raise
+
+def purge_default_partition_ingest_keys_batch(cursor: psycopg2.extensions.cursor, before: date, batch_size: int) -> int:
+    """
+    Удаляет не более batch_size ключей идемпотентности с check_day раньше before
+    из секции по умолчанию node_check_ingest_keys_default (суточные секции
+    удаляются целиком через drop_check_partitions).
+
+    Returns:
+        Количество удаленных строк.
+    """
+    sql = """
+        DELETE FROM node_check_ingest_keys_default
+        WHERE (check_day, idempotency_key) IN (
+            SELECT check_day, idempotency_key FROM node_check_ingest_keys_default
+            WHERE check_day < %s
+            LIMIT %s
+        );
+    """
+    try:
+        cursor.execute(sql, (before, batch_size))
+        return cursor.rowcount
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при очистке node_check_ingest_keys_default: {e}", exc_info=True)
+        raise
+
+def purge_check_rollups_batch(cursor: psycopg2.extensions.cursor, bucket_size: str, before: datetime, batch_size: int) -> int:
+    """
+    Удаляет не более batch_size агрегатов размера bucket_size ('hour'/'day') с началом интервала раньше before.
+
+    Returns:
+        Количество удаленных строк.
+    """
+    sql = """
+        DELETE FROM node_check_rollups
+        WHERE id IN (
+            SELECT id FROM node_check_rollups
+            WHERE bucket_size = %s AND bucket_start < %s
+            LIMIT %s
+        );
+    """
+    try:
+        cursor.execute(sql, (bucket_size, before, batch_size))
+        return cursor.rowcount
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при очистке агрегатов '{bucket_size}': {e}", exc_info=True)
+        raise
+
+def fetch_check_rollups_history(
+    cursor: psycopg2.extensions.cursor,
+    hourly_from: datetime,
+    rollups_to: datetime,
+    node_id: Optional[int] = None,
+    assignment_id: Optional[int] = None,
+    method_id_filter: Optional[int] = None,
+    checked_from: Optional[datetime] = None,
+    limit: int = 50
+) -> List[Dict[str, Any]]:
+    """
+    Агрегированная история узла или задания для интервалов старше срока хранения
+    "сырых" результатов: почасовые агрегаты в [hourly_from; rollups_to) и суточные -
+    раньше hourly_from (почасовые там уже удалены). Сортировка - от новых к старым.
+    Поля совпадают по смыслу с fetch_*_checks_history, плюс счетчики агрегата и is_rollup=True.
+    """
+    params: Dict[str, Any] = {
+        'hourly_from_param': hourly_from, 'rollups_to_param': rollups_to, 'limit_param': limit
+    }
+    filters = ""
+    if node_id is not None:
+        filters += " AND r.node_id = %(node_id_param)s"; params['node_id_param'] = node_id
+    if assignment_id is not None:
+        filters += " AND r.assignment_id = %(assign_id_param)s"; params['assign_id_param'] = assignment_id
+    if method_id_filter is not None:
+        filters += " AND r.method_id = %(method_id_param)s"; params['method_id_param'] = method_id_filter
+    if checked_from is not None:
+        filters += " AND r.last_checked_at >= %(checked_from_param)s"; params['checked_from_param'] = checked_from
+    sql = f"""
+        SELECT
+            r.bucket_size, r.bucket_start, r.node_id, r.assignment_id, r.method_id, cm.method_name,
+            r.checks_count, r.available_count, r.success_count,
+            ROUND(r.success_count::numeric / NULLIF(r.checks_count, 0), 4) AS success_ratio,
+            r.first_checked_at, r.last_checked_at,
+            r.last_checked_at AS checked_at,
+            TRUE AS is_rollup
+        FROM node_check_rollups r
+        JOIN check_methods cm ON r.method_id = cm.id
+        WHERE ((r.bucket_size = 'hour' AND r.bucket_start >= %(hourly_from_param)s AND r.bucket_start < %(rollups_to_param)s)
+            OR (r.bucket_size = 'day' AND r.bucket_start < %(hourly_from_param)s)){filters}
+        ORDER BY r.bucket_start DESC, r.assignment_id
+        LIMIT %(limit_param)s;
+    """
+    logger.debug(f"Репозиторий: Запрос агрегированной истории (node_id={node_id}, assignment_id={assignment_id}) до {rollups_to}.")
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при получении агрегированной истории проверок: {e}", exc_info=True)
+        raise
+
+# ============================================================================
+# СВОДНЫЕ СОБЫТИЯ О РЕЗУЛЬТАТАХ ПРОВЕРОК
+# ============================================================================
+def log_check_result_summaries(cursor: psycopg2.extensions.cursor, now: Optional[datetime] = None) -> int:
+    """
+    Записывает сводные события CHECK_RESULTS_SUMMARY (количество результатов по объекту-исполнителю)
+    за завершенные интервалы settings.check_events_summary_interval_seconds
+    (SQL-функция log_check_result_summaries). Уже обработанные интервалы пропускаются.
+
+    Returns:
+        Количество записанных сводных событий.
+    """
+    if now is None:
+        sql, params = "SELECT log_check_result_summaries() AS logged_count;", None
+    else:
+        sql, params = "SELECT log_check_result_summaries(%s) AS logged_count;", (now,)
+    logger.debug("Репозиторий: Запись сводных событий о результатах проверок.")
+    try:
+        cursor.execute(sql, params)
+        result = cursor.fetchone()
+        return result['logged_count'] if result else 0
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при записи сводных событий о результатах проверок: {e}", exc_info=True)
+        raise
+
 # ============================================================================
 # Конец файла
 # ============================================================================
\ No newline at end of file
@@ -2,24 +2,45 @@
 """
 event_repository.py — CRUD-операции и бизнес-логика для системных событий (system_events).
 Версия 5.0.1: Функции теперь принимают курсор, удалены commit.
+Версия 5.0.7: Добавлена пакетная очистка старых событий (purge_system_events_batch).
+Версия 5.0.21: Пагинация по курсору (fetch_system_events_page, позиция (event_time, id))
+              и подсчет по режимам (count_system_events: точный, оценка планировщика, с пределом).
+Версия 5.0.22: search_text ищется по индексам (text_search): слова - полнотекстово по
+              message_tsv, прочий текст - подстрокой по триграммному индексу message.
+Версия 5.0.24: system_events секционирована по суткам (горячие секции с полным набором
+              индексов, холодные - только BRIN): создание, перевод в холодные и удаление
+              секций; очистка пакетами - только секции по умолчанию.
 """
+import base64
+import binascii
 import logging
 import json
 import psycopg2
 from typing import List, Dict, Any, Optional, Tuple
+from datetime import date, datetime
 
 # <<< ИЗМЕНЕНО: Импортируем get_connection >>>
 from ..db_connection import get_connection
+from . import text_search
 
 logger = logging.getLogger(__name__)
 
 # ================================
 # Получить список событий
 # ================================
-def fetch_system_events( # Переименовал для единообразия
-    cursor: psycopg2.extensions.cursor, # Ожидаем курсор
-    limit: Optional[int] = 200, # Значение по умолчанию для лимита
-    offset: int = 0,
+EVENT_COUNT_MODES = ('exact', 'estimate', 'capped', 'none')
+EVENT_COUNT_CAP = 10000 # Предел точного подсчета в режиме 'capped'
+
+_EVENT_SELECT_FIELDS = """
+    SELECT id, event_time, event_type, severity, message, source,
+           object_id, node_id, assignment_id, node_check_id,
+           related_entity, related_entity_id, details
+    FROM system_events
+"""
+_EVENT_ORDER_SQL = " ORDER BY event_time DESC, id DESC" # Порядок совпадает с индексом (event_time, id) горячих секций
+
+
+def _build_event_filters(
     severity: Optional[str] = None,
     event_type: Optional[str] = None,
     search_text: Optional[str] = None,
@@ -29,27 +50,15 @@ def fetch_system_events( # Переименовал для единообраз
     node_check_id: Optional[int] = None,
     related_entity: Optional[str] = None,
     related_entity_id: Optional[str] = None,
-    start_time: Optional[str] = None, # ISO строка даты
-    end_time: Optional[str] = None   # ISO строка даты
-) -> Tuple[List[Dict[str, Any]], int]:
-    """
-    Получить страницу системных событий с гибкой фильтрацией и пагинацией.
-    """
-    logger.debug(f"Репозиторий: Запрос списка системных событий с фильтрами...")
-    select_fields = """
-        SELECT id, event_time, event_type, severity, message, source,
-               object_id, node_id, assignment_id, node_check_id,
-               related_entity, related_entity_id, details
-        FROM system_events
-    """
-    count_select = "SELECT COUNT(*) FROM system_events"
-    
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None
+) -> Tuple[List[str], Dict[str, Any]]:
+    """ Условия WHERE и параметры фильтров журнала событий (общие для всех режимов выборки). """
     where_clauses: List[str] = []
     query_params: Dict[str, Any] = {}
-
     if severity: where_clauses.append("severity = %(sev)s"); query_params['sev'] = severity.upper()
     if event_type: where_clauses.append("event_type ILIKE %(ev_type)s"); query_params['ev_type'] = f"%{event_type}%" # Частичное совпадение
-    if search_text: where_clauses.append("message ILIKE %(s_text)s"); query_params['s_text'] = f"%{search_text}%"
+    if search_text: where_clauses.append(text_search.message_search_clause(search_text, query_params, 's_text'))
     if object_id is not None: where_clauses.append("object_id = %(o_id)s"); query_params['o_id'] = object_id
     if node_id is not None: where_clauses.append("node_id = %(n_id)s"); query_params['n_id'] = node_id
     if assignment_id is not None: where_clauses.append("assignment_id = %(a_id)s"); query_params['a_id'] = assignment_id
@@ -58,23 +67,151 @@ def fetch_system_events( # Переименовал для единообраз
     if related_entity_id: where_clauses.append("related_entity_id = %(rel_id)s"); query_params['rel_id'] = related_entity_id
     if start_time: where_clauses.append("event_time >= %(start_t)s::timestamptz"); query_params['start_t'] = start_time
     if end_time: where_clauses.append("event_time <= %(end_t)s::timestamptz"); query_params['end_t'] = end_time
-    
-    where_sql = (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+    return where_clauses, query_params
+
+
+def _where_sql(where_clauses: List[str]) -> str:
+    return (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
+
+
+def encode_event_cursor(event_time: datetime, event_id: int) -> str:
+    """ Непрозрачный курсор страницы: позиция (event_time, id) последнего отданного события. """
+    raw_cursor = json.dumps([event_time.isoformat(), int(event_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw_cursor).decode('ascii').rstrip('=')
+
+
+def decode_event_cursor(cursor_token: str) -> Tuple[datetime, int]:
+    """
+    Разбирает курсор encode_event_cursor.
+    Raises:
+        ValueError: Курсор поврежден или получен не от этого API.
+    """
+    try:
+        padded_token = cursor_token + '=' * (-len(cursor_token) % 4)
+        event_time_iso, event_id = json.loads(base64.urlsafe_b64decode(padded_token.encode('ascii')))
+        event_time = datetime.fromisoformat(event_time_iso)
+        if event_time.tzinfo is None or isinstance(event_id, bool) or not isinstance(event_id, int):
+            raise ValueError("неполная позиция")
+        return event_time, event_id
+    except (ValueError, TypeError, UnicodeError, binascii.Error) as e_cursor:
+        raise ValueError(f"Некорректный курсор страницы событий: {e_cursor}")
+
+
+def count_system_events(cursor: psycopg2.extensions.cursor, count_mode: str = 'exact',
+                        cap: int = EVENT_COUNT_CAP, **filters: Any) -> Tuple[Optional[int], bool]:
+    """
+    Количество событий по фильтрам.
+
+    Режимы:
+        'exact'    - COUNT(*) (на больших журналах - полный просмотр);
+        'estimate' - оценка планировщика (EXPLAIN), без чтения строк;
+        'capped'   - точный подсчет, но не более cap строк;
+        'none'     - не считать.
+    Returns:
+        (количество или None, признак приблизительного значения).
+    """
+    if count_mode == 'none':
+        return None, False
+    where_clauses, query_params = _build_event_filters(**filters)
+    where_sql = _where_sql(where_clauses)
+    try:
+        if count_mode == 'estimate':
+            cursor.execute("EXPLAIN (FORMAT JSON) SELECT 1 FROM system_events" + where_sql, query_params)
+            plan_row = cursor.fetchone()
+            plan_json = plan_row['QUERY PLAN'] if isinstance(plan_row, dict) else plan_row[0]
+            if isinstance(plan_json, str):
+                plan_json = json.loads(plan_json)
+            return int(plan_json[0]['Plan']['Plan Rows']), True
+        if count_mode == 'capped':
+            query_params['count_cap'] = cap + 1
+            cursor.execute("SELECT COUNT(*) FROM (SELECT 1 FROM system_events" + where_sql +
+                           " LIMIT %(count_cap)s) AS capped_events", query_params)
+            capped_count = cursor.fetchone()['count']
+            return min(capped_count, cap), capped_count > cap
+        cursor.execute("SELECT COUNT(*) FROM system_events" + where_sql, query_params)
+        return cursor.fetchone()['count'], False
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при подсчете событий ({count_mode}): {e}", exc_info=True)
+        raise
+
+
+def fetch_system_events( # Переименовал для единообразия
+    cursor: psycopg2.extensions.cursor, # Ожидаем курсор
+    limit: Optional[int] = 200, # Значение по умолчанию для лимита
+    offset: int = 0,
+    severity: Optional[str] = None,
+    event_type: Optional[str] = None,
+    search_text: Optional[str] = None,
+    object_id: Optional[int] = None,
+    node_id: Optional[int] = None,
+    assignment_id: Optional[int] = None,
+    node_check_id: Optional[int] = None,
+    related_entity: Optional[str] = None,
+    related_entity_id: Optional[str] = None,
+    start_time: Optional[str] = None, # ISO строка даты
+    end_time: Optional[str] = None   # ISO строка даты
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Получить страницу системных событий с гибкой фильтрацией и пагинацией (LIMIT/OFFSET и точный COUNT).
+    Для глубоких страниц больших журналов - fetch_system_events_page (курсор по (event_time, id)).
+    """
+    logger.debug(f"Репозиторий: Запрос списка системных событий с фильтрами...")
+    where_clauses, query_params = _build_event_filters(
+        severity, event_type, search_text, object_id, node_id, assignment_id, node_check_id,
+        related_entity, related_entity_id, start_time, end_time)
+    where_sql = _where_sql(where_clauses)
     try:
-        cursor.execute(count_select + where_sql, query_params)
+        cursor.execute("SELECT COUNT(*) FROM system_events" + where_sql, query_params)
         total_count = cursor.fetchone()['count']
         events_list: List[Dict[str, Any]] = []
         if total_count > 0 and (limit is None or offset < total_count):
-            order_sql = " ORDER BY event_time DESC, id DESC"
             limit_offset_sql = ""
             if limit is not None: limit_offset_sql = " LIMIT %(lim)s OFFSET %(off)s"; query_params['lim']=limit; query_params['off']=offset
-            cursor.execute(select_fields + where_sql + order_sql + limit_offset_sql, query_params)
+            cursor.execute(_EVENT_SELECT_FIELDS + where_sql + _EVENT_ORDER_SQL + limit_offset_sql, query_params)
             events_list = cursor.fetchall()
             # Десериализация details (JSONB -> Python dict) выполняется psycopg2 RealDictCursor
         logger.info(f"Репозиторий fetch_system_events: Найдено {len(events_list)} событий на странице, всего {total_count}.")
         return events_list, total_count
     except psycopg2.Error as e: logger.error(f"Репозиторий: Ошибка БД при выборке событий: {e}", exc_info=True); raise
 
+
+def fetch_system_events_page(
+    cursor: psycopg2.extensions.cursor,
+    limit: int = 100,
+    after_cursor: Optional[str] = None,
+    **filters: Any
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Страница событий по курсору (keyset): события строго после позиции after_cursor
+    в порядке (event_time DESC, id DESC). Стоимость страницы не зависит от ее глубины -
+    запрос продолжает чтение индекса (event_time, id) с позиции курсора, без OFFSET и COUNT.
+
+    Args:
+        after_cursor: next_cursor предыдущей страницы; None - первая страница.
+        **filters: Фильтры, как у fetch_system_events (severity, node_id, start_time, ...).
+    Returns:
+        (события страницы, next_cursor или None, если страница последняя).
+    Raises:
+        ValueError: Некорректный курсор.
+    """
+    where_clauses, query_params = _build_event_filters(**filters)
+    if after_cursor:
+        query_params['cur_t'], query_params['cur_id'] = decode_event_cursor(after_cursor)
+        where_clauses.append("(event_time, id) < (%(cur_t)s, %(cur_id)s)")
+    query_params['lim'] = limit + 1 # Лишняя строка - признак следующей страницы
+    try:
+        cursor.execute(_EVENT_SELECT_FIELDS + _where_sql(where_clauses) + _EVENT_ORDER_SQL + " LIMIT %(lim)s", query_params)
+        events_list = cursor.fetchall()
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при выборке страницы событий: {e}", exc_info=True)
+        raise
+    next_cursor = None
+    if len(events_list) > limit:
+        events_list = events_list[:limit]
+        next_cursor = encode_event_cursor(events_list[-1]['event_time'], events_list[-1]['id'])
+    logger.info(f"Репозиторий fetch_system_events_page: Найдено {len(events_list)} событий на странице, есть следующая: {next_cursor is not None}.")
+    return events_list, next_cursor
+
 def get_event_by_id(cursor: psycopg2.extensions.cursor, event_id: int) -> Optional[Dict[str, Any]]:
     # ... (логика такая же, курсор уже передан) ...
     sql = """ SELECT id, event_time, event_type, severity, message, source, object_id, node_id, 
@@ -129,4 +266,73 @@ def delete_event(cursor: psycopg2.extensions.cursor, event_id: int) -> bool:
 
 # ================================
 # Конец файла
-# ================================
\ No newline at end of file
+# ================================
+
+
+# ================================
+# Пакетная очистка старых событий
+# ================================
+def purge_default_partition_events_batch(cursor: psycopg2.extensions.cursor, before: datetime, batch_size: int) -> int:
+    """
+    Удаляет не более batch_size событий с event_time раньше before из секции по умолчанию
+    system_events_default. Суточные секции удаляются целиком через drop_event_partitions.
+    Вызывается в цикле с фиксацией после каждого пакета, чтобы не держать длинных блокировок.
+    Возвращает количество удаленных событий.
+    """
+    sql = """
+        DELETE FROM system_events_default
+        WHERE id IN (
+            SELECT id FROM system_events_default
+            WHERE event_time < %s
+            ORDER BY event_time
+            LIMIT %s
+        );
+    """
+    try:
+        cursor.execute(sql, (before, batch_size))
+        return cursor.rowcount
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при очистке старых событий секции по умолчанию: {e}", exc_info=True)
+        raise
+
+# ================================
+# Секции журнала событий (горячие / холодные)
+# ================================
+def create_event_partitions(cursor: psycopg2.extensions.cursor, date_from: date, date_to: date) -> int:
+    """
+    Создает недостающие суточные (UTC) секции system_events за даты [date_from; date_to]
+    с горячим набором индексов (SQL-функция create_event_partitions).
+    Возвращает количество созданных секций.
+    """
+    try:
+        cursor.execute("SELECT create_event_partitions(%s, %s) AS created_count;", (date_from, date_to))
+        result = cursor.fetchone()
+        return result['created_count'] if result else 0
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при создании секций журнала событий: {e}", exc_info=True)
+        raise
+
+def demote_event_partitions(cursor: psycopg2.extensions.cursor, before_date: date) -> List[str]:
+    """
+    Переводит секции system_events, целиком лежащие раньше before_date, в холодные:
+    остается только BRIN-индекс (SQL-функция demote_event_partitions).
+    Возвращает имена переведенных секций.
+    """
+    try:
+        cursor.execute("SELECT partition_name FROM demote_event_partitions(%s);", (before_date,))
+        return [row['partition_name'] for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при переводе секций журнала событий в холодные: {e}", exc_info=True)
+        raise
+
+def drop_event_partitions(cursor: psycopg2.extensions.cursor, before_date: date) -> List[str]:
+    """
+    Удаляет суточные секции system_events, целиком лежащие раньше before_date
+    (SQL-функция drop_event_partitions). Возвращает имена удаленных секций.
+    """
+    try:
+        cursor.execute("SELECT partition_name FROM drop_event_partitions(%s);", (before_date,))
+        return [row['partition_name'] for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при удалении секций журнала событий: {e}", exc_info=True)
+        raise
@@ -3,15 +3,22 @@
 node_repository.py — CRUD-операции и логика для управления узлами мониторинга (nodes).
 Версия 5.0.1: Добавлены функции fetch_node_base_info и fetch_node_ping_status,
              вызывающие соответствующие SQL-функции для node_service.
+Версия 5.0.6: fetch_node_base_info/fetch_node_ping_status принимают набор ID узлов,
+             фильтр передается в SQL-функции массивом (INTEGER[]).
+Версия 5.0.20: fetch_node_primary_status - статус узлов по политике статуса типа узла
+              (SQL-функция get_node_primary_status).
+Версия 5.0.22: Поиск узлов (fetch_nodes) - экранированная подстрока, обслуживается
+              триграммными индексами имени, IP и описания (text_search).
 Везде добавлено логгирование, подробные комментарии и docstring.
 """
 
 import logging
 import psycopg2 # Для типизации курсора и обработки psycopg2.Error
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterable, Union
 
 # Используем относительный импорт для db_connection, если он в том же пакете
 from ..db_connection import get_connection # get_connection теперь возвращает контекстный менеджер
+from . import text_search
 
 logger = logging.getLogger(__name__)
 
@@ -96,8 +103,8 @@ def fetch_nodes(
     
     # Фильтр по тексту
     if search_text:
-        where_clauses.append("(n.name ILIKE %(search)s OR n.ip_address ILIKE %(search)s OR n.description ILIKE %(search)s)")
-        query_params['search'] = f"%{search_text}%"
+        where_clauses.append(text_search.substring_search_clause(
+            ('n.name', 'n.ip_address', 'n.description'), search_text, query_params, 'search'))
 
     where_sql = (" WHERE " + " AND ".join(where_clauses)) if where_clauses else ""
     
@@ -170,21 +177,37 @@ def get_node_by_id(cursor: psycopg2.extensions.cursor, node_id: int) -> Optional
 # НОВЫЕ ФУНКЦИИ для вызова SQL-функций, используемых в node_service.py
 # =================================================================================
 
-def fetch_node_base_info(cursor: psycopg2.extensions.cursor, node_id: Optional[int] = None) -> List[Dict[str, Any]]:
+def _normalize_node_ids_filter(node_ids: Optional[Union[int, Iterable[int]]]) -> Optional[List[int]]:
+    """
+    Приводит фильтр по узлам к списку ID для параметра INTEGER[] SQL-функций.
+    None означает "все узлы"; одиночный ID превращается в список из одного элемента.
+    """
+    if node_ids is None:
+        return None
+    if isinstance(node_ids, int):
+        return [node_ids]
+    return sorted({int(node_id) for node_id in node_ids})
+
+def fetch_node_base_info(cursor: psycopg2.extensions.cursor,
+                         node_id: Optional[Union[int, Iterable[int]]] = None) -> List[Dict[str, Any]]:
     """
     Вызывает SQL-функцию get_node_base_info для получения базовой информации об узлах,
     включая вычисленные свойства типа узла.
 
     Args:
         cursor: Активный курсор базы данных.
-        node_id (int, optional): ID конкретного узла для фильтрации. Если None, для всех узлов.
+        node_id (int | Iterable[int], optional): ID узла или набор ID узлов для фильтрации.
+                                                 Если None, для всех узлов.
 
     Returns:
         Список словарей с базовой информацией об узлах.
     """
-    sql_function_call = "SELECT * FROM get_node_base_info(%(node_id_param)s);"
-    params = {'node_id_param': node_id} # SQL-функция ожидает NULL, если все узлы
-    logger.debug(f"Репозиторий: Вызов SQL-функции get_node_base_info с node_id={node_id}")
+    node_ids_list = _normalize_node_ids_filter(node_id)
+    if node_ids_list is not None and not node_ids_list:
+        return [] # Пустой набор узлов - запрос к БД не нужен
+    sql_function_call = "SELECT * FROM get_node_base_info(%(node_ids_param)s::INTEGER[]);"
+    params = {'node_ids_param': node_ids_list} # SQL-функция ожидает NULL, если все узлы
+    logger.debug(f"Репозиторий: Вызов SQL-функции get_node_base_info с node_ids={node_ids_list}")
     try:
         cursor.execute(sql_function_call, params)
         base_info_list = cursor.fetchall()
@@ -194,22 +217,27 @@ def fetch_node_base_info(cursor: psycopg2.extensions.cursor, node_id: Optional[i
         logger.error(f"Репозиторий: Ошибка БД при вызове get_node_base_info: {e}", exc_info=True)
         raise
 
-def fetch_node_ping_status(cursor: psycopg2.extensions.cursor, node_id_filter: Optional[int] = None) -> List[Dict[str, Any]]:
+def fetch_node_ping_status(cursor: psycopg2.extensions.cursor,
+                           node_id_filter: Optional[Union[int, Iterable[int]]] = None) -> List[Dict[str, Any]]:
     """
     Вызывает SQL-функцию get_node_ping_status для получения статуса последней PING-проверки,
     включая is_available и check_success.
 
     Args:
         cursor: Активный курсор базы данных.
-        node_id_filter (int, optional): ID конкретного узла для фильтрации. Если None, для всех узлов.
+        node_id_filter (int | Iterable[int], optional): ID узла или набор ID узлов для фильтрации.
+                                                        Если None, для всех узлов.
 
     Returns:
         Список словарей со статусами PING-проверок для узлов.
     """
+    node_ids_list = _normalize_node_ids_filter(node_id_filter)
+    if node_ids_list is not None and not node_ids_list:
+        return []
     # SQL-функция get_node_ping_status была обновлена и теперь возвращает check_success
-    sql_function_call = "SELECT * FROM get_node_ping_status(%(node_id_param)s);"
-    params = {'node_id_param': node_id_filter}
-    logger.debug(f"Репозиторий: Вызов SQL-функции get_node_ping_status с node_id_filter={node_id_filter}")
+    sql_function_call = "SELECT * FROM get_node_ping_status(%(node_ids_param)s::INTEGER[]);"
+    params = {'node_ids_param': node_ids_list}
+    logger.debug(f"Репозиторий: Вызов SQL-функции get_node_ping_status с node_ids={node_ids_list}")
     try:
         cursor.execute(sql_function_call, params)
         ping_status_list = cursor.fetchall()
@@ -240,6 +268,35 @@ def fetch_node_ping_status(cursor: psycopg2.extensions.cursor, node_id_filter: O
         logger.error(f"Репозиторий: Ошибка БД при вызове get_node_ping_status: {e}", exc_info=True)
         raise
 
+def fetch_node_primary_status(cursor: psycopg2.extensions.cursor,
+                              node_id_filter: Optional[Union[int, Iterable[int]]] = None) -> List[Dict[str, Any]]:
+    """
+    Вызывает SQL-функцию get_node_primary_status: результат задания, определяющего статус узла
+    по политике его типа (свойства status_methods и status_combine), для всех узлов одним запросом.
+
+    Args:
+        cursor: Активный курсор базы данных.
+        node_id_filter (int | Iterable[int], optional): ID узла или набор ID узлов для фильтрации.
+                                                        Если None, для всех узлов.
+
+    Returns:
+        Список словарей: поля get_node_ping_status и status_method, status_combine, status_assignments.
+    """
+    node_ids_list = _normalize_node_ids_filter(node_id_filter)
+    if node_ids_list is not None and not node_ids_list:
+        return []
+    sql_function_call = "SELECT * FROM get_node_primary_status(%(node_ids_param)s::INTEGER[]);"
+    params = {'node_ids_param': node_ids_list}
+    logger.debug(f"Репозиторий: Вызов SQL-функции get_node_primary_status с node_ids={node_ids_list}")
+    try:
+        cursor.execute(sql_function_call, params)
+        primary_status_list = cursor.fetchall()
+        logger.info(f"Репозиторий: fetch_node_primary_status вернула {len(primary_status_list)} записей.")
+        return primary_status_list
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при вызове get_node_primary_status: {e}", exc_info=True)
+        raise
+
 # =================================================================================
 # CRUD операции для Узлов (Nodes) - остаются в основном без изменений
 # =================================================================================
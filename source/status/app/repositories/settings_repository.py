@@ -0,0 +1,47 @@
+# status/app/repositories/settings_repository.py
+"""
+settings_repository.py — Чтение и запись глобальных настроек приложения (таблица settings).
+Версия 5.0.7: Создан для подсистемы хранения истории (сроки хранения, состояние агрегации).
+"""
+import logging
+import psycopg2 # Для типизации курсора и обработки ошибок psycopg2.Error
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# ================================
+# Получить значения настроек
+# ================================
+def get_settings(cursor: psycopg2.extensions.cursor, keys: Iterable[str]) -> Dict[str, str]:
+    """
+    Получить значения настроек по списку ключей.
+    Возвращает словарь {key: value}; отсутствующие в таблице ключи в словарь не попадают.
+    """
+    keys_list = list(keys)
+    if not keys_list:
+        return {}
+    sql = "SELECT key, value FROM settings WHERE key = ANY(%s);"
+    logger.debug(f"Репозиторий: Запрос настроек {keys_list}")
+    try:
+        cursor.execute(sql, (keys_list,))
+        return {row['key']: row['value'] for row in cursor.fetchall()}
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при получении настроек {keys_list}: {e}", exc_info=True)
+        raise
+
+# ================================
+# Создать или обновить настройку
+# ================================
+def set_setting(cursor: psycopg2.extensions.cursor, key: str, value: str, description: Optional[str] = None) -> None:
+    """ Создать или обновить настройку. Описание обновляется, только если передано. """
+    sql = """
+        INSERT INTO settings (key, value, description) VALUES (%s, %s, %s)
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value,
+            description = COALESCE(EXCLUDED.description, settings.description);
+    """
+    logger.debug(f"Репозиторий: Установка настройки '{key}' = '{value}'")
+    try:
+        cursor.execute(sql, (key, value, description))
+    except psycopg2.Error as e:
+        logger.error(f"Репозиторий: Ошибка БД при установке настройки '{key}': {e}", exc_info=True)
+        raise
@@ -0,0 +1,64 @@
+# status/app/repositories/text_search.py
+"""
+Условия текстового поиска для репозиториев (узлы, задания, журнал событий).
+Версия 5.0.22: Поиск выбирает путь, который обслуживается индексами:
+              - подстрока (ILIKE '%...%') по именам, IP, описаниям - триграммные
+                GIN-индексы pg_trgm (002_create_indexes.sql, если расширение доступно);
+                символы шаблона LIKE в тексте поиска экранируются;
+              - слова в сообщениях событий - полнотекстовый поиск по столбцу
+                system_events.message_tsv (конфигурация 'russian', GIN-индекс)
+                с поиском по началу слова (to_tsquery 'слово:*').
+              Текст, не похожий на слова (IP, имена файлов, коды с '_', '.', '/'),
+              ищется подстрокой - по триграммному индексу сообщения.
+"""
+import re
+from typing import Any, Dict, List, Sequence
+
+FULL_TEXT_CONFIG = 'russian'
+# Короче - триграммный индекс не помогает (нужно >= 3 символов), а префикс в tsquery слишком широк
+MIN_INDEXED_TERM_LENGTH = 3
+
+_WORD_QUERY_PATTERN = re.compile(r'^[^\W_]+(?:[\s-]+[^\W_]+)*$') # Только слова через пробел/дефис
+_WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def escape_like_pattern(search_text: str) -> str:
+    """ Экранирует спецсимволы LIKE (\\, %, _), чтобы текст искался буквально. """
+    return search_text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def substring_search_clause(columns: Sequence[str], search_text: str, params: Dict[str, Any], param_name: str) -> str:
+    """
+    Условие "подстрока в любом из столбцов": (col ILIKE %(p)s OR ...).
+    Параметр шаблона добавляется в params. При наличии pg_trgm каждое ILIKE обслуживается
+    триграммным GIN-индексом столбца (BitmapOr), для текста от MIN_INDEXED_TERM_LENGTH символов.
+    """
+    params[param_name] = f"%{escape_like_pattern(search_text)}%"
+    return "(" + " OR ".join(f"{column} ILIKE %({param_name})s" for column in columns) + ")"
+
+
+def build_prefix_tsquery(search_text: str) -> str:
+    """
+    Текст запроса для to_tsquery: слова через '&', каждое с поиском по началу (':*').
+    Пустая строка - текст не подходит для полнотекстового поиска (не слова или слишком короткие).
+    """
+    search_text = search_text.strip()
+    if not _WORD_QUERY_PATTERN.match(search_text):
+        return ''
+    words: List[str] = _WORD_PATTERN.findall(search_text.lower())
+    if not words or any(len(word) < MIN_INDEXED_TERM_LENGTH for word in words):
+        return ''
+    return ' & '.join(f"{word}:*" for word in words) # Слова состоят только из букв/цифр - синтаксис tsquery безопасен
+
+
+def message_search_clause(search_text: str, params: Dict[str, Any], param_name: str,
+                          tsvector_column: str = 'message_tsv', text_column: str = 'message') -> str:
+    """
+    Условие поиска по сообщению события: полнотекстовое по tsvector_column, если текст - слова,
+    иначе подстрока по text_column (триграммный индекс).
+    """
+    tsquery_text = build_prefix_tsquery(search_text)
+    if tsquery_text:
+        params[param_name] = tsquery_text
+        return f"{tsvector_column} @@ to_tsquery('{FULL_TEXT_CONFIG}', %({param_name})s)"
+    return substring_search_clause((text_column,), search_text, params, param_name)
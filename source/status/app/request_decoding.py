@@ -0,0 +1,111 @@
+# status/app/request_decoding.py
+"""
+Прием сжатых тел запросов (Content-Encoding: gzip / zstd).
+Версия 5.0.17: Для эндпоинтов приема результатов проверок (COMPRESSED_BODY_ENDPOINTS)
+              тело с Content-Encoding распаковывается потоково: request.stream
+              подменяется распаковывающим потоком до первого обращения маршрута к телу,
+              поэтому /checks/bulk разбирает распакованный JSON по мере чтения, а
+              request.get_json() в /checks работает без изменений.
+              Распакованный объем ограничен REQUEST_MAX_DECOMPRESSED_BYTES (защита от
+              "zip-бомб") - при превышении 413. Неизвестная кодировка или сжатое тело
+              для других эндпоинтов - 415, поврежденные сжатые данные - 400.
+              zstd требует модуля 'zstandard' (необязательная зависимость).
+"""
+import gzip
+import io
+import logging
+import os
+import zlib
+from typing import Any, BinaryIO
+
+from flask import Flask, request
+from werkzeug.wsgi import get_input_stream
+
+from .errors import ApiBadRequest, ApiPayloadTooLarge, ApiUnsupportedMediaType
+
+logger = logging.getLogger(__name__)
+
+try:
+    import zstandard
+    HAS_ZSTANDARD = True
+except ImportError:
+    HAS_ZSTANDARD = False
+    logger.info("Модуль 'zstandard' не найден. Тела запросов с Content-Encoding: zstd приниматься не будут.")
+
+REQUEST_MAX_DECOMPRESSED_BYTES = int(os.getenv('REQUEST_MAX_DECOMPRESSED_BYTES', 64 * 1024 * 1024))
+COMPRESSED_BODY_ENDPOINTS = frozenset(('checks.add_check_v1', 'checks.add_checks_bulk_v1'))
+_IDENTITY_ENCODINGS = frozenset(('', 'identity'))
+
+
+def supported_encodings() -> tuple:
+    """ Кодировки тела запроса, которые принимает сервер. """
+    return ('gzip', 'zstd') if HAS_ZSTANDARD else ('gzip',)
+
+
+class _DecodedBodyStream(io.RawIOBase):
+    """
+    Распаковывающий поток поверх wsgi.input. Считает распакованные байты и прерывает
+    чтение сверх max_bytes; ошибки формата сжатия превращает в ApiBadRequest.
+    """
+    def __init__(self, decoder: Any, encoding: str, max_bytes: int):
+        super().__init__()
+        self._decoder = decoder
+        self._encoding = encoding
+        self._max_bytes = max_bytes
+        self.bytes_decoded = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        # Не больше, чем осталось до лимита (+1 байт, чтобы обнаружить превышение)
+        read_size = min(len(buffer), self._max_bytes + 1 - self.bytes_decoded)
+        try:
+            chunk = self._decoder.read(read_size)
+        except (OSError, EOFError, zlib.error) as decode_err:
+            raise ApiBadRequest(f"Не удалось распаковать тело запроса ({self._encoding}): {decode_err}")
+        except Exception as decode_err:
+            if HAS_ZSTANDARD and isinstance(decode_err, zstandard.ZstdError):
+                raise ApiBadRequest(f"Не удалось распаковать тело запроса ({self._encoding}): {decode_err}")
+            raise
+        self.bytes_decoded += len(chunk)
+        if self.bytes_decoded > self._max_bytes:
+            raise ApiPayloadTooLarge(f"Распакованное тело запроса превышает {self._max_bytes} байт.")
+        buffer[:len(chunk)] = chunk
+        return len(chunk)
+
+
+def open_decoded_stream(stream: BinaryIO, encoding: str, max_bytes: int) -> BinaryIO:
+    """
+    Возвращает поток распакованного тела для Content-Encoding encoding.
+    Raises:
+        ApiUnsupportedMediaType: Кодировка не поддерживается.
+    """
+    if encoding == 'gzip':
+        decoder: Any = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif encoding == 'zstd' and HAS_ZSTANDARD:
+        decoder = zstandard.ZstdDecompressor().stream_reader(stream, read_across_frames=True)
+    else:
+        raise ApiUnsupportedMediaType(f"Content-Encoding '{encoding}' не поддерживается. "
+                                      f"Допустимые значения: {', '.join(supported_encodings())}.")
+    return io.BufferedReader(_DecodedBodyStream(decoder, encoding, max_bytes))
+
+
+def init_request_decoding(app: Flask) -> None:
+    """ Подключает распаковку сжатых тел запросов для эндпоинтов приема результатов. """
+    @app.before_request
+    def decode_compressed_request_body():
+        encoding = request.headers.get('Content-Encoding', '').strip().lower()
+        if encoding in _IDENTITY_ENCODINGS:
+            return None
+        if request.endpoint not in COMPRESSED_BODY_ENDPOINTS:
+            raise ApiUnsupportedMediaType(f"Эндпоинт не принимает сжатое тело запроса (Content-Encoding: {encoding}).")
+        environ = request.environ
+        # Сжатое тело читается в пределах Content-Length исходного запроса
+        environ['wsgi.input'] = open_decoded_stream(get_input_stream(environ), encoding, REQUEST_MAX_DECOMPRESSED_BYTES)
+        # Длина распакованного тела заранее неизвестна: тело читается до конца потока
+        environ.pop('CONTENT_LENGTH', None)
+        environ.pop('HTTP_CONTENT_ENCODING', None)
+        environ['wsgi.input_terminated'] = True
+        logger.debug(f"Тело запроса {request.path} распаковывается потоково ({encoding}).")
+        return None
@@ -1,9 +1,22 @@
 ﻿# status/app/routes/__init__.py
 import logging
-from flask import Flask
+from flask import Flask, Response, request
 
 logger = logging.getLogger(__name__)
 
+def invalidate_dashboard_on_write(response: Response) -> Response:
+    """
+    Обработчик after_request для Blueprints справочников (узлы, подразделения, типы, свойства, задания):
+    после успешного изменения сбрасывает общий снимок дашборда (services.dashboard_cache).
+    Сброс выполняется после фиксации транзакции запроса, иначе снимок мог бы
+    перестроиться по данным до изменения.
+    """
+    if request.method in ('POST', 'PUT', 'PATCH', 'DELETE') and response.status_code < 400:
+        from ..services import dashboard_cache
+        from ..db_request import call_after_commit
+        call_after_commit(dashboard_cache.invalidate_dashboard_cache)
+    return response
+
 def init_routes(app: Flask):
     """
     Инициализирует и регистрирует все Blueprints (маршруты) приложения Flask.
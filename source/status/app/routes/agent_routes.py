@@ -2,12 +2,16 @@
 """
 Маршруты API, предназначенные для взаимодействия с Hybrid-Agent и Конфигуратором.
 Версия для pipeline-архитектуры (v5.x).
+Версия 5.0.25: /objects/<id>/offline_config отдает сохраненную конфигурацию с ETag (хеш
+              содержимого) и отвечает 304 на совпавший If-None-Match. Конфигурация
+              генерируется заново только для объектов, отмеченных устаревшими.
 """
 import logging
 import psycopg2 # Для обработки ошибок psycopg2.Error
 import json     # Для работы с JSON (хотя psycopg2 обычно сам десериализует JSONB)
-from flask import Blueprint, request, jsonify, g # g для доступа к db_conn
-# from ..repositories import assignment_repository # Не используется напрямую, т.к. вызываются SQL-функции
+from flask import Blueprint, request, jsonify, g, Response # g для доступа к db_conn
+from ..repositories import assignment_repository # Оффлайн-конфигурации (хранимые версии)
+from ..db_request import commit_read_request
 # from ..db_connection import get_connection       # Соединение через g
 from ..errors import ApiBadRequest, ApiNotFound, ApiInternalError, ApiException # Кастомные исключения
 from ..auth_utils import api_key_required        # Декоратор для проверки API-ключа
@@ -93,16 +97,20 @@ def get_assignments_for_agent():
 @api_key_required(required_role='configurator') # Защита: только для ключей с ролью 'configurator'
 def get_offline_config(object_id: int):
     """
-    Генерирует и возвращает JSON-конфигурацию для оффлайн-режима Hybrid-Agent
-    для указанного `object_id`. Конфигурация извлекается SQL-функцией generate_offline_config,
-    которая теперь включает pipeline-задания и фильтрует по is_enabled=TRUE.
+    Возвращает JSON-конфигурацию для оффлайн-режима Hybrid-Agent для указанного `object_id`.
+    С v5.0.25 конфигурация хранится в offline_config_versions по хешу содержимого и
+    генерируется заново (SQL-функция generate_offline_config) только после изменения
+    заданий, узлов или подразделения объекта (отметка offline_config_dirty).
 
     Path Params:
         object_id (int, required): ID объекта (подразделения).
 
+    Headers:
+        If-None-Match (optional): ETag ранее полученной конфигурации - при совпадении 304 без тела.
+
     Returns:
         JSON: Объект конфигурации, содержащий метаданные и массив `assignments`,
-              где каждое задание имеет поле `pipeline`.
+              где каждое задание имеет поле `pipeline`. Заголовок ETag - хеш содержимого.
     """
     logger.info(f"API Agent (Pipeline): Запрос /objects/{object_id}/offline_config")
 
@@ -110,24 +118,34 @@ def get_offline_config(object_id: int):
         raise ApiBadRequest("Параметр 'object_id' (в пути) должен быть положительным целым числом.")
 
     try:
-        cursor = g.db_conn.cursor()
-        # SQL-функция generate_offline_config возвращает JSONB, который psycopg2 преобразует в Python dict/list
-        cursor.execute("SELECT generate_offline_config(%(obj_id)s) as config_json;", {'obj_id': object_id})
-        result_row = cursor.fetchone()
+        cursor = g.db_cursor # RealDictCursor: репозиторий читает столбцы по имени
+        config_version = assignment_repository.get_offline_config_version(cursor, object_id)
 
-        if not result_row or result_row.get('config_json') is None:
-            logger.error(f"SQL-функция generate_offline_config не вернула результат для object_id={object_id}.")
+        if not config_version:
+            logger.error(f"SQL-функция get_offline_config_version не вернула результат для object_id={object_id}.")
             raise ApiNotFound(f"Конфигурация для object_id={object_id} не найдена или не может быть сгенерирована (SQL-функция не вернула данные).")
 
-        config_data = result_row['config_json'] # Это уже Python dict/list
-
-        # Проверка на наличие поля 'error' внутри JSON ответа SQL-функции
-        if isinstance(config_data, dict) and config_data.get('error'):
-            error_message_from_sql = config_data.get('message', config_data.get('error'))
+        # Ошибка генерации ('error' в ответе SQL-функции)
+        if config_version.get('error'):
+            error_message_from_sql = config_version.get('message', config_version.get('error'))
             logger.warning(f"Ошибка от SQL-функции generate_offline_config для object_id={object_id}: {error_message_from_sql}")
             # Чаще всего это будет "Subdivision not found" или "transport_system_code is missing"
             raise ApiNotFound(f"Не удалось сгенерировать конфигурацию для object_id={object_id}: {error_message_from_sql}")
 
+        if config_version.get('regenerated'):
+            commit_read_request() # Новая версия и снятая отметка сохраняются для следующих запросов
+        etag = config_version['content_hash']
+        if request.if_none_match.contains_weak(etag):
+            logger.info(f"API Agent (Pipeline): offline_config для object_id={object_id} не изменился (версия {config_version['version_tag']}), 304.")
+            not_modified_response = Response(status=304)
+            not_modified_response.set_etag(etag)
+            return not_modified_response
+
+        config_data = assignment_repository.fetch_offline_config(cursor, config_version['version_tag']) # Это уже Python dict
+        if config_data is None:
+            logger.error(f"Сохраненная конфигурация {config_version['version_tag']} не найдена для object_id={object_id}.")
+            raise ApiInternalError("Сохраненная конфигурация не найдена.")
+
         # Обработка поля 'pipeline' внутри каждого задания в массиве 'assignments'
         # (на случай, если SQL-функция вернула pipeline как JSON-строку внутри своего JSON-ответа)
         if isinstance(config_data, dict) and 'assignments' in config_data and isinstance(config_data['assignments'], list):
@@ -149,13 +167,17 @@ def get_offline_config(object_id: int):
                     # Удаляем устаревшие поля, если они вдруг есть
                     assignment_item.pop('parameters', None)
                     assignment_item.pop('success_criteria', None)
-        else: # Если структура ответа от SQL-функции неожиданная
+        else: # Если структура сохраненной конфигурации неожиданная
             logger.error(f"Некорректная структура JSON от generate_offline_config для object_id={object_id}. Ожидался объект с массивом 'assignments'. Получено: {type(config_data)}")
             raise ApiInternalError("Сервер вернул некорректную структуру конфигурации от SQL-функции.")
 
 
-        logger.info(f"API Agent (Pipeline): Успешно сгенерирован offline_config для object_id={object_id}")
-        return jsonify(config_data)
+        logger.info(f"API Agent (Pipeline): offline_config для object_id={object_id} отдан (версия {config_version['version_tag']}, "
+                    f"{'сгенерирована' if config_version.get('regenerated') else 'сохраненная'}).")
+        response = jsonify(config_data)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache' # Клиент перепроверяет ETag при каждом запросе
+        return response
 
     except psycopg2.Error as db_err:
         logger.error(f"Ошибка БД при генерации оффлайн конфигурации для object_id={object_id}: {db_err}", exc_info=True)
@@ -3,11 +3,15 @@
 Маршруты API для управления API-ключами.
 Позволяют создавать, получать список, обновлять и удалять API-ключи.
 Доступ к этим маршрутам требует аутентификации пользователя (UI).
+Версия 5.0.4: Ключи создаются в формате с публичным префиксом (auth_utils.generate_api_key).
+Версия 5.0.5: Изменение и удаление ключа сбрасывают кеш проверенных ключей (auth_utils).
+              Сброс выполняется после фиксации транзакции запроса (call_after_commit): иначе
+              параллельный запрос агента успел бы вернуть в кеш старую строку ключа.
 """
 import logging
 import psycopg2
-import secrets
-import hashlib # Для хеширования ключей
+from datetime import datetime
+from typing import Dict, Optional
 from flask import Blueprint, request, jsonify, g
 from flask_login import login_required # Защита маршрутов, требующих входа пользователя
 from ..repositories import api_key_repository, subdivision_repository # Репозитории для работы с БД
@@ -19,6 +23,8 @@ from ..errors import (
     ApiValidationFailure,
     ApiException # Базовое исключение API
 )
+from ..auth_utils import generate_api_key, invalidate_api_key_cache # Генерация ключа и сброс кеша проверенных ключей
+from ..db_request import call_after_commit # Сброс кеша - после фиксации изменения ключа
 # from ..auth_utils import api_key_required # Этот декоратор здесь не нужен, т.к. маршруты защищены login_required
 
 logger = logging.getLogger(__name__)
@@ -81,9 +87,8 @@ def create_api_key_route():
     # --- Конец валидации ---
 
     try:
-        # Генерируем безопасный API-ключ и его SHA-256 хеш для хранения
-        api_key_value = secrets.token_urlsafe(32) # Генерирует достаточно длинный и случайный ключ
-        key_hash_to_store = hashlib.sha256(api_key_value.encode('utf-8')).hexdigest()
+        # Генерируем API-ключ с публичным префиксом и хеш Werkzeug его секретной части
+        api_key_value, key_prefix_to_store, key_hash_to_store = generate_api_key()
 
         cursor = g.db_conn.cursor()
         # Вызываем функцию репозитория для создания ключа в БД
@@ -92,14 +97,14 @@ def create_api_key_route():
             key_hash=key_hash_to_store,
             description=description.strip(), # Убираем лишние пробелы
             role=role.lower(), # Храним роль в нижнем регистре
-            object_id=object_id
+            object_id=object_id,
+            key_prefix=key_prefix_to_store
         )
 
         if new_key_id is None: # Если репозиторий вернул None, значит создание не удалось
             logger.error("Создание API-ключа не удалось (репозиторий вернул None).")
             raise ApiInternalError("Не удалось создать API-ключ на сервере.")
 
-        # g.db_conn.commit() # Коммит не нужен, если autocommit=True для соединения
 
         # Формируем ответ, включая сам сгенерированный ключ (только при создании!)
         response_data = {
@@ -284,8 +289,8 @@ def update_api_key_route(key_id: int):
 
         if updated_key_data is None: # Репозиторий возвращает None, если ключ не найден
             raise ApiNotFound(f"API-ключ с ID={key_id} не найден для обновления.")
+        call_after_commit(lambda: invalidate_api_key_cache(key_id)) # Роль/object_id/is_active могли измениться
 
-        # g.db_conn.commit() # Если не autocommit
 
         # Форматируем даты для ответа
         if updated_key_data.get('created_at') and isinstance(updated_key_data['created_at'], datetime):
@@ -326,8 +331,8 @@ def delete_api_key_route(key_id: int):
 
         if not deleted_successfully: # Репозиторий возвращает True/False
             raise ApiNotFound(f"API-ключ с ID={key_id} не найден для удаления.")
+        call_after_commit(lambda: invalidate_api_key_cache(key_id))
 
-        # g.db_conn.commit() # Если не autocommit
 
         logger.info(f"API Keys Route: Успешно удален API-ключ ID: {key_id}")
         return '', 204 # HTTP 204 No Content, стандартный ответ для успешного DELETE
@@ -2,6 +2,7 @@
 """
 Маршруты API для управления Заданиями (Assignments) в pipeline-архитектуре.
 Версия 5.0.1: Использует репозиторий, принимающий курсор, управляет транзакциями.
+Версия 5.0.13: commit/rollback убраны - транзакцией запроса управляет db_request.
 """
 import logging
 import psycopg2 # Для обработки psycopg2.Error
@@ -12,6 +13,7 @@ from typing import Dict, Any, List, Optional
 # Импортируем репозитории
 from ..repositories import assignment_repository, node_repository, method_repository
 # Импортируем кастомные исключения API
+from . import invalidate_dashboard_on_write
 from ..errors import (
     ApiBadRequest, ApiNotFound, ApiConflict,
     ApiInternalError, ApiValidationFailure, ApiException
@@ -22,6 +24,7 @@ from flask_login import login_required
 logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1/assignments' будет добавлен при регистрации.
 bp = Blueprint('assignments', __name__) # <<< ЭТО ТО, ЧТО ОТСУТСТВОВАЛО
+bp.after_request(invalidate_dashboard_on_write) # Изменения влияют на сводку - сброс снимка дашборда
 
 # --- Маршрут для получения списка всех заданий (с пагинацией и фильтрами) ---
 @bp.route('/all', methods=['GET'])
@@ -94,7 +97,6 @@ def api_get_all_assignments_paginated():
             include_child_subdivisions=include_child_subdivisions,
             include_nested_types=include_nested_types
         )
-        # g.db_conn.commit() # Не нужен для SELECT
 
         logger.info(f"API Assignment Route: Успешно получен список всех заданий. "
                     f"На странице: {len(assignments_list)}, Всего: {total_assignments}")
@@ -174,7 +176,6 @@ def api_create_or_assign_assignments():
             criteria_target=criteria_for_nodes if not target_node_ids_list else None, # criteria, если нет node_ids
             node_ids_target=target_node_ids_list
         )
-        g.db_conn.commit() # Коммитим транзакцию после всех операций
 
         logger.info(f"API Assignment Route: Массовое создание завершено. Создано новых заданий: {num_created}.")
         return jsonify({
@@ -185,16 +186,13 @@ def api_create_or_assign_assignments():
         }), 201
 
     except ValueError as val_err_repo: # Ошибки валидации из репозитория
-        g.db_conn.rollback()
         logger.warning(f"Ошибка ValueError из репозитория при массовом создании заданий: {val_err_repo}")
         raise ApiValidationFailure(str(val_err_repo))
     except psycopg2.Error as db_err:
-        g.db_conn.rollback()
         logger.error(f"Ошибка БД при массовом создании заданий: {db_err}", exc_info=True)
         raise ApiInternalError("Ошибка базы данных при массовом создании заданий.")
     except ApiException: raise
     except Exception as e:
-        g.db_conn.rollback()
         logger.exception("Неожиданная ошибка сервера при массовом создании заданий.")
         raise ApiInternalError(f"Внутренняя ошибка сервера: {type(e).__name__} - {e}")
 
@@ -211,7 +209,6 @@ def api_get_assignment(assignment_id: int):
         assignment_data = assignment_repository.get_assignment_by_id(cursor, assignment_id)
         if not assignment_data:
             raise ApiNotFound(f"Задание с ID={assignment_id} не найдено.")
-        # g.db_conn.commit() # Не нужен для SELECT
         return jsonify(assignment_data), 200
     except psycopg2.Error as db_err: logger.error(f"Ошибка БД (GET assign_id={assignment_id}): {db_err}", exc_info=True); raise ApiInternalError("Ошибка БД.")
     except ApiException: raise
@@ -238,12 +235,11 @@ def api_update_assignment(assignment_id: int):
         updated_assignment = assignment_repository.update_assignment(cursor, assignment_id, update_payload)
         if not updated_assignment:
             raise ApiNotFound(f"Задание с ID={assignment_id} не найдено для обновления.")
-        g.db_conn.commit()
         return jsonify(updated_assignment), 200
-    except ValueError as val_err_repo_upd: g.db_conn.rollback(); raise ApiValidationFailure(str(val_err_repo_upd))
-    except psycopg2.Error as db_err_upd: g.db_conn.rollback(); logger.error(f"Ошибка БД (PUT assign_id={assignment_id}): {db_err_upd}", exc_info=True); raise ApiInternalError("Ошибка БД.")
-    except ApiException: g.db_conn.rollback(); raise
-    except Exception as e_upd: g.db_conn.rollback(); logger.exception(f"Ошибка (PUT assign_id={assignment_id})"); raise ApiInternalError(f"{type(e_upd).__name__}")
+    except ValueError as val_err_repo_upd: raise ApiValidationFailure(str(val_err_repo_upd))
+    except psycopg2.Error as db_err_upd: logger.error(f"Ошибка БД (PUT assign_id={assignment_id}): {db_err_upd}", exc_info=True); raise ApiInternalError("Ошибка БД.")
+    except ApiException: raise
+    except Exception as e_upd: logger.exception(f"Ошибка (PUT assign_id={assignment_id})"); raise ApiInternalError(f"{type(e_upd).__name__}")
 
 
 @bp.route('/<int:assignment_id>', methods=['DELETE'])
@@ -257,16 +253,14 @@ def api_delete_assignment(assignment_id: int):
         deleted_successfully = assignment_repository.delete_assignment(cursor, assignment_id)
         if not deleted_successfully:
             raise ApiNotFound(f"Задание с ID={assignment_id} не найдено для удаления.")
-        g.db_conn.commit()
         return '', 204 # No Content
     except psycopg2.Error as db_err_del:
-        g.db_conn.rollback()
         # Обработка ForeignKeyViolation (если на задание ссылаются node_checks и ON DELETE RESTRICT)
         if db_err_del.pgcode == '23503':
             raise ApiConflict(f"Невозможно удалить задание ID={assignment_id}, так как на него есть ссылки в истории проверок.")
         logger.error(f"Ошибка БД (DELETE assign_id={assignment_id}): {db_err_del}", exc_info=True)
         raise ApiInternalError("Ошибка БД при удалении задания.")
-    except ApiException: g.db_conn.rollback(); raise
-    except Exception as e_del: g.db_conn.rollback(); logger.exception(f"Ошибка (DELETE assign_id={assignment_id})"); raise ApiInternalError(f"{type(e_del).__name__}")
+    except ApiException: raise
+    except Exception as e_del: logger.exception(f"Ошибка (DELETE assign_id={assignment_id})"); raise ApiInternalError(f"{type(e_del).__name__}")
 
 # --- Конец файла ---
\ No newline at end of file
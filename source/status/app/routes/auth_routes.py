@@ -2,6 +2,7 @@
 """
 Маршруты для аутентификации пользователей веб-интерфейса (UI).
 Версия 5.0.2: Добавлен импорт Optional для type hints.
+Версия 5.0.11: При входе кеш пользователя сбрасывается (user_loader получит актуальные данные).
 """
 import logging
 from flask import Blueprint, request, render_template, redirect, url_for, flash, g, current_app
@@ -9,6 +10,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from typing import Optional # <<< ДОБАВЛЕН ИМПОРТ Optional
 from ..models.user import User
 from ..db_connection import psycopg2
+from ..auth_utils import invalidate_user_cache
 
 from urllib.parse import urlparse as urllib_urlparse
 from urllib.parse import urljoin as urllib_urljoin
@@ -91,6 +93,7 @@ def login():
             flash('Непредвиденная ошибка.', 'danger')
 
         if user_from_db:
+            invalidate_user_cache(user_from_db.id)
             login_user(user_from_db)
             logger.info(f"Пользователь '{username}' (ID: {user_from_db.id}) успешно вошел.")
             next_page_url = request.args.get('next')
@@ -3,26 +3,63 @@
 Маршруты API для работы с результатами проверок (Checks).
 Версия 5.0.2: Адаптировано для обработки поля 'check_success' из запроса
 и передачи его в процедуру записи. Включает логику для pipeline-архитектуры.
+Версия 5.0.3: Пакетная загрузка (/checks/bulk) валидирует весь пакет и записывает
+его одним set-based вызовом record_check_results_bulk вместо CALL на каждый элемент.
+Версия 5.0.6: Для SocketIO статус пересчитывается только для затронутых узлов.
+             История проверок запрашивается за интервал (?from=&to=, по умолчанию
+             последние CHECK_HISTORY_LOOKBACK_DAYS суток) - отсечение секций node_checks.
+Версия 5.0.7: Для интервалов старше срока хранения результатов история дополняется
+             агрегатами node_check_rollups (элементы с is_rollup=True).
+Версия 5.0.8: Статусы затронутых узлов вычисляются один раз и используются и для
+             SocketIO, и для обновления общего снимка дашборда (services.dashboard_cache).
+Версия 5.0.9: Поштучные 'node_status_update' заменены пакетной рассылкой изменений
+             снимка (services.status_push, событие 'node_status_batch').
+Версия 5.0.13: Запись выполняется в транзакции запроса (db_request), фиксация - одна на запрос.
+              Пакет /checks/bulk пишется одним вызовом в точке сохранения; при ошибке БД
+              элементы записываются по одному, каждый в своей точке сохранения, и ошибочный
+              элемент не отменяет запись остальных. Снимок дашборда обновляется после фиксации.
+Версия 5.0.14: В режиме CHECK_INGEST_MODE=async провалидированные результаты помещаются
+              в очередь на диске (services.check_ingest) и в БД записываются фоновой задачей:
+              ответ 202 Accepted (207 при ошибках валидации части элементов), при заполненной
+              очереди - 503 с Retry-After.
+Версия 5.0.15: Идемпотентный прием: у результата есть ключ идемпотентности (поле
+              'idempotency_key'/'IdempotencyKey' или вычисленный из задания, времени агента
+              и исполнителя). Повторно присланные результаты не записываются: /checks отвечает
+              200 с 'duplicate': true, /checks/bulk - 207 со списком 'duplicate_items'
+              (статус 'success', если ошибок нет).
+Версия 5.0.16: /checks/bulk разбирает тело потоково (services.bulk_payload) и валидирует/
+              записывает элементы порциями по мере чтения; размер тела и количество
+              элементов ограничены (413).
+Версия 5.0.18: История проверок и агрегатов отдается без поэлементного isoformat() -
+              даты сериализует JSON-провайдер приложения (json_provider).
 """
 import logging
+import os
 import psycopg2 # Для обработки ошибок psycopg2.Error и типизации курсора
 import json     # Для работы с JSON
-from datetime import datetime, timezone # Для работы с датами и таймзонами
-from flask import Blueprint, request, jsonify, g, current_app # g для доступа к db_conn, current_app для SocketIO
-from typing import Optional, Any, Dict, List, Union # Для аннотаций типов
+from datetime import datetime, timezone, timedelta # Для работы с датами и таймзонами
+from flask import Blueprint, request, jsonify, g # g для доступа к db_conn
+from typing import Optional, Any, Dict, Iterator, List, Tuple, Union # Для аннотаций типов
 
 # Импортируем зависимости из текущего приложения
 from ..repositories import check_repository, node_repository, assignment_repository
-from ..services import node_service # Для обновления статуса узла через SocketIO
+from ..services import node_service # Пересчет статуса затронутых узлов
+from ..services import retention_service # Границы хранения истории (fallback на агрегаты)
+from ..services import dashboard_cache # Общий снимок статусов для /dashboard и /status_detailed
+from ..services import check_ingest # Пакетная запись результатов и асинхронная очередь приема
+from ..services import bulk_payload # Потоковый разбор тела /checks/bulk
 from ..errors import (
     ApiBadRequest,
     ApiNotFound,
     ApiInternalError,
     ApiValidationFailure,
+    ApiServiceUnavailable,
+    ApiPayloadTooLarge,
     ApiException
 )
 from ..db_connection import HAS_DATEUTIL # Флаг для проверки наличия python-dateutil
 from ..auth_utils import api_key_required # Декоратор для защиты API-эндпоинтов
+from ..db_request import call_after_commit, savepoint # Действия после фиксации; точки сохранения
 
 # Условный импорт dateutil для более гибкого парсинга дат
 if HAS_DATEUTIL:
@@ -33,6 +70,34 @@ logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1' будет добавлен при регистрации в app/routes/__init__.py
 bp = Blueprint('checks', __name__)
 
+# Глубина истории проверок по умолчанию (сутки), если интервал не задан в запросе.
+# 0 - без ограничения (будут просмотрены все секции node_checks).
+CHECK_HISTORY_LOOKBACK_DAYS = int(os.getenv('CHECK_HISTORY_LOOKBACK_DAYS', '31'))
+
+
+def _publish_touched_nodes(cursor, node_ids: set) -> None:
+    """
+    Пересчитывает статус только затронутых узлов (одним запросом) и обновляет ими
+    общий снимок дашборда. Реально изменившиеся узлы попадают в пакетную рассылку
+    SocketIO (services.status_push). Если снимок не построен, пересчет не выполняется.
+    Статусы вычисляются в транзакции запроса, а снимок обновляется только после ее фиксации.
+    Вызывающий выполняет пересчет в точке сохранения: ошибка БД при пересчете пропускает
+    обновление снимка, но не откатывает уже записанные результаты.
+    """
+    if not node_ids or not dashboard_cache.is_dashboard_snapshot_built():
+        return
+    processed_nodes = node_service.get_processed_node_status(cursor, node_ids)
+    call_after_commit(lambda: dashboard_cache.patch_dashboard_nodes(processed_nodes))
+
+def _enqueue_check_items(items: List[Dict[str, Any]], request_tag: Optional[str] = None) -> int:
+    """ Помещает результаты в очередь асинхронного приема. Возвращает глубину очереди; при переполнении - 503. """
+    try:
+        return check_ingest.enqueue_check_items(items, request_tag)
+    except check_ingest.IngestQueueFull as queue_full_err:
+        logger.warning(f"Прием результатов отклонен: {queue_full_err}")
+        raise ApiServiceUnavailable("Очередь приема результатов заполнена. Повторите отправку позже.",
+                                    retry_after=check_ingest.CHECK_INGEST_RETRY_AFTER_SECONDS)
+
 # --- Маршрут для приема ОДИНОЧНОГО результата проверки (агрегированного результата pipeline) ---
 @bp.route('/checks', methods=['POST'])
 @api_key_required(required_role=('agent', 'loader')) # Доступен для ключей с ролью 'agent' (Online) или 'loader' (Offline)
@@ -65,16 +130,11 @@ def add_check_v1():
     2. Вызывает хранимую процедуру `record_check_result_proc` (через `check_repository`) для записи в БД.
        Эта процедура записывает основной результат в `node_checks` (включая `is_available` и `check_success`)
        и детали в `node_check_details`.
-    3. При успешной записи, отправляет обновление статуса затронутого узла через SocketIO (если настроен).
+    3. При успешной записи обновляет статус затронутого узла в снимке дашборда (рассылка через SocketIO - пакетами).
 
     Returns:
         JSON-ответ со статусом операции (HTTP 201 при успехе).
     """
-    # Получаем объект SocketIO из расширений Flask (если он был инициализирован в app.py)
-    socketio = current_app.extensions.get('socketio')
-    if not socketio:
-         logger.error("SocketIO не инициализирован в приложении! Обновления статуса узла через WebSocket не будут отправлены.")
-
     logger.info("API Check Route (v5.0.2): Запрос POST /api/v1/checks (прием одиночного результата pipeline)")
     data_from_request = request.get_json() # Получаем JSON из тела запроса
     if not data_from_request: # Если тело пустое или не JSON
@@ -99,6 +159,7 @@ def add_check_v1():
             resolution_method_req = data_from_request.get('resolution_method')
             assignment_version_req = data_from_request.get('assignment_config_version')
             agent_version_req = data_from_request.get('agent_script_version')
+            idempotency_key_req = data_from_request.get('idempotency_key', data_from_request.get('IdempotencyKey'))
 
             # --- Валидация обязательных полей ---
             if assignment_id_raw is None:
@@ -162,6 +223,10 @@ def add_check_v1():
             else:
                  logger.debug("Поле 'Timestamp' (время на агенте) не предоставлено. Время проверки будет установлено сервером.")
 
+            # --- Ключ идемпотентности (повторная отправка того же результата не записывается) ---
+            idempotency_key = check_ingest.resolve_idempotency_key(
+                idempotency_key_req, assignment_id, check_timestamp_for_db, executor_object_id, executor_host)
+
             # --- Формирование detail_type и detail_data для записи в node_check_details ---
             # detail_type теперь будет стандартным для агрегированного результата pipeline.
             final_detail_type_for_db = "PIPELINE_AGGREGATED_RESULT"
@@ -177,7 +242,8 @@ def add_check_v1():
             
             # Определяем resolution_method: либо из запроса, либо из основного метода задания
             final_resolution_method_for_db = resolution_method_req
-            if not final_resolution_method_for_db: # Если агент не передал
+            # В асинхронном режиме запрос к БД не выполняется: метод остается пустым, если агент не передал
+            if not final_resolution_method_for_db and not check_ingest.is_async_ingest_enabled():
                 cursor_for_method = g.db_conn.cursor() # Используем существующее соединение
                 assignment_info = assignment_repository.get_assignment_by_id(cursor_for_method, assignment_id)
                 final_resolution_method_for_db = assignment_info.get('method_name', 'UNKNOWN_PIPELINE_TYPE') if assignment_info else 'UNKNOWN_PIPELINE_TYPE'
@@ -189,9 +255,23 @@ def add_check_v1():
             logger.warning(f"Ошибка валидации данных при приеме одиночного результата: {val_err_init}", exc_info=True)
             raise ApiValidationFailure(f"Ошибка обработки предоставленных данных: {val_err_init}")
 
+        # --- Асинхронный прием: результат в очередь, запись в БД - фоновой задачей ---
+        if check_ingest.is_async_ingest_enabled():
+            queue_depth = _enqueue_check_items([{
+                'item_index': 0, 'assignment_id': assignment_id, 'is_available': is_available,
+                'check_success': check_success_final, 'check_timestamp': check_timestamp_for_db,
+                'executor_object_id': executor_object_id, 'executor_host': executor_host,
+                'resolution_method': final_resolution_method_for_db, 'detail_type': final_detail_type_for_db,
+                'detail_data': final_detail_data_for_db,
+                'assignment_version': assignment_version_req, 'agent_version': agent_version_req,
+                'idempotency_key': idempotency_key,
+            }])
+            logger.info(f"Результат pipeline-задания ID {assignment_id} принят в очередь (глубина очереди: {queue_depth}).")
+            return jsonify({"status": "success", "message": f"Результат для задания {assignment_id} принят в очередь на запись."}), 202
+
         # --- Вызов репозитория для записи в БД (через хранимую процедуру) ---
-        current_db_cursor = g.db_conn.cursor() # Получаем курсор из контекста запроса
-        check_repository.record_check_result_proc(
+        current_db_cursor = g.db_cursor # RealDictCursor из контекста запроса
+        write_result = check_repository.record_check_result_proc(
             cursor=current_db_cursor, # Передаем курсор
             assignment_id=assignment_id,
             is_available=is_available,
@@ -203,39 +283,30 @@ def add_check_v1():
             detail_type=final_detail_type_for_db,
             detail_data=final_detail_data_for_db, # Это уже Python dict/list или None
             p_assignment_version=assignment_version_req,
-            p_agent_version=agent_version_req
+            p_agent_version=agent_version_req,
+            idempotency_key=idempotency_key
         )
-        # g.db_conn.commit() # Коммит не нужен здесь, если autocommit=True для соединения или управляется транзакцией на уровне запроса.
-                           # Если autocommit=False, коммит должен быть после всех операций в запросе.
+        # Транзакция фиксируется при успешном завершении запроса (db_request)
+        if write_result['duplicate']:
+            logger.info(f"Результат pipeline-задания ID {assignment_id} уже был записан ранее (повтор не записан).")
+            return jsonify({"status": "success", "duplicate": True, "node_check_id": write_result['node_check_id'],
+                            "message": f"Результат для задания {assignment_id} уже был принят ранее."}), 200
 
-        # --- Отправка обновления статуса узла через SocketIO (если настроен) ---
-        if socketio:
-            try:
-                # Используем тот же курсор, если транзакция еще не завершена
+        # --- Обновление снимка дашборда (изменения уходят в пакетную рассылку SocketIO) ---
+        try:
+            # Тот же курсор, но в точке сохранения: ошибка пересчета не откатывает записанный результат
+            with savepoint(current_db_cursor, 'publish_nodes'):
                 assignment_details_for_socket = assignment_repository.get_assignment_by_id(current_db_cursor, assignment_id)
                 if assignment_details_for_socket and assignment_details_for_socket.get('node_id'):
-                    node_id_for_socket_update = assignment_details_for_socket['node_id']
-                    # Получаем актуальный ОБРАБОТАННЫЙ статус узла (с учетом check_success)
-                    processed_nodes_for_socket = node_service.get_processed_node_status(current_db_cursor)
-                    updated_node_data_for_socket = next(
-                        (node for node in processed_nodes_for_socket if node.get('id') == node_id_for_socket_update), None
-                    )
-                    if updated_node_data_for_socket:
-                        socket_payload_ui_update = { 'node_id': node_id_for_socket_update, **updated_node_data_for_socket }
-                        socketio.emit('node_status_update', socket_payload_ui_update)
-                        logger.debug(f"SocketIO: Отправлено событие 'node_status_update' для узла ID {node_id_for_socket_update}.")
-                    else:
-                        logger.warning(f"SocketIO: Не найдены актуальные данные для узла ID {node_id_for_socket_update} после записи результата. Обновление не отправлено.")
+                    _publish_touched_nodes(current_db_cursor, {assignment_details_for_socket['node_id']})
                 else:
-                    logger.warning(f"SocketIO: Не удалось найти узел для задания ID {assignment_id}. Обновление статуса узла не отправлено.")
-            except Exception as socket_err_single_send:
-                logger.error(f"Ошибка при отправке обновления статуса узла через SocketIO (одиночный результат): {socket_err_single_send}", exc_info=True)
-        else:
-            logger.debug("SocketIO не настроен в приложении. Обновление статуса узла через WebSocket пропущено.")
-        # --- Конец блока SocketIO ---
+                    logger.warning(f"Не удалось найти узел для задания ID {assignment_id}. Обновление статуса узла не отправлено.")
+        except Exception as socket_err_single_send:
+            logger.error(f"Ошибка при обновлении статуса узла (одиночный результат): {socket_err_single_send}", exc_info=True)
 
         logger.info(f"Результат pipeline-задания ID {assignment_id} успешно принят и записан в БД.")
-        return jsonify({"status": "success", "message": f"Результат для задания {assignment_id} успешно принят."}), 201
+        return jsonify({"status": "success", "duplicate": False, "node_check_id": write_result['node_check_id'],
+                        "message": f"Результат для задания {assignment_id} успешно принят."}), 201
 
     # --- Обработка исключений на верхнем уровне функции ---
     except ValueError as repo_validation_error: # Ошибки валидации из репозитория или нашей логики
@@ -257,6 +328,167 @@ def add_check_v1():
         raise ApiInternalError(f"Внутренняя ошибка сервера: {type(generic_error_main).__name__} - {generic_error_main}")
 
 
+# --- Вспомогательные функции для ПАКЕТНОЙ загрузки ---
+def _parse_bulk_timestamp(check_timestamp_str: Optional[str], item_index: int) -> Optional[datetime]:
+    """
+    Разбирает 'Timestamp' элемента пакета в UTC datetime.
+    При ошибке парсинга возвращает None (время будет установлено сервером), как и add_check_v1.
+    """
+    if not check_timestamp_str:
+        return None
+    try:
+        if HAS_DATEUTIL:
+            parsed_dt = dateutil_parser.isoparse(check_timestamp_str)
+        else: # Fallback на datetime.fromisoformat
+            ts_clean = check_timestamp_str.replace('Z', '+00:00')
+            if '.' in ts_clean:
+                main_part, micro_tz_part = ts_clean.split('.', 1)
+                micro_part = micro_tz_part.split('+', 1)[0].split('-', 1)[0]
+                tz_suffix = micro_tz_part[len(micro_part):]
+                ts_clean = f"{main_part}.{micro_part[:6]}{tz_suffix}"
+            parsed_dt = datetime.fromisoformat(ts_clean)
+        if parsed_dt.tzinfo:
+            return parsed_dt.astimezone(timezone.utc)
+        return parsed_dt.replace(tzinfo=timezone.utc)
+    except Exception:
+        logger.warning(f"Ошибка парсинга Timestamp ('{check_timestamp_str}') для элемента {item_index} в bulk.")
+        return None
+
+def _validate_bulk_item(
+    item_raw: Any,
+    item_index: int,
+    agent_version_global: Optional[str],
+    assignment_version_global: Optional[str],
+    object_id_global: Optional[int]
+) -> Dict[str, Any]:
+    """
+    Валидирует один элемент массива 'results' и приводит его к формату,
+    ожидаемому check_repository.record_check_results_bulk.
+    Raises:
+        ValueError: Если элемент невалиден (текст ошибки попадает в 207-ответ).
+    """
+    if not isinstance(item_raw, dict):
+        raise ValueError("Элемент результата в массиве 'results' не является объектом JSON.")
+
+    # Поля из PowerShell объекта (PascalCase)
+    assignment_id_raw = item_raw.get('assignment_id')
+    is_available_raw = item_raw.get('IsAvailable')
+    check_success_raw = item_raw.get('CheckSuccess')
+    nested_details_obj = item_raw.get('Details')
+    error_message_from_ps = item_raw.get('ErrorMessage')
+
+    # Валидация обязательных полей для элемента
+    if assignment_id_raw is None: raise ValueError("Поле 'assignment_id' обязательно для каждой записи в пакете.")
+    if is_available_raw is None: raise ValueError("Поле 'IsAvailable' обязательно для каждой записи в пакете.")
+
+    try:
+        assignment_id = int(assignment_id_raw)
+        if assignment_id <= 0: raise ValueError
+    except (ValueError, TypeError):
+        raise ValueError("Поле 'assignment_id' должно быть положительным целым числом.")
+
+    is_available: bool
+    if isinstance(is_available_raw, str): is_available = is_available_raw.lower() in ['true', '1']
+    elif isinstance(is_available_raw, bool): is_available = is_available_raw
+    else: raise ValueError("Поле 'IsAvailable' элемента должно быть булевым.")
+
+    check_success: Optional[bool] = None
+    if check_success_raw is not None:
+        if isinstance(check_success_raw, str): check_success = check_success_raw.lower() in ['true', '1']
+        elif isinstance(check_success_raw, bool): check_success = check_success_raw
+        else: raise ValueError("Поле 'CheckSuccess' элемента должно быть булевым или null.")
+
+    # Формирование detail_data для элемента (аналогично add_check_v1)
+    detail_data: Optional[Dict[str, Any]] = None
+    if nested_details_obj and isinstance(nested_details_obj, dict):
+        detail_data = nested_details_obj
+        if error_message_from_ps:
+            detail_data['pipeline_overall_error_message_bulk'] = error_message_from_ps
+        if check_success is not None:
+            detail_data['pipeline_overall_check_success_bulk'] = check_success
+    elif error_message_from_ps:
+        detail_data = {'pipeline_overall_error_message_bulk': error_message_from_ps}
+        if check_success is not None:
+            detail_data['pipeline_overall_check_success_bulk'] = check_success
+
+    check_timestamp = _parse_bulk_timestamp(item_raw.get('Timestamp'), item_index)
+    # Ключ идемпотентности: от клиента или из (задание, время агента, объект) - повтор файла дает те же ключи
+    idempotency_key = check_ingest.resolve_idempotency_key(
+        item_raw.get('idempotency_key', item_raw.get('IdempotencyKey')), assignment_id, check_timestamp, object_id_global, None)
+
+    return {
+        'item_index': item_index,
+        'assignment_id': assignment_id,
+        'is_available': is_available,
+        'check_success': check_success,
+        'check_timestamp': check_timestamp,
+        'executor_object_id': object_id_global, # ID объекта из общей части .zrpu
+        'executor_host': None, # Обычно нет для bulk
+        'resolution_method': 'offline_loader_pipeline_bulk', # resolution_method для bulk стандартный
+        'detail_type': "PIPELINE_AGGREGATED_RESULT_BULK",
+        'detail_data': detail_data,
+        # Версии могут быть переопределены на уровне элемента, иначе используются глобальные
+        'assignment_version': item_raw.get('assignment_config_version', assignment_version_global),
+        'agent_version': item_raw.get('agent_script_version', agent_version_global),
+        'idempotency_key': idempotency_key,
+    }
+
+
+# --- Вспомогательные функции для потоковой пакетной загрузки ---
+_BULK_METADATA_FIELDS = ('agent_script_version', 'assignment_config_version', 'object_id')
+
+def _iter_raw_item_batches(
+    payload_events: Iterator[Tuple[str, Any, Any]],
+    bulk_metadata: Dict[str, Any],
+    batch_size: int
+) -> Iterator[List[Tuple[int, Any]]]:
+    """
+    Группирует элементы 'results' потока разбора в порции по batch_size, а общие поля
+    пакета (_BULK_METADATA_FIELDS) собирает в bulk_metadata. Поле, пришедшее после
+    уже отданной на запись порции, применить нельзя - это ошибка запроса.
+    """
+    pending_items: List[Tuple[int, Any]] = []
+    batches_yielded = 0
+    for event_kind, event_key, event_value in payload_events:
+        if event_kind == 'meta':
+            if event_key in _BULK_METADATA_FIELDS:
+                if batches_yielded:
+                    raise ApiBadRequest(f"Поле '{event_key}' должно располагаться в теле запроса перед массивом 'results' "
+                                        f"(пакет больше {batch_size} элементов записывается по мере чтения).")
+                bulk_metadata[event_key] = event_value
+            continue
+        pending_items.append((event_key, event_value))
+        if len(pending_items) >= batch_size:
+            yield pending_items
+            pending_items = []
+            batches_yielded += 1
+    if pending_items:
+        yield pending_items
+
+def _write_bulk_batch(cursor, valid_items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]], int]:
+    """
+    Записывает порцию провалидированных элементов в транзакции запроса.
+    Returns:
+        (записанные строки, повторы {index, assignment_id, node_check_id},
+         ошибки элементов для 207-ответа, количество ошибок БД среди них)
+    """
+    result_rows, db_errors = check_ingest.record_check_items(cursor, valid_items)
+    written_rows = [row for row in result_rows if not row.get('duplicate')]
+    duplicate_items = [{"index": row['item_index'], "assignment_id": row['assignment_id'], "node_check_id": row['node_check_id']}
+                       for row in result_rows if row.get('duplicate')]
+    item_errors = list(db_errors)
+    # Элементы, которые прошли валидацию, но не были записаны (задание не найдено)
+    handled_indexes = {row['item_index'] for row in result_rows} | {db_error['index'] for db_error in db_errors}
+    for valid_item in valid_items:
+        if valid_item['item_index'] not in handled_indexes:
+            item_errors.append({
+                "index": valid_item['item_index'],
+                "assignment_id": valid_item['assignment_id'],
+                "error": f"Задание с ID={valid_item['assignment_id']} не найдено."
+            })
+    return written_rows, duplicate_items, item_errors, len(db_errors)
+
+
 # --- Маршрут для ПАКЕТНОЙ загрузки результатов (агрегированных результатов pipeline) ---
 @bp.route('/checks/bulk', methods=['POST'])
 @api_key_required(required_role='loader') # Доступен только для ключей с ролью 'loader'
@@ -273,229 +505,210 @@ def add_checks_bulk_v1():
         - assignment_config_version (str, optional): Общая версия конфигурации для пакета.
         - object_id (int, optional): Общий ID объекта (подразделения) для пакета.
 
-    Обрабатывает каждую запись индивидуально. При ошибке БД вся транзакция (если не autocommit)
-    может быть отменена. Возвращает статус 207 Multi-Status в случае частичных ошибок
-    обработки отдельных записей (например, ошибок валидации элемента).
+    Обработка (v5.0.16) выполняется потоково: тело разбирается по мере чтения
+    (services.bulk_payload), элементы валидируются и записываются порциями по
+    CHECK_BULK_WRITE_BATCH_SIZE, поэтому память не растет с размером файла.
+    Размер тела (CHECK_BULK_MAX_BODY_BYTES) и количество элементов (CHECK_BULK_MAX_ITEMS)
+    ограничены - при превышении ответ 413. Общие поля пакета должны предшествовать
+    'results', если пакет больше одной порции.
+    1. Невалидные элементы порции попадают в список ошибок.
+    2. Валидные элементы порции записываются одним set-based вызовом
+       check_repository.record_check_results_bulk. Элементы с несуществующим
+       заданием возвращаются как ошибки. При ошибке БД (v5.0.13) элементы
+       записываются по одному в точках сохранения: ошибочные попадают в список
+       ошибок, остальные записываются. Весь пакет фиксируется одной транзакцией запроса.
+    Возвращает статус 207 Multi-Status в случае частичных ошибок.
+    В асинхронном режиме (v5.0.14) порции помещаются в очередь, запись выполняется фоновой
+    задачей, ответ - 202 Accepted ("processed" - количество принятых в очередь результатов).
+    Порции запроса становятся доступны фоновой записи только после разбора всего тела;
+    при ошибке разбора (400/413) или переполнении очереди (503) они удаляются из очереди.
+    Повторы по ключу идемпотентности (v5.0.15) не записываются и не считаются ошибками:
+    "duplicates" - их количество, "duplicate_items" - список {index, assignment_id, node_check_id},
+    ответ 207 со статусом "success" (если нет ошибок элементов).
     """
-    socketio = current_app.extensions.get('socketio')
-    logger.info("API Check Route (v5.0.2): Запрос POST /api/v1/checks/bulk (пакетная загрузка pipeline-результатов)")
-    payload_top_level_bulk = request.get_json()
-    transaction_had_db_errors_in_bulk = False # Флаг, если ошибка БД затронула всю транзакцию
-
-    # --- Валидация входных данных верхнего уровня ---
-    if not payload_top_level_bulk or not isinstance(payload_top_level_bulk, dict):
-        raise ApiBadRequest("Тело запроса для пакетной загрузки должно быть JSON-объектом.")
-    results_list_from_payload = payload_top_level_bulk.get('results')
-    # Получаем общие версии и object_id из верхнеуровневого payload
-    agent_version_global_from_payload = payload_top_level_bulk.get('agent_script_version')
-    assignment_version_global_from_payload = payload_top_level_bulk.get('assignment_config_version')
-    object_id_global_from_payload = payload_top_level_bulk.get('object_id') # Может быть None
-
-    if not isinstance(results_list_from_payload, list):
-        raise ApiBadRequest("Поле 'results' в теле запроса должно быть массивом (списком).")
-    if not results_list_from_payload: # Если массив пуст
-        logger.info("Получен пустой массив 'results' в запросе на пакетную загрузку.")
-        return jsonify({"status": "success", "processed": 0, "failed": 0, "message": "Пустой массив результатов был получен и обработан."}), 200
+    logger.info("API Check Route (v5.0.16): Запрос POST /api/v1/checks/bulk (потоковая пакетная загрузка pipeline-результатов)")
 
-    logger.info(f"Получено {len(results_list_from_payload)} записей для пакетной обработки. "
-                f"AgentVer(глоб): {agent_version_global_from_payload}, ConfigVer(глоб): {assignment_version_global_from_payload}, OID(глоб): {object_id_global_from_payload}")
+    # --- Ограничения, которые можно проверить до чтения тела ---
+    if request.content_length is not None and request.content_length > bulk_payload.CHECK_BULK_MAX_BODY_BYTES:
+        raise ApiPayloadTooLarge(f"Размер тела запроса ({request.content_length} байт) превышает "
+                                 f"{bulk_payload.CHECK_BULK_MAX_BODY_BYTES} байт.")
+    if not request.is_json:
+        raise ApiBadRequest("Тело запроса для пакетной загрузки должно быть JSON-объектом (Content-Type: application/json).")
 
-    # --- Инициализация счетчиков и списков для ответа ---
-    processed_items_count_bulk = 0
-    failed_items_count_bulk = 0
+    async_ingest = check_ingest.is_async_ingest_enabled()
+    bulk_metadata: Dict[str, Any] = {}
     errors_list_for_response: List[Dict[str, Any]] = []
-    successfully_processed_assignment_ids_for_socket: set[int] = set() # Для обновления UI через SocketIO
-
-    # Используем соединение и курсор из контекста запроса Flask (g)
-    current_db_connection = g.db_conn
-    current_db_cursor = current_db_connection.cursor()
-
-    # if not current_db_connection.autocommit: current_db_connection.begin() # Явно начинаем транзакцию, если autocommit выключен
-
-    # --- Обработка каждого результата в цикле ---
-    for item_index_bulk, single_result_item_raw_bulk in enumerate(results_list_from_payload):
-        # Если предыдущая ошибка БД привела к сбою транзакции, пропускаем обработку остальных
-        if transaction_had_db_errors_in_bulk:
-            failed_items_count_bulk += 1
-            errors_list_for_response.append({
-                "index": item_index_bulk,
-                "assignment_id": single_result_item_raw_bulk.get('assignment_id', 'N/A_ID_in_error'),
-                "error": "Обработка этого элемента пропущена из-за предыдущей ошибки транзакции базы данных."
-            })
-            continue # Переходим к следующему элементу
+    duplicate_items_bulk: List[Dict[str, Any]] = []
+    touched_node_ids_bulk: set = set()
+    processed_items_count_bulk = 0
+    db_errors_count_bulk = 0
+    total_items_in_request = 0
+    spool_request_tag = check_ingest.begin_spool_request() if async_ingest else None
+    spool_request_committed = False
 
-        current_assignment_id_for_log_bulk = single_result_item_raw_bulk.get('assignment_id', '[ID не указан в элементе]')
-        try:
-            # --- Извлечение и валидация полей для КОНКРЕТНОГО элемента (аналогично add_check_v1) ---
-            if not isinstance(single_result_item_raw_bulk, dict):
-                raise ValueError("Элемент результата в массиве 'results' не является объектом JSON.")
-            
-            # Поля из PowerShell объекта (PascalCase)
-            assignment_id_item_bulk_raw = single_result_item_raw_bulk.get('assignment_id')
-            is_available_item_bulk_raw = single_result_item_raw_bulk.get('IsAvailable')
-            check_success_item_bulk_raw = single_result_item_raw_bulk.get('CheckSuccess')
-            check_timestamp_item_bulk_str = single_result_item_raw_bulk.get('Timestamp')
-            nested_details_item_bulk_obj = single_result_item_raw_bulk.get('Details')
-            error_message_from_ps_item_bulk = single_result_item_raw_bulk.get('ErrorMessage')
-
-            # Версии могут быть переопределены на уровне элемента, если есть, иначе используются глобальные
-            agent_version_item_for_db = single_result_item_raw_bulk.get('agent_script_version', agent_version_global_from_payload)
-            assign_version_item_for_db = single_result_item_raw_bulk.get('assignment_config_version', assignment_version_global_from_payload)
-            # executor_object_id и executor_host для bulk обычно берутся из общей части .zrpu или устанавливаются лоадером
-            # Здесь мы берем object_id из общей части payload'а, если он есть
-            executor_object_id_item_for_db = object_id_global_from_payload # Может быть None
-
-            # Валидация обязательных полей для элемента
-            if assignment_id_item_bulk_raw is None: raise ValueError("Поле 'assignment_id' обязательно для каждой записи в пакете.")
-            if is_available_item_bulk_raw is None: raise ValueError("Поле 'IsAvailable' обязательно для каждой записи в пакете.")
-            
-            # Приведение типов для элемента (аналогично add_check_v1)
-            assignment_id_item_for_db = int(assignment_id_item_bulk_raw)
-            is_available_item_for_db: bool
-            if isinstance(is_available_item_bulk_raw, str): is_available_item_for_db = is_available_item_bulk_raw.lower() in ['true','1']
-            elif isinstance(is_available_item_bulk_raw, bool): is_available_item_for_db = is_available_item_bulk_raw
-            else: raise ValueError("Поле 'IsAvailable' элемента должно быть булевым.")
-
-            check_success_item_for_db: Optional[bool] = None
-            if check_success_item_bulk_raw is not None:
-                if isinstance(check_success_item_bulk_raw, str): check_success_item_for_db = check_success_item_bulk_raw.lower() in ['true','1']
-                elif isinstance(check_success_item_bulk_raw, bool): check_success_item_for_db = check_success_item_bulk_raw
-                else: raise ValueError("Поле 'CheckSuccess' элемента должно быть булевым или null.")
-            
-            check_timestamp_item_for_db: Optional[datetime] = None
-            if check_timestamp_item_bulk_str:
-                # (Логика парсинга timestamp - без изменений от add_check_v1)
+    try:
+        payload_events = bulk_payload.iter_bulk_payload(request.stream)
+        for raw_items_batch in _iter_raw_item_batches(payload_events, bulk_metadata, bulk_payload.CHECK_BULK_WRITE_BATCH_SIZE):
+            total_items_in_request += len(raw_items_batch)
+
+            # --- Этап 1: валидация порции ---
+            valid_items_batch: List[Dict[str, Any]] = []
+            for item_index_bulk, single_result_item_raw_bulk in raw_items_batch:
+                current_assignment_id_for_log_bulk = (single_result_item_raw_bulk.get('assignment_id', '[ID не указан в элементе]')
+                                                      if isinstance(single_result_item_raw_bulk, dict) else '[ID не указан в элементе]')
                 try:
-                    if HAS_DATEUTIL: parsed_dt_bulk_item = dateutil_parser.isoparse(check_timestamp_item_bulk_str)
-                    else: # Fallback
-                         ts_clean_bulk_item = check_timestamp_item_bulk_str.replace('Z','+00:00');
-                         if '.' in ts_clean_bulk_item: parts_bi=ts_clean_bulk_item.split('.',1); micro_bi=parts_bi[1].split('+',1)[0].split('-',1)[0];tz_s_bi=parts_bi[1][len(micro_bi):]; ts_clean_bulk_item=f"{parts_bi[0]}.{micro_bi[:6]}{tz_s_bi}"
-                         parsed_dt_bulk_item = datetime.fromisoformat(ts_clean_bulk_item)
-                    if parsed_dt_bulk_item.tzinfo: check_timestamp_item_for_db = parsed_dt_bulk_item.astimezone(timezone.utc)
-                    else: check_timestamp_item_for_db = parsed_dt_bulk_item.replace(tzinfo=timezone.utc)
-                except Exception: check_timestamp_item_for_db = None; logger.warning(f"Ошибка парсинга Timestamp ('{check_timestamp_item_bulk_str}') для элемента {item_index_bulk} в bulk.")
-
-            # Формирование detail_type и detail_data для элемента (аналогично add_check_v1)
-            final_detail_type_item_for_db = "PIPELINE_AGGREGATED_RESULT_BULK" # Тип для элемента из bulk
-            final_detail_data_item_for_db: Optional[Dict[str, Any]] = None
-            if nested_details_item_bulk_obj and isinstance(nested_details_item_bulk_obj, dict):
-                final_detail_data_item_for_db = nested_details_item_bulk_obj
-                if error_message_from_ps_item_bulk:
-                    final_detail_data_item_for_db['pipeline_overall_error_message_bulk'] = error_message_from_ps_item_bulk
-                # Добавляем CheckSuccess, если он был, чтобы сохранить в деталях
-                if check_success_item_for_db is not None:
-                    final_detail_data_item_for_db['pipeline_overall_check_success_bulk'] = check_success_item_for_db
-            elif error_message_from_ps_item_bulk:
-                final_detail_data_item_for_db = {'pipeline_overall_error_message_bulk': error_message_from_ps_item_bulk}
-                if check_success_item_for_db is not None:
-                     final_detail_data_item_for_db['pipeline_overall_check_success_bulk'] = check_success_item_for_db
-            
-            # resolution_method для bulk обычно стандартный
-            resolution_method_item_for_db = 'offline_loader_pipeline_bulk'
-
-            # --- Вызов процедуры записи для текущего элемента пакета ---
-            check_repository.record_check_result_proc(
-                cursor=current_db_cursor,
-                assignment_id=assignment_id_item_for_db,
-                is_available=is_available_item_for_db,
-                check_success=check_success_item_for_db, # <<< ПЕРЕДАЕМ check_success
-                check_timestamp=check_timestamp_item_for_db,
-                executor_object_id=executor_object_id_item_for_db, # ID объекта из .zrpu
-                executor_host=None, # Обычно нет для bulk
-                resolution_method=resolution_method_item_for_db,
-                detail_type=final_detail_type_item_for_db,
-                detail_data=final_detail_data_item_for_db,
-                p_assignment_version=assign_version_item_for_db,
-                p_agent_version=agent_version_item_for_db
-            )
-            processed_items_count_bulk += 1
-            successfully_processed_assignment_ids_for_socket.add(assignment_id_item_for_db) # Для SocketIO
-
-        except ValueError as val_err_item_processing_bulk: # Ошибки валидации для ЭТОГО элемента
-            failed_items_count_bulk += 1
-            errors_list_for_response.append({"index": item_index_bulk, "assignment_id": current_assign_id_log_bulk, "error": f"Ошибка валидации данных: {val_err_item_processing_bulk}"})
-            logger.warning(f"Ошибка валидации элемента {item_index_bulk} (assign_id: {current_assign_id_log_bulk}) в bulk-запросе: {val_err_item_processing_bulk}")
-            # Ошибка валидации НЕ должна прерывать транзакцию для других элементов, если autocommit=False
-        except psycopg2.Error as db_err_item_processing_bulk: # Ошибки БД для ЭТОГО элемента
-            failed_items_count_bulk += 1
-            errors_list_for_response.append({"index": item_index_bulk, "assignment_id": current_assign_id_log_bulk, "error": f"Ошибка базы данных: {db_err_item_processing_bulk.pgcode} - {str(db_err_item_processing_bulk)}"})
-            logger.error(f"Ошибка БД при обработке элемента {item_index_bulk} (assign_id: {current_assign_id_log_bulk}) в bulk-запросе: {db_err_item_processing_bulk}", exc_info=False) # exc_info=False, т.к. уже обработали
-            transaction_had_db_errors_in_bulk = True # Ставим флаг, что транзакция БД скомпрометирована
-            # if not current_db_connection.autocommit: current_db_connection.rollback(); logger.warning("Транзакция для bulk-запроса отменена из-за ошибки БД при обработке элемента. Начата новая."); current_db_connection.begin() # Откат и начало новой (если это нужно)
-        except Exception as e_item_processing_bulk: # Другие непредвиденные ошибки для ЭТОГО элемента
-            failed_items_count_bulk += 1
-            errors_list_for_response.append({"index": item_index_bulk, "assignment_id": current_assign_id_log_bulk, "error": f"Неожиданная ошибка обработки: {type(e_item_processing_bulk).__name__}"})
-            logger.exception(f"Неожиданная ошибка при обработке элемента {item_index_bulk} (assign_id: {current_assign_id_log_bulk}) в bulk-запросе.")
-            transaction_had_db_errors_in_bulk = True # Непредвиденная ошибка также может повлиять на транзакцию
-            # if not current_db_connection.autocommit: current_db_connection.rollback(); logger.warning("Транзакция для bulk-запроса отменена из-за неожиданной ошибки. Начата новая."); current_db_connection.begin()
-    # --- Конец цикла по элементам в bulk ---
-
-    # --- Завершение обработки всего пакета ---
-    # Коммит/откат транзакции (если autocommit=False)
-    # if not current_db_connection.autocommit:
-    #     if transaction_had_db_errors_in_bulk:
-    #         current_db_connection.rollback()
-    #         logger.warning("Итоговая транзакция для bulk-запроса была отменена из-за ошибок БД при обработке некоторых элементов.")
-    #         successfully_processed_assignment_ids_for_socket.clear() # Очищаем, т.к. ничего не сохранилось
-    #         processed_items_count_bulk = 0 # Реально сохранено 0
-    #     else:
-    #         current_db_connection.commit()
-    #         logger.info(f"Все {processed_items_count_bulk} успешно обработанных записей в bulk-запросе закоммичены.")
-
-    # --- Отправка обновлений через SocketIO для успешно обработанных (если транзакция не была отменена) ---
-    if socketio and not transaction_had_db_errors_in_bulk and successfully_processed_assignment_ids_for_socket:
-        # (Логика SocketIO для bulk - без изменений от v7.0.5, но использует обновленный node_service)
-        # ...
+                    valid_items_batch.append(_validate_bulk_item(
+                        single_result_item_raw_bulk, item_index_bulk, bulk_metadata.get('agent_script_version'),
+                        bulk_metadata.get('assignment_config_version'), bulk_metadata.get('object_id')
+                    ))
+                except ValueError as val_err_item_processing_bulk: # Ошибки валидации для ЭТОГО элемента
+                    errors_list_for_response.append({"index": item_index_bulk, "assignment_id": current_assignment_id_for_log_bulk, "error": f"Ошибка валидации данных: {val_err_item_processing_bulk}"})
+                    logger.warning(f"Ошибка валидации элемента {item_index_bulk} (assign_id: {current_assignment_id_for_log_bulk}) в bulk-запросе: {val_err_item_processing_bulk}")
+            if not valid_items_batch:
+                continue
+
+            # --- Асинхронный прием: порция в очередь, запись в БД - фоновой задачей ---
+            if async_ingest:
+                queue_depth = _enqueue_check_items(valid_items_batch, spool_request_tag)
+                processed_items_count_bulk += len(valid_items_batch)
+                logger.info(f"Пакет: {len(valid_items_batch)} результатов принято в очередь (глубина очереди: {queue_depth}).")
+                continue
+
+            # --- Этап 2: set-based запись порции (в транзакции запроса) ---
+            try:
+                written_rows_batch, duplicate_items_batch, item_errors_batch, db_errors_count_batch = _write_bulk_batch(g.db_cursor, valid_items_batch)
+            except Exception:
+                logger.exception("Неожиданная ошибка при пакетной записи результатов.")
+                raise ApiInternalError("Внутренняя ошибка сервера при пакетной записи результатов.")
+            processed_items_count_bulk += len(written_rows_batch)
+            touched_node_ids_bulk.update(row['node_id'] for row in written_rows_batch)
+            duplicate_items_bulk.extend(duplicate_items_batch)
+            errors_list_for_response.extend(item_errors_batch)
+            db_errors_count_bulk += db_errors_count_batch
+        if spool_request_tag is not None: # Тело разобрано целиком - порции доступны фоновой записи
+            check_ingest.commit_spool_request(spool_request_tag)
+            spool_request_committed = True
+    except bulk_payload.BulkPayloadTooLarge as too_large_err:
+        raise ApiPayloadTooLarge(str(too_large_err))
+    except bulk_payload.BulkPayloadError as payload_err:
+        raise ApiBadRequest(str(payload_err))
+    finally:
+        if spool_request_tag is not None and not spool_request_committed:
+            check_ingest.rollback_spool_request(spool_request_tag)
+
+    if not total_items_in_request: # Если массив пуст
+        logger.info("Получен пустой массив 'results' в запросе на пакетную загрузку.")
+        return jsonify({"status": "success", "processed": 0, "failed": 0, "message": "Пустой массив результатов был получен и обработан."}), 200
+    logger.info(f"Получено {total_items_in_request} записей для пакетной обработки. "
+                f"AgentVer(глоб): {bulk_metadata.get('agent_script_version')}, ConfigVer(глоб): {bulk_metadata.get('assignment_config_version')}, "
+                f"OID(глоб): {bulk_metadata.get('object_id')}")
+    errors_list_for_response.sort(key=lambda err_item: err_item['index'])
+    failed_items_count_bulk = len(errors_list_for_response)
+
+    if async_ingest:
+        queued_response = {"status": "success", "processed": processed_items_count_bulk, "queued": processed_items_count_bulk,
+                           "failed": failed_items_count_bulk, "total_in_request": total_items_in_request}
+        if not errors_list_for_response:
+            return jsonify(queued_response), 202
+        queued_response["status"] = "partial_error" if processed_items_count_bulk else "error"
+        queued_response["errors"] = errors_list_for_response
+        return jsonify(queued_response), 207
+
+    # --- Обновление снимка дашборда для успешно записанных узлов (рассылка SocketIO - пакетами) ---
+    if touched_node_ids_bulk:
         try:
-            node_ids_to_update_socket_bulk: set[int] = set()
-            if successfully_processed_assignment_ids_for_socket: # Если есть ID заданий, для которых данные успешно записаны
-                placeholders_bulk_socket = ', '.join(['%s'] * len(successfully_processed_assignment_ids_for_socket))
-                sql_get_nodes_for_socket = f"SELECT DISTINCT node_id FROM node_check_assignments WHERE id IN ({placeholders_bulk_socket})"
-                current_db_cursor.execute(sql_get_nodes_for_socket, tuple(list(successfully_processed_assignment_ids_for_socket)))
-                node_ids_to_update_socket_bulk = {row['node_id'] for row in current_db_cursor.fetchall()}
-
-            if node_ids_to_update_socket_bulk:
-                processed_nodes_map_for_socket_bulk = {n['id']: n for n in node_service.get_processed_node_status(current_db_cursor)}
-                for node_id_to_send_socket_bulk in node_ids_to_update_socket_bulk:
-                    if node_id_to_send_socket_bulk in processed_nodes_map_for_socket_bulk:
-                        socket_payload_for_ui_bulk = { 'node_id': node_id_to_send_socket_bulk, **processed_nodes_map_for_socket_bulk[node_id_to_send_socket_bulk] }
-                        socketio.emit('node_status_update', socket_payload_for_ui_bulk)
-                        logger.debug(f"SocketIO (Bulk): Отправлено обновление статуса для узла ID {node_id_to_send_socket_bulk}.")
-                    else:
-                        logger.warning(f"SocketIO (Bulk): Не найдены актуальные данные для узла ID {node_id_to_send_socket_bulk}. Обновление не отправлено.")
+            with savepoint(g.db_cursor, 'publish_nodes'): # Ошибка пересчета не откатывает записанный пакет
+                _publish_touched_nodes(g.db_cursor, touched_node_ids_bulk)
         except Exception as socket_err_bulk_send:
-             logger.error(f"Ошибка при отправке обновлений SocketIO после пакетной загрузки: {socket_err_bulk_send}", exc_info=True)
-    elif transaction_had_db_errors_in_bulk:
-         logger.warning("Обновления UI через SocketIO пропущены из-за общей ошибки транзакции во время пакетной обработки.")
+             logger.error(f"Ошибка при обновлении статусов узлов после пакетной загрузки: {socket_err_bulk_send}", exc_info=True)
 
-    # --- Формирование HTTP-ответа (логика без изменений от v7.0.5) ---
-    # ...
+    # --- Формирование HTTP-ответа ---
     final_response_status_str_bulk = "success"
     final_http_code_bulk = 200
+    if duplicate_items_bulk: # Повторы - не ошибка, но отличаются от записанных результатов
+        final_http_code_bulk = 207
     if failed_items_count_bulk > 0:
-        final_response_status_str_bulk = "partial_error" if processed_items_count_bulk > 0 else "error"
+        final_response_status_str_bulk = "partial_error" if processed_items_count_bulk > 0 or duplicate_items_bulk else "error"
         final_http_code_bulk = 207 # Multi-Status
-    if transaction_had_db_errors_in_bulk: # Если была ошибка БД, которая привела к откату
-        final_response_status_str_bulk = "error" # Перезаписываем статус
-        final_http_code_bulk = 500 if processed_items_count_bulk == 0 and failed_items_count_bulk > 0 else 207
-        if not any(e_resp.get("error","").startswith("Ошибка БД") for e_resp in errors_list_for_response):
-             errors_list_for_response.append({"index": -1, "error": "Произошла общая ошибка базы данных при обработке пакета. Некоторые или все записи могли не сохраниться."})
+    if db_errors_count_bulk and processed_items_count_bulk == 0 and not duplicate_items_bulk: # Ни один элемент не записан из-за ошибок БД
+        final_response_status_str_bulk = "error"
+        final_http_code_bulk = 500 if failed_items_count_bulk == total_items_in_request else 207
 
     response_payload_for_client = {
         "status": final_response_status_str_bulk,
-        "processed": processed_items_count_bulk if not transaction_had_db_errors_in_bulk else 0, # Если транзакция отменена, реально 0
-        "failed": failed_items_count_bulk + (len(results_list_from_payload) - processed_items_count_bulk - failed_items_count_bulk if transaction_had_db_errors_in_bulk else 0),
-        "total_in_request": len(results_list_from_payload)
+        "processed": processed_items_count_bulk,
+        "duplicates": len(duplicate_items_bulk),
+        "failed": failed_items_count_bulk,
+        "total_in_request": total_items_in_request
     }
+    if duplicate_items_bulk:
+        response_payload_for_client["duplicate_items"] = duplicate_items_bulk
     if errors_list_for_response:
         response_payload_for_client["errors"] = errors_list_for_response
 
     logger.info(f"Пакетная обработка pipeline-результатов завершена. Итоговый статус: {final_response_status_str_bulk}. "
-                f"Обработано (до коммита): {processed_items_count_bulk}, Ошибки элементов: {failed_items_count_bulk}, "
-                f"Ошибка БД транзакции: {transaction_had_db_errors_in_bulk}")
+                f"Записано: {processed_items_count_bulk}, Повторы: {len(duplicate_items_bulk)}, Ошибки элементов: {failed_items_count_bulk}, "
+                f"Ошибки БД элементов: {db_errors_count_bulk}")
     return jsonify(response_payload_for_client), final_http_code_bulk
 
 
+def _parse_history_range() -> Tuple[Optional[datetime], Optional[datetime]]:
+    """
+    Разбирает параметры ?from= и ?to= (ISO 8601) запроса истории проверок.
+    Если ни один не задан, нижняя граница - CHECK_HISTORY_LOOKBACK_DAYS суток назад,
+    чтобы запрос читал только последние секции node_checks.
+    """
+    range_bounds: List[Optional[datetime]] = []
+    for param_name in ('from', 'to'):
+        param_value = request.args.get(param_name)
+        if not param_value:
+            range_bounds.append(None)
+            continue
+        try:
+            parsed_dt = dateutil_parser.isoparse(param_value) if HAS_DATEUTIL else datetime.fromisoformat(param_value.replace('Z', '+00:00'))
+        except ValueError:
+            raise ApiBadRequest(f"Неверный формат параметра '{param_name}': ожидается дата/время ISO 8601.")
+        range_bounds.append(parsed_dt if parsed_dt.tzinfo else parsed_dt.replace(tzinfo=timezone.utc))
+    checked_from, checked_to = range_bounds
+    if checked_from is None and checked_to is None and CHECK_HISTORY_LOOKBACK_DAYS > 0:
+        checked_from = datetime.now(timezone.utc) - timedelta(days=CHECK_HISTORY_LOOKBACK_DAYS)
+    if checked_from and checked_to and checked_from >= checked_to:
+        raise ApiBadRequest("Параметр 'from' должен быть раньше 'to'.")
+    return checked_from, checked_to
+
+
+def _fetch_history_with_rollups(
+    cursor,
+    checked_from: Optional[datetime],
+    checked_to: Optional[datetime],
+    limit: int,
+    fetch_raw_history,
+    **rollup_filters: Any
+) -> List[Dict[str, Any]]:
+    """
+    Возвращает историю за интервал: "сырые" результаты - не раньше границы хранения,
+    для более старой части интервала - агрегаты node_check_rollups (is_rollup=True).
+    fetch_raw_history(checked_from, checked_to) выполняет запрос к node_checks.
+    """
+    history_cutoffs = retention_service.get_history_cutoffs(cursor)
+    raw_cutoff = history_cutoffs['raw_cutoff']
+    history_items: List[Dict[str, Any]] = []
+    if checked_to is None or checked_to > raw_cutoff:
+        raw_from = checked_from if checked_from is not None and checked_from >= raw_cutoff else raw_cutoff
+        history_items = fetch_raw_history(raw_from, checked_to)
+    if len(history_items) < limit and (checked_from is None or checked_from < raw_cutoff):
+        rollups_to = min(checked_to, raw_cutoff) if checked_to is not None else raw_cutoff
+        rollup_items = check_repository.fetch_check_rollups_history(
+            cursor, history_cutoffs['hourly_cutoff'], rollups_to,
+            checked_from=checked_from, limit=limit - len(history_items), **rollup_filters
+        )
+        for rollup_item in rollup_items:
+            if rollup_item.get('success_ratio') is not None:
+                rollup_item['success_ratio'] = float(rollup_item['success_ratio'])
+        history_items.extend(rollup_items)
+    return history_items
+
+
 # --- Маршруты для получения истории и деталей проверок ---
 # (Эти маршруты остаются без изменений от версии 7.0.5, так как их SQL-запросы
 #  в репозитории уже должны быть адаптированы для выборки нового поля check_success)
@@ -509,7 +722,7 @@ def api_get_node_check_details(check_id: int):
     """
     logger.info(f"API Check Route (v5.0.2): Запрос GET /node_checks/{check_id}/details")
     try:
-        cursor = g.db_conn.cursor()
+        cursor = g.db_cursor
         details_list_from_repo = check_repository.fetch_check_details(cursor, check_id)
 
         # Пост-обработка: десериализация поля 'data', если оно пришло как строка
@@ -538,25 +751,28 @@ def api_get_node_check_details(check_id: int):
 def api_get_node_checks_history(node_id: int):
     """
     Получает историю последних N результатов проверок для указанного узла.
-    Может фильтроваться по ID метода проверки. Возвращает `check_success`.
+    Может фильтроваться по ID метода проверки и интервалу времени (?from=&to=, ISO 8601).
+    Возвращает `check_success`.
     """
     logger.info(f"API Check Route (v5.0.2): Запрос GET /nodes/{node_id}/checks_history, параметры: {request.args}")
     try:
         limit_str = request.args.get('limit', default='50'); limit = int(limit_str)
         method_id_str = request.args.get('method_id'); method_id_filter = int(method_id_str) if method_id_str else None
+        checked_from, checked_to = _parse_history_range()
         
-        cursor = g.db_conn.cursor()
+        cursor = g.db_cursor
         # Проверка существования узла
         if not node_repository.get_node_by_id(cursor, node_id): # Используем репозиторий для проверки
             raise ApiNotFound(f"Узел с ID={node_id} не найден.")
         
-        history_items_from_repo = check_repository.fetch_node_checks_history(cursor, node_id, method_id_filter, limit)
-        # Форматирование дат
-        for item_hist_node in history_items_from_repo:
-            for date_key_node in ['checked_at', 'check_timestamp']:
-                 if item_hist_node.get(date_key_node) and isinstance(item_hist_node[date_key_node], datetime):
-                     item_hist_node[date_key_node] = item_hist_node[date_key_node].isoformat()
-        
+        history_items_from_repo = _fetch_history_with_rollups(
+            cursor, checked_from, checked_to, limit,
+            lambda raw_from, raw_to: check_repository.fetch_node_checks_history(
+                cursor, node_id, method_id_filter, limit, checked_from=raw_from, checked_to=raw_to
+            ),
+            node_id=node_id, method_id_filter=method_id_filter
+        )
+
         logger.info(f"Для узла ID={node_id} (метод: {method_id_filter or 'все'}) найдено {len(history_items_from_repo)} записей истории (лимит: {limit}).")
         return jsonify(history_items_from_repo), 200
 
@@ -574,24 +790,26 @@ def api_get_node_checks_history(node_id: int):
 # @login_required
 def api_get_assignment_checks_history(assignment_id: int):
     """
-    Получает историю последних N результатов проверок для указанного задания.
-    Возвращает `check_success`.
+    Получает историю последних N результатов проверок для указанного задания
+    за интервал времени (?from=&to=, ISO 8601). Возвращает `check_success`.
     """
     logger.info(f"API Check Route (v5.0.2): Запрос GET /assignments/{assignment_id}/checks_history, параметры: {request.args}")
     try:
         limit_str = request.args.get('limit', default='50'); limit = int(limit_str)
+        checked_from, checked_to = _parse_history_range()
         
-        cursor = g.db_conn.cursor()
+        cursor = g.db_cursor
         # Проверка существования задания
         if not assignment_repository.get_assignment_by_id(cursor, assignment_id): # Используем репозиторий
             raise ApiNotFound(f"Задание с ID={assignment_id} не найдено.")
         
-        history_items_from_repo_assign = check_repository.fetch_assignment_checks_history(cursor, assignment_id, limit)
-        # Форматирование дат
-        for item_hist_assign in history_items_from_repo_assign:
-            for date_key_assign in ['checked_at', 'check_timestamp']:
-                 if item_hist_assign.get(date_key_assign) and isinstance(item_hist_assign[date_key_assign], datetime):
-                     item_hist_assign[date_key_assign] = item_hist_assign[date_key_assign].isoformat()
+        history_items_from_repo_assign = _fetch_history_with_rollups(
+            cursor, checked_from, checked_to, limit,
+            lambda raw_from, raw_to: check_repository.fetch_assignment_checks_history(
+                cursor, assignment_id, limit, checked_from=raw_from, checked_to=raw_to
+            ),
+            assignment_id=assignment_id
+        )
 
         logger.info(f"Для задания ID={assignment_id} найдено {len(history_items_from_repo_assign)} записей истории (лимит: {limit}).")
         return jsonify(history_items_from_repo_assign), 200
@@ -2,13 +2,20 @@
 """
 Маршруты API для работы с системными событиями (журнал).
 Позволяет получать список событий с фильтрацией и добавлять новые события.
+Версия 5.0.21: Пагинация по курсору (параметр cursor, в ответе next_cursor) и режимы
+              подсчета (параметр count: exact / estimate / capped / none).
+Версия 5.0.24: Без start_time выборка ограничена горячими секциями журнала (последние
+              retention_system_events_hot_days суток, в ответе hot_from), холодные секции
+              читаются по фильтру времени или с include_archive=true.
 """
 import logging
 import psycopg2
 import json
 from datetime import datetime # Для проверки типа datetime при пост-обработке
+from typing import Optional, Dict
 from flask import Blueprint, request, jsonify, g
 from ..repositories import event_repository # Репозиторий для работы с событиями
+from ..services import retention_service # Граница горячих секций журнала
 from ..errors import ApiBadRequest, ApiInternalError, ApiValidationFailure, ApiException # Кастомные исключения
 from ..auth_utils import api_key_required # Декоратор для защиты эндпоинта создания события
 
@@ -23,9 +30,19 @@ def api_get_system_events():
     """
     Получает список системных событий с возможностью фильтрации и пагинации.
 
+    Пагинация по курсору: параметр cursor (пустой - первая страница, далее - next_cursor
+    предыдущего ответа). Страница выбирается по позиции (event_time, id), поэтому
+    время ответа не зависит от глубины страницы. Без cursor - прежняя пагинация
+    по offset (глубокие страницы больших журналов медленные).
+
     Query Params:
         limit (int, optional): Количество записей на странице (default 100, max 500).
-        offset (int, optional): Смещение для пагинации (default 0).
+        offset (int, optional): Смещение для пагинации (default 0). Не используется вместе с cursor.
+        cursor (str, optional): Непрозрачный курсор страницы (next_cursor из предыдущего ответа).
+        count (str, optional): Подсчет total_count: 'exact' (по умолчанию без cursor),
+                               'estimate' (оценка планировщика), 'capped' (точно, но не более
+                               EVENT_COUNT_CAP), 'none' (по умолчанию с cursor - не считать).
+                               При offset > 0 подсчет всегда точный.
         severity (str, optional): Фильтр по уровню важности ('INFO', 'WARN', 'ERROR', 'CRITICAL').
         event_type (str, optional): Фильтр по точному типу события.
         object_id (int, optional): Фильтр по ID объекта (подразделения).
@@ -34,12 +51,17 @@ def api_get_system_events():
         node_check_id (int, optional): Фильтр по ID результата проверки.
         related_entity (str, optional): Фильтр по типу связанной сущности (например, 'FILE').
         related_entity_id (str, optional): Фильтр по ID связанной сущности (например, имя файла).
-        start_time (str, optional): Фильтр по времени начала периода (ISO 8601).
+        start_time (str, optional): Фильтр по времени начала периода (ISO 8601). Без него (и без
+                                    include_archive) выбираются события не раньше hot_from -
+                                    только горячие секции журнала.
+        include_archive (bool, optional): 'true' - без start_time искать и в холодных секциях (медленнее).
         end_time (str, optional): Фильтр по времени конца периода (ISO 8601).
         search_text (str, optional): Поиск по текстовому полю 'message'.
 
     Returns:
-        JSON: Объект с полями "items" (список событий) и "total_count".
+        JSON: Объект с полями "items" (список событий), "total_count" (или null при count=none),
+              "total_count_estimated" (значение приблизительное), "next_cursor" (null - последняя страница)
+              и "hot_from" (начало выборки по горячим секциям или null, если период задан запросом).
     """
     logger.info(f"API Event Route: Запрос GET /api/v1/events, параметры: {request.args}")
     try:
@@ -57,6 +79,9 @@ def api_get_system_events():
         start_time_filter = request.args.get('start_time') # Валидация формата даты - на стороне репозитория/БД
         end_time_filter = request.args.get('end_time')
         search_text_filter = request.args.get('search_text')
+        page_cursor = request.args.get('cursor') # None - пагинация по offset, '' - первая страница по курсору
+        include_archive = request.args.get('include_archive', 'false').lower() == 'true'
+        count_mode = (request.args.get('count') or ('none' if page_cursor is not None else 'exact')).lower()
 
         try:
             limit = int(limit_str); assert limit > 0 and limit <= 500
@@ -86,19 +111,40 @@ def api_get_system_events():
         if severity_filter and severity_filter.upper() not in ('INFO', 'WARN', 'ERROR', 'CRITICAL'):
              raise ApiValidationFailure("Недопустимое значение для параметра 'severity'. Допустимы: INFO, WARN, ERROR, CRITICAL.")
         if search_text_filter: search_text_filter = search_text_filter.strip()
+        if count_mode not in event_repository.EVENT_COUNT_MODES:
+            raise ApiValidationFailure(f"Недопустимое значение для параметра 'count'. Допустимы: {', '.join(event_repository.EVENT_COUNT_MODES)}.")
+        if page_cursor and 'offset' in request.args:
+            raise ApiBadRequest("Параметры 'cursor' и 'offset' не используются вместе.")
         # --- Конец парсинга и валидации ---
 
-        cursor = g.db_conn.cursor()
-        # Вызов функции репозитория для получения событий
-        event_items, total_event_count = event_repository.fetch_system_events(
-            cursor,
-            limit=limit, offset=offset, severity=severity_filter.upper() if severity_filter else None,
+        event_filters = dict(
+            severity=severity_filter.upper() if severity_filter else None,
             event_type=event_type_filter, search_text=search_text_filter,
             object_id=object_id_filter, node_id=node_id_filter,
             assignment_id=assignment_id_filter, node_check_id=node_check_id_filter,
             related_entity=related_entity_filter, related_entity_id=related_entity_id_filter,
             start_time=start_time_filter, end_time=end_time_filter
         )
+        cursor = g.db_cursor # RealDictCursor: строки событий, счетчики и настройки читаются по имени столбца
+        # Холодные секции (только BRIN) читаются, только если этого требует фильтр по времени
+        hot_from: Optional[datetime] = None
+        if not start_time_filter and not include_archive:
+            hot_from = retention_service.get_events_hot_boundary(cursor)
+            event_filters['start_time'] = hot_from
+        next_cursor: Optional[str] = None
+        total_count_estimated = False
+        if page_cursor is None and (count_mode == 'exact' or offset):
+            # Прежний режим: LIMIT/OFFSET и точный COUNT
+            event_items, total_event_count = event_repository.fetch_system_events(cursor, limit=limit, offset=offset, **event_filters)
+            if event_items and offset + len(event_items) < total_event_count:
+                next_cursor = event_repository.encode_event_cursor(event_items[-1]['event_time'], event_items[-1]['id'])
+        else:
+            try:
+                event_items, next_cursor = event_repository.fetch_system_events_page(
+                    cursor, limit=limit, after_cursor=page_cursor or None, **event_filters)
+            except ValueError as cursor_err:
+                raise ApiBadRequest(str(cursor_err))
+            total_event_count, total_count_estimated = event_repository.count_system_events(cursor, count_mode, **event_filters)
 
         # --- ПОСТ-ОБРАБОТКА для JSON ответа ---
         for item in event_items:
@@ -119,8 +165,11 @@ def api_get_system_events():
         response_data = {
             "items": event_items,
             "total_count": total_event_count,
+            "total_count_estimated": total_count_estimated,
             "limit": limit,
-            "offset": offset
+            "offset": offset if page_cursor is None else None,
+            "next_cursor": next_cursor,
+            "hot_from": hot_from.isoformat() if hot_from else None
         }
         logger.info(f"API Event Route: Успешно отдан список системных событий. Найдено на странице: {len(event_items)}, Всего: {total_event_count}")
         return jsonify(response_data), 200
@@ -191,7 +240,7 @@ def api_add_system_event():
     # --- Конец валидации ---
 
     try:
-        cursor = g.db_conn.cursor()
+        cursor = g.db_cursor
         # Вызываем функцию репозитория для создания события
         # Репозиторий сам обработает `data.get('details')` для JSONB
         new_event_id = event_repository.create_system_event(cursor, data)
@@ -199,7 +248,6 @@ def api_add_system_event():
             logger.error("Создание системного события не удалось (репозиторий вернул None). Данные: %s", data)
             raise ApiInternalError("Не удалось создать системное событие на сервере.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Event Route: Успешно создано системное событие ID: {new_event_id}, Тип: '{event_type}', Сообщение: '{message[:50]}...'")
         return jsonify({"status": "success", "event_id": new_event_id}), 201 # HTTP 201 Created
 
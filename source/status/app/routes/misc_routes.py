@@ -2,11 +2,25 @@
 """
 Прочие маршруты API, не относящиеся к конкретным сущностям.
 На данный момент содержит только эндпоинт для проверки состояния сервиса.
+Версия 5.0.5: /health дополнительно возвращает счетчики кеша API-ключей.
+Версия 5.0.8: /health возвращает счетчики общего снимка дашборда.
+Версия 5.0.9: /health возвращает счетчики рассылки изменений статусов (SocketIO).
+Версия 5.0.10: /health возвращает состояние пула соединений с БД.
+Версия 5.0.11: /health возвращает счетчики кеша пользователей UI.
+Версия 5.0.12: /health возвращает время удержания соединения с БД по эндпоинтам.
+Версия 5.0.14: /health возвращает глубину и задержку очереди приема результатов.
+Версия 5.0.24: /health возвращает счетчики фонового обслуживания БД.
 """
 import logging
 from flask import Blueprint, jsonify, Response # Добавлен Response для явного указания типа
 import psycopg2
 from .. import db_connection # Для get_connection из текущего пакета
+from ..auth_utils import get_api_key_cache_stats, get_user_cache_stats # Счетчики кешей API-ключей и пользователей
+from ..db_request import get_db_hold_stats
+from ..services.check_ingest import get_check_ingest_stats
+from ..services.dashboard_cache import get_dashboard_cache_stats # Счетчики снимка дашборда
+from ..services.maintenance import get_maintenance_stats # Счетчики фонового обслуживания
+from ..services.status_push import get_status_push_stats # Счетчики рассылки изменений статусов
 from flask import g # Для доступа к g.db_conn, если он устанавливается в before_request
 
 logger = logging.getLogger(__name__)
@@ -19,8 +33,15 @@ def health_check() -> Response:
 
     Returns:
         JSON: Объект со статусом:
-              {"status": "ok", "database_connected": true} - если все в порядке.
-              {"status": "error", "database_connected": false} - если БД недоступна.
+              {"status": "ok", "database_connected": true, "api_key_cache": {...}} - если все в порядке.
+              {"status": "error", "database_connected": false, "api_key_cache": {...}} - если БД недоступна.
+              api_key_cache - попадания/промахи кеша API-ключей и отложенная запись last_used_at.
+              dashboard_cache - версия и счетчики общего снимка /dashboard и /status_detailed.
+              status_push - номер последовательности и счетчики рассылки 'node_status_batch'.
+              db_pool - занятые/свободные соединения, ожидающие, время ожидания, ошибки пула.
+              user_cache - попадания/промахи кеша пользователей UI (user_loader).
+              db_hold_time - время удержания соединения с БД по эндпоинтам (count/avg_ms/max_ms).
+              check_ingest - режим приема результатов; в режиме async - глубина (depth) и задержка (lag_seconds) очереди.
         HTTP Status:
               200 OK - если сервис и БД доступны.
               503 Service Unavailable - если БД недоступна.
@@ -62,6 +83,14 @@ def health_check() -> Response:
     # Соединение, полученное через with db_connection.get_connection(), закроется автоматически.
 
     response_status_code = 200 if db_ok else 503 # HTTP 503 Service Unavailable, если БД недоступна
-    response_json = {"status": "ok" if db_ok else "error", "database_connected": db_ok}
+    response_json = {"status": "ok" if db_ok else "error", "database_connected": db_ok,
+                     "api_key_cache": get_api_key_cache_stats(),
+                     "dashboard_cache": get_dashboard_cache_stats(),
+                     "status_push": get_status_push_stats(),
+                     "db_pool": db_connection.get_db_pool_stats(),
+                     "user_cache": get_user_cache_stats(),
+                     "db_hold_time": get_db_hold_stats(),
+                     "check_ingest": get_check_ingest_stats(),
+                     "maintenance": get_maintenance_stats()}
     logger.info(f"Health check завершен. Статус: {response_json['status']}, БД: {response_json['database_connected']}. HTTP-код: {response_status_code}")
     return jsonify(response_json), response_status_code
\ No newline at end of file
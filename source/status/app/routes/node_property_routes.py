@@ -9,6 +9,7 @@ import psycopg2
 from flask import Blueprint, request, jsonify, g
 from typing import Dict, Any # Для аннотаций типов
 from ..repositories import node_property_repository, node_type_repository # Репозитории
+from . import invalidate_dashboard_on_write
 from ..errors import (
     ApiBadRequest,
     ApiNotFound,
@@ -23,6 +24,7 @@ logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1' будет добавлен при регистрации в app/routes/__init__.py,
 # так как этот blueprint обрабатывает пути вида /api/v1/node_property_types и /api/v1/node_types/...
 bp = Blueprint('node_properties', __name__)
+bp.after_request(invalidate_dashboard_on_write) # Изменения влияют на сводку - сброс снимка дашборда
 
 # --- Маршруты для Типов Свойств (node_property_types) ---
 
@@ -146,7 +148,6 @@ def api_set_or_update_node_type_properties(node_type_id: int):
             # Если были ошибки при обработке отдельных свойств, возвращаем их
             raise ApiBadRequest("Произошли ошибки при обновлении некоторых свойств.", details=operation_errors)
 
-        # g.db_conn.commit() # Если не autocommit
 
         # Возвращаем актуальный список свойств после всех операций
         updated_properties_list = node_property_repository.get_properties_for_node_type(cursor, node_type_id)
@@ -185,7 +186,6 @@ def api_delete_single_node_property(node_type_id: int, property_type_id: int):
             logger.warning(f"Свойство с type_id={property_type_id} не найдено для типа узла ID={node_type_id} при попытке удаления.")
             raise ApiNotFound(f"Свойство с ID типа={property_type_id} не найдено для типа узла ID={node_type_id}, или не было назначено.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API NodeProperty Route: Успешно удалено свойство с type_id={property_type_id} для типа узла ID={node_type_id}.")
         return '', 204 # HTTP 204 No Content
 
@@ -10,6 +10,7 @@ from datetime import datetime # Для форматирования дат
 from flask import Blueprint, request, jsonify, g
 from typing import Optional, Dict, Any
 from ..repositories import node_repository, assignment_repository # Репозитории
+from . import invalidate_dashboard_on_write
 from ..errors import (
     ApiNotFound,
     ApiInternalError,
@@ -23,6 +24,7 @@ from flask_login import login_required # Защита маршрутов
 logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1/nodes' будет добавлен при регистрации в app/routes/__init__.py
 bp = Blueprint('nodes', __name__)
+bp.after_request(invalidate_dashboard_on_write) # Изменения влияют на сводку - сброс снимка дашборда
 
 @bp.route('', methods=['GET'])
 @login_required # Только авторизованные пользователи могут просматривать список узлов
@@ -157,7 +159,6 @@ def api_create_node():
             # В крайнем случае, возвращаем то, что вернул create_node, если он возвращает больше чем ID
             return jsonify(created_node_info), 201
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Route: Успешно создан узел ID: {new_node_id}, Имя: '{data_from_request['name']}'")
         return jsonify(full_new_node_data), 201 # HTTP 201 Created
 
@@ -235,7 +236,6 @@ def api_update_node_by_id_route(node_id: int):
             logger.warning(f"Узел с ID={node_id} не найден при попытке обновления.")
             raise ApiNotFound(f"Узел с ID={node_id} не найден для обновления.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Route: Успешно обновлен узел ID: {node_id}. Обновленные поля: {list(data_to_update.keys())}")
         return jsonify(updated_node_data), 200
     except ValueError as val_err_repo: # Ошибки валидации из репозитория
@@ -270,7 +270,6 @@ def api_delete_node_by_id_route(node_id: int):
             logger.warning(f"Узел с ID={node_id} не найден при попытке удаления.")
             raise ApiNotFound(f"Узел с ID={node_id} не найден.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Route: Успешно удален узел ID: {node_id}")
         return '', 204 # HTTP 204 No Content (стандарт для успешного DELETE)
     except psycopg2.Error as db_err:
@@ -8,6 +8,7 @@ import psycopg2
 from flask import Blueprint, request, jsonify, g
 from typing import Optional, Dict, Any
 from ..repositories import node_type_repository # Репозиторий для типов узлов
+from . import invalidate_dashboard_on_write
 from ..errors import (
     ApiBadRequest,
     ApiNotFound,
@@ -21,6 +22,7 @@ from flask_login import login_required # Защита маршрутов
 logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1/node_types' будет добавлен при регистрации.
 bp = Blueprint('node_types', __name__)
+bp.after_request(invalidate_dashboard_on_write) # Изменения влияют на сводку - сброс снимка дашборда
 
 @bp.route('', methods=['GET'])
 @login_required # Только авторизованные пользователи
@@ -154,7 +156,6 @@ def api_create_node_type():
             logger.error("Создание типа узла не удалось: репозиторий не вернул данные с ID.")
             raise ApiInternalError("Не удалось создать тип узла на сервере.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Type Route: Успешно создан тип узла ID: {new_type_data['id']}, Имя: '{new_type_data['name']}'")
         return jsonify(new_type_data), 201 # HTTP 201 Created
 
@@ -257,7 +258,6 @@ def api_update_node_type_by_id_route(type_id: int):
             logger.warning(f"Тип узла с ID={type_id} не найден при попытке обновления.")
             raise ApiNotFound(f"Тип узла с ID={type_id} не найден для обновления.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Type Route: Успешно обновлен тип узла ID: {type_id}. Обновленные поля: {list(data_to_update.keys())}")
         return jsonify(updated_type_data), 200
     except ValueError as val_err_repo: # Ошибки бизнес-логики из репозитория
@@ -294,7 +294,6 @@ def api_delete_node_type_by_id_route(type_id: int):
             logger.warning(f"Тип узла с ID={type_id} не найден или не может быть удален (проверьте зависимости).")
             raise ApiNotFound(f"Тип узла с ID={type_id} не найден или не может быть удален (возможно, есть связанные узлы или дочерние типы).")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Node Type Route: Успешно удален тип узла ID: {type_id}")
         return '', 204 # HTTP 204 No Content
     except ValueError as dep_err: # Ошибки бизнес-логики из репозитория (нельзя удалить базовый, есть дети/узлы)
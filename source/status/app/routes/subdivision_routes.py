@@ -8,6 +8,7 @@ import psycopg2
 from flask import Blueprint, request, jsonify, g
 from typing import Optional, Dict, Any
 from ..repositories import subdivision_repository # Репозиторий для работы с подразделениями
+from . import invalidate_dashboard_on_write
 from ..errors import (
     ApiBadRequest,
     ApiNotFound,
@@ -21,6 +22,7 @@ from flask_login import login_required # Защита маршрутов
 logger = logging.getLogger(__name__)
 # Создаем Blueprint. Префикс '/api/v1/subdivisions' будет добавлен при регистрации.
 bp = Blueprint('subdivisions', __name__)
+bp.after_request(invalidate_dashboard_on_write) # Изменения влияют на сводку - сброс снимка дашборда
 
 @bp.route('', methods=['GET'])
 @login_required # Только авторизованные пользователи
@@ -159,7 +161,6 @@ def api_create_subdivision():
             logger.error("Создание подразделения не удалось: репозиторий не вернул данные с ID.")
             raise ApiInternalError("Не удалось создать подразделение на сервере.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Subdivision Route: Успешно создано подразделение ID: {new_subdivision_data['id']}, "
                     f"ObjectID: {new_subdivision_data['object_id']}, Имя: '{new_subdivision_data['short_name']}'")
         return jsonify(new_subdivision_data), 201 # HTTP 201 Created
@@ -239,7 +240,6 @@ def api_update_subdivision_by_id_route(subdivision_id: int):
             logger.warning(f"Подразделение с ID={subdivision_id} не найдено при попытке обновления.")
             raise ApiNotFound(f"Подразделение с ID={subdivision_id} не найдено для обновления.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Subdivision Route: Успешно обновлено подразделение ID: {subdivision_id}. Обновленные поля: {list(data_to_update.keys())}")
         return jsonify(updated_subdivision_data), 200
     except ValueError as val_err_repo: # Ошибки валидации из репозитория (например, цикл. зависимость)
@@ -274,7 +274,6 @@ def api_delete_subdivision_by_id_route(subdivision_id: int):
             logger.warning(f"Подразделение с ID={subdivision_id} не найдено при попытке удаления.")
             raise ApiNotFound(f"Подразделение с ID={subdivision_id} не найдено.")
 
-        # g.db_conn.commit() # Если не autocommit
         logger.info(f"API Subdivision Route: Успешно удалено подразделение ID: {subdivision_id}")
         return '', 204 # HTTP 204 No Content
 
@@ -0,0 +1,155 @@
+# status/app/services/bulk_payload.py
+"""
+Потоковый разбор тела пакетной загрузки результатов (/checks/bulk).
+Версия 5.0.16: Тело читается из request.stream порциями и разбирается потоковым
+              парсером ijson: элементы массива 'results' выдаются по одному по мере
+              чтения, поэтому в памяти одновременно находится только текущая порция
+              записи, а не весь файл и все вложенные Details.steps_results.
+              Размер тела (CHECK_BULK_MAX_BODY_BYTES) и количество элементов
+              (CHECK_BULK_MAX_ITEMS) проверяются во время чтения.
+              Без ijson тело читается целиком (с тем же ограничением размера)
+              и разбирается json.loads - поведение и формат событий те же.
+"""
+import json
+import logging
+import os
+from typing import Any, BinaryIO, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+    logger.warning("Модуль 'ijson' не найден. Пакетная загрузка результатов будет разбирать тело целиком.")
+
+CHECK_BULK_MAX_BODY_BYTES = int(os.getenv('CHECK_BULK_MAX_BODY_BYTES', 64 * 1024 * 1024))
+CHECK_BULK_MAX_ITEMS = int(os.getenv('CHECK_BULK_MAX_ITEMS', 100000))
+CHECK_BULK_WRITE_BATCH_SIZE = int(os.getenv('CHECK_BULK_WRITE_BATCH_SIZE', 1000))
+_READ_CHUNK_BYTES = 64 * 1024
+
+_SCALAR_EVENTS = frozenset(('null', 'boolean', 'integer', 'double', 'number', 'string'))
+
+
+class BulkPayloadError(ValueError):
+    """ Тело пакетной загрузки не является JSON-объектом с массивом 'results'. """
+
+
+class BulkPayloadTooLarge(BulkPayloadError):
+    """ Превышен допустимый размер тела или количество элементов. """
+
+
+class _LimitedReader:
+    """ Обертка потока: считает прочитанные байты и прерывает чтение сверх max_bytes. """
+    def __init__(self, stream: BinaryIO, max_bytes: int):
+        self._stream = stream
+        self._max_bytes = max_bytes
+        self.bytes_read = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size == 0: # ijson проверяет тип потока чтением 0 байт; LimitedStream werkzeug считает его обрывом
+            return b''
+        chunk = self._stream.read(size if size is not None and size >= 0 else self._max_bytes + 1 - self.bytes_read)
+        self.bytes_read += len(chunk)
+        if self.bytes_read > self._max_bytes:
+            raise BulkPayloadTooLarge(f"Размер тела запроса превышает {self._max_bytes} байт.")
+        return chunk
+
+
+def iter_bulk_payload(
+    stream: BinaryIO,
+    max_bytes: int = CHECK_BULK_MAX_BODY_BYTES,
+    max_items: int = CHECK_BULK_MAX_ITEMS
+) -> Iterator[Tuple[str, Any, Any]]:
+    """
+    Разбирает тело {"results": [...], <поле>: <значение>, ...} по мере чтения.
+
+    Yields:
+        ('meta', имя, значение) - скалярные поля верхнего уровня (кроме 'results');
+        ('item', индекс, элемент) - очередной элемент массива 'results'.
+    Raises:
+        BulkPayloadTooLarge: Превышен max_bytes или max_items.
+        BulkPayloadError: Некорректный JSON, тело не объект, 'results' отсутствует или не массив.
+    """
+    reader = _LimitedReader(stream, max_bytes)
+    events = _iter_stream_events(reader) if HAS_IJSON else _iter_loaded_events(reader)
+    results_found = False
+    for kind, key, value in events:
+        if kind == 'results':
+            results_found = True
+            continue
+        if kind == 'item' and key >= max_items:
+            raise BulkPayloadTooLarge(f"Количество элементов 'results' превышает {max_items}.")
+        yield kind, key, value
+    if not results_found:
+        raise BulkPayloadError("Поле 'results' в теле запроса должно быть массивом (списком).")
+
+
+def _iter_stream_events(reader: _LimitedReader) -> Iterator[Tuple[str, Any, Any]]:
+    """ События разбора через ijson.parse: элемент 'results' собирается ObjectBuilder'ом целиком. """
+    item_builder: Optional[ijson.ObjectBuilder] = None
+    item_depth = 0
+    item_index = 0
+    started = False
+    try:
+        for prefix, event, value in ijson.parse(reader, buf_size=_READ_CHUNK_BYTES, use_float=True):
+            if item_builder is not None: # Внутри элемента 'results'
+                item_builder.event(event, value)
+                if event in ('start_map', 'start_array'):
+                    item_depth += 1
+                elif event in ('end_map', 'end_array'):
+                    item_depth -= 1
+                    if item_depth == 0:
+                        yield 'item', item_index, item_builder.value
+                        item_builder = None
+                        item_index += 1
+                continue
+            if prefix == '':
+                if event == 'start_map' and not started:
+                    started = True
+                    continue
+                if started and event in ('map_key', 'end_map'):
+                    continue
+                raise BulkPayloadError("Тело запроса для пакетной загрузки должно быть JSON-объектом.")
+            if prefix == 'results':
+                if event == 'start_array':
+                    yield 'results', None, None
+                    continue
+                if event == 'end_array':
+                    continue
+                raise BulkPayloadError("Поле 'results' в теле запроса должно быть массивом (списком).")
+            if prefix == 'results.item':
+                if event in ('start_map', 'start_array'):
+                    item_builder = ijson.ObjectBuilder()
+                    item_builder.event(event, value)
+                    item_depth = 1
+                    continue
+                yield 'item', item_index, value # Скалярный элемент - отклонит валидация
+                item_index += 1
+                continue
+            if '.' not in prefix and event in _SCALAR_EVENTS:
+                yield 'meta', prefix, value
+            # Вложенные значения прочих полей верхнего уровня не используются
+    except ijson.JSONError as e_json:
+        parse_error_text = str(e_json).strip().split('\n', 1)[0] # Сообщение yajl многострочное
+        raise BulkPayloadError(f"Тело запроса не является валидным JSON: {parse_error_text}")
+
+
+def _iter_loaded_events(reader: _LimitedReader) -> Iterator[Tuple[str, Any, Any]]:
+    """ Запасной вариант без ijson: тело читается целиком и выдается теми же событиями. """
+    try:
+        payload = json.loads(reader.read())
+    except (json.JSONDecodeError, UnicodeDecodeError) as e_json:
+        raise BulkPayloadError(f"Тело запроса не является валидным JSON: {e_json}")
+    if not isinstance(payload, dict):
+        raise BulkPayloadError("Тело запроса для пакетной загрузки должно быть JSON-объектом.")
+    for key, value in payload.items():
+        if key == 'results':
+            if not isinstance(value, list):
+                raise BulkPayloadError("Поле 'results' в теле запроса должно быть массивом (списком).")
+            yield 'results', None, None
+            for item_index, item in enumerate(value):
+                yield 'item', item_index, item
+        elif not isinstance(value, (dict, list)):
+            yield 'meta', key, value
@@ -0,0 +1,360 @@
+# status/app/services/check_ingest.py
+"""
+Запись результатов проверок в БД и асинхронный прием через локальную очередь.
+Версия 5.0.14: В режиме CHECK_INGEST_MODE=async маршруты /checks и /checks/bulk
+              только валидируют результаты, кладут их в очередь на диске (SQLite-файл
+              CHECK_INGEST_SPOOL_PATH, журнал WAL, synchronous=FULL) и отвечают 202 Accepted.
+              Фоновая задача каждые CHECK_INGEST_FLUSH_INTERVAL_SECONDS забирает из очереди
+              до CHECK_INGEST_BATCH_SIZE результатов и записывает их одной транзакцией
+              (record_check_items). Результаты удаляются из очереди только после фиксации;
+              если БД недоступна, они остаются в очереди до следующей попытки
+              (сбой между фиксацией и удалением из очереди приведет к повторной записи порции).
+              При заполнении очереди (CHECK_INGEST_MAX_QUEUE_DEPTH) прием отвечает 503
+              с Retry-After. Глубина очереди и задержка записи выводятся в /health.
+              Очередь рассчитана на один процесс-воркер (gunicorn -w 1): при нескольких
+              воркерах у каждого должен быть свой файл очереди.
+Версия 5.0.14: record_check_items (пакетная запись с точками сохранения) перенесена
+              сюда из check_routes - ее используют и маршрут, и фоновая запись.
+Версия 5.0.15: Ключ идемпотентности результата (resolve_idempotency_key): передается
+              агентом/загрузчиком или вычисляется из задания, времени выполнения на агенте
+              и исполнителя. Повторно присланный (или повторно записанный из очереди)
+              результат не записывается, а возвращается как повтор (duplicate).
+Версия 5.0.16: Порции одного потокового запроса /checks/bulk кладутся в очередь
+              "отложенными" (pending_request = тег запроса) и не видны фоновой записи.
+              После полного разбора тела они публикуются одной транзакцией SQLite
+              (commit_spool_request), при ошибке разбора - удаляются (rollback_spool_request),
+              поэтому клиент, получивший 400/413, может повторить пакет без двойного приема.
+              Общая транзакция SQLite на весь запрос не используется: она блокировала бы
+              очередь для других запросов и фоновой записи на время загрузки тела.
+              Отложенные порции, оставшиеся после сбоя процесса, удаляются при открытии очереди.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from . import dashboard_cache
+from . import node_service
+from ..db_connection import get_connection
+from ..db_request import savepoint
+from ..repositories import check_repository
+
+logger = logging.getLogger(__name__)
+
+CHECK_INGEST_MODE = os.getenv('CHECK_INGEST_MODE', 'sync').strip().lower() # 'sync' | 'async'
+CHECK_INGEST_SPOOL_PATH = os.getenv('CHECK_INGEST_SPOOL_PATH', os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'spool', 'check_ingest.sqlite3'))
+CHECK_INGEST_MAX_QUEUE_DEPTH = int(os.getenv('CHECK_INGEST_MAX_QUEUE_DEPTH', 200000))
+CHECK_INGEST_BATCH_SIZE = int(os.getenv('CHECK_INGEST_BATCH_SIZE', 2000))
+CHECK_INGEST_FLUSH_INTERVAL_SECONDS = float(os.getenv('CHECK_INGEST_FLUSH_INTERVAL_SECONDS', 1.0))
+CHECK_INGEST_RETRY_AFTER_SECONDS = int(os.getenv('CHECK_INGEST_RETRY_AFTER_SECONDS', 10))
+IDEMPOTENCY_KEY_MAX_LENGTH = 200
+
+
+class IngestQueueFull(Exception):
+    """ Очередь приема заполнена - клиент должен повторить отправку позже. """
+
+
+def resolve_idempotency_key(
+    client_key: Any,
+    assignment_id: int,
+    check_timestamp: Optional[datetime],
+    executor_object_id: Optional[int],
+    executor_host: Optional[str]
+) -> Optional[str]:
+    """
+    Ключ идемпотентности результата. Ключ клиента используется как есть; иначе ключ
+    вычисляется из (задание, время выполнения на агенте, исполнитель) - повторная
+    отправка того же файла дает тот же ключ. Без времени агента ключ не вычисляется
+    (время проставит сервер, и повтор неотличим от нового результата).
+    Raises:
+        ValueError: Ключ клиента не строка, пустой или длиннее IDEMPOTENCY_KEY_MAX_LENGTH.
+    """
+    if client_key is not None:
+        if not isinstance(client_key, str) or not client_key.strip() or len(client_key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise ValueError(f"Поле 'idempotency_key' должно быть непустой строкой до {IDEMPOTENCY_KEY_MAX_LENGTH} символов.")
+        return client_key
+    if check_timestamp is None:
+        return None
+    key_source = f"{assignment_id}|{check_timestamp.isoformat()}|{executor_object_id}|{executor_host or ''}"
+    return "auto:" + hashlib.sha1(key_source.encode('utf-8')).hexdigest()
+
+
+def record_check_items(cursor, valid_items: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Записывает провалидированные результаты в текущей транзакции.
+    Сначала - одним set-based вызовом в точке сохранения. Если он завершился ошибкой БД,
+    вызов откатывается до точки сохранения, и элементы записываются по одному, каждый
+    в своей точке сохранения. Потеря соединения не приписывается элементам - исключение пробрасывается.
+    Returns:
+        (строки {item_index, assignment_id, node_id, node_check_id, duplicate}, ошибки элементов для 207-ответа).
+        Строки с duplicate=True - повторы по ключу идемпотентности, они не записаны.
+    """
+    try:
+        with savepoint(cursor, 'checks_bulk'):
+            return check_repository.record_check_results_bulk(cursor, valid_items), []
+    except (psycopg2.Error, ValueError) as db_err_batch:
+        if cursor.connection.closed:
+            raise
+        logger.warning(f"Пакетная запись {len(valid_items)} результатов не удалась ({db_err_batch}). "
+                       "Запись по одному элементу с точками сохранения.")
+    written_rows: List[Dict[str, Any]] = []
+    item_errors: List[Dict[str, Any]] = []
+    for valid_item in valid_items:
+        try:
+            with savepoint(cursor, 'checks_bulk_item'):
+                written_rows.extend(check_repository.record_check_results_bulk(cursor, [valid_item]))
+        except (psycopg2.Error, ValueError) as db_err_item:
+            if cursor.connection.closed:
+                raise
+            item_errors.append({
+                "index": valid_item['item_index'],
+                "assignment_id": valid_item['assignment_id'],
+                "error": f"Ошибка базы данных: {getattr(db_err_item, 'pgcode', None)} - {str(db_err_item)}"
+            })
+    return written_rows, item_errors
+
+
+def _spool_json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+class _CheckIngestSpool:
+    """ Очередь результатов в SQLite-файле: добавление пачкой, чтение с начала, удаление после записи в БД. """
+    def __init__(self, path: str, max_depth: int):
+        self.path = path
+        self.max_depth = max_depth
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._depth = 0
+        self.enqueued = 0
+        self.rejected = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            if self.path != ':memory:':
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=FULL") # Принятый (202) результат не должен теряться при сбое
+            self._db.execute("CREATE TABLE IF NOT EXISTS spool ("
+                             "id INTEGER PRIMARY KEY AUTOINCREMENT, enqueued_at REAL NOT NULL, item TEXT NOT NULL, "
+                             "pending_request TEXT NULL)")
+            spool_columns = {column_info[1] for column_info in self._db.execute("PRAGMA table_info(spool)")}
+            if 'pending_request' not in spool_columns: # Очередь, созданная до v5.0.16
+                self._db.execute("ALTER TABLE spool ADD COLUMN pending_request TEXT NULL")
+            # Порции запросов, не завершенных до остановки процесса, клиенту не подтверждены
+            self._db.execute("DELETE FROM spool WHERE pending_request IS NOT NULL")
+            self._depth = self._db.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+            logger.info(f"CheckIngest: Очередь {self.path} открыта (результатов в очереди: {self._depth}).")
+        return self._db
+
+    def enqueue(self, items: List[Dict[str, Any]], request_tag: Optional[str] = None) -> int:
+        """
+        Добавляет результаты одной транзакцией SQLite. С request_tag результаты отложены
+        до commit_request (не видны peek). Raises: IngestQueueFull.
+        """
+        now = time.time()
+        rows = [(now, json.dumps(item, default=_spool_json_default), request_tag) for item in items]
+        with self._lock:
+            spool_db = self._connection()
+            if self._depth + len(rows) > self.max_depth:
+                self.rejected += len(rows)
+                raise IngestQueueFull(f"Очередь приема заполнена ({self._depth} из {self.max_depth}).")
+            with spool_db:
+                spool_db.execute("BEGIN IMMEDIATE")
+                spool_db.executemany("INSERT INTO spool (enqueued_at, item, pending_request) VALUES (?, ?, ?)", rows)
+            self._depth += len(rows)
+            if request_tag is None:
+                self.enqueued += len(rows)
+            return self._depth
+
+    def commit_request(self, request_tag: str) -> int:
+        """ Публикует отложенные результаты запроса одной транзакцией. Возвращает их количество. """
+        with self._lock:
+            spool_db = self._connection()
+            with spool_db:
+                spool_db.execute("BEGIN IMMEDIATE")
+                published = spool_db.execute("UPDATE spool SET pending_request = NULL WHERE pending_request = ?",
+                                             (request_tag,)).rowcount
+            self.enqueued += published
+            return published
+
+    def rollback_request(self, request_tag: str) -> int:
+        """ Удаляет отложенные результаты запроса. Возвращает их количество. """
+        with self._lock:
+            spool_db = self._connection()
+            with spool_db:
+                spool_db.execute("BEGIN IMMEDIATE")
+                discarded = spool_db.execute("DELETE FROM spool WHERE pending_request = ?", (request_tag,)).rowcount
+            self._depth = max(0, self._depth - discarded)
+            return discarded
+
+    def peek(self, limit: int) -> List[Tuple[int, Dict[str, Any]]]:
+        with self._lock:
+            rows = self._connection().execute("SELECT id, item FROM spool WHERE pending_request IS NULL "
+                                              "ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(spool_id, json.loads(item_json)) for spool_id, item_json in rows]
+
+    def ack(self, last_spool_id: int) -> None:
+        """ Удаляет из очереди все результаты до last_spool_id включительно (они записаны в БД). """
+        with self._lock:
+            spool_db = self._connection()
+            with spool_db:
+                spool_db.execute("BEGIN IMMEDIATE")
+                deleted = spool_db.execute("DELETE FROM spool WHERE id <= ? AND pending_request IS NULL",
+                                           (last_spool_id,)).rowcount
+            self._depth = max(0, self._depth - deleted)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            spool_db = self._connection()
+            oldest = spool_db.execute("SELECT MIN(enqueued_at) FROM spool WHERE pending_request IS NULL").fetchone()[0]
+            return {"depth": self._depth, "max_depth": self.max_depth,
+                    "lag_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+                    "enqueued": self.enqueued, "rejected": self.rejected}
+
+
+_ingest_spool: Optional[_CheckIngestSpool] = None
+_ingest_spool_lock = threading.Lock()
+_writer_stats: Dict[str, Any] = {"batches": 0, "written": 0, "duplicates": 0, "dropped": 0, "failed_batches": 0,
+                                 "last_batch_ms": None, "last_error": None}
+
+
+def is_async_ingest_enabled() -> bool:
+    return CHECK_INGEST_MODE == 'async'
+
+
+def _get_spool() -> _CheckIngestSpool:
+    global _ingest_spool
+    with _ingest_spool_lock:
+        if _ingest_spool is None:
+            _ingest_spool = _CheckIngestSpool(CHECK_INGEST_SPOOL_PATH, CHECK_INGEST_MAX_QUEUE_DEPTH)
+        return _ingest_spool
+
+
+def enqueue_check_items(items: List[Dict[str, Any]], request_tag: Optional[str] = None) -> int:
+    """
+    Помещает провалидированные результаты (формат _validate_bulk_item) в очередь приема.
+    С request_tag (begin_spool_request) результаты ждут commit_spool_request.
+    Возвращает глубину очереди после добавления. Raises: IngestQueueFull.
+    """
+    return _get_spool().enqueue(items, request_tag)
+
+
+def begin_spool_request() -> str:
+    """ Тег запроса, порции которого публикуются в очереди только вместе (commit_spool_request). """
+    return uuid.uuid4().hex
+
+
+def commit_spool_request(request_tag: str) -> int:
+    """ Делает результаты запроса доступными фоновой записи (одна транзакция SQLite). """
+    return _get_spool().commit_request(request_tag)
+
+
+def rollback_spool_request(request_tag: str) -> int:
+    """ Удаляет из очереди результаты незавершенного запроса (ошибка разбора тела). """
+    discarded = _get_spool().rollback_request(request_tag)
+    if discarded:
+        logger.warning(f"CheckIngest: Запрос не принят, из очереди удалено отложенных результатов: {discarded}.")
+    return discarded
+
+
+def flush_check_ingest_queue(batch_size: int = CHECK_INGEST_BATCH_SIZE) -> int:
+    """
+    Записывает в БД одну порцию из очереди (одна транзакция) и удаляет ее из очереди после фиксации.
+    Результаты с ошибкой элемента (задание не найдено, ошибка данных) отбрасываются с записью в журнал,
+    повторы по ключу идемпотентности (в т.ч. повторная запись порции после сбоя до удаления из очереди) пропускаются.
+    Возвращает количество обработанных результатов (0 - очередь пуста).
+    """
+    spool_batch = _get_spool().peek(batch_size)
+    if not spool_batch:
+        return 0
+    batch_started = time.monotonic()
+    batch_items: List[Dict[str, Any]] = []
+    for batch_index, (_, spooled_item) in enumerate(spool_batch):
+        batch_items.append(dict(spooled_item, item_index=batch_index)) # Индексы запросов в порции пересекаются
+    try:
+        with get_connection() as conn_ingest:
+            try:
+                with conn_ingest.cursor(cursor_factory=RealDictCursor) as cursor_ingest:
+                    result_rows, item_errors = record_check_items(cursor_ingest, batch_items)
+                conn_ingest.commit()
+            except Exception:
+                if not conn_ingest.closed: conn_ingest.rollback()
+                raise
+            written_rows = [row for row in result_rows if not row.get('duplicate')]
+            _publish_written_nodes(conn_ingest, {row['node_id'] for row in written_rows})
+    except Exception as e_flush:
+        _writer_stats["failed_batches"] += 1
+        _writer_stats["last_error"] = f"{type(e_flush).__name__}: {e_flush}"
+        logger.error(f"CheckIngest: Не удалось записать порцию из {len(spool_batch)} результатов, "
+                     f"она останется в очереди: {e_flush}")
+        return 0
+    _get_spool().ack(spool_batch[-1][0])
+    duplicates_count = len(result_rows) - len(written_rows)
+    dropped_count = len(spool_batch) - len(result_rows)
+    if dropped_count:
+        logger.warning(f"CheckIngest: Отброшено результатов: {dropped_count} (ошибки элементов: {item_errors[:5]}).")
+    _writer_stats["batches"] += 1
+    _writer_stats["written"] += len(written_rows)
+    _writer_stats["duplicates"] += duplicates_count
+    _writer_stats["dropped"] += dropped_count
+    _writer_stats["last_batch_ms"] = round((time.monotonic() - batch_started) * 1000, 1)
+    return len(spool_batch)
+
+
+def _publish_written_nodes(conn, node_ids: set) -> None:
+    """ Обновляет снимок дашборда узлами записанной (уже зафиксированной) порции. """
+    if not node_ids or not dashboard_cache.is_dashboard_snapshot_built():
+        return
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor_status:
+            dashboard_cache.patch_dashboard_nodes(node_service.get_processed_node_status(cursor_status, node_ids))
+    except Exception as e_publish:
+        logger.error(f"CheckIngest: Ошибка обновления снимка дашборда: {e_publish}", exc_info=True)
+    finally:
+        conn.rollback() # Только чтение - транзакцию не оставляем открытой
+
+
+def _check_ingest_loop(socketio) -> None:
+    logger.info(f"CheckIngest: Фоновая запись очереди запущена (интервал {CHECK_INGEST_FLUSH_INTERVAL_SECONDS} с, "
+                f"порция до {CHECK_INGEST_BATCH_SIZE}).")
+    while True:
+        try:
+            # Полная порция - очередь не успевает разгружаться, следующую пишем сразу
+            while flush_check_ingest_queue() >= CHECK_INGEST_BATCH_SIZE:
+                socketio.sleep(0)
+        except Exception as e_loop:
+            logger.error(f"CheckIngest: Ошибка фоновой записи: {e_loop}", exc_info=True)
+        socketio.sleep(CHECK_INGEST_FLUSH_INTERVAL_SECONDS)
+
+
+def init_check_ingest(socketio) -> None:
+    """ В асинхронном режиме открывает очередь (с результатами, оставшимися с прошлого запуска) и запускает запись. """
+    if not is_async_ingest_enabled():
+        return
+    _get_spool().stats()
+    socketio.start_background_task(_check_ingest_loop, socketio)
+
+
+def get_check_ingest_stats() -> Dict[str, Any]:
+    """ Режим приема, глубина и задержка очереди, счетчики фоновой записи (для /health). """
+    if not is_async_ingest_enabled():
+        return {"mode": CHECK_INGEST_MODE}
+    ingest_stats = {"mode": CHECK_INGEST_MODE}
+    try:
+        ingest_stats.update(_get_spool().stats())
+    except sqlite3.Error as e_stats:
+        ingest_stats["spool_error"] = str(e_stats)
+    ingest_stats.update(_writer_stats)
+    return ingest_stats
@@ -0,0 +1,231 @@
+# status/app/services/dashboard_cache.py
+"""
+Общий (на процесс) кеш снимка статусов узлов для /api/v1/dashboard и /api/v1/status_detailed.
+Версия 5.0.8: Снимок строится один раз и разделяется всеми вкладками браузера.
+             Прием результатов проверок обновляет в снимке только затронутые узлы,
+             изменения узлов/подразделений/типов сбрасывают снимок целиком.
+             Для каждой версии снимка представление сериализуется один раз,
+             ETag вычисляется по телу ответа (клиенты получают 304 Not Modified).
+
+Статус узла зависит и от времени (устаревание по таймауту), поэтому снимок
+дополнительно перестраивается не чаще, чем раз в DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS.
+Версия снимка увеличивается только если данные действительно изменились.
+Кеш локален для процесса: при нескольких воркерах у каждого свой снимок,
+но ETag одинаковый для одинаковых данных (вычисляется по содержимому).
+Версия 5.0.9: Подписчики (add_change_listener) получают реально изменившиеся узлы
+             при точечном обновлении и пересборке снимка; удаление узлов, изменение
+             подразделений и инвалидация передаются как запрос полной ресинхронизации.
+Версия 5.0.12: get_dashboard_view получает функцию-поставщик курсора и вызывает ее только
+              при пересборке снимка (соединение из пула не берется при попадании в кеш).
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import psycopg2
+
+from . import node_service
+from ..repositories import subdivision_repository
+
+logger = logging.getLogger(__name__)
+
+DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS = float(os.getenv('DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS', 15))
+
+
+class _DashboardSnapshotCache:
+    """ Потокобезопасный снимок: узлы со статусами, подразделения, счетчик версий и сериализованные представления. """
+    def __init__(self, max_age_seconds: float):
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.RLock()
+        self._nodes: Dict[int, Dict[str, Any]] = {}
+        self._subdivisions: List[Dict[str, Any]] = []
+        self._built_at: Optional[float] = None # time.monotonic() последней полной сборки
+        self.version = 0
+        # Имя представления -> (версия снимка, тело ответа, ETag)
+        self._rendered_views: Dict[str, Tuple[int, bytes, str]] = {}
+        self._ever_built = False # Первая сборка не рассылается подписчикам как изменения
+        # Подписчики: callback(изменившиеся узлы, требуется ли полная ресинхронизация)
+        self._change_listeners: List[Callable[[List[Dict[str, Any]], bool], None]] = []
+        self.rebuilds = 0
+        self.patches = 0
+        self.view_hits = 0
+        self.view_renders = 0
+        self.invalidations = 0
+
+    def is_built(self) -> bool:
+        with self._lock:
+            return self._built_at is not None
+
+    def _is_stale(self) -> bool:
+        return self._built_at is None or time.monotonic() - self._built_at >= self.max_age_seconds
+
+    def add_change_listener(self, listener: Callable[[List[Dict[str, Any]], bool], None]) -> None:
+        with self._lock:
+            if listener not in self._change_listeners:
+                self._change_listeners.append(listener)
+
+    def _notify(self, changed_nodes: List[Dict[str, Any]], resync: bool) -> None:
+        """ Вызывается вне блокировки: подписчики могут сами обращаться к кешу. """
+        if not changed_nodes and not resync:
+            return
+        for listener in list(self._change_listeners):
+            try:
+                listener(changed_nodes, resync)
+            except Exception as e_listener:
+                logger.error(f"DashboardCache: Ошибка подписчика изменений снимка: {e_listener}", exc_info=True)
+
+    def _rebuild(self, cursor) -> Tuple[List[Dict[str, Any]], bool]:
+        """ Пересобирает снимок. Возвращает (изменившиеся узлы, требуется ли ресинхронизация). """
+        nodes_with_status = node_service.get_processed_node_status(cursor)
+        subdivisions_flat, _ = subdivision_repository.fetch_subdivisions(cursor, limit=None)
+        new_nodes = {node_data['id']: node_data for node_data in nodes_with_status}
+        changed_nodes: List[Dict[str, Any]] = []
+        resync = False
+        if new_nodes != self._nodes or subdivisions_flat != self._subdivisions:
+            self.version += 1
+            if self._ever_built:
+                changed_nodes = [dict(node_data) for node_id, node_data in new_nodes.items()
+                                 if self._nodes.get(node_id) != node_data]
+                resync = subdivisions_flat != self._subdivisions or not self._nodes.keys() <= new_nodes.keys()
+        self._nodes = new_nodes
+        self._subdivisions = subdivisions_flat
+        self._built_at = time.monotonic()
+        self._ever_built = True
+        self.rebuilds += 1
+        logger.debug(f"DashboardCache: Снимок перестроен (узлов: {len(new_nodes)}, версия: {self.version}).")
+        return changed_nodes, resync
+
+    def refresh_if_stale(self, cursor) -> bool:
+        """ Пересобирает построенный, но устаревший снимок (фоновое обновление по таймауту статусов). """
+        with self._lock:
+            if self._built_at is None or not self._is_stale():
+                return False
+            changed_nodes, resync = self._rebuild(cursor)
+        self._notify(changed_nodes, resync)
+        return True
+
+    def get_view(self, get_cursor: Callable[[], Any], view_name: str,
+                 build_payload: Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Any],
+                 serialize: Callable[[Any], bytes]) -> Tuple[bytes, str]:
+        """
+        Возвращает (тело ответа, ETag) представления view_name для текущей версии снимка.
+        Блокировка удерживается на время сборки: одновременные запросы ждут одну сборку вместо N.
+        get_cursor вызывается только при (пере)сборке снимка.
+        """
+        changed_nodes: List[Dict[str, Any]] = []
+        resync = False
+        with self._lock:
+            if self._is_stale():
+                changed_nodes, resync = self._rebuild(get_cursor())
+            rendered_view = self._rendered_views.get(view_name)
+            if rendered_view is not None and rendered_view[0] == self.version:
+                self.view_hits += 1
+                body, etag = rendered_view[1], rendered_view[2]
+            else:
+                payload = build_payload([dict(node_data) for node_data in self._nodes.values()],
+                                        [dict(sub) for sub in self._subdivisions])
+                body = serialize(payload)
+                if isinstance(body, str):
+                    body = body.encode('utf-8')
+                etag = hashlib.sha1(body).hexdigest()
+                self._rendered_views[view_name] = (self.version, body, etag)
+                self.view_renders += 1
+        self._notify(changed_nodes, resync)
+        return body, etag
+
+    def patch_nodes(self, processed_nodes: Iterable[Dict[str, Any]]) -> int:
+        """ Подменяет в снимке записи переданных узлов. Возвращает число реально изменившихся узлов. """
+        with self._lock:
+            if self._built_at is None:
+                return 0 # Снимка нет - будет построен при следующем чтении
+            changed_nodes: List[Dict[str, Any]] = []
+            for node_data in processed_nodes:
+                node_id = node_data.get('id')
+                if node_id is None or self._nodes.get(node_id) == node_data:
+                    continue
+                self._nodes[node_id] = dict(node_data)
+                changed_nodes.append(dict(node_data))
+            if changed_nodes:
+                self.version += 1
+                self.patches += 1
+        self._notify(changed_nodes, False)
+        return len(changed_nodes)
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._built_at = None
+            self.invalidations += 1
+        self._notify([], True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "built": self._built_at is not None, "version": self.version,
+                "nodes": len(self._nodes), "max_age_seconds": self.max_age_seconds,
+                "age_seconds": round(time.monotonic() - self._built_at, 3) if self._built_at is not None else None,
+                "rebuilds": self.rebuilds, "patches": self.patches, "invalidations": self.invalidations,
+                "view_hits": self.view_hits, "view_renders": self.view_renders,
+            }
+
+
+_dashboard_snapshot_cache = _DashboardSnapshotCache(DASHBOARD_SNAPSHOT_MAX_AGE_SECONDS)
+
+
+def get_dashboard_view(get_cursor: Callable[[], psycopg2.extensions.cursor], view_name: str,
+                       build_payload: Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], Any],
+                       serialize: Callable[[Any], bytes]) -> Tuple[bytes, str]:
+    """
+    Возвращает сериализованное представление снимка и его ETag.
+
+    Args:
+        get_cursor: Функция, возвращающая курсор БД (RealDictCursor). Вызывается только
+            при (пере)сборке снимка: попадание в кеш и 304 не берут соединение из пула.
+        view_name: Имя представления ('dashboard', 'status_detailed').
+        build_payload: Функция (узлы, подразделения) -> данные ответа. Получает копии записей.
+        serialize: Функция сериализации данных ответа в bytes/str.
+    """
+    return _dashboard_snapshot_cache.get_view(get_cursor, view_name, build_payload, serialize)
+
+
+def is_dashboard_snapshot_built() -> bool:
+    """ True, если снимок уже построен (имеет смысл вычислять статусы узлов для patch_dashboard_nodes). """
+    return _dashboard_snapshot_cache.is_built()
+
+
+def patch_dashboard_nodes(processed_nodes: Iterable[Dict[str, Any]]) -> int:
+    """
+    Обновляет в снимке статусы узлов, затронутых приемом результатов проверок.
+    processed_nodes - результат node_service.get_processed_node_status(cursor, node_ids).
+    """
+    changed_count = _dashboard_snapshot_cache.patch_nodes(processed_nodes)
+    if changed_count:
+        logger.debug(f"DashboardCache: Обновлено узлов в снимке: {changed_count}.")
+    return changed_count
+
+
+def refresh_dashboard_snapshot_if_stale(cursor: psycopg2.extensions.cursor) -> bool:
+    """ Пересобирает устаревший снимок без HTTP-запроса (вызывается фоновой задачей рассылки). """
+    return _dashboard_snapshot_cache.refresh_if_stale(cursor)
+
+
+def add_change_listener(listener: Callable[[List[Dict[str, Any]], bool], None]) -> None:
+    """
+    Подписывает listener(changed_nodes, resync) на изменения снимка.
+    changed_nodes - записи узлов, изменившихся при точечном обновлении или пересборке;
+    resync=True - изменилась структура (узлы удалены, подразделения, инвалидация), нужна полная перезагрузка.
+    """
+    _dashboard_snapshot_cache.add_change_listener(listener)
+
+
+def invalidate_dashboard_cache() -> None:
+    """ Сбрасывает снимок целиком (изменены узлы, подразделения, типы или свойства узлов). """
+    _dashboard_snapshot_cache.invalidate()
+    logger.debug("DashboardCache: Снимок инвалидирован.")
+
+
+def get_dashboard_cache_stats() -> Dict[str, Any]:
+    """ Счетчики кеша снимка (для /health). """
+    return _dashboard_snapshot_cache.stats()
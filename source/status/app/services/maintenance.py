@@ -0,0 +1,165 @@
+# status/app/services/maintenance.py
+"""
+Периодическое обслуживание БД фоновой задачей приложения (v5.0.24).
+Раз в MAINTENANCE_INTERVAL_SECONDS (после паузы MAINTENANCE_START_DELAY_SECONDS
+от старта) задача:
+  1. Создает секции истории проверок, ключей идемпотентности и журнала событий
+     на MAINTENANCE_PARTITIONS_DAYS_BACK суток назад и MAINTENANCE_PARTITIONS_DAYS_AHEAD
+     вперед (то же, что flask checks create-partitions).
+  2. Выполняет прогон хранения истории retention_service.run_retention: агрегацию,
+     удаление старых секций и пакетов, перевод секций событий в холодные
+     (то же, что flask checks retention).
+Каждый шаг выполняется отдельно: ошибка одного шага записывается в журнал
+и не отменяет остальные. При нескольких процессах-воркерах прогон выполняет
+только тот, кто получил рекомендательную блокировку (pg_try_advisory_lock),
+остальные его пропускают. MAINTENANCE_INTERVAL_SECONDS=0 отключает задачу
+(обслуживание тогда запускается командами flask checks из планировщика).
+Версия 5.0.24: Отдельная фоновая задача раз в MAINTENANCE_SUMMARY_INTERVAL_SECONDS
+              записывает сводные события CHECK_RESULTS_SUMMARY за завершенные интервалы
+              (то же, что flask checks event-summaries, v5.0.23). Параллельные вызовы
+              из нескольких воркеров сводки не дублируют (блокируется строка отметки).
+"""
+import logging
+import os
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+from . import retention_service
+from ..db_connection import get_connection
+from ..repositories import check_repository, event_repository
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv('MAINTENANCE_INTERVAL_SECONDS', 3600))
+MAINTENANCE_START_DELAY_SECONDS = float(os.getenv('MAINTENANCE_START_DELAY_SECONDS', 60))
+MAINTENANCE_PARTITIONS_DAYS_AHEAD = int(os.getenv('MAINTENANCE_PARTITIONS_DAYS_AHEAD', 7))
+MAINTENANCE_PARTITIONS_DAYS_BACK = int(os.getenv('MAINTENANCE_PARTITIONS_DAYS_BACK', 1))
+MAINTENANCE_SUMMARY_INTERVAL_SECONDS = float(os.getenv('MAINTENANCE_SUMMARY_INTERVAL_SECONDS', 30))
+# Ключ рекомендательной блокировки: один прогон обслуживания на всю БД
+MAINTENANCE_ADVISORY_LOCK_KEY = 5024001
+
+_maintenance_stats: Dict[str, Any] = {"runs": 0, "skipped_locked": 0, "last_run_at": None, "last_errors": [],
+                                      "summary_events_logged": 0, "summary_last_error": None}
+
+
+def _create_partitions(conn, today_utc: date) -> Dict[str, int]:
+    """ Создает секции истории проверок и журнала событий; ошибка одной группы не мешает другой. """
+    date_from = today_utc - timedelta(days=MAINTENANCE_PARTITIONS_DAYS_BACK)
+    date_to = today_utc + timedelta(days=MAINTENANCE_PARTITIONS_DAYS_AHEAD)
+    created: Dict[str, int] = {'check_partitions': 0, 'event_partitions': 0}
+    for stat_key, create_partitions in (('check_partitions', check_repository.create_check_partitions),
+                                        ('event_partitions', event_repository.create_event_partitions)):
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                created[stat_key] = create_partitions(cursor, date_from, date_to)
+            conn.commit()
+        except psycopg2.Error as e_partitions:
+            conn.rollback()
+            _maintenance_stats["last_errors"].append(f"{stat_key}: {e_partitions}")
+            logger.error(f"Maintenance: Ошибка создания секций ({stat_key}): {e_partitions}")
+    return created
+
+
+def run_maintenance(conn, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+    """
+    Выполняет один прогон обслуживания (секции вперед, хранение истории).
+
+    Args:
+        conn: Соединение psycopg2 (транзакции фиксируются внутри по шагам).
+        now: Текущее время (для тестов), по умолчанию - сейчас UTC.
+
+    Returns:
+        Статистика прогона или None, если прогон уже выполняет другой процесс.
+    """
+    now_utc = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    with conn.cursor() as cursor_lock:
+        cursor_lock.execute("SELECT pg_try_advisory_lock(%s);", (MAINTENANCE_ADVISORY_LOCK_KEY,))
+        lock_acquired = cursor_lock.fetchone()[0]
+    conn.commit() # Блокировка сессионная - переживает фиксацию
+    if not lock_acquired:
+        _maintenance_stats["skipped_locked"] += 1
+        logger.info("Maintenance: Прогон пропущен - обслуживание выполняет другой процесс.")
+        return None
+    _maintenance_stats["last_errors"] = []
+    try:
+        maintenance_stats: Dict[str, Any] = _create_partitions(conn, now_utc.date())
+        try:
+            maintenance_stats['retention'] = retention_service.run_retention(conn, now=now_utc)
+        except psycopg2.Error as e_retention:
+            conn.rollback()
+            _maintenance_stats["last_errors"].append(f"retention: {e_retention}")
+            logger.error(f"Maintenance: Ошибка прогона хранения истории: {e_retention}", exc_info=True)
+    finally:
+        conn.rollback() # Незавершенная после ошибки транзакция не должна мешать снятию блокировки
+        with conn.cursor() as cursor_unlock:
+            cursor_unlock.execute("SELECT pg_advisory_unlock(%s);", (MAINTENANCE_ADVISORY_LOCK_KEY,))
+        conn.commit()
+    _maintenance_stats["runs"] += 1
+    _maintenance_stats["last_run_at"] = now_utc.isoformat()
+    logger.info(f"Maintenance: Прогон завершен: секций проверок создано {maintenance_stats['check_partitions']}, "
+                f"секций событий {maintenance_stats['event_partitions']}.")
+    return maintenance_stats
+
+
+def write_check_event_summaries(conn) -> int:
+    """ Записывает сводные события о результатах проверок за завершенные интервалы. """
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            logged_count = check_repository.log_check_result_summaries(cursor)
+        conn.commit()
+    except psycopg2.Error as e_summaries:
+        conn.rollback()
+        _maintenance_stats["summary_last_error"] = str(e_summaries)
+        logger.error(f"Maintenance: Ошибка записи сводных событий: {e_summaries}")
+        return 0
+    _maintenance_stats["summary_events_logged"] += logged_count
+    _maintenance_stats["summary_last_error"] = None
+    return logged_count
+
+
+def _summary_loop(socketio, app) -> None:
+    logger.info(f"Maintenance: Фоновая запись сводных событий запущена (интервал {MAINTENANCE_SUMMARY_INTERVAL_SECONDS} с).")
+    while True:
+        socketio.sleep(MAINTENANCE_SUMMARY_INTERVAL_SECONDS)
+        try:
+            with app.app_context():
+                with get_connection() as conn:
+                    write_check_event_summaries(conn)
+        except Exception as e_loop:
+            logger.error(f"Maintenance: Ошибка фоновой записи сводных событий: {e_loop}", exc_info=True)
+
+
+def _maintenance_loop(socketio, app) -> None:
+    logger.info(f"Maintenance: Фоновое обслуживание запущено (интервал {MAINTENANCE_INTERVAL_SECONDS} с).")
+    socketio.sleep(MAINTENANCE_START_DELAY_SECONDS)
+    while True:
+        try:
+            with app.app_context():
+                with get_connection() as conn:
+                    run_maintenance(conn)
+        except Exception as e_loop:
+            logger.error(f"Maintenance: Ошибка фонового обслуживания: {e_loop}", exc_info=True)
+        socketio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+
+
+def init_maintenance(socketio, app) -> None:
+    """
+    Запускает фоновое обслуживание и запись сводных событий (кроме тестового режима;
+    интервал 0 отключает соответствующую задачу).
+    """
+    if app.config.get('FLASK_ENV') == 'testing':
+        logger.info("Maintenance: Фоновое обслуживание отключено (тестовый режим).")
+        return
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(_maintenance_loop, socketio, app)
+    if MAINTENANCE_SUMMARY_INTERVAL_SECONDS > 0:
+        socketio.start_background_task(_summary_loop, socketio, app)
+
+
+def get_maintenance_stats() -> Dict[str, Any]:
+    """ Счетчики фонового обслуживания (для /health). """
+    return dict(_maintenance_stats, interval_seconds=MAINTENANCE_INTERVAL_SECONDS,
+                summary_interval_seconds=MAINTENANCE_SUMMARY_INTERVAL_SECONDS)
@@ -0,0 +1,218 @@
+# status/app/services/retention_service.py
+"""
+Сервис хранения истории проверок и событий (v5.0.7).
+
+Сроки хранения задаются в таблице settings (см. RETENTION_SETTINGS_DEFAULTS).
+Один прогон run_retention:
+  1. Агрегирует node_checks в почасовые/суточные node_check_rollups от сохраненной
+     отметки (retention_rollup_watermark) до начала текущего часа, порциями по суткам.
+  2. Удаляет "сырую" историю старше срока хранения - целыми суточными секциями
+     (только уже агрегированную), остаток в секции по умолчанию - пакетами.
+     Вместе с секциями истории удаляются секции ключей идемпотентности (v5.0.15).
+  3. Журнал событий system_events (v5.0.24, секции по суткам): создает секции вперед,
+     переводит секции старше retention_system_events_hot_days в холодные (только BRIN),
+     удаляет секции старше срока хранения, остаток в секции по умолчанию - пакетами.
+  4. Пакетами удаляет старые агрегаты.
+Каждый шаг и каждый пакет фиксируется отдельной транзакцией, поэтому очистка
+не держит длинных блокировок и не мешает записи результатов.
+Ошибка БД в шаге над секциями (создание, удаление, перевод в холодные)
+откатывает только этот шаг: остальные шаги прогона выполняются.
+"""
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Optional
+
+import psycopg2
+from psycopg2 import errors as pg_errors
+from psycopg2.extras import RealDictCursor
+
+from ..repositories import check_repository, event_repository, settings_repository
+
+logger = logging.getLogger(__name__)
+
+# Настройки хранения (ключ в settings -> значение по умолчанию, сутки / строки)
+RETENTION_SETTINGS_DEFAULTS: Dict[str, int] = {
+    'retention_raw_checks_days': 30,
+    'retention_rollup_hourly_days': 180,
+    'retention_rollup_daily_days': 1095,
+    'retention_system_events_days': 90,
+    'retention_system_events_hot_days': 2,
+    'retention_purge_batch_size': 5000,
+}
+# Отметка, до которой (не включительно) история уже агрегирована
+ROLLUP_WATERMARK_KEY = 'retention_rollup_watermark'
+# Размер порции агрегации за одну транзакцию
+ROLLUP_CHUNK = timedelta(hours=24)
+# Ожидание блокировки при отсоединении секций: лучше пропустить прогон, чем задержать запись
+PARTITION_LOCK_TIMEOUT = '5s'
+# На сколько суток вперед создаются секции журнала событий
+EVENT_PARTITIONS_DAYS_AHEAD = 7
+
+
+def _floor_to_day(moment: datetime) -> datetime:
+    return moment.astimezone(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def load_retention_settings(cursor: psycopg2.extensions.cursor) -> Dict[str, int]:
+    """
+    Читает настройки хранения из settings. Отсутствующие или некорректные
+    (не целые, <= 0) значения заменяются значениями по умолчанию.
+    """
+    raw_values = settings_repository.get_settings(cursor, RETENTION_SETTINGS_DEFAULTS.keys())
+    retention_settings: Dict[str, int] = {}
+    for setting_key, default_value in RETENTION_SETTINGS_DEFAULTS.items():
+        raw_value = raw_values.get(setting_key)
+        try:
+            parsed_value = int(raw_value) if raw_value is not None else default_value
+            if parsed_value <= 0:
+                raise ValueError("значение должно быть > 0")
+        except ValueError as e_setting:
+            logger.warning(f"Retention: Некорректная настройка '{setting_key}'='{raw_value}' ({e_setting}). Используется {default_value}.")
+            parsed_value = default_value
+        retention_settings[setting_key] = parsed_value
+    return retention_settings
+
+
+def get_history_cutoffs(cursor: psycopg2.extensions.cursor, now: Optional[datetime] = None) -> Dict[str, datetime]:
+    """
+    Границы хранения (начало суток UTC): 'raw_cutoff' - раньше нее доступны только агрегаты,
+    'hourly_cutoff' - раньше нее только суточные агрегаты.
+    """
+    retention_settings = load_retention_settings(cursor)
+    now_utc = now or datetime.now(timezone.utc)
+    return {
+        'raw_cutoff': _floor_to_day(now_utc - timedelta(days=retention_settings['retention_raw_checks_days'])),
+        'hourly_cutoff': _floor_to_day(now_utc - timedelta(days=retention_settings['retention_rollup_hourly_days'])),
+    }
+
+
+def get_events_hot_boundary(cursor: psycopg2.extensions.cursor, now: Optional[datetime] = None) -> datetime:
+    """
+    Начало горячих секций журнала событий (начало суток UTC): более ранние события лежат
+    в холодных секциях (только BRIN) и читаются, только если их требует фильтр по времени.
+    """
+    retention_settings = load_retention_settings(cursor)
+    now_utc = now or datetime.now(timezone.utc)
+    return _floor_to_day(now_utc - timedelta(days=retention_settings['retention_system_events_hot_days']))
+
+
+def _purge_in_batches(conn, purge_batch: Callable[[int], int], batch_size: int) -> int:
+    """ Вызывает purge_batch до тех пор, пока пакет не окажется неполным; фиксирует каждый пакет. """
+    total_deleted = 0
+    while True:
+        deleted_in_batch = purge_batch(batch_size)
+        conn.commit()
+        total_deleted += deleted_in_batch
+        if deleted_in_batch < batch_size:
+            return total_deleted
+
+
+def _run_partition_step(conn, cursor, step_title: str, run_step: Callable[[], Any], default: Any) -> Any:
+    """
+    Выполняет DDL над секциями отдельной транзакцией с lock_timeout.
+    Ошибка БД откатывает только этот шаг (повтор в следующем прогоне) - прогон продолжается.
+    """
+    try:
+        cursor.execute(f"SET LOCAL lock_timeout = '{PARTITION_LOCK_TIMEOUT}';")
+        result = run_step()
+        conn.commit()
+        return result
+    except pg_errors.LockNotAvailable:
+        conn.rollback()
+        logger.warning(f"Retention: {step_title}: секции заняты (lock_timeout), шаг отложен до следующего прогона.")
+    except psycopg2.Error as e:
+        conn.rollback()
+        logger.error(f"Retention: {step_title}: ошибка БД, шаг пропущен до следующего прогона: {e}")
+    return default
+
+
+def _rollup_pending_history(conn, cursor, now_utc: datetime) -> Optional[datetime]:
+    """ Агрегирует историю от отметки до начала текущего часа. Возвращает новую отметку. """
+    current_hour = now_utc.replace(minute=0, second=0, microsecond=0)
+    stored_watermark = settings_repository.get_settings(cursor, [ROLLUP_WATERMARK_KEY]).get(ROLLUP_WATERMARK_KEY)
+    if stored_watermark:
+        watermark = datetime.fromisoformat(stored_watermark)
+    else:
+        oldest_check_time = check_repository.get_oldest_check_time(cursor)
+        if oldest_check_time is None:
+            conn.rollback()
+            return None # Истории нет - агрегировать нечего
+        watermark = oldest_check_time.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    while watermark < current_hour:
+        chunk_end = min(watermark + ROLLUP_CHUNK, current_hour)
+        hourly_rows = check_repository.rollup_node_checks(cursor, watermark, chunk_end)
+        settings_repository.set_setting(cursor, ROLLUP_WATERMARK_KEY, chunk_end.isoformat(),
+                                        'Служебная: история node_checks агрегирована до этого момента (UTC).')
+        conn.commit()
+        logger.info(f"Retention: Агрегировано {watermark.isoformat()} - {chunk_end.isoformat()}: почасовых агрегатов {hourly_rows}.")
+        watermark = chunk_end
+    conn.rollback() # Завершаем транзакцию чтения
+    return watermark
+
+
+def run_retention(conn, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Выполняет агрегацию и очистку истории согласно настройкам из settings.
+
+    Args:
+        conn: Соединение psycopg2 (транзакции фиксируются внутри по шагам).
+        now: Текущее время (для тестов), по умолчанию - сейчас UTC.
+
+    Returns:
+        Словарь со статистикой прогона.
+    """
+    now_utc = (now or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    stats: Dict[str, Any] = {'dropped_partitions': [], 'deleted_default_checks': 0, 'deleted_default_ingest_keys': 0, 'deleted_events': 0,
+                             'created_event_partitions': 0, 'demoted_event_partitions': [], 'dropped_event_partitions': [],
+                             'deleted_hourly_rollups': 0, 'deleted_daily_rollups': 0}
+    with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+        retention_settings = load_retention_settings(cursor)
+        conn.rollback()
+        batch_size = retention_settings['retention_purge_batch_size']
+        stats['settings'] = retention_settings
+
+        # --- 1. Агрегация ---
+        watermark = _rollup_pending_history(conn, cursor, now_utc)
+        stats['rollup_watermark'] = watermark.isoformat() if watermark else None
+
+        # --- 2. "Сырая" история: только уже агрегированная часть ---
+        raw_cutoff = _floor_to_day(now_utc - timedelta(days=retention_settings['retention_raw_checks_days']))
+        raw_purge_before = min(raw_cutoff, _floor_to_day(watermark)) if watermark else raw_cutoff
+        dropped_partitions = _run_partition_step(
+            conn, cursor, "Удаление секций истории",
+            lambda: check_repository.drop_check_partitions(cursor, raw_purge_before.date()), [])
+        stats['dropped_partitions'] = [p['partition_name'] for p in dropped_partitions]
+        stats['deleted_default_checks'] = _purge_in_batches(
+            conn, lambda size: check_repository.purge_default_partition_checks_batch(cursor, raw_purge_before, size), batch_size)
+        stats['deleted_default_ingest_keys'] = _purge_in_batches(
+            conn, lambda size: check_repository.purge_default_partition_ingest_keys_batch(cursor, raw_purge_before.date(), size), batch_size)
+
+        # --- 3. События: секции вперед, горячие -> холодные, удаление старых ---
+        today_utc = _floor_to_day(now_utc).date()
+        stats['created_event_partitions'] = _run_partition_step(
+            conn, cursor, "Создание секций журнала событий",
+            lambda: event_repository.create_event_partitions(
+                cursor, today_utc, today_utc + timedelta(days=EVENT_PARTITIONS_DAYS_AHEAD)), 0)
+        hot_boundary = _floor_to_day(now_utc - timedelta(days=retention_settings['retention_system_events_hot_days']))
+        events_cutoff = _floor_to_day(now_utc - timedelta(days=retention_settings['retention_system_events_days']))
+        stats['dropped_event_partitions'] = _run_partition_step(
+            conn, cursor, "Удаление секций журнала событий",
+            lambda: event_repository.drop_event_partitions(cursor, events_cutoff.date()), [])
+        stats['demoted_event_partitions'] = _run_partition_step(
+            conn, cursor, "Перевод секций журнала событий в холодные",
+            lambda: event_repository.demote_event_partitions(cursor, hot_boundary.date()), [])
+        stats['deleted_events'] = _purge_in_batches(
+            conn, lambda size: event_repository.purge_default_partition_events_batch(cursor, events_cutoff, size), batch_size)
+
+        # --- 4. Агрегаты ---
+        hourly_cutoff = _floor_to_day(now_utc - timedelta(days=retention_settings['retention_rollup_hourly_days']))
+        daily_cutoff = _floor_to_day(now_utc - timedelta(days=retention_settings['retention_rollup_daily_days']))
+        stats['deleted_hourly_rollups'] = _purge_in_batches(
+            conn, lambda size: check_repository.purge_check_rollups_batch(cursor, 'hour', hourly_cutoff, size), batch_size)
+        stats['deleted_daily_rollups'] = _purge_in_batches(
+            conn, lambda size: check_repository.purge_check_rollups_batch(cursor, 'day', daily_cutoff, size), batch_size)
+
+    logger.info(f"Retention: Прогон завершен: секций удалено {len(stats['dropped_partitions'])}, "
+                f"секций событий переведено в холодные {len(stats['demoted_event_partitions'])} / удалено {len(stats['dropped_event_partitions'])}, "
+                f"событий {stats['deleted_events']}, агрегатов {stats['deleted_hourly_rollups']}+{stats['deleted_daily_rollups']}.")
+    return stats
@@ -0,0 +1,173 @@
+# status/app/services/status_classifier.py
+"""
+Классификатор отображаемого статуса узла (status_class / status_text).
+Версия 5.0.19: Правила статуса заданы один раз таблицей STATUS_RULES: состояние
+              времени последней проверки, is_available, check_success и признак
+              устаревания по таймауту -> класс и шаблон текста. Из правил при
+              импорте строится полная таблица поиска (_STATUS_TABLE), поэтому
+              классификация узла - один поиск в словаре без ветвлений и логирования.
+              classify_statuses выполняет пакетный проход по столбцам значений
+              (время проверки, доступность, успех, таймаут) для всех узлов сразу.
+Версия 5.0.20: Метод, определивший статус, может быть свой у каждого узла (политика
+              статуса типа узла): столбец method_column / поле узла status_method.
+"""
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..db_connection import HAS_DATEUTIL
+
+if HAS_DATEUTIL:
+    from dateutil import parser as dateutil_parser
+
+DEFAULT_STATUS_TIMEOUT_MINUTES = 5
+
+STATUS_AVAILABLE = 'available'
+STATUS_WARNING = 'warning'
+STATUS_UNAVAILABLE = 'unavailable'
+STATUS_UNKNOWN = 'unknown'
+
+# Состояние времени последней проверки
+TIME_PRESENT = 'present' # Время есть и разобрано
+TIME_MISSING = 'missing' # Времени нет
+TIME_INVALID = 'invalid' # Время есть, но не разбирается
+_ANY = '*'
+
+# (время, is_available, check_success, устарело) -> (status_class, шаблон status_text).
+# Правила применяются сверху вниз, '*' - любое значение. {method} - метод ключевой
+# проверки, {timeout} - таймаут актуальности узла в минутах.
+STATUS_RULES: Tuple[Tuple[Any, Any, Any, Any, str, str], ...] = (
+    (TIME_INVALID, _ANY,  _ANY,  _ANY,  STATUS_UNKNOWN,     "Ошибка данных ({method})"),
+    (TIME_PRESENT, True,  True,  False, STATUS_AVAILABLE,   "Доступен ({method})"),
+    (TIME_PRESENT, True,  True,  True,  STATUS_WARNING,     "Устарело ({method} > {timeout} мин)"),
+    (TIME_PRESENT, True,  False, _ANY,  STATUS_UNAVAILABLE, "Ошибка ({method}: критерии не пройдены)"),
+    (TIME_PRESENT, True,  None,  False, STATUS_WARNING,     "Предупреждение ({method}: статус критериев не ясен)"),
+    (TIME_PRESENT, True,  None,  True,  STATUS_WARNING,     "Предупреждение ({method}: статус критериев не ясен), данные устарели (> {timeout} мин)"),
+    (TIME_PRESENT, False, _ANY,  _ANY,  STATUS_UNAVAILABLE, "Недоступен ({method}: ошибка выполнения)"),
+    (TIME_PRESENT, None,  _ANY,  _ANY,  STATUS_UNKNOWN,     "Статус {method} не определен"),
+    (TIME_MISSING, False, _ANY,  _ANY,  STATUS_UNAVAILABLE, "Недоступен ({method}: ошибка выполнения, время не определено)"),
+    (TIME_MISSING, _ANY,  _ANY,  _ANY,  STATUS_UNKNOWN,     "Нет данных ({method})"),
+)
+
+StatusKey = Tuple[str, Optional[bool], Optional[bool], bool]
+
+
+def _build_status_table(rules: Sequence[Tuple[Any, Any, Any, Any, str, str]]) -> Dict[StatusKey, Tuple[str, str]]:
+    """ Разворачивает правила в полную таблицу поиска; каждая комбинация должна покрываться правилом. """
+    status_table: Dict[StatusKey, Tuple[str, str]] = {}
+    for status_key in itertools.product((TIME_PRESENT, TIME_MISSING, TIME_INVALID), (True, False, None),
+                                        (True, False, None), (False, True)):
+        for rule in rules:
+            if all(pattern == _ANY or pattern is value for pattern, value in zip(rule[:4], status_key)):
+                status_table[status_key] = (rule[4], rule[5])
+                break
+        else:
+            raise ValueError(f"Комбинация {status_key} не покрыта правилами статуса.")
+    return status_table
+
+
+_STATUS_TABLE = _build_status_table(STATUS_RULES)
+
+
+def _to_utc_datetime(value: Any) -> Optional[datetime]:
+    """ Время проверки в aware datetime (без зоны - UTC). None - значение не разбирается. """
+    if isinstance(value, str):
+        try:
+            if HAS_DATEUTIL:
+                value = dateutil_parser.isoparse(value)
+            else:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (ValueError, OverflowError):
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def _normalize_timeout(value: Any) -> int:
+    """ Таймаут актуальности в минутах; некорректное или неположительное значение - по умолчанию. """
+    try:
+        timeout_minutes = int(value)
+    except (ValueError, TypeError):
+        return DEFAULT_STATUS_TIMEOUT_MINUTES
+    return timeout_minutes if timeout_minutes > 0 else DEFAULT_STATUS_TIMEOUT_MINUTES
+
+
+def classify_statuses(
+    checked_at_column: Sequence[Any],
+    is_available_column: Sequence[Any],
+    check_success_column: Sequence[Any],
+    timeout_column: Sequence[Any],
+    method_name: str,
+    now: Optional[datetime] = None,
+    method_column: Optional[Sequence[Any]] = None
+) -> Tuple[List[str], List[str]]:
+    """
+    Пакетная классификация: i-е значения столбцов описывают i-й узел.
+
+    Args:
+        checked_at_column: Время последней ключевой проверки (datetime, ISO-строка или None).
+        is_available_column, check_success_column: Результат проверки (True/False/None).
+        timeout_column: Таймаут актуальности узла в минутах.
+        method_name: Метод ключевой проверки (для текста статуса).
+        now: Текущее время UTC (по умолчанию - момент вызова).
+        method_column: Метод ключевой проверки каждого узла; пустое значение - method_name.
+    Returns:
+        (список status_class, список status_text) в порядке узлов.
+    """
+    now = now or datetime.now(timezone.utc)
+    cutoffs: Dict[int, datetime] = {} # Таймаут -> граница актуальности (проверка раньше нее - устарела)
+    rendered_texts: Dict[Tuple[StatusKey, int, str], str] = {}
+    status_classes: List[str] = []
+    status_texts: List[str] = []
+    if method_column is None:
+        method_column = itertools.repeat(method_name)
+    for checked_at, is_available, check_success, timeout_value, node_method in zip(
+            checked_at_column, is_available_column, check_success_column, timeout_column, method_column):
+        node_method = node_method or method_name
+        timeout_minutes = timeout_value if type(timeout_value) is int and timeout_value > 0 else _normalize_timeout(timeout_value)
+        outdated = False
+        if not checked_at:
+            time_state = TIME_MISSING
+        else:
+            checked_at_utc = checked_at if type(checked_at) is datetime and checked_at.tzinfo is not None else _to_utc_datetime(checked_at)
+            if checked_at_utc is None:
+                time_state = TIME_INVALID
+            else:
+                time_state = TIME_PRESENT
+                cutoff = cutoffs.get(timeout_minutes)
+                if cutoff is None:
+                    cutoff = cutoffs[timeout_minutes] = now - timedelta(minutes=timeout_minutes)
+                outdated = checked_at_utc < cutoff
+        status_key = (time_state,
+                      is_available if is_available is True or is_available is False else None,
+                      check_success if check_success is True or check_success is False else None,
+                      outdated)
+        status_class, text_template = _STATUS_TABLE[status_key]
+        text_key = (status_key, timeout_minutes, node_method)
+        status_text = rendered_texts.get(text_key)
+        if status_text is None:
+            status_text = rendered_texts[text_key] = text_template.format(method=node_method, timeout=timeout_minutes)
+        status_classes.append(status_class)
+        status_texts.append(status_text)
+    return status_classes, status_texts
+
+
+def classify_nodes(nodes: Iterable[Dict[str, Any]], method_name: str, now: Optional[datetime] = None) -> None:
+    """
+    Добавляет status_class/status_text узлам (объединенные данные узла и ключевой проверки).
+    Время проверки - check_timestamp (время агента), иначе last_checked.
+    Метод в тексте статуса - status_method узла (политика его типа), иначе method_name.
+    """
+    nodes = nodes if isinstance(nodes, list) else list(nodes)
+    status_classes, status_texts = classify_statuses(
+        [node.get('check_timestamp') or node.get('last_checked') for node in nodes],
+        [node.get('is_available') for node in nodes],
+        [node.get('check_success') for node in nodes],
+        [node.get('timeout_minutes', DEFAULT_STATUS_TIMEOUT_MINUTES) for node in nodes],
+        method_name, now,
+        [node.get('status_method') for node in nodes]
+    )
+    for node, status_class, status_text in zip(nodes, status_classes, status_texts):
+        node['status_class'] = status_class
+        node['status_text'] = status_text
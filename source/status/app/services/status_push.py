@@ -0,0 +1,175 @@
+# status/app/services/status_push.py
+"""
+Рассылка изменений статусов узлов через SocketIO (подписка вместо опроса).
+Версия 5.0.9: Протокол подписки:
+             1. Клиент загружает снимок (/api/v1/dashboard или /status_detailed)
+                и номер последовательности из заголовка X-Status-Seq.
+             2. Затем получает событие 'node_status_batch':
+                {"seq": N, "nodes": [...], "resync": false}. Изменения одного узла
+                между рассылками схлопываются (отправляется последнее состояние).
+             3. При пропуске номера (seq != последний + 1), resync=true или
+                переподключении клиент заново загружает снимок.
+             Рассылка выполняется фоновой задачей раз в STATUS_PUSH_INTERVAL_SECONDS,
+             большие пакеты делятся на сообщения по STATUS_PUSH_MAX_NODES_PER_MESSAGE узлов.
+             Пока есть подключенные клиенты, та же задача перестраивает устаревший
+             снимок дашборда (статусы, устаревшие по таймауту, тоже доходят до клиентов).
+             Клиент Socket.IO отдается из static (SOCKETIO_CLIENT_STATIC_PATH), а не с CDN:
+             сервис работает во внутренней сети. Без файла дашборд работает опросом.
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from . import dashboard_cache
+from ..db_connection import get_connection
+
+logger = logging.getLogger(__name__)
+
+STATUS_PUSH_INTERVAL_SECONDS = float(os.getenv('STATUS_PUSH_INTERVAL_SECONDS', 0.5))
+STATUS_PUSH_MAX_NODES_PER_MESSAGE = int(os.getenv('STATUS_PUSH_MAX_NODES_PER_MESSAGE', 1000))
+STATUS_PUSH_EVENT = 'node_status_batch'
+SOCKETIO_CLIENT_STATIC_PATH = 'vendor/socket.io.min.js' # Относительно app/static (см. dashboard.html)
+
+
+class _StatusDeltaQueue:
+    """ Накопитель изменений узлов между рассылками и счетчик последовательности сообщений. """
+    def __init__(self, max_nodes_per_message: int):
+        self.max_nodes_per_message = max(1, max_nodes_per_message)
+        self._lock = threading.Lock()
+        self._pending_nodes: Dict[int, Dict[str, Any]] = {}
+        self._resync_pending = False
+        self.seq = 0
+        self.nodes_queued = 0
+        self.nodes_sent = 0
+        self.messages_sent = 0
+
+    def queue(self, changed_nodes: List[Dict[str, Any]], resync: bool) -> None:
+        with self._lock:
+            for node_data in changed_nodes:
+                self._pending_nodes[node_data['id']] = node_data # Схлопывание: остается последнее состояние
+            self.nodes_queued += len(changed_nodes)
+            self._resync_pending = self._resync_pending or resync
+
+    def current_seq(self) -> int:
+        with self._lock:
+            return self.seq
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """ Забирает накопленные изменения и формирует сообщения с последовательными номерами. """
+        with self._lock:
+            if not self._pending_nodes and not self._resync_pending:
+                return []
+            pending_nodes = list(self._pending_nodes.values())
+            resync = self._resync_pending
+            self._pending_nodes = {}
+            self._resync_pending = False
+            messages = []
+            for chunk_start in range(0, max(len(pending_nodes), 1), self.max_nodes_per_message):
+                self.seq += 1
+                messages.append({"seq": self.seq, "resync": resync,
+                                 "nodes": pending_nodes[chunk_start:chunk_start + self.max_nodes_per_message]})
+            self.nodes_sent += len(pending_nodes)
+            self.messages_sent += len(messages)
+            return messages
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"seq": self.seq, "pending_nodes": len(self._pending_nodes),
+                    "nodes_queued": self.nodes_queued, "nodes_sent": self.nodes_sent,
+                    "messages_sent": self.messages_sent}
+
+
+_status_delta_queue = _StatusDeltaQueue(STATUS_PUSH_MAX_NODES_PER_MESSAGE)
+_push_state: Dict[str, Any] = {"connected_clients": 0, "loop_started": False}
+_push_state_lock = threading.Lock()
+
+
+def get_status_seq() -> int:
+    """
+    Номер последнего разосланного сообщения. Маршруты снимка читают его ДО получения снимка:
+    все изменения из сообщений <= seq к этому моменту уже внесены в снимок.
+    """
+    return _status_delta_queue.current_seq()
+
+
+def _on_snapshot_change(changed_nodes: List[Dict[str, Any]], resync: bool) -> None:
+    with _push_state_lock:
+        if _push_state["connected_clients"] <= 0:
+            return # Подписчиков нет - подключившийся клиент начнет со свежего снимка
+    _status_delta_queue.queue(changed_nodes, resync)
+
+
+def flush_status_updates(socketio) -> int:
+    """ Отправляет накопленные изменения. Возвращает количество отправленных сообщений. """
+    messages = _status_delta_queue.drain()
+    for message in messages:
+        socketio.emit(STATUS_PUSH_EVENT, message)
+    if messages:
+        logger.debug(f"StatusPush: Отправлено сообщений: {len(messages)} (последний seq: {messages[-1]['seq']}).")
+    return len(messages)
+
+
+def _refresh_stale_snapshot() -> None:
+    if not dashboard_cache.is_dashboard_snapshot_built():
+        return
+    try:
+        with get_connection() as conn_refresh:
+            try:
+                with conn_refresh.cursor(cursor_factory=RealDictCursor) as cursor_refresh:
+                    dashboard_cache.refresh_dashboard_snapshot_if_stale(cursor_refresh)
+            finally:
+                conn_refresh.rollback() # Только чтение - транзакцию не оставляем открытой
+    except Exception as e_refresh:
+        logger.error(f"StatusPush: Не удалось обновить устаревший снимок дашборда: {e_refresh}")
+
+
+def _status_push_loop(socketio, app) -> None:
+    logger.info(f"StatusPush: Фоновая рассылка запущена (интервал {STATUS_PUSH_INTERVAL_SECONDS} с).")
+    while True:
+        socketio.sleep(STATUS_PUSH_INTERVAL_SECONDS)
+        try:
+            with app.app_context():
+                with _push_state_lock:
+                    has_clients = _push_state["connected_clients"] > 0
+                if has_clients:
+                    _refresh_stale_snapshot()
+                flush_status_updates(socketio)
+        except Exception as e_loop:
+            logger.error(f"StatusPush: Ошибка фоновой рассылки: {e_loop}", exc_info=True)
+
+
+def init_status_push(socketio, app) -> None:
+    """
+    Регистрирует обработчики подключения SocketIO и подписку на изменения снимка дашборда.
+    Фоновая задача рассылки запускается при первом подключении клиента.
+    """
+    dashboard_cache.add_change_listener(_on_snapshot_change)
+    if not os.path.isfile(os.path.join(app.static_folder, SOCKETIO_CLIENT_STATIC_PATH)):
+        logger.warning(f"StatusPush: Нет клиента Socket.IO static/{SOCKETIO_CLIENT_STATIC_PATH} - "
+                       f"дашборд будет обновляться опросом (см. README, STATUS_PUSH_INTERVAL_SECONDS).")
+
+    @socketio.on('connect')
+    def _status_push_client_connected(auth=None):
+        with _push_state_lock:
+            _push_state["connected_clients"] += 1
+            start_loop = not _push_state["loop_started"]
+            _push_state["loop_started"] = True
+        if start_loop:
+            socketio.start_background_task(_status_push_loop, socketio, app)
+
+    @socketio.on('disconnect')
+    def _status_push_client_disconnected():
+        with _push_state_lock:
+            _push_state["connected_clients"] = max(0, _push_state["connected_clients"] - 1)
+
+
+def get_status_push_stats() -> Dict[str, Any]:
+    """ Счетчики рассылки (для /health). """
+    push_stats = _status_delta_queue.stats()
+    with _push_state_lock:
+        push_stats["connected_clients"] = _push_state["connected_clients"]
+    push_stats["interval_seconds"] = STATUS_PUSH_INTERVAL_SECONDS
+    return push_stats
@@ -0,0 +1,102 @@
+# status/benchmarks/bench_bulk_ingest.py
+"""
+Бенчмарк пакетной записи результатов проверок.
+Сравнивает скорость (строк/сек) двух путей записи:
+  - loop: вызов record_check_result_proc на каждый элемент (старое поведение /checks/bulk);
+  - bulk: один вызов record_check_results_bulk на весь пакет (v5.0.3).
+
+Работает с реальной БД (параметры берутся из DATABASE_URL / DB_* как в приложении).
+Каждый прогон выполняется в транзакции, которая затем откатывается, поэтому данные
+в БД не изменяются. Требуется хотя бы одно задание в node_check_assignments.
+
+Запуск (из каталога status/):
+    python -m benchmarks.bench_bulk_ingest --rows 5000 --repeat 3
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from app.db_connection import get_connection
+from app.repositories import check_repository
+
+
+def _build_items(assignment_ids: List[int], rows: int) -> List[Dict[str, Any]]:
+    """ Генерирует пакет валидных элементов в формате record_check_results_bulk. """
+    now_utc = datetime.now(timezone.utc)
+    items: List[Dict[str, Any]] = []
+    for item_index in range(rows):
+        is_available = random.random() > 0.1
+        items.append({
+            'item_index': item_index,
+            'assignment_id': random.choice(assignment_ids),
+            'is_available': is_available,
+            'check_success': is_available and random.random() > 0.2,
+            'check_timestamp': now_utc,
+            'executor_object_id': None,
+            'executor_host': None,
+            'resolution_method': 'offline_loader_pipeline_bulk',
+            'detail_type': 'PIPELINE_AGGREGATED_RESULT_BULK',
+            'detail_data': {'steps_results': [{'step': 1, 'ok': is_available}], 'pipeline_status_message': 'bench'},
+            'assignment_version': 'bench_conf',
+            'agent_version': 'bench_agent',
+        })
+    return items
+
+
+def _run_loop(cursor, items: List[Dict[str, Any]]) -> None:
+    for item in items:
+        check_repository.record_check_result_proc(
+            cursor=cursor,
+            assignment_id=item['assignment_id'],
+            is_available=item['is_available'],
+            check_success=item['check_success'],
+            check_timestamp=item['check_timestamp'],
+            executor_object_id=item['executor_object_id'],
+            executor_host=item['executor_host'],
+            resolution_method=item['resolution_method'],
+            detail_type=item['detail_type'],
+            detail_data=item['detail_data'],
+            p_assignment_version=item['assignment_version'],
+            p_agent_version=item['agent_version']
+        )
+
+
+def _run_bulk(cursor, items: List[Dict[str, Any]]) -> None:
+    check_repository.record_check_results_bulk(cursor, items)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк: поэлементная vs пакетная запись результатов проверок.")
+    arg_parser.add_argument('--rows', type=int, default=2000, help='Количество результатов в пакете.')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого режима.')
+    args = arg_parser.parse_args()
+
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT id FROM node_check_assignments ORDER BY id LIMIT 1000;")
+            assignment_ids = [row['id'] for row in cursor.fetchall()]
+        conn.rollback()
+        if not assignment_ids:
+            print("В БД нет заданий (node_check_assignments). Бенчмарк невозможен.")
+            return
+
+        items = _build_items(assignment_ids, args.rows)
+        print(f"Пакет: {args.rows} результатов, {len(assignment_ids)} заданий, повторов: {args.repeat}")
+        for mode_name, runner in (('loop', _run_loop), ('bulk', _run_bulk)):
+            timings: List[float] = []
+            for _ in range(args.repeat):
+                with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                    started_at = time.perf_counter()
+                    runner(cursor, items)
+                    timings.append(time.perf_counter() - started_at)
+                conn.rollback() # Ничего не сохраняем
+            best = min(timings)
+            print(f"  {mode_name:>4}: лучшее {best:.3f} c, {args.rows / best:,.0f} строк/сек")
+
+
+if __name__ == '__main__':
+    main()
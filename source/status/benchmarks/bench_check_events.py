@@ -0,0 +1,133 @@
+# status/benchmarks/bench_check_events.py
+"""
+Замер записи в system_events при приеме результатов проверок (v5.0.23).
+Сравнивает политики settings.check_events_mode на одном и том же потоке результатов:
+  - all: событие на каждый результат (поведение до v5.0.23);
+  - transitions: только смена IsAvailable/CheckSuccess задания (по умолчанию);
+  - none: без событий (нижняя граница).
+Поток - несколько раундов, в каждом все задания присылают по результату; состояние
+задания меняется с вероятностью --flip-ratio (остальные результаты повторяют прежнее).
+
+Для каждой политики выводятся: количество событий, прирост system_events с индексами
+(pg_total_relation_size секций) и объем WAL (pg_current_wal_insert_lsn) на один результат -
+т.е. сколько записи добавляют события к самому результату.
+
+Работает с реальной БД (параметры берутся из DATABASE_URL / DB_* как в приложении).
+Каждый прогон выполняется в транзакции, которая затем откатывается, поэтому данные
+в БД не изменяются. Требуется хотя бы одно задание в node_check_assignments.
+
+Запуск (из каталога status/):
+    python -m benchmarks.bench_check_events --rounds 20 --flip-ratio 0.02
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from app.db_connection import get_connection
+from app.repositories import check_repository, settings_repository
+
+_MODES = ('all', 'transitions', 'none')
+
+
+def _build_rounds(assignment_ids: List[int], rounds: int, flip_ratio: float) -> List[List[Dict[str, Any]]]:
+    """ Раунды результатов: в каждом по одному результату на задание, редкая смена состояния. """
+    started_utc = datetime.now(timezone.utc)
+    states = {assignment_id: True for assignment_id in assignment_ids}
+    all_rounds: List[List[Dict[str, Any]]] = []
+    for round_index in range(rounds):
+        items: List[Dict[str, Any]] = []
+        for item_index, assignment_id in enumerate(assignment_ids):
+            if random.random() < flip_ratio:
+                states[assignment_id] = not states[assignment_id]
+            is_available = states[assignment_id]
+            items.append({
+                'item_index': item_index,
+                'assignment_id': assignment_id,
+                'is_available': is_available,
+                'check_success': is_available,
+                'check_timestamp': started_utc + timedelta(minutes=round_index),
+                'executor_object_id': None,
+                'executor_host': None,
+                'resolution_method': 'bench_check_events',
+                'detail_type': None,
+                'detail_data': None,
+                'assignment_version': 'bench_conf',
+                'agent_version': 'bench_agent',
+            })
+        all_rounds.append(items)
+    return all_rounds
+
+
+def _measure(cursor) -> Dict[str, int]:
+    cursor.execute("""
+        SELECT COALESCE((SELECT MAX(id) FROM system_events), 0) AS max_event_id,
+               (SELECT COALESCE(SUM(pg_total_relation_size(relid)), 0) FROM pg_partition_tree('system_events'))::BIGINT AS events_bytes,
+               pg_wal_lsn_diff(pg_current_wal_insert_lsn(), '0/0')::BIGINT AS wal_bytes;
+    """)
+    return dict(cursor.fetchone())
+
+
+def _run_mode(conn, mode: str, all_rounds: List[List[Dict[str, Any]]]) -> Dict[str, float]:
+    """ Прогон потока при политике mode в откатываемой транзакции. """
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            settings_repository.set_setting(cursor, 'check_events_mode', mode)
+            before = _measure(cursor)
+            started_at = time.perf_counter()
+            for items in all_rounds:
+                check_repository.record_check_results_bulk(cursor, items)
+            elapsed = time.perf_counter() - started_at
+            after = _measure(cursor)
+            cursor.execute("SELECT COUNT(*) AS events_count FROM system_events WHERE id > %s;", (before['max_event_id'],))
+            events_count = cursor.fetchone()['events_count']
+    finally:
+        conn.rollback() # Ни результаты, ни изменение настройки не сохраняются
+    return {
+        'events': events_count,
+        'events_bytes': after['events_bytes'] - before['events_bytes'],
+        'wal_bytes': after['wal_bytes'] - before['wal_bytes'],
+        'seconds': elapsed,
+    }
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Замер: события на каждый результат vs только смена состояния.")
+    arg_parser.add_argument('--rounds', type=int, default=20, help='Количество раундов (результатов на задание).')
+    arg_parser.add_argument('--assignments', type=int, default=1000, help='Максимум заданий из БД в потоке.')
+    arg_parser.add_argument('--flip-ratio', type=float, default=0.02, help='Доля результатов со сменой состояния.')
+    args = arg_parser.parse_args()
+
+    with get_connection() as conn:
+        with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            cursor.execute("SELECT id FROM node_check_assignments ORDER BY id LIMIT %s;", (args.assignments,))
+            assignment_ids = [row['id'] for row in cursor.fetchall()]
+        conn.rollback()
+        if not assignment_ids:
+            print("В БД нет заданий (node_check_assignments). Замер невозможен.")
+            return
+
+        all_rounds = _build_rounds(assignment_ids, args.rounds, args.flip_ratio)
+        results_count = sum(len(items) for items in all_rounds)
+        print(f"Поток: {results_count:,} результатов ({len(assignment_ids)} заданий x {args.rounds} раундов), "
+              f"смена состояния: {args.flip_ratio:.1%}")
+        mode_stats = {mode: _run_mode(conn, mode, all_rounds) for mode in _MODES}
+
+    baseline_wal = mode_stats['none']['wal_bytes']
+    for mode in _MODES:
+        stats = mode_stats[mode]
+        print(f"  {mode:>11}: событий {stats['events']:>8,} ({stats['events'] / results_count:.3f} на результат), "
+              f"system_events +{stats['events_bytes'] / 1024:,.0f} КБ, "
+              f"WAL {stats['wal_bytes'] / results_count:,.0f} Б/результат "
+              f"(события: +{(stats['wal_bytes'] - baseline_wal) / results_count:,.0f} Б), {stats['seconds']:.2f} c")
+    if mode_stats['all']['wal_bytes'] > 0:
+        saved_wal = mode_stats['all']['wal_bytes'] - mode_stats['transitions']['wal_bytes']
+        print(f"transitions vs all: WAL меньше на {saved_wal / mode_stats['all']['wal_bytes']:.0%}, "
+              f"записи в system_events меньше в x{mode_stats['all']['events'] / max(mode_stats['transitions']['events'], 1):.0f}")
+
+
+if __name__ == '__main__':
+    main()
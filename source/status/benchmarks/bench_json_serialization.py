@@ -0,0 +1,121 @@
+# status/benchmarks/bench_json_serialization.py
+"""
+Микробенчмарк сериализации ответов API.
+Сравнивает на типичных ответах (снимок дашборда, история проверок узла,
+ответ /checks/bulk):
+  - default: прежний путь - isoformat() каждой даты в цикле + DefaultJSONProvider Flask;
+  - fast: FastJSONProvider (orjson, если установлен) без предварительного форматирования дат (v5.0.18).
+
+БД не требуется. Запуск (из каталога status/):
+    python -m benchmarks.bench_json_serialization --nodes 2000 --history 5000 --repeat 5
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Tuple
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from psycopg2.extras import RealDictRow
+
+from app import json_provider
+
+_NODE_DATE_KEYS = ('last_checked', 'last_available', 'check_timestamp')
+_HISTORY_DATE_KEYS = ('checked_at', 'check_timestamp')
+
+
+def _row(**fields: Any) -> RealDictRow:
+    row = RealDictRow()
+    row.update(fields)
+    return row
+
+
+def _build_dashboard(nodes: int) -> List[Dict[str, Any]]:
+    """ Узлы снимка дашборда в формате node_service.get_processed_node_status. """
+    now_utc = datetime.now(timezone.utc)
+    return [_row(
+        id=node_id, name=f"Узел {node_id}", ip_address=f"10.0.{node_id // 250}.{node_id % 250}",
+        parent_subdivision_id=random.randint(1, 80), node_type_id=random.randint(1, 12),
+        icon_filename='server.svg', timeout_minutes=5, is_available=random.random() > 0.1,
+        check_success=random.random() > 0.2, assignment_id=node_id * 3,
+        last_checked=now_utc - timedelta(seconds=random.randint(0, 900)),
+        last_available=now_utc - timedelta(seconds=random.randint(0, 3600)),
+        check_timestamp=now_utc - timedelta(seconds=random.randint(0, 900)),
+        status_class='available', status_text='Доступен (PING)'
+    ) for node_id in range(1, nodes + 1)]
+
+
+def _build_history(rows: int) -> List[Dict[str, Any]]:
+    """ Строки истории проверок узла (fetch_node_checks_history). """
+    now_utc = datetime.now(timezone.utc)
+    return [_row(
+        id=row_id, assignment_id=row_id % 40, method_name='PING', is_available=True, check_success=True,
+        checked_at=now_utc - timedelta(minutes=row_id), check_timestamp=now_utc - timedelta(minutes=row_id, seconds=2),
+        executor_object_id=1060, executor_host=None, resolution_method='agent_pipeline',
+        assignment_version='20250501120000_1060_abcdef', agent_version='hybrid_agent_v7.1.0',
+        success_ratio=Decimal('0.9500')
+    ) for row_id in range(rows)]
+
+
+def _build_bulk_response(items: int) -> Dict[str, Any]:
+    return {"status": "partial_error", "processed": items - 10, "duplicates": 0, "failed": 10, "total_in_request": items,
+            "errors": [{"index": index, "assignment_id": index, "error": f"Задание с ID={index} не найдено."} for index in range(10)]}
+
+
+def _format_dates(rows: List[Dict[str, Any]], date_keys: Tuple[str, ...]) -> List[Dict[str, Any]]:
+    """ Прежний путь: копия строк с isoformat() каждой даты (маршруты меняли строки на месте). """
+    formatted_rows = []
+    for row in rows:
+        row_copy = dict(row)
+        for date_key in date_keys:
+            if isinstance(row_copy.get(date_key), datetime):
+                row_copy[date_key] = row_copy[date_key].isoformat()
+        formatted_rows.append(row_copy)
+    return formatted_rows
+
+
+def _best_of(repeat: int, runner: Callable[[], bytes]) -> Tuple[float, int]:
+    timings: List[float] = []
+    body_size = 0
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        body_size = len(runner())
+        timings.append(time.perf_counter() - started_at)
+    return min(timings), body_size
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Микробенчмарк: DefaultJSONProvider + isoformat vs FastJSONProvider.")
+    arg_parser.add_argument('--nodes', type=int, default=2000, help='Узлов в снимке дашборда.')
+    arg_parser.add_argument('--history', type=int, default=5000, help='Строк в истории проверок.')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Количество повторов.')
+    args = arg_parser.parse_args()
+
+    flask_app = Flask(__name__)
+    default_provider = DefaultJSONProvider(flask_app)
+    fast_provider = json_provider.FastJSONProvider(flask_app)
+    payloads = (
+        ('dashboard', _build_dashboard(args.nodes), _NODE_DATE_KEYS),
+        ('history', _build_history(args.history), _HISTORY_DATE_KEYS),
+        ('bulk_response', _build_bulk_response(5000), ()),
+    )
+    print(f"Сериализатор fast: {'orjson' if json_provider.HAS_ORJSON else 'json'}, повторов: {args.repeat}")
+    with flask_app.app_context():
+        for payload_name, payload, date_keys in payloads:
+            def run_default() -> bytes:
+                prepared = _format_dates(payload, date_keys) if date_keys else payload
+                return default_provider.response(prepared).get_data()
+
+            def run_fast() -> bytes:
+                return fast_provider.response(payload).get_data()
+
+            default_time, default_size = _best_of(args.repeat, run_default)
+            fast_time, fast_size = _best_of(args.repeat, run_fast)
+            print(f"  {payload_name:>13}: default {default_time * 1000:8.2f} мс ({default_size / 1024:,.0f} КБ), "
+                  f"fast {fast_time * 1000:8.2f} мс ({fast_size / 1024:,.0f} КБ), ускорение x{default_time / fast_time:.1f}")
+
+
+if __name__ == '__main__':
+    main()
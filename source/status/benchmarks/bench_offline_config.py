@@ -0,0 +1,90 @@
+# status/benchmarks/bench_offline_config.py
+"""
+Замер выдачи оффлайн-конфигураций (v5.0.25) для подразделений с кодом ТС.
+Сравнивает на одних и тех же объектах:
+  - generate: генерация при каждом запросе (как до v5.0.25 - сборка заданий,
+    сериализация, SHA-256, поиск версии) - generate_offline_config;
+  - stored: сохраненная версия - get_offline_config_version + чтение config_json
+    (ответ 200 конфигуратору без генерации);
+  - not_modified: только get_offline_config_version (ответ 304 на совпавший If-None-Match).
+Перед замером stored/not_modified конфигурации генерируются один раз (отметки сняты).
+
+Работает с реальной БД (параметры берутся из DATABASE_URL / DB_* как в приложении).
+Замер выполняется в транзакции, которая затем откатывается, поэтому данные в БД
+не изменяются. Требуется хотя бы одно подразделение с transport_system_code.
+
+Запуск (из каталога status/):
+    python -m benchmarks.bench_offline_config --objects 200 --repeat 5
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from psycopg2.extras import RealDictCursor
+
+from app.db_connection import get_connection
+from app.repositories import assignment_repository
+
+
+def _time_per_object(object_ids: List[int], repeat: int, request_config: Callable[[int], None]) -> float:
+    """ Лучшее из repeat время прохода по всем объектам, мс на объект. """
+    timings: List[float] = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        for object_id in object_ids:
+            request_config(object_id)
+        timings.append(time.perf_counter() - started_at)
+    return min(timings) * 1000 / len(object_ids)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Замер: генерация оффлайн-конфигурации на каждый запрос vs сохраненная версия.")
+    arg_parser.add_argument('--objects', type=int, default=200, help='Максимум подразделений с кодом ТС.')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Количество проходов по объектам.')
+    args = arg_parser.parse_args()
+
+    with get_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT object_id FROM subdivisions WHERE transport_system_code IS NOT NULL
+                    ORDER BY object_id LIMIT %s;
+                """, (args.objects,))
+                object_ids = [row['object_id'] for row in cursor.fetchall()]
+                if not object_ids:
+                    print("В БД нет подразделений с transport_system_code. Замер невозможен.")
+                    return
+                cursor.execute("""
+                    SELECT COUNT(*) AS assignments_count
+                    FROM node_check_assignments nca
+                    JOIN nodes n ON n.id = nca.node_id
+                    JOIN subdivisions s ON s.id = n.parent_subdivision_id
+                    WHERE nca.is_enabled AND s.object_id = ANY(%s);
+                """, (object_ids,))
+                assignments_count = cursor.fetchone()['assignments_count']
+                print(f"Объектов: {len(object_ids)}, активных заданий: {assignments_count:,}, проходов: {args.repeat}")
+
+                def generate(object_id: int) -> None:
+                    cursor.execute("SELECT generate_offline_config(%s) AS config_json;", (object_id,))
+                    cursor.fetchone()
+
+                def stored(object_id: int) -> None:
+                    config_version = assignment_repository.get_offline_config_version(cursor, object_id)
+                    assignment_repository.fetch_offline_config(cursor, config_version['version_tag'])
+
+                def not_modified(object_id: int) -> None:
+                    assignment_repository.get_offline_config_version(cursor, object_id)
+
+                generate_ms = _time_per_object(object_ids, args.repeat, generate) # Заодно сохраняет версии
+                stored_ms = _time_per_object(object_ids, args.repeat, stored)
+                not_modified_ms = _time_per_object(object_ids, args.repeat, not_modified)
+        finally:
+            conn.rollback() # Сохраненные версии не остаются в БД
+
+    stats: Dict[str, float] = {'generate': generate_ms, 'stored': stored_ms, 'not_modified': not_modified_ms}
+    for mode, per_object_ms in stats.items():
+        print(f"  {mode:>12}: {per_object_ms:8.3f} мс/объект (x{generate_ms / per_object_ms:.1f} к generate)")
+
+
+if __name__ == '__main__':
+    main()
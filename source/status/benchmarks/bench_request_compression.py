@@ -0,0 +1,105 @@
+# status/benchmarks/bench_request_compression.py
+"""
+Бенчмарк сжатия тела пакетной загрузки результатов (/api/v1/checks/bulk).
+Для тела в формате result_loader (агрегированные pipeline-результаты со steps_results)
+сравнивает по кодировкам (identity, gzip, zstd):
+  - байты "на проводе" (размер тела запроса) и степень сжатия;
+  - CPU сервера (time.process_time) на распаковку и потоковый разбор тела
+    тем же путем, что и в приложении (request_decoding + services.bulk_payload);
+  - CPU клиента на сжатие (справочно).
+
+БД не требуется. Запуск (из каталога status/):
+    python -m benchmarks.bench_request_compression --rows 5000 --repeat 3
+"""
+import argparse
+import gzip
+import io
+import json
+import random
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import request_decoding
+from app.services import bulk_payload
+
+
+def _build_body(rows: int) -> bytes:
+    """ Генерирует тело /checks/bulk, похожее на то, что отправляет result_loader. """
+    now_iso = datetime.now(timezone.utc).isoformat()
+    results: List[Dict[str, Any]] = []
+    for item_index in range(rows):
+        is_available = random.random() > 0.1
+        steps_results = [{
+            'step_index': step_index,
+            'method_name': random.choice(('PING', 'SERVICE_STATUS', 'DISK_USAGE', 'SQL_QUERY_EXECUTE')),
+            'IsAvailable': is_available,
+            'CheckSuccess': is_available and random.random() > 0.2,
+            'Timestamp': now_iso,
+            'Details': {'response_time_ms': random.randint(1, 900), 'target': f"srv-{random.randint(1, 200):03d}.local",
+                        'disks': [{'drive': 'C', 'percent_free': round(random.uniform(1, 90), 2)}]},
+            'ErrorMessage': None if is_available else 'Узел недоступен: превышено время ожидания ответа.'
+        } for step_index in range(random.randint(1, 4))]
+        results.append({
+            'assignment_id': random.randint(1, 5000),
+            'is_available': is_available,
+            'check_timestamp': now_iso,
+            'detail_type': 'PIPELINE_AGGREGATED_RESULT',
+            'detail_data': {'steps_results': steps_results, 'pipeline_status_message': 'Pipeline выполнен.'},
+            'agent_script_version': 'hybrid_agent_v7.1.0',
+            'assignment_config_version': '20250501120000_1060_abcdef',
+            'executor_object_id': 1060,
+            'resolution_method': 'offline_loader_pipeline',
+            'idempotency_key': f"bench:{item_index}"
+        })
+    return json.dumps({'results': results}, ensure_ascii=False).encode('utf-8')
+
+
+def _compressors() -> List[Tuple[str, Optional[str], Callable[[bytes], bytes]]]:
+    """ (название, Content-Encoding, функция сжатия) для доступных кодировок. """
+    compressors: List[Tuple[str, Optional[str], Callable[[bytes], bytes]]] = [
+        ('identity', None, lambda body: body),
+        ('gzip-1', 'gzip', lambda body: gzip.compress(body, compresslevel=1)),
+        ('gzip-6', 'gzip', lambda body: gzip.compress(body, compresslevel=6)),
+    ]
+    if request_decoding.HAS_ZSTANDARD:
+        import zstandard
+        compressors.append(('zstd-3', 'zstd', lambda body: zstandard.ZstdCompressor(level=3).compress(body)))
+    return compressors
+
+
+def _server_parse(wire_body: bytes, encoding: Optional[str]) -> int:
+    """ Распаковка и потоковый разбор тела, как в приложении. Возвращает число элементов. """
+    stream: Any = io.BytesIO(wire_body)
+    if encoding:
+        stream = request_decoding.open_decoded_stream(stream, encoding, request_decoding.REQUEST_MAX_DECOMPRESSED_BYTES)
+    return sum(1 for kind, _, _ in bulk_payload.iter_bulk_payload(stream, max_items=10**9) if kind == 'item')
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк: размер и CPU сервера для сжатых тел /checks/bulk.")
+    arg_parser.add_argument('--rows', type=int, default=5000, help='Количество результатов в пакете.')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Количество повторов разбора.')
+    args = arg_parser.parse_args()
+
+    body = _build_body(args.rows)
+    print(f"Пакет: {args.rows} результатов, исходный размер {len(body) / 1024:,.0f} КБ, повторов: {args.repeat}, "
+          f"парсер: {'ijson' if bulk_payload.HAS_IJSON else 'json.loads'}")
+    for name, encoding, compress in _compressors():
+        compress_started_at = time.process_time()
+        wire_body = compress(body)
+        compress_cpu = time.process_time() - compress_started_at
+        timings: List[float] = []
+        for _ in range(args.repeat):
+            started_at = time.process_time()
+            parsed_items = _server_parse(wire_body, encoding)
+            timings.append(time.process_time() - started_at)
+        assert parsed_items == args.rows
+        best = min(timings)
+        print(f"  {name:>8}: на проводе {len(wire_body) / 1024:>9,.0f} КБ (x{len(body) / len(wire_body):5.1f}), "
+              f"CPU сервера {best * 1000:7.1f} мс ({args.rows / best:,.0f} результатов/сек), "
+              f"CPU сжатия на клиенте {compress_cpu * 1000:7.1f} мс")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# status/benchmarks/bench_status_classifier.py
+"""
+Бенчмарк вычисления отображаемого статуса узлов.
+Сравнивает на синтетических узлах (10k и 100k по умолчанию):
+  - legacy: поузловой расчет, как в node_service до v5.0.19 (слияние словарей,
+    разбор времени, ветвления правил и отладочные f-строки на каждый узел);
+  - table: слияние словарей + пакетный проход status_classifier.classify_nodes (v5.0.19).
+
+БД не требуется. Запуск (из каталога status/):
+    python -m benchmarks.bench_status_classifier --nodes 10000 100000 --repeat 3
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+from dateutil import parser as dateutil_parser
+
+from app.services import status_classifier
+
+logger = logging.getLogger('bench_status_classifier')
+METHOD_NAME = 'PING'
+
+
+def _build_nodes(count: int, now: datetime) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """ Базовая информация узлов и карта последних ключевых проверок (как из get_node_*). """
+    base_nodes = [{'id': node_id, 'name': f"Узел {node_id}", 'timeout_minutes': random.choice((5, 5, 10, 15)),
+                   'icon_filename': 'server.svg', 'subdivision_id': node_id % 80} for node_id in range(1, count + 1)]
+    primary_checks: Dict[int, Dict[str, Any]] = {}
+    for node_id in range(1, count + 1):
+        if random.random() < 0.05:
+            continue # Нет данных
+        primary_checks[node_id] = {
+            'node_id': node_id,
+            'is_available': random.random() > 0.1,
+            'check_success': random.choice((True, True, True, False, None)),
+            'last_checked': now - timedelta(minutes=random.uniform(0, 20)),
+            'check_timestamp': now - timedelta(minutes=random.uniform(0, 20)),
+        }
+    return base_nodes, primary_checks
+
+
+def _legacy_pass(base_nodes: List[Dict[str, Any]], primary_checks: Dict[int, Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    processed_nodes = []
+    for base_node in base_nodes:
+        node_id = base_node.get('id')
+        node_data = {**base_node, **primary_checks.get(node_id, {})}
+        status_class, status_text = "unknown", f"Нет данных ({METHOD_NAME})"
+        try:
+            timeout_minutes = int(node_data.get('timeout_minutes', 5))
+            if timeout_minutes <= 0: raise ValueError("Таймаут должен быть > 0.")
+        except (ValueError, TypeError):
+            timeout_minutes = 5
+        timeout_delta = timedelta(minutes=timeout_minutes)
+        timestamp_value = node_data.get('check_timestamp') or node_data.get('last_checked')
+        is_available, check_success = node_data.get('is_available'), node_data.get('check_success')
+        logger.debug(f"Node ID {node_id}: Расчет статуса... is_available={is_available}, check_success={check_success}, "
+                     f"timestamp_str='{timestamp_value}', timeout_min={timeout_minutes}")
+        if timestamp_value:
+            parsed = dateutil_parser.isoparse(timestamp_value) if isinstance(timestamp_value, str) else timestamp_value
+            if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
+            logger.debug(f"  Node ID {node_id}: Распарсено время проверки (UTC): {parsed.isoformat()}")
+            outdated = now - parsed > timeout_delta
+            logger.debug(f"  Node ID {node_id}: Разница={now - parsed}, Таймаут={timeout_delta}, Устарело={outdated}")
+            if is_available is True:
+                if check_success is True:
+                    status_class = "warning" if outdated else "available"
+                    status_text = f"Устарело ({METHOD_NAME} > {timeout_minutes} мин)" if outdated else f"Доступен ({METHOD_NAME})"
+                elif check_success is False:
+                    status_class, status_text = "unavailable", f"Ошибка ({METHOD_NAME}: критерии не пройдены)"
+                else:
+                    status_class, status_text = "warning", f"Предупреждение ({METHOD_NAME}: статус критериев не ясен)"
+                    if outdated: status_text += f", данные устарели (> {timeout_minutes} мин)"
+            elif is_available is False:
+                status_class, status_text = "unavailable", f"Недоступен ({METHOD_NAME}: ошибка выполнения)"
+            else:
+                status_class, status_text = "unknown", f"Статус {METHOD_NAME} не определен"
+        elif is_available is False:
+            status_class, status_text = "unavailable", f"Недоступен ({METHOD_NAME}: ошибка выполнения, время не определено)"
+        node_data['status_class'] = status_class
+        node_data['status_text'] = status_text
+        for date_key in ('last_checked', 'last_available', 'check_timestamp'):
+            if isinstance(node_data.get(date_key), datetime):
+                node_data[date_key] = node_data[date_key].isoformat()
+        processed_nodes.append(node_data)
+        logger.debug(f"Node ID {node_id}: Обработан. Итоговый статус-класс: '{status_class}', текст: '{status_text}'")
+    return processed_nodes
+
+
+def _table_pass(base_nodes: List[Dict[str, Any]], primary_checks: Dict[int, Dict[str, Any]], now: datetime) -> List[Dict[str, Any]]:
+    processed_nodes = [{**base_node, **primary_checks.get(base_node['id'], {})} for base_node in base_nodes]
+    status_classifier.classify_nodes(processed_nodes, METHOD_NAME, now)
+    return processed_nodes
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк: поузловой расчет статуса vs табличный классификатор.")
+    arg_parser.add_argument('--nodes', type=int, nargs='+', default=[10000, 100000], help='Количество узлов (несколько значений).')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого режима.')
+    args = arg_parser.parse_args()
+
+    now = datetime.now(timezone.utc)
+    for node_count in args.nodes:
+        base_nodes, primary_checks = _build_nodes(node_count, now)
+        legacy_statuses = [(node['status_class'], node['status_text']) for node in _legacy_pass(base_nodes, primary_checks, now)]
+        table_statuses = [(node['status_class'], node['status_text']) for node in _table_pass(base_nodes, primary_checks, now)]
+        assert legacy_statuses == table_statuses, "Результаты классификаторов расходятся"
+        print(f"Узлов: {node_count:,}, повторов: {args.repeat}")
+        best_timings = {}
+        for mode_name, runner in (('legacy', _legacy_pass), ('table', _table_pass)):
+            timings: List[float] = []
+            for _ in range(args.repeat):
+                started_at = time.perf_counter()
+                runner(base_nodes, primary_checks, now)
+                timings.append(time.perf_counter() - started_at)
+            best_timings[mode_name] = min(timings)
+            print(f"  {mode_name:>6}: лучшее {best_timings[mode_name] * 1000:8.1f} мс, {node_count / best_timings[mode_name]:,.0f} узлов/сек")
+        print(f"  ускорение: x{best_timings['legacy'] / best_timings['table']:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# status/benchmarks/bench_text_search.py
+"""
+Бенчмарк текстового поиска (v5.0.22) на сгенерированном наборе данных.
+Сравнивает время поиска по событиям и узлам:
+  - seq: те же условия без индексов поиска (как до v5.0.22 - полный просмотр);
+  - indexed: с триграммными GIN-индексами (pg_trgm, если доступно) и GIN-индексом
+    message_tsv (полнотекстовый поиск, конфигурация russian).
+Условия строятся теми же функциями, что и в репозиториях (app.repositories.text_search).
+
+Работает с реальной БД (параметры берутся из DATABASE_URL / DB_* как в приложении).
+Данные генерируются во временных таблицах внутри транзакции, которая затем
+откатывается, поэтому данные в БД не изменяются.
+
+Запуск (из каталога status/):
+    python -m benchmarks.bench_text_search --events 1000000 --nodes 100000 --repeat 3
+"""
+import argparse
+import time
+from typing import Any, Dict, List, Tuple
+
+from psycopg2.extras import RealDictCursor
+
+from app.db_connection import get_connection
+from app.repositories import text_search
+
+_EVENT_PHRASES = [
+    'Результат проверки получен', 'Ошибка загрузки файла результатов', 'Узел недоступен по PING',
+    'Критерии задания не пройдены', 'Файл обработан загрузчиком', 'Служба остановлена на узле',
+    'Превышено время ожидания ответа', 'Сертификат скоро истекает', 'Заканчивается место на диске',
+]
+
+# (таблица, описание, функция построения условия)
+_SEARCH_CASES = [
+    ('bench_events', "события: слово 'недоступен'", lambda params: text_search.message_search_clause('недоступен', params, 'q')),
+    ('bench_events', "события: слова 'ошибка загрузки'", lambda params: text_search.message_search_clause('ошибка загрузки', params, 'q')),
+    ('bench_events', "события: подстрока '10.1.23.'", lambda params: text_search.message_search_clause('10.1.23.', params, 'q')),
+    ('bench_events', "события: имя файла 'rep_4711'", lambda params: text_search.message_search_clause('rep_4711', params, 'q')),
+    ('bench_nodes', "узлы: имя/IP/описание 'srv-0042'", lambda params: text_search.substring_search_clause(('name', 'ip_address', 'description'), 'srv-0042', params, 'q')),
+    ('bench_nodes', "узлы: IP '10.7.'", lambda params: text_search.substring_search_clause(('name', 'ip_address', 'description'), '10.7.', params, 'q')),
+]
+
+
+def _create_dataset(cursor, events_count: int, nodes_count: int) -> None:
+    """ Временные таблицы с теми же столбцами поиска, что system_events и nodes. """
+    cursor.execute("""
+        CREATE TEMP TABLE bench_events (
+            id SERIAL PRIMARY KEY,
+            message TEXT NOT NULL,
+            message_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('russian', message)) STORED
+        ) ON COMMIT DROP;
+        CREATE TEMP TABLE bench_nodes (
+            id SERIAL PRIMARY KEY, name VARCHAR(255), ip_address VARCHAR(45), description TEXT
+        ) ON COMMIT DROP;
+    """)
+    cursor.execute("""
+        INSERT INTO bench_events (message)
+        SELECT (%(phrases)s::TEXT[])[1 + g %% array_length(%(phrases)s::TEXT[], 1)]
+               || ': узел srv-' || lpad((g %% %(nodes)s)::TEXT, 4, '0')
+               || ' (10.' || (g %% 250) || '.' || (g / 250 %% 250) || '.' || (g %% 97) || ')'
+               || CASE WHEN g %% 10 = 0 THEN ', файл rep_' || g || '.zrpu' ELSE '' END
+        FROM generate_series(1, %(events)s) AS g;
+    """, {'phrases': _EVENT_PHRASES, 'events': events_count, 'nodes': max(nodes_count, 1)})
+    cursor.execute("""
+        INSERT INTO bench_nodes (name, ip_address, description)
+        SELECT 'srv-' || lpad(g::TEXT, 4, '0'), '10.' || (g %% 250) || '.' || (g / 250 %% 250) || '.' || (g %% 97),
+               'Сервер ' || g || ' подразделения ' || (g %% 80)
+        FROM generate_series(1, %(nodes)s) AS g;
+    """, {'nodes': nodes_count})
+    cursor.execute("ANALYZE bench_events; ANALYZE bench_nodes;")
+
+
+def _create_search_indexes(cursor) -> bool:
+    """ Индексы поиска как в 002_create_indexes.sql. Возвращает наличие pg_trgm. """
+    cursor.execute("CREATE INDEX ON bench_events USING gin (message_tsv);")
+    cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') AS has_trgm;")
+    has_trgm = cursor.fetchone()['has_trgm']
+    if has_trgm:
+        cursor.execute("""
+            CREATE INDEX ON bench_events USING gin (message gin_trgm_ops);
+            CREATE INDEX ON bench_nodes USING gin (name gin_trgm_ops);
+            CREATE INDEX ON bench_nodes USING gin (ip_address gin_trgm_ops);
+            CREATE INDEX ON bench_nodes USING gin (description gin_trgm_ops);
+        """)
+    cursor.execute("ANALYZE bench_events; ANALYZE bench_nodes;")
+    return has_trgm
+
+
+def _run_cases(cursor, repeat: int) -> List[Tuple[str, float, int]]:
+    results: List[Tuple[str, float, int]] = []
+    for table_name, case_name, build_clause in _SEARCH_CASES:
+        params: Dict[str, Any] = {}
+        sql = f"SELECT COUNT(*) AS matched FROM {table_name} WHERE {build_clause(params)};"
+        timings: List[float] = []
+        matched = 0
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            cursor.execute(sql, params)
+            matched = cursor.fetchone()['matched']
+            timings.append(time.perf_counter() - started_at)
+        results.append((case_name, min(timings), matched))
+    return results
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк: поиск без индексов vs триграммные/полнотекстовые индексы.")
+    arg_parser.add_argument('--events', type=int, default=500000, help='Количество сгенерированных событий.')
+    arg_parser.add_argument('--nodes', type=int, default=50000, help='Количество сгенерированных узлов.')
+    arg_parser.add_argument('--repeat', type=int, default=3, help='Количество повторов каждого запроса.')
+    args = arg_parser.parse_args()
+
+    with get_connection() as conn:
+        try:
+            with conn.cursor(cursor_factory=RealDictCursor) as cursor:
+                started_at = time.perf_counter()
+                _create_dataset(cursor, args.events, args.nodes)
+                print(f"Данные: {args.events:,} событий, {args.nodes:,} узлов (генерация {time.perf_counter() - started_at:.1f} c), повторов: {args.repeat}")
+                seq_results = _run_cases(cursor, args.repeat)
+                started_at = time.perf_counter()
+                has_trgm = _create_search_indexes(cursor)
+                print(f"Индексы поиска построены за {time.perf_counter() - started_at:.1f} c, pg_trgm: {'да' if has_trgm else 'нет'}")
+                indexed_results = _run_cases(cursor, args.repeat)
+            for (case_name, seq_best, matched), (_, indexed_best, indexed_matched) in zip(seq_results, indexed_results):
+                assert matched == indexed_matched, f"Результаты поиска расходятся: {case_name}"
+                print(f"  {case_name:<40} найдено {matched:>8,}: seq {seq_best * 1000:9.1f} мс, "
+                      f"indexed {indexed_best * 1000:9.1f} мс (x{seq_best / indexed_best:.1f})")
+        finally:
+            conn.rollback() # Временные таблицы удаляются вместе с транзакцией
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,7 @@
 #!/bin/sh
 # status/entrypoint.sh
 # Версия 1.0.1: Исправлен вызов команды flask для создания пользователя.
+# Версия 1.0.2: При старте создаются секции истории проверок (flask checks create-partitions).
 
 # Выход при ошибке
 set -e
@@ -31,6 +32,13 @@ fi
 # Эту строку можно оставить для лога, но она дублирует сообщение из if/else
 # echo "Entrypoint: Пользователь 'adm' проверен/создан (или уже существовал)."
 
+# Секции истории проверок создаются заранее (дальше - периодически, см. README)
+if flask checks create-partitions; then
+    echo "Entrypoint: Секции истории проверок проверены/созданы."
+else
+    echo "Entrypoint: Не удалось создать секции истории проверок. См. вывод команды flask выше."
+fi
+
 echo "Entrypoint: Запуск основной команды (Gunicorn)..."
 
 # exec "$@" выполняет команду, которая передана в CMD Dockerfile
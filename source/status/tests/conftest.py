@@ -5,6 +5,7 @@ import logging
 from flask import session # <<< Добавлен импорт session
 from app.app import create_app
 from app import db_connection
+from app.services import dashboard_cache
 import psycopg2
 
 logging.basicConfig(level=logging.DEBUG)
@@ -73,6 +74,12 @@ def app():
         else: log.info("Пул соединений тестового приложения успешно закрыт.")
     else: log.warning("Пул соединений (db_pool) не найден в db_connection для закрытия.")
 
+@pytest.fixture(autouse=True)
+def reset_dashboard_snapshot():
+    """Сбрасывает общий снимок дашборда: тесты меняют данные напрямую в БД, минуя маршруты."""
+    dashboard_cache.invalidate_dashboard_cache()
+    yield
+
 @pytest.fixture(scope='function')
 def client(app):
     """Тестовый клиент Flask (новый для каждого теста)."""
@@ -248,6 +248,25 @@ def test_get_offline_config_success(client, setup_agent_data, agent_api_keys):
     assert 'interval_seconds' in first_assignment
     assert 'success_criteria' in first_assignment # Должен быть null, если не задан
 
+def test_get_offline_config_etag_not_modified(client, setup_agent_data, agent_api_keys):
+    """Тест: повторный запрос с ETag получает 304, версия конфигурации не меняется (v5.0.25)."""
+    log.info("\nТест: GET /objects/{id}/offline_config - ETag / 304")
+    object_id = setup_agent_data['sub1_oid']
+    headers = {'X-API-Key': agent_api_keys['configurator']}
+
+    first_response = client.get(f'/api/v1/objects/{object_id}/offline_config', headers=headers)
+    assert first_response.status_code == 200
+    etag = first_response.headers.get('ETag')
+    assert etag, "Ответ должен содержать ETag"
+
+    second_response = client.get(f'/api/v1/objects/{object_id}/offline_config', headers={**headers, 'If-None-Match': etag})
+    assert second_response.status_code == 304
+    assert second_response.headers.get('ETag') == etag
+
+    third_response = client.get(f'/api/v1/objects/{object_id}/offline_config', headers=headers)
+    assert third_response.status_code == 200
+    assert third_response.get_json()['assignment_config_version'] == first_response.get_json()['assignment_config_version']
+
 def test_get_offline_config_no_transport_code(client, setup_agent_data, agent_api_keys):
     """Тест: Ошибка 404, если у подразделения нет transport_system_code."""
     log.info("\nТест: GET /objects/{id}/offline_config - Ошибка (нет кода ТС)")
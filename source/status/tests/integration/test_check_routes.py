@@ -8,6 +8,7 @@ import json
 import logging
 import secrets
 import psycopg2 # Для ошибок
+import psycopg2.extras
 from datetime import datetime, timezone, timedelta
 
 # Используем фикстуры из conftest.py
@@ -521,6 +522,68 @@ def test_add_checks_bulk_partial_error(client, db_conn, setup_check_data, api_ke
     assert error2.get('assignment_id') == assign_id_valid
     assert 'Validation Error' in error2.get('error') and "'IsAvailable' is required" in error2.get('error')
 
+def test_add_checks_bulk_same_assignment_last_wins(client, db_conn, setup_check_data, api_keys):
+    """Тест: Пакет с несколькими результатами одного задания записывается целиком,
+    last_node_check_id указывает на последний по порядку элемент пакета."""
+    log.info("\nТест: POST /api/v1/checks/bulk - Несколько результатов одного задания")
+    headers = {'X-API-Key': api_keys['loader'], 'Content-Type': 'application/json'}
+    assign_id = setup_check_data['assignment_id']
+    ts_base = datetime.now(timezone.utc) - timedelta(minutes=5)
+    results_list = [
+        {"assignment_id": assign_id, "IsAvailable": (i % 2 == 0), "Timestamp": (ts_base + timedelta(seconds=i)).isoformat()}
+        for i in range(5)
+    ]
+    response = client.post('/api/v1/checks/bulk', headers=headers, json={"results": results_list})
+    log.info(f"Ответ API: {response.status_code}, Тело: {response.get_data(as_text=True)}")
+
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data.get('processed') == 5 and data.get('failed') == 0
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT id, is_available FROM node_checks WHERE assignment_id = %s ORDER BY id DESC LIMIT 1", (assign_id,))
+    last_check = cursor.fetchone()
+    assert last_check['is_available'] is True # Элемент с индексом 4
+    cursor.execute("SELECT last_node_check_id FROM node_check_assignments WHERE id = %s", (assign_id,))
+    assert cursor.fetchone()['last_node_check_id'] == last_check['id']
+    # Политика событий по умолчанию (transitions): каждая смена IsAvailable внутри пакета -
+    # событие CHECK_STATE_CHANGED (первый элемент может совпасть с прежним состоянием)
+    cursor.execute("SELECT COUNT(*) AS cnt FROM system_events WHERE event_type = 'CHECK_STATE_CHANGED' AND assignment_id = %s", (assign_id,))
+    assert cursor.fetchone()['cnt'] >= 4
+    cursor.close()
+
+def test_add_checks_bulk_retry_reports_duplicates(client, db_conn, setup_check_data, api_keys):
+    """Тест: Повторная отправка того же пакета не создает записей, повторы возвращаются отдельно (207, success)."""
+    log.info("\nТест: POST /api/v1/checks/bulk - Повторная отправка пакета")
+    headers = {'X-API-Key': api_keys['loader'], 'Content-Type': 'application/json'}
+    assign_id = setup_check_data['assignment_id']
+    ts_base = datetime.now(timezone.utc) - timedelta(minutes=3)
+    payload = {"object_id": 1060, "results": [
+        {"assignment_id": assign_id, "IsAvailable": True, "Timestamp": ts_base.isoformat()},
+        {"assignment_id": assign_id, "IsAvailable": False, "Timestamp": (ts_base + timedelta(seconds=1)).isoformat(),
+         "idempotency_key": f"retry-test-{ts_base.timestamp()}"},
+    ]}
+    first_response = client.post('/api/v1/checks/bulk', headers=headers, json=payload)
+    assert first_response.status_code == 200
+    assert first_response.get_json()['processed'] == 2 and first_response.get_json()['duplicates'] == 0
+
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT COUNT(*) AS cnt FROM node_checks WHERE assignment_id = %s", (assign_id,))
+    checks_count_before = cursor.fetchone()['cnt']
+
+    retry_response = client.post('/api/v1/checks/bulk', headers=headers, json=payload)
+    log.info(f"Ответ API: {retry_response.status_code}, Тело: {retry_response.get_data(as_text=True)}")
+    assert retry_response.status_code == 207
+    data = retry_response.get_json()
+    assert data['status'] == 'success' and data['processed'] == 0 and data['failed'] == 0
+    assert data['duplicates'] == 2
+    assert [item['index'] for item in data['duplicate_items']] == [0, 1]
+    assert all(item['node_check_id'] for item in data['duplicate_items'])
+
+    cursor.execute("SELECT COUNT(*) AS cnt FROM node_checks WHERE assignment_id = %s", (assign_id,))
+    assert cursor.fetchone()['cnt'] == checks_count_before
+    cursor.close()
+
 def test_add_checks_bulk_empty_list(client, api_keys):
     """Тест: Отправка пустого массива results."""
     log.info("\nТест: POST /api/v1/checks/bulk - Пустой список")
@@ -710,4 +773,105 @@ def test_get_assignment_checks_history_not_found(logged_in_client):
     assert 'Assignment with id=' in error_data['error']['message']
     assert 'not found' in error_data['error']['message']
 
+
+def test_create_check_partitions_moves_rows_from_default_partition(db_conn):
+    """
+    Тест: секции суток создаются, даже если строки этих суток уже попали в секцию
+    по умолчанию; строки (и детали) переносятся в новые секции.
+    """
+    log.info("\nТест: create_check_partitions при непустой секции по умолчанию")
+    from app.repositories import check_repository
+    day = datetime.now(timezone.utc).date() + timedelta(days=3650) # Секций на эти сутки еще нет
+    suffix = '_p' + day.strftime('%Y%m%d')
+    checked_at = datetime(day.year, day.month, day.day, 12, 0, tzinfo=timezone.utc)
+    cursor = db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) # Репозиторий читает столбцы по имени
+    cursor.execute("SELECT to_regclass(%s) IS NULL AS missing;", ('node_checks' + suffix,))
+    assert cursor.fetchone()['missing'] is True
+    # Засеваем секции по умолчанию: проверка, ее детали и ключ идемпотентности
+    cursor.execute("""
+        INSERT INTO node_checks (node_id, method_id, is_available, checked_at)
+        VALUES (0, 0, TRUE, %s) RETURNING id;
+    """, (checked_at,))
+    node_check_id = cursor.fetchone()['id']
+    cursor.execute("""
+        INSERT INTO node_check_details (node_check_id, checked_at, detail_type, data)
+        VALUES (%s, %s, 'TEST', '{}'::jsonb);
+    """, (node_check_id, checked_at))
+    cursor.execute("""
+        INSERT INTO node_check_ingest_keys (check_day, idempotency_key, node_check_id)
+        VALUES (%s, %s, %s);
+    """, (day, secrets.token_hex(8), node_check_id))
+    cursor.execute("SELECT tableoid::regclass::text AS partition_name FROM node_checks WHERE id = %s AND checked_at = %s;",
+                   (node_check_id, checked_at))
+    assert cursor.fetchone()['partition_name'] == 'node_checks_default'
+
+    created_count = check_repository.create_check_partitions(cursor, day, day)
+
+    assert created_count == 3
+    for table_name in ('node_checks', 'node_check_details'):
+        cursor.execute(f"SELECT tableoid::regclass::text AS partition_name FROM {table_name} WHERE checked_at = %s;", (checked_at,))
+        assert [row['partition_name'] for row in cursor.fetchall()] == [table_name + suffix]
+    cursor.execute("SELECT tableoid::regclass::text AS partition_name FROM node_check_ingest_keys WHERE check_day = %s;", (day,))
+    assert [row['partition_name'] for row in cursor.fetchall()] == ['node_check_ingest_keys' + suffix]
+    cursor.execute("SELECT COUNT(*) AS left_count FROM node_checks_default WHERE checked_at = %s;", (checked_at,))
+    assert cursor.fetchone()['left_count'] == 0
+    cursor.close()
+
+# --- Тесты для node_check_latest (текущее состояние заданий) ---
+
+def test_add_check_updates_node_check_latest(client, db_conn, setup_check_data, api_keys):
+    """
+    Тест: после двух результатов одного задания node_check_latest хранит последний результат,
+    а last_success_at - время записи последнего успешного; backfill по истории
+    восстанавливает те же значения в очищенной таблице.
+    """
+    log.info("\nТест: POST /api/v1/checks - node_check_latest и backfill")
+    from app.repositories import check_repository
+    assignment_id = setup_check_data['assignment_id']
+    headers = {'X-API-Key': api_keys['agent'], 'Content-Type': 'application/json'}
+
+    success_payload = {"assignment_id": assignment_id, "is_available": True, "CheckSuccess": True}
+    response_success = client.post('/api/v1/checks', headers=headers, json=success_payload)
+    assert response_success.status_code == 201
+    failure_payload = {"assignment_id": assignment_id, "is_available": False, "CheckSuccess": False}
+    response_failure = client.post('/api/v1/checks', headers=headers, json=failure_payload)
+    assert response_failure.status_code == 201
+
+    cursor = db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+    cursor.execute("SELECT id, is_available, checked_at FROM node_checks WHERE assignment_id = %s ORDER BY checked_at, id", (assignment_id,))
+    success_check, failure_check = cursor.fetchall()
+    assert success_check['is_available'] is True and failure_check['is_available'] is False
+
+    latest_columns = "last_node_check_id, node_id, is_available, check_success, checked_at, last_success_at"
+    cursor.execute(f"SELECT {latest_columns} FROM node_check_latest WHERE assignment_id = %s", (assignment_id,))
+    latest_row = cursor.fetchone()
+    assert latest_row is not None, "Запись не найдена в node_check_latest"
+    assert latest_row['last_node_check_id'] == failure_check['id']
+    assert latest_row['node_id'] == setup_check_data['node_id']
+    assert latest_row['is_available'] is False and latest_row['check_success'] is False
+    assert latest_row['checked_at'] == failure_check['checked_at']
+    assert latest_row['last_success_at'] == success_check['checked_at']
+
+    # Backfill (то, что выполняет flask checks backfill-latest) по очищенной таблице.
+    # Выполняется в транзакции db_conn: TRUNCATE блокирует таблицу до отката.
+    cursor.execute("TRUNCATE node_check_latest;")
+    assert check_repository.backfill_node_check_latest(cursor) >= 1
+    cursor.execute(f"SELECT {latest_columns} FROM node_check_latest WHERE assignment_id = %s", (assignment_id,))
+    assert cursor.fetchone() == latest_row
+    cursor.close()
+
+def test_backfill_latest_cli(client, runner, setup_check_data, api_keys):
+    """Тест: команда flask checks backfill-latest завершается успешно и сообщает число заданий."""
+    log.info("\nТест: CLI checks backfill-latest")
+    headers = {'X-API-Key': api_keys['agent'], 'Content-Type': 'application/json'}
+    response = client.post('/api/v1/checks', headers=headers,
+                           json={"assignment_id": setup_check_data['assignment_id'], "is_available": True})
+    assert response.status_code == 201
+
+    result = runner.invoke(args=['checks', 'backfill-latest'])
+    log.info(f"Вывод CLI: {result.output}")
+    assert result.exit_code == 0
+    assert 'node_check_latest заполнена' in result.output
+
+
 # --- Конец файла ---
\ No newline at end of file
@@ -0,0 +1,59 @@
+# status/tests/test_agent_routes.py
+import psycopg2.extensions
+import psycopg2.extras
+import pytest
+from unittest.mock import MagicMock
+from flask import Flask
+from app import db_request
+from app.routes import agent_routes
+
+_CONFIG_VERSION = {'version_tag': '20250501120000000_1060_abcdef12', 'content_hash': 'abcdef12' * 8, 'regenerated': False}
+
+
+@pytest.fixture
+def agent_app(mocker):
+    """Приложение только с маршрутами агента: пул и проверка API-ключа подменены."""
+    mock_pool = MagicMock()
+    mock_pool.getconn.return_value.closed = 0
+    mock_pool.getconn.return_value.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    mocker.patch('app.db_request.db_connection.db_pool', mock_pool)
+    mocker.patch('app.auth_utils.verify_api_key', return_value={'id': 1, 'role': 'configurator'})
+    flask_app = Flask(__name__)
+    db_request.init_request_db(flask_app)
+    flask_app.register_blueprint(agent_routes.bp, url_prefix='/api/v1')
+    return flask_app, mock_pool.getconn.return_value
+
+
+def test_offline_config_matching_etag_returns_304_without_reading_config(agent_app, mocker):
+    """Тест: совпавший If-None-Match - 304 без чтения сохраненной конфигурации и без фиксации."""
+    flask_app, mock_conn = agent_app
+    mocker.patch('app.routes.agent_routes.assignment_repository.get_offline_config_version', return_value=dict(_CONFIG_VERSION))
+    mock_fetch = mocker.patch('app.routes.agent_routes.assignment_repository.fetch_offline_config')
+
+    response = flask_app.test_client().get('/api/v1/objects/1060/offline_config',
+                                           headers={'X-API-Key': 'k', 'If-None-Match': f'"{_CONFIG_VERSION["content_hash"]}"'})
+
+    assert response.status_code == 304
+    assert response.get_etag() == (_CONFIG_VERSION['content_hash'], False)
+    mock_fetch.assert_not_called()
+    mock_conn.commit.assert_not_called()
+
+
+def test_offline_config_regenerated_is_returned_with_etag_and_committed(agent_app):
+    """Тест: сгенерированная заново конфигурация отдается с ETag, транзакция GET фиксируется.
+    Репозиторий не подменяется: строки читаются по имени столбца через курсор запроса (RealDictCursor)."""
+    flask_app, mock_conn = agent_app
+    stored_config = {'object_id': 1060, 'assignment_config_version': _CONFIG_VERSION['version_tag'],
+                     'assignments': [{'assignment_id': 5, 'pipeline': None}]}
+    mock_cursor = mock_conn.cursor.return_value
+    mock_cursor.fetchone.side_effect = [{'config_version': dict(_CONFIG_VERSION, regenerated=True)},
+                                        {'config_json': stored_config}]
+
+    response = flask_app.test_client().get('/api/v1/objects/1060/offline_config',
+                                           headers={'X-API-Key': 'k', 'If-None-Match': '"stale"'})
+
+    assert response.status_code == 200
+    assert response.get_etag() == (_CONFIG_VERSION['content_hash'], False)
+    assert response.get_json()['assignments'] == [{'assignment_id': 5, 'pipeline': []}]
+    mock_conn.cursor.assert_called_once_with(cursor_factory=psycopg2.extras.RealDictCursor)
+    mock_conn.commit.assert_called_once()
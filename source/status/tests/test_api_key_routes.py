@@ -0,0 +1,43 @@
+# status/tests/test_api_key_routes.py
+import psycopg2.extensions
+import pytest
+from unittest.mock import MagicMock
+from flask import Flask
+from flask_login import LoginManager
+from app import db_request
+from app.routes import api_key_routes
+
+
+@pytest.fixture
+def api_key_app(mocker):
+    """Приложение только с маршрутами API-ключей: пул подменен, вход не требуется."""
+    mock_pool = MagicMock()
+    mock_conn = mock_pool.getconn.return_value
+    mock_conn.closed = 0
+    mock_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    mocker.patch('app.db_request.db_connection.db_pool', mock_pool)
+    flask_app = Flask(__name__)
+    flask_app.config['LOGIN_DISABLED'] = True
+    LoginManager().init_app(flask_app)
+    db_request.init_request_db(flask_app)
+    flask_app.register_blueprint(api_key_routes.bp, url_prefix='/api/v1/api_keys')
+    return flask_app, mock_conn
+
+
+@pytest.mark.parametrize('method, repository_function, repository_result, expected_status', [
+    ('put', 'update_api_key', {'id': 7, 'is_active': False}, 200),
+    ('delete', 'delete_api_key', True, 204),
+])
+def test_api_key_cache_invalidated_after_commit(api_key_app, mocker, method, repository_function, repository_result, expected_status):
+    """Тест: кеш проверенных ключей сбрасывается только после фиксации изменения ключа."""
+    flask_app, mock_conn = api_key_app
+    mocker.patch(f'app.routes.api_key_routes.api_key_repository.{repository_function}', return_value=repository_result)
+    call_order = []
+    mock_conn.commit.side_effect = lambda: call_order.append('commit')
+    mocker.patch('app.routes.api_key_routes.invalidate_api_key_cache',
+                 side_effect=lambda key_id: call_order.append(('invalidate', key_id)))
+
+    response = getattr(flask_app.test_client(), method)('/api/v1/api_keys/7', json={'is_active': False})
+
+    assert response.status_code == expected_status
+    assert call_order == ['commit', ('invalidate', 7)]
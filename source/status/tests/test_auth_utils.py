@@ -0,0 +1,170 @@
+# status/tests/test_auth_utils.py
+import pytest
+from unittest.mock import MagicMock
+from werkzeug.security import generate_password_hash
+
+from app import auth_utils
+
+
+@pytest.fixture(autouse=True)
+def reset_api_key_cache():
+    """Очищает кеши (ключи, пользователи) и очередь last_used_at между тестами."""
+    auth_utils.invalidate_api_key_cache()
+    auth_utils.invalidate_user_cache()
+    auth_utils._pending_last_used.clear()
+    yield
+    auth_utils.invalidate_api_key_cache()
+    auth_utils.invalidate_user_cache()
+    auth_utils._pending_last_used.clear()
+
+
+def _mock_connection(mocker):
+    """Подменяет get_connection: возвращает мок соединения с моком курсора."""
+    mock_cursor = MagicMock()
+    mock_conn = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_get_conn = mocker.patch('app.auth_utils.get_connection')
+    mock_get_conn.return_value.__enter__.return_value = mock_conn
+    return mock_cursor
+
+
+def test_generate_and_split_api_key_roundtrip():
+    """Тест: сгенерированный ключ разбирается на тот же префикс, хеш соответствует секрету."""
+    plain_key, key_prefix, key_hash = auth_utils.generate_api_key()
+    parsed_prefix, secret_part = auth_utils.split_api_key(plain_key)
+    assert plain_key.startswith(f"sm_{key_prefix}_")
+    assert parsed_prefix == key_prefix
+    assert plain_key.endswith(secret_part)
+    assert key_hash != secret_part
+
+
+def test_split_api_key_legacy_format():
+    """Тест: ключ старого формата возвращается как есть, без префикса."""
+    legacy_key = "AbCdEf_legacy_token_value"
+    assert auth_utils.split_api_key(legacy_key) == (None, legacy_key)
+
+
+def test_verify_api_key_prefixed_single_lookup(mocker):
+    """Тест: ключ нового формата проверяется одной выборкой по префиксу без перебора ключей."""
+    mock_cursor = _mock_connection(mocker)
+    plain_key, key_prefix, key_hash = auth_utils.generate_api_key()
+    mock_find = mocker.patch('app.auth_utils.api_key_repository.find_api_key_by_prefix', return_value={
+        'id': 7, 'key_prefix': key_prefix, 'key_hash': key_hash, 'role': 'agent', 'object_id': 1060, 'is_active': True
+    })
+    mock_legacy = mocker.patch('app.auth_utils.api_key_repository.fetch_legacy_api_keys')
+
+    key_info = auth_utils.verify_api_key(plain_key)
+
+    mock_find.assert_called_once_with(mock_cursor, key_prefix)
+    mock_legacy.assert_not_called()
+    assert key_info == {'id': 7, 'role': 'agent', 'object_id': 1060, 'is_active': True}
+
+
+def test_verify_api_key_prefixed_wrong_secret(mocker):
+    """Тест: неверная секретная часть при верном префиксе отклоняется."""
+    _mock_connection(mocker)
+    plain_key, key_prefix, _ = auth_utils.generate_api_key()
+    mocker.patch('app.auth_utils.api_key_repository.find_api_key_by_prefix', return_value={
+        'id': 7, 'key_prefix': key_prefix, 'key_hash': generate_password_hash('other-secret', method='pbkdf2:sha256'),
+        'role': 'agent', 'object_id': None, 'is_active': True
+    })
+    assert auth_utils.verify_api_key(plain_key) is None
+
+
+def test_verify_api_key_legacy_werkzeug_key(mocker):
+    """Тест: ключ старого формата (хеш Werkzeug всего ключа) продолжает работать до ротации."""
+    _mock_connection(mocker)
+    legacy_key = "legacy-token-created-before-prefixes"
+    mocker.patch('app.auth_utils.api_key_repository.find_api_key_by_hash', return_value=None)
+    mocker.patch('app.auth_utils.api_key_repository.fetch_legacy_api_keys', return_value=[
+        {'id': 3, 'key_hash': generate_password_hash(legacy_key, method='pbkdf2:sha256'),
+         'role': 'loader', 'object_id': None, 'is_active': True}
+    ])
+
+    key_info = auth_utils.verify_api_key(legacy_key)
+    assert key_info is not None and key_info['id'] == 3 and key_info['role'] == 'loader'
+
+
+def test_verify_api_key_cache_hit_skips_db(mocker):
+    """Тест: повторная проверка того же ключа обслуживается из кеша без обращения к БД."""
+    _mock_connection(mocker)
+    plain_key, key_prefix, key_hash = auth_utils.generate_api_key()
+    mock_find = mocker.patch('app.auth_utils.api_key_repository.find_api_key_by_prefix', return_value={
+        'id': 11, 'key_prefix': key_prefix, 'key_hash': key_hash, 'role': 'loader', 'object_id': None, 'is_active': True
+    })
+    hits_before = auth_utils.get_api_key_cache_stats()['hits']
+
+    first_info = auth_utils.verify_api_key(plain_key)
+    second_info = auth_utils.verify_api_key(plain_key)
+
+    assert first_info == second_info
+    assert mock_find.call_count == 1
+    assert auth_utils.get_api_key_cache_stats()['hits'] == hits_before + 1
+
+
+def test_invalidate_api_key_cache_forces_recheck(mocker):
+    """Тест: после инвалидации по key_id ключ снова проверяется через БД."""
+    _mock_connection(mocker)
+    plain_key, key_prefix, key_hash = auth_utils.generate_api_key()
+    mock_find = mocker.patch('app.auth_utils.api_key_repository.find_api_key_by_prefix', return_value={
+        'id': 12, 'key_prefix': key_prefix, 'key_hash': key_hash, 'role': 'agent', 'object_id': 5, 'is_active': True
+    })
+    auth_utils.verify_api_key(plain_key)
+    assert auth_utils.invalidate_api_key_cache(12) == 1
+    auth_utils.verify_api_key(plain_key)
+    assert mock_find.call_count == 2
+
+
+def test_flush_api_key_last_used_batches_updates(mocker):
+    """Тест: last_used_at копится в памяти и записывается одним пакетным UPDATE."""
+    mock_cursor = MagicMock()
+    mock_conn = MagicMock()
+    mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+    mock_get_conn = mocker.patch('app.auth_utils.get_connection')
+    mock_get_conn.return_value.__enter__.return_value = mock_conn
+    mock_bulk = mocker.patch('app.auth_utils.api_key_repository.update_last_used_bulk')
+
+    for key_id in (1, 2, 1, 3):
+        auth_utils._mark_api_key_used(key_id)
+    mock_get_conn.assert_not_called() # Запрос не берет соединение: запись - фоновой задачей
+
+    assert auth_utils.flush_api_key_last_used() == 3
+    mock_bulk.assert_called_once()
+    assert set(mock_bulk.call_args[0][1].keys()) == {1, 2, 3}
+    mock_conn.commit.assert_called_once()
+
+
+def test_load_user_data_cached_until_invalidated(mocker):
+    """Тест: пользователь загружается из БД один раз; после инвалидации (деактивация) - снова из БД."""
+    _mock_connection(mocker)
+    mock_get_user = mocker.patch('app.auth_utils.user_repository.get_user_by_id', return_value={
+        'id': 5, 'username': 'operator', 'password_hash': 'hash', 'is_active': True, 'created_at': None
+    })
+
+    assert auth_utils.load_user_data(5)['is_active'] is True
+    assert auth_utils.load_user_data(5)['username'] == 'operator'
+    assert mock_get_user.call_count == 1
+
+    mock_get_user.return_value = {'id': 5, 'username': 'operator', 'password_hash': 'hash', 'is_active': False}
+    assert auth_utils.invalidate_user_cache(5) == 1
+    assert auth_utils.load_user_data(5)['is_active'] is False
+    assert mock_get_user.call_count == 2
+
+
+def test_load_user_data_expires_after_ttl(mocker):
+    """Тест: по истечении USER_CACHE_TTL_SECONDS данные пользователя перечитываются из БД."""
+    _mock_connection(mocker)
+    mock_get_user = mocker.patch('app.auth_utils.user_repository.get_user_by_id', return_value={
+        'id': 6, 'username': 'viewer', 'password_hash': 'hash', 'is_active': True
+    })
+    mock_monotonic = mocker.patch('app.auth_utils.time.monotonic', return_value=1000.0)
+    auth_utils.load_user_data(6)
+    mock_monotonic.return_value = 1000.0 + auth_utils.USER_CACHE_TTL_SECONDS + 1
+    auth_utils.load_user_data(6)
+
+    assert mock_get_user.call_count == 2
+
+    mock_get_user.return_value = None # Не найденный пользователь не кешируется
+    assert auth_utils.load_user_data(99) is None
+    assert auth_utils.load_user_data(99) is None
+    assert mock_get_user.call_count == 4
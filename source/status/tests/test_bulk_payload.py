@@ -0,0 +1,54 @@
+# status/tests/test_bulk_payload.py
+import io
+import json
+import pytest
+from app.services import bulk_payload
+
+
+def _events(payload, **limits):
+    return list(bulk_payload.iter_bulk_payload(io.BytesIO(json.dumps(payload).encode('utf-8')), **limits))
+
+
+@pytest.fixture(params=[True, False], ids=['ijson', 'json_loads'])
+def parser_mode(request, mocker):
+    """Каждый тест выполняется и с потоковым разбором, и с запасным json.loads."""
+    if request.param and not bulk_payload.HAS_IJSON:
+        pytest.skip("ijson не установлен")
+    mocker.patch('app.services.bulk_payload.HAS_IJSON', request.param)
+    return request.param
+
+
+def test_iter_bulk_payload_yields_items_and_trailing_metadata(parser_mode):
+    """Тест: элементы выдаются по порядку с вложенными Details, общие поля - и после 'results'."""
+    item = {'assignment_id': 5, 'IsAvailable': True, 'Details': {'steps_results': [{'ok': 1.5}]}}
+    events = _events({'results': [item, {'assignment_id': 6}], 'object_id': 1060, 'extra': {'ignored': True}})
+
+    assert events == [('item', 0, item), ('item', 1, {'assignment_id': 6}), ('meta', 'object_id', 1060)]
+
+
+def test_iter_bulk_payload_enforces_limits(parser_mode):
+    """Тест: превышение количества элементов или размера тела - BulkPayloadTooLarge."""
+    payload = {'results': [{'assignment_id': n} for n in range(3)]}
+    with pytest.raises(bulk_payload.BulkPayloadTooLarge):
+        _events(payload, max_items=2)
+    with pytest.raises(bulk_payload.BulkPayloadTooLarge):
+        _events(payload, max_bytes=10)
+    assert len(_events(payload, max_items=3)) == 3
+
+
+@pytest.mark.parametrize('body', [b'[1, 2]', b'{"results": {"a": 1}}', b'{"object_id": 1}', b'{"results": [1,'])
+def test_iter_bulk_payload_rejects_malformed_body(parser_mode, body):
+    """Тест: тело не объект, 'results' не массив или отсутствует, обрезанный JSON - BulkPayloadError (400)."""
+    with pytest.raises(bulk_payload.BulkPayloadError) as exc_info:
+        list(bulk_payload.iter_bulk_payload(io.BytesIO(body)))
+    assert not isinstance(exc_info.value, bulk_payload.BulkPayloadTooLarge)
+
+
+def test_iter_bulk_payload_reads_werkzeug_request_stream(parser_mode):
+    """Тест: разбор тела из LimitedStream werkzeug (несжатый request.stream) без ложного обрыва соединения."""
+    from werkzeug.wsgi import LimitedStream
+    body = json.dumps({'results': [{'assignment_id': 1}], 'object_id': 5}).encode('utf-8')
+
+    events = list(bulk_payload.iter_bulk_payload(LimitedStream(io.BytesIO(body), len(body))))
+
+    assert events == [('item', 0, {'assignment_id': 1}), ('meta', 'object_id', 5)]
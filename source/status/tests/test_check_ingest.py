@@ -0,0 +1,209 @@
+# status/tests/test_check_ingest.py
+import json
+import psycopg2
+import psycopg2.extensions
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from flask import Flask
+from app import db_request
+from app.errors import register_error_handlers
+from app.services import check_ingest
+
+
+def _bulk_item(item_index, assignment_id):
+    return {'item_index': item_index, 'assignment_id': assignment_id, 'is_available': True}
+
+
+@pytest.fixture
+def mock_cursor():
+    cursor = MagicMock()
+    cursor.connection.closed = 0
+    return cursor
+
+
+@pytest.fixture
+def spool(mocker, tmp_path):
+    """Очередь приема во временном файле вместо общей."""
+    test_spool = check_ingest._CheckIngestSpool(str(tmp_path / 'spool.sqlite3'), max_depth=3)
+    mocker.patch('app.services.check_ingest._ingest_spool', test_spool)
+    mocker.patch.dict(check_ingest._writer_stats, {"batches": 0, "written": 0, "duplicates": 0, "dropped": 0, "failed_batches": 0})
+    return test_spool
+
+
+def test_resolve_idempotency_key_prefers_client_key_and_derives_stable_key():
+    """Тест: ключ клиента используется как есть; вычисленный ключ одинаков для повтора и зависит от исполнителя."""
+    checked_at = datetime(2025, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert check_ingest.resolve_idempotency_key('file-1:0', 5, checked_at, 1060, None) == 'file-1:0'
+    derived_key = check_ingest.resolve_idempotency_key(None, 5, checked_at, 1060, None)
+    assert derived_key.startswith('auto:')
+    assert derived_key == check_ingest.resolve_idempotency_key(None, 5, checked_at, 1060, None)
+    assert derived_key != check_ingest.resolve_idempotency_key(None, 5, checked_at, 1061, None)
+    assert check_ingest.resolve_idempotency_key(None, 5, None, 1060, None) is None # Без времени агента повтор неотличим
+    with pytest.raises(ValueError):
+        check_ingest.resolve_idempotency_key('x' * (check_ingest.IDEMPOTENCY_KEY_MAX_LENGTH + 1), 5, checked_at, 1060, None)
+
+
+def test_record_check_items_single_call_when_batch_succeeds(mocker, mock_cursor):
+    """Тест: валидный пакет записывается одним вызовом без поштучной записи."""
+    written_rows = [{'item_index': 0, 'assignment_id': 5, 'node_id': 1, 'node_check_id': 100}]
+    mock_record = mocker.patch('app.services.check_ingest.check_repository.record_check_results_bulk', return_value=written_rows)
+
+    rows, item_errors = check_ingest.record_check_items(mock_cursor, [_bulk_item(0, 5)])
+
+    assert rows == written_rows and item_errors == []
+    mock_record.assert_called_once()
+
+
+def test_record_check_items_isolates_failed_item_with_savepoints(mocker, mock_cursor):
+    """Тест: ошибка БД в пакете не отменяет запись остальных элементов - они пишутся по одному."""
+    def fake_record(cursor, items):
+        if len(items) > 1 or items[0]['assignment_id'] == 7:
+            raise psycopg2.DataError("invalid input syntax")
+        return [{'item_index': items[0]['item_index'], 'assignment_id': items[0]['assignment_id'], 'node_id': 1, 'node_check_id': 1}]
+    mocker.patch('app.services.check_ingest.check_repository.record_check_results_bulk', side_effect=fake_record)
+
+    rows, item_errors = check_ingest.record_check_items(mock_cursor, [_bulk_item(0, 5), _bulk_item(1, 7), _bulk_item(2, 9)])
+
+    assert [row['item_index'] for row in rows] == [0, 2]
+    assert [(error['index'], error['assignment_id']) for error in item_errors] == [(1, 7)]
+    rollback_statements = [call for call in mock_cursor.execute.call_args_list if 'ROLLBACK TO' in repr(call.args[0])]
+    assert len(rollback_statements) == 2 # Пакет целиком и ошибочный элемент
+
+
+def test_spool_rejects_items_over_max_depth(spool):
+    """Тест: очередь принимает результаты до max_depth, сверх - IngestQueueFull; после ack место освобождается."""
+    checked_at = datetime(2025, 5, 1, 12, 0, tzinfo=timezone.utc)
+    assert check_ingest.enqueue_check_items([dict(_bulk_item(0, 5), check_timestamp=checked_at), _bulk_item(1, 6)]) == 2
+    with pytest.raises(check_ingest.IngestQueueFull):
+        check_ingest.enqueue_check_items([_bulk_item(0, 7), _bulk_item(1, 8)])
+
+    queued = spool.peek(10)
+    assert [item['assignment_id'] for _, item in queued] == [5, 6]
+    assert queued[0][1]['check_timestamp'] == checked_at.isoformat()
+    spool.ack(queued[0][0])
+    assert spool.stats()['depth'] == 1 and spool.stats()['rejected'] == 2
+
+
+def test_flush_writes_batch_and_acks_after_commit(mocker, spool):
+    """Тест: порция записывается одной транзакцией и удаляется из очереди только после фиксации."""
+    check_ingest.enqueue_check_items([_bulk_item(4, 5), _bulk_item(9, 6)])
+    mock_conn = MagicMock(closed=0)
+    mocker.patch('app.services.check_ingest.get_connection').return_value.__enter__.return_value = mock_conn
+    mock_record = mocker.patch('app.services.check_ingest.record_check_items', return_value=(
+        [{'item_index': 0, 'assignment_id': 5, 'node_id': 1, 'node_check_id': 10}], []))
+
+    assert check_ingest.flush_check_ingest_queue() == 2
+
+    assert [item['item_index'] for item in mock_record.call_args.args[1]] == [0, 1] # Индексы порции, а не запросов
+    mock_conn.commit.assert_called_once()
+    assert spool.stats()['depth'] == 0
+    assert check_ingest._writer_stats['written'] == 1 and check_ingest._writer_stats['dropped'] == 1
+
+
+def test_flush_keeps_items_when_database_unavailable(mocker, spool):
+    """Тест: при недоступной БД порция остается в очереди."""
+    check_ingest.enqueue_check_items([_bulk_item(0, 5)])
+    mocker.patch('app.services.check_ingest.get_connection', side_effect=psycopg2.OperationalError("connection refused"))
+
+    assert check_ingest.flush_check_ingest_queue() == 0
+    assert spool.stats()['depth'] == 1
+    assert check_ingest._writer_stats['failed_batches'] == 1
+
+
+def test_flush_counts_duplicates_separately(mocker, spool):
+    """Тест: повторы по ключу идемпотентности не считаются ни записанными, ни отброшенными и не публикуются."""
+    check_ingest.enqueue_check_items([_bulk_item(0, 5), _bulk_item(1, 6)])
+    mocker.patch('app.services.check_ingest.get_connection').return_value.__enter__.return_value = MagicMock(closed=0)
+    mocker.patch('app.services.check_ingest.record_check_items', return_value=([
+        {'item_index': 0, 'assignment_id': 5, 'node_id': 1, 'node_check_id': 10, 'duplicate': False},
+        {'item_index': 1, 'assignment_id': 6, 'node_id': 2, 'node_check_id': 7, 'duplicate': True}], []))
+    mock_publish = mocker.patch('app.services.check_ingest._publish_written_nodes')
+
+    assert check_ingest.flush_check_ingest_queue() == 2
+
+    assert mock_publish.call_args.args[1] == {1}
+    assert check_ingest._writer_stats['written'] == 1
+    assert check_ingest._writer_stats['duplicates'] == 1 and check_ingest._writer_stats['dropped'] == 0
+
+
+def test_spool_request_items_visible_only_after_commit(spool, tmp_path):
+    """Тест: порции запроса не видны записи до фиксации; откат и незавершенный запрос удаляют их из очереди."""
+    committed_tag, discarded_tag, unfinished_tag = (check_ingest.begin_spool_request() for _ in range(3))
+    check_ingest.enqueue_check_items([_bulk_item(0, 5)], committed_tag)
+    check_ingest.enqueue_check_items([_bulk_item(0, 6)], discarded_tag)
+    assert spool.peek(10) == [] and spool.stats()['depth'] == 2
+
+    assert check_ingest.commit_spool_request(committed_tag) == 1
+    assert check_ingest.rollback_spool_request(discarded_tag) == 1
+    assert [item['assignment_id'] for _, item in spool.peek(10)] == [5]
+    assert spool.stats()['depth'] == 1 and spool.stats()['enqueued'] == 1
+
+    check_ingest.enqueue_check_items([_bulk_item(0, 7)], unfinished_tag) # Процесс остановлен до фиксации
+    reopened_spool = check_ingest._CheckIngestSpool(str(tmp_path / 'spool.sqlite3'), max_depth=3)
+    assert [item['assignment_id'] for _, item in reopened_spool.peek(10)] == [5]
+    assert reopened_spool.stats()['depth'] == 1
+
+
+@pytest.fixture
+def async_bulk_client(mocker, spool):
+    """Маршрут /checks/bulk в асинхронном режиме: порции по 2 элемента, проверка API-ключа подменена."""
+    from app.routes import check_routes
+    mocker.patch('app.services.check_ingest.CHECK_INGEST_MODE', 'async')
+    mocker.patch('app.services.bulk_payload.CHECK_BULK_WRITE_BATCH_SIZE', 2)
+    mocker.patch('app.auth_utils.verify_api_key', return_value={'id': 1, 'role': 'loader'})
+    flask_app = Flask(__name__)
+    register_error_handlers(flask_app)
+    flask_app.register_blueprint(check_routes.bp, url_prefix='/api/v1')
+    return flask_app.test_client()
+
+
+def _post_bulk(client, payload: bytes):
+    return client.post('/api/v1/checks/bulk', data=payload, headers={'X-API-Key': 'k', 'Content-Type': 'application/json'})
+
+
+def test_async_bulk_parse_error_leaves_no_queued_batches(async_bulk_client, spool):
+    """Тест: ошибка разбора после уже помещенных в очередь порций (400) - очередь пуста; успешный запрос - 202."""
+    results = [{'assignment_id': n, 'IsAvailable': True} for n in (5, 6, 7)]
+    late_metadata = json.dumps({'results': results, 'object_id': 1060}).encode('utf-8')
+    truncated = json.dumps({'results': results}).encode('utf-8')[:-3]
+
+    assert _post_bulk(async_bulk_client, late_metadata).status_code == 400
+    assert _post_bulk(async_bulk_client, truncated).status_code == 400
+    assert spool.stats()['depth'] == 0 and spool.peek(10) == []
+
+    response = _post_bulk(async_bulk_client, json.dumps({'results': results[:2]}).encode('utf-8'))
+
+    assert response.status_code == 202 and response.get_json()['queued'] == 2
+    assert [item['assignment_id'] for _, item in spool.peek(10)] == [5, 6]
+
+
+def test_sync_bulk_keeps_written_results_when_status_recompute_fails(mocker):
+    """Тест: ошибка БД при пересчете статусов для дашборда откатывается до точки сохранения, пакет фиксируется."""
+    from app.routes import check_routes
+    mock_pool = MagicMock()
+    mock_conn = mock_pool.getconn.return_value
+    mock_conn.closed = 0
+    mock_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    mocker.patch('app.db_request.db_connection.db_pool', mock_pool)
+    mocker.patch('app.auth_utils.verify_api_key', return_value={'id': 1, 'role': 'loader'})
+    mocker.patch('app.services.check_ingest.CHECK_INGEST_MODE', 'sync')
+    mocker.patch('app.routes.check_routes.check_ingest.record_check_items', return_value=(
+        [{'item_index': 0, 'assignment_id': 5, 'node_id': 1, 'node_check_id': 10, 'duplicate': False}], []))
+    mocker.patch('app.routes.check_routes.dashboard_cache.is_dashboard_snapshot_built', return_value=True)
+    mocker.patch('app.routes.check_routes.node_service.get_processed_node_status',
+                 side_effect=psycopg2.OperationalError('statement timeout'))
+    mock_patch_nodes = mocker.patch('app.routes.check_routes.dashboard_cache.patch_dashboard_nodes')
+    flask_app = Flask(__name__)
+    db_request.init_request_db(flask_app)
+    register_error_handlers(flask_app)
+    flask_app.register_blueprint(check_routes.bp, url_prefix='/api/v1')
+
+    response = _post_bulk(flask_app.test_client(), json.dumps({'results': [{'assignment_id': 5, 'IsAvailable': True}]}).encode('utf-8'))
+
+    assert response.status_code == 200 and response.get_json()['processed'] == 1
+    executed_sql = [str(call.args[0]) for call in mock_conn.cursor.return_value.execute.call_args_list]
+    assert any('ROLLBACK TO SAVEPOINT' in statement for statement in executed_sql)
+    mock_conn.commit.assert_called_once()
+    mock_conn.rollback.assert_not_called()
+    mock_patch_nodes.assert_not_called()
@@ -0,0 +1,48 @@
+# status/tests/test_check_repository.py
+import pytest
+from unittest.mock import MagicMock
+from datetime import datetime, timezone
+from app.repositories import check_repository
+
+
+def test_fetch_node_checks_history_checked_at_range():
+    """Тест: границы интервала передаются условием по checked_at (ключ секционирования)."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = []
+    checked_from = datetime(2024, 5, 1, tzinfo=timezone.utc)
+    checked_to = datetime(2024, 5, 2, tzinfo=timezone.utc)
+
+    check_repository.fetch_node_checks_history(mock_cursor, 7, limit=10, checked_from=checked_from, checked_to=checked_to)
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert "nc.checked_at >= %(checked_from_param)s" in sql_called
+    assert "nc.checked_at < %(checked_to_param)s" in sql_called
+    assert params_called['checked_from_param'] == checked_from
+    assert params_called['checked_to_param'] == checked_to
+
+
+def test_fetch_assignment_checks_history_without_range():
+    """Тест: без границ интервала условие по checked_at не добавляется."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{'id': 1}]
+
+    result = check_repository.fetch_assignment_checks_history(mock_cursor, 3, limit=5)
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert "checked_from_param" not in sql_called and "checked_to_param" not in sql_called
+    assert params_called == {'assign_id_param': 3, 'limit_param': 5}
+    assert result == [{'id': 1}]
+
+
+def test_log_check_result_summaries_passes_now():
+    """Тест: сводные события записываются SQL-функцией, время отсчета передается параметром."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.return_value = {'logged_count': 3}
+    now = datetime(2024, 5, 1, 12, 0, 30, tzinfo=timezone.utc)
+
+    result = check_repository.log_check_result_summaries(mock_cursor, now=now)
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert "log_check_result_summaries(%s)" in sql_called
+    assert params_called == (now,)
+    assert result == 3
@@ -0,0 +1,101 @@
+# status/tests/test_dashboard_cache.py
+import json
+import pytest
+from unittest.mock import MagicMock
+from app.services import dashboard_cache
+
+
+def _build_nodes_view(nodes, subdivisions):
+    return {"nodes": nodes, "subdivisions": subdivisions}
+
+
+def _serialize(payload):
+    return json.dumps(payload, sort_keys=True, default=str)
+
+
+@pytest.fixture
+def snapshot_cache(mocker):
+    """Отдельный экземпляр кеша с подмененными источниками данных (узлы и подразделения)."""
+    mock_get_status = mocker.patch('app.services.dashboard_cache.node_service.get_processed_node_status', return_value=[
+        {'id': 1, 'name': 'srv-1', 'status_class': 'available'},
+        {'id': 2, 'name': 'srv-2', 'status_class': 'unknown'},
+    ])
+    mocker.patch('app.services.dashboard_cache.subdivision_repository.fetch_subdivisions',
+                 return_value=([{'id': 10, 'short_name': 'ОП'}], 1))
+    return dashboard_cache._DashboardSnapshotCache(max_age_seconds=3600), mock_get_status
+
+
+def test_get_view_builds_snapshot_once(snapshot_cache):
+    """Тест: повторные запросы одной версии отдаются из кеша без обращения к БД и с тем же ETag."""
+    cache, mock_get_status = snapshot_cache
+    first_body, first_etag = cache.get_view(MagicMock, 'status_detailed', _build_nodes_view, _serialize)
+    second_body, second_etag = cache.get_view(MagicMock, 'status_detailed', _build_nodes_view, _serialize)
+
+    assert mock_get_status.call_count == 1
+    assert first_body == second_body and first_etag == second_etag
+    assert cache.stats()['view_hits'] == 1
+    assert json.loads(first_body)['nodes'][0]['name'] == 'srv-1'
+
+
+
+def test_get_view_requests_cursor_only_on_rebuild(snapshot_cache):
+    """Тест: курсор (соединение из пула) запрашивается только при сборке снимка, но не при попадании в кеш."""
+    cache, _ = snapshot_cache
+    get_cursor = MagicMock()
+    cache.get_view(get_cursor, 'dashboard', _build_nodes_view, _serialize)
+    cache.get_view(get_cursor, 'dashboard', _build_nodes_view, _serialize)
+    cache.patch_nodes([{'id': 2, 'name': 'srv-2', 'status_class': 'unavailable'}])
+    cache.get_view(get_cursor, 'dashboard', _build_nodes_view, _serialize)
+
+    assert get_cursor.call_count == 1
+
+def test_patch_nodes_bumps_version_only_on_change(snapshot_cache):
+    """Тест: patch_nodes меняет версию и ETag только если статус узла действительно изменился."""
+    cache, mock_get_status = snapshot_cache
+    _, etag_before = cache.get_view(MagicMock, 'status_detailed', _build_nodes_view, _serialize)
+    version_before = cache.version
+
+    assert cache.patch_nodes([{'id': 1, 'name': 'srv-1', 'status_class': 'available'}]) == 0
+    assert cache.version == version_before
+
+    assert cache.patch_nodes([{'id': 2, 'name': 'srv-2', 'status_class': 'unavailable'}]) == 1
+    body_after, etag_after = cache.get_view(MagicMock, 'status_detailed', _build_nodes_view, _serialize)
+
+    assert cache.version == version_before + 1
+    assert etag_after != etag_before
+    assert json.loads(body_after)['nodes'][1]['status_class'] == 'unavailable'
+    assert mock_get_status.call_count == 1 # Патч не требует полной пересборки
+
+
+def test_invalidate_forces_rebuild_without_new_version_if_data_same(snapshot_cache):
+    """Тест: после инвалидации снимок перестраивается, но при тех же данных версия и ETag не меняются."""
+    cache, mock_get_status = snapshot_cache
+    assert cache.patch_nodes([{'id': 1, 'status_class': 'available'}]) == 0 # Снимка еще нет - патч игнорируется
+    _, etag_before = cache.get_view(MagicMock, 'dashboard', _build_nodes_view, _serialize)
+
+    cache.invalidate()
+    _, etag_after = cache.get_view(MagicMock, 'dashboard', _build_nodes_view, _serialize)
+
+    assert mock_get_status.call_count == 2
+    assert etag_after == etag_before
+
+
+def test_rebuild_notifies_listeners_with_changed_nodes_only(snapshot_cache):
+    """Тест: пересборка передает подписчикам только изменившиеся узлы; исчезновение узла - ресинхронизация."""
+    cache, mock_get_status = snapshot_cache
+    notifications = []
+    cache.add_change_listener(lambda changed_nodes, resync: notifications.append((changed_nodes, resync)))
+    cache.get_view(MagicMock, 'dashboard', _build_nodes_view, _serialize)
+    assert notifications == [] # Первая сборка не рассылается
+
+    mock_get_status.return_value = [
+        {'id': 1, 'name': 'srv-1', 'status_class': 'warning'},
+        {'id': 2, 'name': 'srv-2', 'status_class': 'unknown'},
+    ]
+    cache.max_age_seconds = 0
+    assert cache.refresh_if_stale(MagicMock()) is True
+    assert notifications[-1] == ([{'id': 1, 'name': 'srv-1', 'status_class': 'warning'}], False)
+
+    mock_get_status.return_value = [{'id': 1, 'name': 'srv-1', 'status_class': 'warning'}]
+    cache.refresh_if_stale(MagicMock())
+    assert notifications[-1] == ([], True)
@@ -0,0 +1,88 @@
+# status/tests/test_db_pool.py
+import threading
+import time
+import pytest
+import psycopg2.extensions
+from unittest.mock import MagicMock
+from app.db_connection import BoundedConnectionPool, PoolTimeoutError, PoolQueueFullError
+
+
+def _make_connection():
+    """Мок соединения psycopg2 в состоянии IDLE (без открытой транзакции)."""
+    mock_conn = MagicMock()
+    mock_conn.closed = 0
+    mock_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+    return mock_conn
+
+
+def _make_pool(maxconn=2, **pool_kwargs):
+    connect = MagicMock(side_effect=lambda: _make_connection())
+    pool_kwargs.setdefault('validate_idle_seconds', 3600)
+    return BoundedConnectionPool(0, maxconn, connect, **pool_kwargs), connect
+
+
+def test_getconn_reuses_returned_connection():
+    """Тест: возвращенное соединение выдается повторно без создания нового."""
+    pool, connect = _make_pool()
+    first_conn = pool.getconn()
+    pool.putconn(first_conn)
+
+    assert pool.getconn() is first_conn
+    assert connect.call_count == 1
+    assert pool.stats()['in_use'] == 1
+
+
+def test_getconn_waits_for_release_then_times_out():
+    """Тест: при исчерпании пула getconn ждет освобождения соединения, без освобождения - таймаут."""
+    pool, _ = _make_pool(maxconn=1, wait_timeout=2)
+    busy_conn = pool.getconn()
+    releaser = threading.Timer(0.1, pool.putconn, args=(busy_conn,))
+    releaser.start()
+
+    assert pool.getconn() is busy_conn # Дождались возврата
+    assert pool.stats()['waits'] == 1
+
+    pool.wait_timeout = 0.05
+    with pytest.raises(PoolTimeoutError):
+        pool.getconn()
+    assert pool.stats()['timeouts'] == 1
+
+
+def test_getconn_rejects_when_wait_queue_full():
+    """Тест: при заполненной очереди ожидания запрос отклоняется сразу."""
+    pool, _ = _make_pool(maxconn=1, max_waiters=0)
+    pool.getconn()
+    with pytest.raises(PoolQueueFullError):
+        pool.getconn()
+    assert pool.stats()['rejected'] == 1
+
+
+def test_putconn_discards_broken_and_rolls_back_open_transaction():
+    """Тест: соединение в неизвестном состоянии закрывается, незавершенная транзакция откатывается."""
+    pool, connect = _make_pool()
+    broken_conn = pool.getconn()
+    broken_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+    pool.putconn(broken_conn)
+    broken_conn.close.assert_called_once()
+
+    in_transaction_conn = pool.getconn()
+    in_transaction_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    pool.putconn(in_transaction_conn)
+    in_transaction_conn.rollback.assert_called_once()
+
+    pool_stats = pool.stats()
+    assert pool_stats['discarded_broken'] == 1 and pool_stats['idle'] == 1
+    assert connect.call_count == 2
+
+
+def test_expired_connection_is_recycled():
+    """Тест: соединение старше max_age_seconds не выдается повторно, вместо него создается новое."""
+    pool, connect = _make_pool(max_age_seconds=0.01)
+    old_conn = pool.getconn()
+    time.sleep(0.02)
+    pool.putconn(old_conn)
+
+    new_conn = pool.getconn()
+    assert new_conn is not old_conn
+    assert pool.stats()['recycled_age'] == 1
+    assert connect.call_count == 2
@@ -0,0 +1,149 @@
+# status/tests/test_db_request.py
+import pytest
+import psycopg2
+import psycopg2.extensions
+from psycopg2 import sql
+from unittest.mock import MagicMock
+from flask import Flask, g
+from app import db_request
+
+
+@pytest.fixture
+def lazy_db_app(mocker):
+    """Минимальное приложение с ленивым g и подмененным пулом соединений."""
+    mock_pool = MagicMock()
+    mock_pool.getconn.return_value.closed = 0
+    mock_pool.getconn.return_value.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    mocker.patch('app.db_request.db_connection.db_pool', mock_pool)
+    mocker.patch.dict(db_request._hold_stats, clear=True)
+    flask_app = Flask(__name__)
+    db_request.init_request_db(flask_app)
+
+    @flask_app.route('/static-page')
+    def static_page():
+        return 'ok'
+
+    @flask_app.route('/uses-db')
+    def uses_db():
+        g.db_cursor.execute("SELECT 1;")
+        assert g.db_conn is mock_pool.getconn.return_value
+        return 'ok'
+
+    @flask_app.route('/writes-db', methods=['POST'])
+    def writes_db():
+        g.db_cursor.execute("UPDATE nodes SET name = 'x';")
+        db_request.call_after_commit(lambda: flask_app.config['after_commit_calls'].append('done'))
+        return ('', 400) if flask_app.config.get('fail_write') else ('', 201)
+
+    @flask_app.route('/reads-and-saves-db')
+    def reads_and_saves_db():
+        g.db_cursor.execute("SELECT get_offline_config_version(1);")
+        db_request.commit_read_request()
+        return 'ok'
+
+    flask_app.config['after_commit_calls'] = []
+    return flask_app, mock_pool
+
+
+def test_route_without_db_does_not_take_connection(lazy_db_app):
+    """Тест: маршрут, не обращающийся к g.db_*, не занимает соединение из пула."""
+    flask_app, mock_pool = lazy_db_app
+    response = flask_app.test_client().get('/static-page')
+
+    assert response.status_code == 200
+    mock_pool.getconn.assert_not_called()
+    mock_pool.putconn.assert_not_called()
+    assert db_request.get_db_hold_stats() == []
+
+
+def test_route_with_db_takes_and_returns_connection_once(lazy_db_app):
+    """Тест: соединение берется при первом обращении, возвращается один раз, время удержания учитывается."""
+    flask_app, mock_pool = lazy_db_app
+    response = flask_app.test_client().get('/uses-db')
+
+    assert response.status_code == 200
+    mock_pool.getconn.assert_called_once()
+    mock_pool.putconn.assert_called_once_with(mock_pool.getconn.return_value)
+    hold_stats = db_request.get_db_hold_stats()
+    assert [(row["endpoint"], row["count"]) for row in hold_stats] == [('uses_db', 1)]
+
+
+def test_pool_error_leaves_db_attributes_none(lazy_db_app):
+    """Тест: при ошибке пула g.db_conn/g.db_cursor равны None (как и раньше), повторного захода в пул нет."""
+    flask_app, mock_pool = lazy_db_app
+    mock_pool.getconn.side_effect = psycopg2.OperationalError("pool exhausted")
+
+    with flask_app.test_request_context('/uses-db'):
+        assert g.db_cursor is None
+        assert g.db_conn is None
+    mock_pool.getconn.assert_called_once()
+    mock_pool.putconn.assert_not_called()
+
+
+def test_successful_write_commits_once_then_runs_after_commit(lazy_db_app):
+    """Тест: успешный изменяющий запрос фиксируется один раз, затем выполняются действия после фиксации."""
+    flask_app, mock_pool = lazy_db_app
+    mock_conn = mock_pool.getconn.return_value
+    response = flask_app.test_client().post('/writes-db')
+
+    assert response.status_code == 201
+    mock_conn.commit.assert_called_once()
+    mock_conn.rollback.assert_not_called()
+    assert flask_app.config['after_commit_calls'] == ['done']
+
+
+def test_read_commits_only_when_requested(lazy_db_app):
+    """Тест: GET откатывается, если маршрут не запросил фиксацию через commit_read_request."""
+    flask_app, mock_pool = lazy_db_app
+    mock_conn = mock_pool.getconn.return_value
+    client = flask_app.test_client()
+
+    assert client.get('/uses-db').status_code == 200
+    mock_conn.commit.assert_not_called()
+    mock_conn.rollback.assert_called_once()
+
+    assert client.get('/reads-and-saves-db').status_code == 200
+    mock_conn.commit.assert_called_once()
+    mock_conn.rollback.assert_called_once()
+
+
+def test_failed_write_rolls_back_and_skips_after_commit(lazy_db_app):
+    """Тест: ответ с ошибкой откатывает транзакцию, действия после фиксации не выполняются."""
+    flask_app, mock_pool = lazy_db_app
+    flask_app.config['fail_write'] = True
+    mock_conn = mock_pool.getconn.return_value
+    response = flask_app.test_client().post('/writes-db')
+
+    assert response.status_code == 400
+    mock_conn.commit.assert_not_called()
+    mock_conn.rollback.assert_called_once()
+    assert flask_app.config['after_commit_calls'] == []
+
+
+def test_commit_error_turns_response_into_500(lazy_db_app):
+    """Тест: ошибка фиксации откатывает транзакцию и возвращает 500 вместо успешного ответа."""
+    flask_app, mock_pool = lazy_db_app
+    mock_conn = mock_pool.getconn.return_value
+    mock_conn.commit.side_effect = psycopg2.OperationalError("could not serialize access")
+    response = flask_app.test_client().post('/writes-db')
+
+    assert response.status_code == 500
+    assert response.get_json()['error']['code'] == 'INTERNAL_SERVER_ERROR'
+    mock_conn.rollback.assert_called_once()
+    mock_pool.putconn.assert_called_once_with(mock_conn)
+    assert flask_app.config['after_commit_calls'] == []
+
+
+def test_savepoint_rolls_back_only_failed_block():
+    """Тест: исключение внутри savepoint откатывает только блок и пробрасывается дальше."""
+    mock_cursor = MagicMock()
+    with db_request.savepoint(mock_cursor, 'item'):
+        pass
+    with pytest.raises(ValueError):
+        with db_request.savepoint(mock_cursor, 'item'):
+            raise ValueError("bad item")
+
+    executed = [call.args[0] for call in mock_cursor.execute.call_args_list]
+    expected = [sql.SQL(statement).format(sql.Identifier('item')) for statement in
+                ("SAVEPOINT {}", "RELEASE SAVEPOINT {}", "SAVEPOINT {}", "ROLLBACK TO SAVEPOINT {}")]
+    assert executed == expected
@@ -0,0 +1,71 @@
+# status/tests/test_event_repository.py
+import pytest
+from datetime import date, datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from app.repositories import event_repository
+
+EVENT_TIME = datetime(2025, 5, 1, 12, 0, 0, 123456, tzinfo=timezone.utc)
+
+
+def _event(event_id, event_time):
+    return {'id': event_id, 'event_time': event_time, 'event_type': 'CHECK_RESULT_RECEIVED'}
+
+
+def test_event_cursor_round_trip_and_rejects_garbage():
+    """Тест: курсор восстанавливает позицию (event_time, id) с микросекундами; мусор - ValueError."""
+    cursor_token = event_repository.encode_event_cursor(EVENT_TIME, 42)
+    assert event_repository.decode_event_cursor(cursor_token) == (EVENT_TIME, 42)
+    for bad_token in ('не-курсор', 'W10', event_repository.encode_event_cursor(EVENT_TIME, 42)[:-3]):
+        with pytest.raises(ValueError):
+            event_repository.decode_event_cursor(bad_token)
+
+
+def test_fetch_page_continues_after_cursor_and_returns_next_cursor():
+    """Тест: страница выбирается по позиции курсора без OFFSET; лишняя строка дает next_cursor последнего события."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [_event(10 - i, EVENT_TIME - timedelta(seconds=i)) for i in range(3)]
+
+    events, next_cursor = event_repository.fetch_system_events_page(
+        mock_cursor, limit=2, after_cursor=event_repository.encode_event_cursor(EVENT_TIME, 11), node_id=5)
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert '(event_time, id) < (%(cur_t)s, %(cur_id)s)' in sql_called and 'OFFSET' not in sql_called
+    assert params_called['lim'] == 3 and params_called['n_id'] == 5 and params_called['cur_id'] == 11
+    assert [event['id'] for event in events] == [10, 9]
+    assert event_repository.decode_event_cursor(next_cursor) == (EVENT_TIME - timedelta(seconds=1), 9)
+
+
+def test_fetch_page_last_page_has_no_next_cursor():
+    """Тест: неполная страница - последняя."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [_event(1, EVENT_TIME)]
+    assert event_repository.fetch_system_events_page(mock_cursor, limit=2) == ([_event(1, EVENT_TIME)], None)
+
+
+def test_count_modes_estimate_and_capped():
+    """Тест: оценка берется из плана запроса, подсчет с пределом сообщает о превышении."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchone.return_value = {'QUERY PLAN': [{'Plan': {'Plan Rows': 1234567}}]}
+    assert event_repository.count_system_events(mock_cursor, 'estimate', severity='error') == (1234567, True)
+    assert mock_cursor.execute.call_args[0][0].startswith('EXPLAIN')
+
+    mock_cursor.fetchone.return_value = {'count': 11}
+    assert event_repository.count_system_events(mock_cursor, 'capped', cap=10) == (10, True)
+    assert mock_cursor.execute.call_args[0][1]['count_cap'] == 11
+
+    mock_cursor.reset_mock()
+    assert event_repository.count_system_events(mock_cursor, 'none') == (None, False)
+    mock_cursor.execute.assert_not_called()
+
+
+def test_demote_event_partitions_returns_names():
+    """Тест: перевод секций в холодные - SQL-функция с датой границы, результат - имена секций."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{'partition_name': 'system_events_p20240501'}]
+
+    demoted = event_repository.demote_event_partitions(mock_cursor, date(2024, 5, 2))
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert "demote_event_partitions(%s)" in sql_called
+    assert params_called == (date(2024, 5, 2),)
+    assert demoted == ['system_events_p20240501']
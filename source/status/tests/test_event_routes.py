@@ -0,0 +1,107 @@
+# status/tests/test_event_routes.py
+import psycopg2.extensions
+import psycopg2.extras
+import pytest
+from datetime import datetime, timedelta, timezone
+from unittest.mock import MagicMock
+from flask import Flask
+from app import db_request
+from app.errors import register_error_handlers
+from app.routes import event_routes
+
+
+class _FakeEventsCursor:
+    """Курсор с dict-строками (как RealDictCursor): журнал событий и настройки хранения."""
+    def __init__(self, events):
+        self.events = events
+        self.executed = []
+        self.closed = False
+        self._last_sql = ''
+
+    def execute(self, sql, params=None):
+        self.executed.append((sql, params))
+        self._last_sql = sql
+
+    def fetchall(self):
+        if 'FROM settings' in self._last_sql:
+            return [{'key': 'retention_system_events_hot_days', 'value': '2'}]
+        limit = self.executed[-1][1].get('lim', len(self.events))
+        return [dict(event) for event in self.events[:limit]]
+
+    def fetchone(self):
+        return {'count': len(self.events)}
+
+    def close(self):
+        self.closed = True
+
+    def event_queries(self):
+        return [(sql, params) for sql, params in self.executed if 'FROM system_events' in sql]
+
+
+def _event(event_id, event_time):
+    return {'id': event_id, 'event_time': event_time, 'event_type': 'CHECK_STATE_CHANGED', 'severity': 'INFO',
+            'message': f'event {event_id}', 'source': None, 'object_id': None, 'node_id': None,
+            'assignment_id': None, 'node_check_id': None, 'related_entity': None, 'related_entity_id': None,
+            'details': None}
+
+
+@pytest.fixture
+def events_app(mocker):
+    """Приложение только с маршрутами журнала; соединение из пула отдает курсор с dict-строками."""
+    now = datetime.now(timezone.utc)
+    fake_cursor = _FakeEventsCursor([_event(3, now), _event(2, now - timedelta(minutes=1)), _event(1, now - timedelta(minutes=2))])
+    mock_pool = MagicMock()
+    mock_conn = mock_pool.getconn.return_value
+    mock_conn.closed = 0
+    mock_conn.info.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    mock_conn.cursor.return_value = fake_cursor
+    mocker.patch('app.db_request.db_connection.db_pool', mock_pool)
+    flask_app = Flask(__name__)
+    db_request.init_request_db(flask_app)
+    register_error_handlers(flask_app)
+    flask_app.register_blueprint(event_routes.bp, url_prefix='/api/v1/events')
+    return flask_app, mock_conn, fake_cursor
+
+
+def test_events_cursor_pages_use_request_dict_cursor(events_app):
+    """Тест: страницы по курсору читаются через курсор запроса (RealDictCursor), next_cursor ведет дальше."""
+    flask_app, mock_conn, fake_cursor = events_app
+    client = flask_app.test_client()
+
+    first_page = client.get('/api/v1/events?cursor=&limit=2')
+    assert first_page.status_code == 200
+    first_data = first_page.get_json()
+    assert [item['id'] for item in first_data['items']] == [3, 2]
+    assert first_data['next_cursor'] and first_data['total_count'] is None
+    mock_conn.cursor.assert_called_with(cursor_factory=psycopg2.extras.RealDictCursor)
+
+    second_page = client.get(f"/api/v1/events?cursor={first_data['next_cursor']}&limit=2&count=exact")
+    assert second_page.status_code == 200
+    assert second_page.get_json()['total_count'] == 3
+    page_sql, page_params = fake_cursor.event_queries()[-2]
+    assert '(event_time, id) <' in page_sql and page_params['cur_id'] == 2
+
+
+def test_events_default_to_hot_partitions_unless_archive_requested(events_app):
+    """Тест: без start_time выборка ограничена горячими секциями (hot_from); include_archive и start_time снимают границу."""
+    flask_app, _, fake_cursor = events_app
+    client = flask_app.test_client()
+
+    hot_response = client.get('/api/v1/events?count=none')
+    assert hot_response.status_code == 200
+    hot_from = datetime.fromisoformat(hot_response.get_json()['hot_from'])
+    expected_boundary = (datetime.now(timezone.utc) - timedelta(days=2)).replace(hour=0, minute=0, second=0, microsecond=0)
+    assert hot_from == expected_boundary
+    assert fake_cursor.event_queries()[-1][1]['start_t'] == hot_from
+
+    fake_cursor.executed.clear()
+    archive_response = client.get('/api/v1/events?count=none&include_archive=true')
+    assert archive_response.status_code == 200
+    assert archive_response.get_json()['hot_from'] is None
+    assert not any('FROM settings' in sql for sql, _ in fake_cursor.executed)
+    assert 'start_t' not in fake_cursor.event_queries()[-1][1]
+
+    period_response = client.get('/api/v1/events?count=none&start_time=2025-01-01T00:00:00Z')
+    assert period_response.status_code == 200
+    assert period_response.get_json()['hot_from'] is None
+    assert fake_cursor.event_queries()[-1][1]['start_t'] == '2025-01-01T00:00:00Z'
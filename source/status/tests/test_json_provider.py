@@ -0,0 +1,64 @@
+# status/tests/test_json_provider.py
+import json
+import pytest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from flask import Flask, jsonify, request
+from psycopg2.extras import RealDictRow
+from app import json_provider
+
+
+def _history_row():
+    row = RealDictRow()
+    row['id'] = 7
+    row['checked_at'] = datetime(2025, 5, 1, 12, 0, 0, 250000, tzinfo=timezone.utc)
+    row['check_timestamp'] = datetime(2025, 5, 1, 11, 59, 58, tzinfo=timezone.utc)
+    row['check_day'] = date(2025, 5, 1)
+    row['success_ratio'] = Decimal('0.7500')
+    row['node_name'] = 'Узел'
+    return row
+
+
+@pytest.fixture(params=[True, False], ids=['orjson', 'json'])
+def serializer_mode(request, mocker):
+    """Каждый тест выполняется и с orjson, и со стандартным json."""
+    if request.param and not json_provider.HAS_ORJSON:
+        pytest.skip("orjson не установлен")
+    mocker.patch('app.json_provider.HAS_ORJSON', request.param)
+    return request.param
+
+
+def test_dumps_serializes_db_rows_like_isoformat(serializer_mode):
+    """Тест: даты - как datetime.isoformat(), Decimal - строкой, ключи-числа - строками, кириллица без экранирования."""
+    row = _history_row()
+    decoded = json.loads(json_provider.dumps({5: row}))
+
+    assert decoded == {'5': {
+        'id': 7, 'checked_at': row['checked_at'].isoformat(), 'check_timestamp': row['check_timestamp'].isoformat(),
+        'check_day': '2025-05-01', 'success_ratio': '0.7500', 'node_name': 'Узел'
+    }}
+    assert 'Узел' in json_provider.dumps(row)
+
+
+def test_dumps_falls_back_for_values_outside_orjson_range(serializer_mode):
+    """Тест: целое больше 64 бит и нестандартные аргументы json.dumps обрабатываются стандартным json."""
+    assert json.loads(json_provider.dumps({'value': 2 ** 70})) == {'value': 2 ** 70}
+    assert json_provider.dumps({'b': 1, 'a': 2}, sort_keys=True) == '{"a": 2, "b": 1}'
+    with pytest.raises(TypeError):
+        json_provider.dumps({'value': object()})
+
+
+def test_flask_app_uses_provider_for_jsonify_and_get_json(serializer_mode):
+    """Тест: jsonify и request.get_json приложения идут через FastJSONProvider."""
+    flask_app = Flask(__name__)
+    flask_app.json = json_provider.FastJSONProvider(flask_app)
+
+    @flask_app.route('/history', methods=['POST'])
+    def history():
+        return jsonify(rows=[_history_row()], received=request.get_json())
+
+    response = flask_app.test_client().post('/history', json={'limit': 10})
+
+    assert response.get_json()['rows'][0]['checked_at'] == '2025-05-01T12:00:00.250000+00:00'
+    assert response.get_json()['received'] == {'limit': 10}
+    assert response.mimetype == 'application/json'
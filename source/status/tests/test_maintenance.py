@@ -0,0 +1,58 @@
+# status/tests/test_maintenance.py
+import psycopg2
+from unittest.mock import MagicMock
+from datetime import datetime, timezone, date
+from app.services import maintenance
+
+
+def _mock_conn(lock_acquired: bool) -> tuple:
+    mock_conn = MagicMock()
+    mock_cursor = mock_conn.cursor.return_value.__enter__.return_value
+    mock_cursor.fetchone.return_value = (lock_acquired,)
+    return mock_conn, mock_cursor
+
+
+def test_run_maintenance_skipped_when_other_process_holds_lock(mocker):
+    """Тест: без рекомендательной блокировки прогон не выполняется."""
+    mock_retention = mocker.patch('app.services.maintenance.retention_service.run_retention')
+    mock_create = mocker.patch('app.services.maintenance.check_repository.create_check_partitions')
+    mock_conn, _ = _mock_conn(lock_acquired=False)
+
+    assert maintenance.run_maintenance(mock_conn) is None
+    mock_create.assert_not_called()
+    mock_retention.assert_not_called()
+
+
+def test_run_maintenance_continues_after_partition_error(mocker):
+    """Тест: ошибка создания секций не отменяет остальные шаги, блокировка снимается."""
+    mocker.patch('app.services.maintenance.check_repository.create_check_partitions',
+                 side_effect=psycopg2.OperationalError('lock timeout'))
+    mock_create_events = mocker.patch('app.services.maintenance.event_repository.create_event_partitions', return_value=8)
+    mock_retention = mocker.patch('app.services.maintenance.retention_service.run_retention', return_value={'deleted_events': 0})
+    mock_conn, mock_cursor = _mock_conn(lock_acquired=True)
+    now_utc = datetime(2024, 5, 20, 3, 0, tzinfo=timezone.utc)
+
+    maintenance_stats = maintenance.run_maintenance(mock_conn, now=now_utc)
+
+    assert maintenance_stats == {'check_partitions': 0, 'event_partitions': 8, 'retention': {'deleted_events': 0}}
+    mock_create_events.assert_called_once_with(mocker.ANY, date(2024, 5, 19), date(2024, 5, 27))
+    mock_retention.assert_called_once_with(mock_conn, now=now_utc)
+    mock_conn.rollback.assert_called()
+    assert mock_cursor.execute.call_args_list[-1][0][0] == "SELECT pg_advisory_unlock(%s);"
+    assert maintenance.get_maintenance_stats()['last_errors'] == ['check_partitions: lock timeout']
+
+
+def test_write_check_event_summaries_commits_and_counts(mocker):
+    """Тест: сводные события записываются и фиксируются, ошибка БД откатывается без исключения."""
+    mock_log = mocker.patch('app.services.maintenance.check_repository.log_check_result_summaries', return_value=3)
+    mock_conn = MagicMock()
+    logged_before = maintenance.get_maintenance_stats()['summary_events_logged']
+
+    assert maintenance.write_check_event_summaries(mock_conn) == 3
+    mock_conn.commit.assert_called_once()
+    assert maintenance.get_maintenance_stats()['summary_events_logged'] == logged_before + 3
+
+    mock_log.side_effect = psycopg2.OperationalError('connection lost')
+    assert maintenance.write_check_event_summaries(mock_conn) == 0
+    mock_conn.rollback.assert_called_once()
+    assert maintenance.get_maintenance_stats()['summary_last_error'] == 'connection lost'
@@ -31,5 +31,37 @@ def test_get_node_by_id_not_found(mocker):
     mock_fetch.assert_called_once_with(mock_cursor, node_id=99)
     assert node is None
 
+def test_fetch_node_ping_status_node_set_filter():
+    """Тест: набор ID узлов передается в SQL-функцию одним массивом."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{'node_id': 3, 'is_available': True, 'check_success': True}]
+
+    result = node_repository.fetch_node_ping_status(mock_cursor, {5, 3})
+
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert 'INTEGER[]' in sql_called
+    assert params_called == {'node_ids_param': [3, 5]}
+    assert result[0]['node_id'] == 3
+
+def test_fetch_node_primary_status_single_query_for_node_set():
+    """Тест: статус по политикам типов узлов запрашивается одним вызовом SQL-функции для набора узлов."""
+    mock_cursor = MagicMock()
+    mock_cursor.fetchall.return_value = [{'node_id': 3, 'status_method': 'PING', 'status_combine': 'latest'}]
+
+    result = node_repository.fetch_node_primary_status(mock_cursor, [3, 5, 3])
+
+    mock_cursor.execute.assert_called_once()
+    sql_called, params_called = mock_cursor.execute.call_args[0]
+    assert 'get_node_primary_status' in sql_called
+    assert params_called == {'node_ids_param': [3, 5]}
+    assert result[0]['status_method'] == 'PING'
+    assert node_repository.fetch_node_primary_status(mock_cursor, []) == []
+
+def test_fetch_node_base_info_empty_set_skips_db():
+    """Тест: пустой набор узлов не приводит к запросу в БД (в отличие от None - все узлы)."""
+    mock_cursor = MagicMock()
+    assert node_repository.fetch_node_base_info(mock_cursor, set()) == []
+    mock_cursor.execute.assert_not_called()
+
 # ... другие тесты для create_node, update_node, delete_node (могут быть сложнее, т.к. меняют состояние)
 # Для create/update/delete лучше использовать интеграционные тесты с тестовой БД.
\ No newline at end of file
@@ -0,0 +1,73 @@
+# status/tests/test_request_decoding.py
+import gzip
+import json
+import pytest
+from flask import Blueprint, Flask, jsonify, request
+from app import request_decoding
+from app.errors import register_error_handlers
+from app.services import bulk_payload
+
+
+@pytest.fixture
+def decoding_client():
+    """Минимальное приложение с эндпоинтами приема результатов и распаковкой тел запросов."""
+    flask_app = Flask(__name__)
+    checks_bp = Blueprint('checks', __name__)
+
+    @checks_bp.route('/checks', methods=['POST'])
+    def add_check_v1():
+        return jsonify(request.get_json())
+
+    @checks_bp.route('/checks/bulk', methods=['POST'])
+    def add_checks_bulk_v1():
+        return jsonify(items=sum(1 for kind, _, _ in bulk_payload.iter_bulk_payload(request.stream) if kind == 'item'))
+
+    @checks_bp.route('/events', methods=['POST'])
+    def create_event():
+        return jsonify(request.get_json())
+
+    flask_app.register_blueprint(checks_bp)
+    request_decoding.init_request_decoding(flask_app)
+    register_error_handlers(flask_app)
+    return flask_app.test_client()
+
+
+def _post(client, path, body, encoding):
+    return client.post(path, data=body, headers={'Content-Encoding': encoding, 'Content-Type': 'application/json'})
+
+
+def test_gzip_body_is_decoded_for_check_endpoints(decoding_client):
+    """Тест: сжатое тело распаковывается и для get_json(), и для потокового разбора /checks/bulk."""
+    bulk_body = json.dumps({'results': [{'assignment_id': n} for n in range(500)]}).encode('utf-8')
+
+    assert _post(decoding_client, '/checks', gzip.compress(b'{"assignment_id": 5}'), 'gzip').get_json() == {'assignment_id': 5}
+    assert _post(decoding_client, '/checks/bulk', gzip.compress(bulk_body), 'gzip').get_json() == {'items': 500}
+
+
+@pytest.mark.skipif(not request_decoding.HAS_ZSTANDARD, reason="zstandard не установлен")
+def test_zstd_body_is_decoded(decoding_client):
+    """Тест: тело zstd распаковывается при наличии модуля zstandard."""
+    import zstandard
+    body = zstandard.ZstdCompressor().compress(b'{"results": [{"assignment_id": 1}]}')
+    assert _post(decoding_client, '/checks/bulk', body, 'zstd').get_json() == {'items': 1}
+
+
+def test_decompressed_size_limit_rejects_bomb(decoding_client, mocker):
+    """Тест: распакованный объем сверх лимита - 413, даже если сжатое тело маленькое."""
+    mocker.patch('app.request_decoding.REQUEST_MAX_DECOMPRESSED_BYTES', 1024)
+    bomb = gzip.compress(b'{"results": [' + b' ' * 1_000_000 + b']}')
+
+    response = _post(decoding_client, '/checks/bulk', bomb, 'gzip')
+
+    assert len(bomb) < 1024 * 2 and response.status_code == 413
+
+
+@pytest.mark.parametrize('path, body, encoding, expected_status', [
+    ('/checks/bulk', b'not gzip', 'gzip', 400),
+    ('/checks/bulk', gzip.compress(b'{"results": []}')[:-8], 'gzip', 400),
+    ('/checks/bulk', b'{}', 'br', 415),
+    ('/events', gzip.compress(b'{}'), 'gzip', 415),
+])
+def test_invalid_compressed_bodies_are_rejected(decoding_client, path, body, encoding, expected_status):
+    """Тест: поврежденные данные - 400, неизвестная кодировка и сжатие для других эндпоинтов - 415."""
+    assert _post(decoding_client, path, body, encoding).status_code == expected_status
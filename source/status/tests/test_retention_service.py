@@ -0,0 +1,109 @@
+# status/tests/test_retention_service.py
+import pytest
+import psycopg2
+from unittest.mock import MagicMock
+from datetime import datetime, timezone
+from app.services import retention_service
+
+
+def test_load_retention_settings_falls_back_to_defaults(mocker):
+    """Тест: отсутствующие и некорректные значения настроек заменяются значениями по умолчанию."""
+    mocker.patch('app.services.retention_service.settings_repository.get_settings', return_value={
+        'retention_raw_checks_days': '14',
+        'retention_system_events_days': 'abc',
+        'retention_purge_batch_size': '0',
+    })
+    retention_settings = retention_service.load_retention_settings(MagicMock())
+
+    assert retention_settings['retention_raw_checks_days'] == 14
+    assert retention_settings['retention_system_events_days'] == 90
+    assert retention_settings['retention_purge_batch_size'] == 5000
+    assert retention_settings['retention_rollup_hourly_days'] == 180
+
+
+def test_get_history_cutoffs_aligned_to_utc_day(mocker):
+    """Тест: границы хранения выровнены по началу суток UTC."""
+    mocker.patch('app.services.retention_service.settings_repository.get_settings', return_value={
+        'retention_raw_checks_days': '2', 'retention_rollup_hourly_days': '10'
+    })
+    now_utc = datetime(2024, 5, 20, 15, 30, tzinfo=timezone.utc)
+    history_cutoffs = retention_service.get_history_cutoffs(MagicMock(), now=now_utc)
+
+    assert history_cutoffs['raw_cutoff'] == datetime(2024, 5, 18, tzinfo=timezone.utc)
+    assert history_cutoffs['hourly_cutoff'] == datetime(2024, 5, 10, tzinfo=timezone.utc)
+
+
+def test_purge_in_batches_commits_each_batch():
+    """Тест: удаление идет пакетами до первого неполного, каждый пакет фиксируется."""
+    mock_conn = MagicMock()
+    batch_results = iter([3, 3, 1])
+    purge_batch = MagicMock(side_effect=lambda size: next(batch_results))
+
+    total_deleted = retention_service._purge_in_batches(mock_conn, purge_batch, 3)
+
+    assert total_deleted == 7
+    assert purge_batch.call_count == 3
+    assert mock_conn.commit.call_count == 3
+
+
+def test_get_events_hot_boundary_aligned_to_utc_day(mocker):
+    """Тест: граница горячих секций журнала событий - начало суток UTC N суток назад."""
+    mocker.patch('app.services.retention_service.settings_repository.get_settings', return_value={
+        'retention_system_events_hot_days': '3'
+    })
+    now_utc = datetime(2024, 5, 20, 0, 30, tzinfo=timezone.utc)
+
+    assert retention_service.get_events_hot_boundary(MagicMock(), now=now_utc) == datetime(2024, 5, 17, tzinfo=timezone.utc)
+
+
+def test_run_retention_continues_when_event_partitions_fail(mocker):
+    """Тест: ошибка создания секций журнала событий откатывается, прогон продолжается."""
+    mocker.patch('app.services.retention_service.settings_repository.get_settings', return_value={})
+    mock_checks = mocker.patch('app.services.retention_service.check_repository')
+    mock_checks.get_oldest_check_time.return_value = None
+    mock_checks.drop_check_partitions.return_value = []
+    mock_checks.purge_default_partition_checks_batch.return_value = 0
+    mock_checks.purge_default_partition_ingest_keys_batch.return_value = 0
+    mock_checks.purge_check_rollups_batch.return_value = 0
+    mock_events = mocker.patch('app.services.retention_service.event_repository')
+    mock_events.create_event_partitions.side_effect = psycopg2.OperationalError('lock timeout')
+    mock_events.drop_event_partitions.return_value = ['system_events_p20240101']
+    mock_events.demote_event_partitions.return_value = []
+    mock_events.purge_default_partition_events_batch.return_value = 0
+    mock_conn = MagicMock()
+
+    stats = retention_service.run_retention(mock_conn, now=datetime(2024, 5, 20, 3, 0, tzinfo=timezone.utc))
+
+    assert stats['created_event_partitions'] == 0
+    assert stats['dropped_event_partitions'] == ['system_events_p20240101']
+    mock_events.demote_event_partitions.assert_called_once()
+    mock_checks.purge_check_rollups_batch.assert_called()
+    assert mock_conn.rollback.called
+
+
+def test_run_retention_continues_when_partition_drops_fail(mocker):
+    """Тест: ошибка БД при удалении секций истории и событий откатывает шаг, остальные шаги выполняются."""
+    mocker.patch('app.services.retention_service.settings_repository.get_settings', return_value={})
+    mock_checks = mocker.patch('app.services.retention_service.check_repository')
+    mock_checks.get_oldest_check_time.return_value = None
+    mock_checks.drop_check_partitions.side_effect = psycopg2.errors.InsufficientPrivilege('must be owner')
+    mock_checks.purge_default_partition_checks_batch.return_value = 0
+    mock_checks.purge_default_partition_ingest_keys_batch.return_value = 0
+    mock_checks.purge_check_rollups_batch.return_value = 0
+    mock_events = mocker.patch('app.services.retention_service.event_repository')
+    mock_events.create_event_partitions.return_value = 2
+    mock_events.drop_event_partitions.side_effect = psycopg2.errors.DependentObjectsStillExist('in use')
+    mock_events.demote_event_partitions.return_value = ['system_events_p20240501']
+    mock_events.purge_default_partition_events_batch.return_value = 0
+    mock_conn = MagicMock()
+
+    stats = retention_service.run_retention(mock_conn, now=datetime(2024, 5, 20, 3, 0, tzinfo=timezone.utc))
+
+    assert stats['dropped_partitions'] == []
+    assert stats['dropped_event_partitions'] == []
+    assert stats['demoted_event_partitions'] == ['system_events_p20240501']
+    assert stats['created_event_partitions'] == 2
+    mock_checks.purge_default_partition_checks_batch.assert_called()
+    mock_events.purge_default_partition_events_batch.assert_called()
+    mock_checks.purge_check_rollups_batch.assert_called()
+    assert mock_conn.rollback.call_count >= 2
@@ -0,0 +1,97 @@
+# status/tests/test_status_classifier.py
+import itertools
+import pytest
+from datetime import datetime, timedelta, timezone
+from dateutil import parser as dateutil_parser
+from app.services import node_service, status_classifier
+
+NOW = datetime(2025, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _legacy_status(node, now, method='PING'):
+    """Правила статуса в том виде, в каком они были в node_service до v5.0.19 (эталон эквивалентности)."""
+    current_status_class, current_status_text = "unknown", f"Нет данных ({method})"
+    try:
+        status_timeout_minutes = int(node.get('timeout_minutes', 5))
+        if status_timeout_minutes <= 0: raise ValueError("Таймаут должен быть > 0.")
+    except (ValueError, TypeError):
+        status_timeout_minutes = 5
+    timestamp_value = node.get('check_timestamp') or node.get('last_checked')
+    is_available, is_successful = node.get('is_available'), node.get('check_success')
+    if timestamp_value:
+        try:
+            if isinstance(timestamp_value, str): parsed = dateutil_parser.isoparse(timestamp_value)
+            elif isinstance(timestamp_value, datetime): parsed = timestamp_value
+            else: raise ValueError("Неподдерживаемый тип для времени")
+            if parsed.tzinfo is None: parsed = parsed.replace(tzinfo=timezone.utc)
+            outdated = now - parsed > timedelta(minutes=status_timeout_minutes)
+            if is_available is True:
+                if is_successful is True:
+                    current_status_class = "warning" if outdated else "available"
+                    current_status_text = f"Устарело ({method} > {status_timeout_minutes} мин)" if outdated else f"Доступен ({method})"
+                elif is_successful is False:
+                    current_status_class, current_status_text = "unavailable", f"Ошибка ({method}: критерии не пройдены)"
+                else:
+                    current_status_class, current_status_text = "warning", f"Предупреждение ({method}: статус критериев не ясен)"
+                    if outdated: current_status_text += f", данные устарели (> {status_timeout_minutes} мин)"
+            elif is_available is False:
+                current_status_class, current_status_text = "unavailable", f"Недоступен ({method}: ошибка выполнения)"
+            else:
+                current_status_class, current_status_text = "unknown", f"Статус {method} не определен"
+        except Exception:
+            current_status_class, current_status_text = "unknown", f"Ошибка данных ({method})"
+    elif is_available is False:
+        current_status_class, current_status_text = "unavailable", f"Недоступен ({method}: ошибка выполнения, время не определено)"
+    return current_status_class, current_status_text
+
+
+_TIMESTAMPS = [
+    None, '', NOW - timedelta(minutes=1), NOW - timedelta(minutes=7), NOW - timedelta(minutes=30),
+    (NOW - timedelta(minutes=6)).replace(tzinfo=None), NOW + timedelta(minutes=3),
+    (NOW - timedelta(minutes=2)).isoformat().replace('+00:00', 'Z'), (NOW - timedelta(hours=2)).isoformat(),
+    'не дата', 12345,
+]
+_TIMEOUTS = [5, 10, '10', None, 0, -3, 'abc']
+
+
+def test_classifier_matches_legacy_rules_for_all_combinations():
+    """Тест: табличный классификатор дает те же класс и текст, что прежний поузловой расчет."""
+    nodes = [
+        {'check_timestamp': timestamp, 'last_checked': NOW - timedelta(minutes=20) if use_last_checked else None,
+         'is_available': is_available, 'check_success': check_success, 'timeout_minutes': timeout}
+        for timestamp, use_last_checked, is_available, check_success, timeout in itertools.product(
+            _TIMESTAMPS, (False, True), (True, False, None, 1), (True, False, None), _TIMEOUTS)
+    ]
+    nodes.append({'is_available': True, 'check_success': True}) # Нет ни времени, ни таймаута
+
+    status_classifier.classify_nodes(nodes, 'PING', NOW)
+
+    mismatches = [(node, _legacy_status(node, NOW)) for node in nodes
+                  if (node['status_class'], node['status_text']) != _legacy_status(node, NOW)]
+    assert not mismatches
+
+
+def test_status_rules_cover_every_combination():
+    """Тест: правила без покрытия части комбинаций отвергаются при построении таблицы."""
+    with pytest.raises(ValueError):
+        status_classifier._build_status_table(status_classifier.STATUS_RULES[:-1])
+
+
+def test_get_processed_node_status_merges_and_classifies(mocker):
+    """Тест: узлы объединяются с ключевой проверкой, получают статус и иконку по умолчанию."""
+    mocker.patch('app.services.node_service.node_repository.fetch_node_base_info', return_value=[
+        {'id': 1, 'name': 'A', 'timeout_minutes': 5, 'icon_filename': 'server.svg'},
+        {'id': 2, 'name': 'B', 'timeout_minutes': 5, 'icon_filename': None},
+        {'id': None, 'name': 'без ID'},
+    ])
+    mocker.patch('app.services.node_service.node_repository.fetch_node_primary_status', return_value=[
+        {'node_id': 1, 'status_method': 'SQL_QUERY_EXECUTE', 'is_available': True, 'check_success': True,
+         'check_timestamp': datetime.now(timezone.utc)},
+        {'node_id': 2, 'status_method': 'PROCESS_LIST, PING', 'is_available': None, 'check_success': None},
+    ])
+
+    nodes = node_service.get_processed_node_status(mocker.MagicMock())
+
+    assert [(node['id'], node['status_class']) for node in nodes] == [(1, 'available'), (2, 'unknown')]
+    assert nodes[0]['status_text'] == 'Доступен (SQL_QUERY_EXECUTE)' # Метод из политики статуса типа узла
+    assert nodes[1]['status_text'] == 'Нет данных (PROCESS_LIST, PING)' and nodes[1]['icon_filename'] == node_service.DEFAULT_NODE_ICON
@@ -0,0 +1,41 @@
+# status/tests/test_status_push.py
+import pytest
+from unittest.mock import MagicMock
+from app.services import status_push
+
+
+def test_drain_coalesces_node_updates():
+    """Тест: несколько изменений одного узла между рассылками отправляются одним (последним) состоянием."""
+    delta_queue = status_push._StatusDeltaQueue(max_nodes_per_message=100)
+    delta_queue.queue([{'id': 1, 'status_class': 'unavailable'}, {'id': 2, 'status_class': 'available'}], False)
+    delta_queue.queue([{'id': 1, 'status_class': 'available'}], False)
+
+    messages = delta_queue.drain()
+
+    assert len(messages) == 1
+    assert messages[0]['seq'] == 1 and messages[0]['resync'] is False
+    assert {node['id']: node['status_class'] for node in messages[0]['nodes']} == {1: 'available', 2: 'available'}
+    assert delta_queue.drain() == [] # Нечего отправлять - номер не расходуется
+    assert delta_queue.current_seq() == 1
+
+
+def test_drain_splits_large_batch_into_sequential_messages():
+    """Тест: большой пакет (bulk на тысячи узлов) делится на несколько сообщений с последовательными номерами."""
+    delta_queue = status_push._StatusDeltaQueue(max_nodes_per_message=2000)
+    delta_queue.queue([{'id': node_id, 'status_class': 'available'} for node_id in range(5000)], False)
+
+    messages = delta_queue.drain()
+
+    assert [message['seq'] for message in messages] == [1, 2, 3]
+    assert sum(len(message['nodes']) for message in messages) == 5000
+
+
+def test_resync_only_message_and_flush_emits(mocker):
+    """Тест: запрос ресинхронизации без узлов тоже расходует номер и отправляется событием node_status_batch."""
+    delta_queue = status_push._StatusDeltaQueue(max_nodes_per_message=10)
+    mocker.patch.object(status_push, '_status_delta_queue', delta_queue)
+    mock_socketio = MagicMock()
+    delta_queue.queue([], True)
+
+    assert status_push.flush_status_updates(mock_socketio) == 1
+    mock_socketio.emit.assert_called_once_with('node_status_batch', {'seq': 1, 'resync': True, 'nodes': []})
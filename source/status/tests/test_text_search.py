@@ -0,0 +1,29 @@
+# status/tests/test_text_search.py
+from app.repositories import text_search
+
+
+def test_substring_clause_escapes_like_wildcards():
+    """Тест: %, _ и \\ в тексте поиска ищутся буквально, один параметр на все столбцы."""
+    params = {}
+    clause = text_search.substring_search_clause(('n.name', 'n.ip_address'), 'srv_01%', params, 'search')
+    assert clause == "(n.name ILIKE %(search)s OR n.ip_address ILIKE %(search)s)"
+    assert params == {'search': '%srv\\_01\\%%'}
+
+
+def test_prefix_tsquery_only_for_words():
+    """Тест: слова превращаются в префиксный tsquery; IP, имена файлов и короткие слова - нет."""
+    assert text_search.build_prefix_tsquery(' Ошибка  загрузки-файла ') == 'ошибка:* & загрузки:* & файла:*'
+    for not_words in ('10.0.0.15', 'report_2025.zrpu', 'ab', 'ping ok', "x' | y", ''):
+        assert text_search.build_prefix_tsquery(not_words) == ''
+
+
+def test_message_clause_chooses_indexed_path():
+    """Тест: слова ищутся по message_tsv, прочий текст - подстрокой по message."""
+    params = {}
+    assert text_search.message_search_clause('недоступен узел', params, 's_text') == \
+        "message_tsv @@ to_tsquery('russian', %(s_text)s)"
+    assert params['s_text'] == 'недоступен:* & узел:*'
+
+    params = {}
+    assert text_search.message_search_clause('192.168.1.', params, 's_text') == "(message ILIKE %(s_text)s)"
+    assert params['s_text'] == '%192.168.1.%'